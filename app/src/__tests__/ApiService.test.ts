@@ -5,6 +5,7 @@ import {
   savePreferences,
   saveOnboardingData,
   submitTelemetry,
+  submitTelemetryBatch,
   checkHealth
 } from '../services/api';
 
@@ -203,6 +204,48 @@ describe('API Service', () => {
     });
   });
   
+  describe('submitTelemetryBatch', () => {
+    it('should send all events as one NDJSON request', async () => {
+      const batchResult = { status: 'received', accepted: 2, rejected: 0, errors: [] };
+      mockFetch.mockImplementationOnce(() =>
+        Promise.resolve({
+          ok: true,
+          json: () => Promise.resolve(batchResult)
+        })
+      );
+
+      const events = [
+        { event: 'step_viewed', details: { step: 1 } },
+        { event: 'step_viewed', details: { step: 2 } },
+      ];
+
+      const result = await submitTelemetryBatch(events);
+
+      expect(mockFetch).toHaveBeenCalledTimes(1);
+      expect(mockFetch).toHaveBeenCalledWith('http://127.0.0.1:5002/telemetry/batch', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/x-ndjson',
+        },
+        body: events.map((event) => JSON.stringify(event)).join('\n') + '\n',
+      });
+      expect(result).toEqual(batchResult);
+    });
+
+    it('should throw when the backend rejects the batch', async () => {
+      mockFetch.mockImplementationOnce(() =>
+        Promise.resolve({
+          ok: false,
+          status: 500,
+          statusText: 'Internal Server Error'
+        })
+      );
+
+      await expect(submitTelemetryBatch([{ event: 'a', details: {} }]))
+        .rejects.toThrow('Failed to submit telemetry batch: 500 Internal Server Error');
+    });
+  });
+
   describe('checkHealth', () => {
     it('should check health successfully', async () => {
       mockFetch.mockImplementationOnce(() => 
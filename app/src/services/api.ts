@@ -102,6 +102,33 @@ export const submitTelemetry = async (
   }
 };
 
+export interface TelemetryBatchResult {
+  status: string;
+  accepted: number;
+  rejected: number;
+  errors: { index: number; errors: { loc: (string | number)[]; msg: string }[] }[];
+}
+
+/**
+ * Replay queued telemetry events to the backend in a single NDJSON request
+ */
+export const submitTelemetryBatch = async (events: TelemetryEvent[]): Promise<TelemetryBatchResult> => {
+  const body = events.map((event) => JSON.stringify(event)).join('\n') + '\n';
+  const response = await fetch(`${API_BASE_URL}/telemetry/batch`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/x-ndjson',
+    },
+    body,
+  });
+
+  if (!response.ok) {
+    throw new Error(`Failed to submit telemetry batch: ${response.status} ${response.statusText}`);
+  }
+
+  return await response.json();
+};
+
 /**
  * Check health status of the backend
  */
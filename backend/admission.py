@@ -0,0 +1,187 @@
+"""Admission control: per-class concurrency limits and priority queueing.
+
+Every request is mapped to a ``PriorityClass``. ``AdmissionController`` lets at
+most ``capacity`` requests run at once (per worker), and at most
+``max_concurrent`` of each class. A request that finds no free slot waits in a
+queue ordered by class priority, then arrival. When a slot frees up, the
+highest-priority waiter that fits its class limit gets it. A request still
+waiting after its class's ``deadline``, or arriving at a full queue, is shed
+(``AdmissionMiddleware`` answers 503 with ``Retry-After``).
+
+Capping the low-priority classes below ``capacity`` keeps slots free for the
+rest: a flood of telemetry can fill its own share and queue, but ``/health``
+and preference reads still start at once. Queued requests wait on a future,
+so they cost the event loop nothing until they are admitted.
+
+The controller is thread-safe and may be shared by requests on different
+event loops (e.g. the test client's).
+"""
+import asyncio
+import bisect
+import itertools
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from starlette.responses import JSONResponse
+
+from backend.telemetry_governor import retry_after_header
+
+ADMITTED = "admitted" # Started at once
+QUEUED = "queued" # Started after waiting for a slot
+SHED = "shed" # Rejected with 503
+OUTCOMES = (ADMITTED, QUEUED, SHED)
+
+
+class PriorityClass(NamedTuple):
+    name: str
+    priority: int # Lower is served first
+    max_concurrent: int = 0 # 0 = limited only by the controller's capacity
+    deadline: float = 1.0 # Seconds a request may wait for a slot; 0 = never wait
+
+
+class Overloaded(Exception):
+    """No slot became free within the class's deadline (or the queue was full)."""
+
+    def __init__(self, priority_class: PriorityClass, retry_after: float):
+        super().__init__(f"Server busy: no capacity for '{priority_class.name}' requests.")
+        self.priority_class = priority_class
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority_class", "loop", "future", "granted")
+
+    def __init__(self, priority_class: PriorityClass):
+        self.priority_class = priority_class
+        self.loop = asyncio.get_running_loop()
+        self.future = self.loop.create_future()
+        self.granted = False
+
+
+def _wake(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """Grants request slots by priority class; see the module docstring."""
+
+    def __init__(self, classes: Iterable[PriorityClass], capacity: int = 0, max_queue: int = 0):
+        self.classes: Dict[str, PriorityClass] = {c.name: c for c in classes}
+        self.capacity = capacity # 0 = no overall limit
+        self.max_queue = max_queue # 0 = unbounded
+        self.active: Dict[str, int] = {name: 0 for name in self.classes}
+        self.counts: Dict[str, Dict[str, int]] = {name: dict.fromkeys(OUTCOMES, 0) for name in self.classes}
+        self._running = 0
+        self._lock = threading.Lock()
+        self._queue: List[tuple] = [] # (priority, seq, waiter), kept sorted
+        self._seq = itertools.count()
+
+    def _fits(self, priority_class: PriorityClass) -> bool:
+        return (not self.capacity or self._running < self.capacity) and (
+            not priority_class.max_concurrent or self.active[priority_class.name] < priority_class.max_concurrent
+        )
+
+    def _take(self, priority_class: PriorityClass) -> None:
+        self._running += 1
+        self.active[priority_class.name] += 1
+
+    def _grant_waiters(self) -> None:
+        # Every waiter whose class fits is granted, highest priority first; the rest keep their place
+        i = 0
+        while i < len(self._queue) and (not self.capacity or self._running < self.capacity):
+            waiter = self._queue[i][2]
+            if self._fits(waiter.priority_class):
+                del self._queue[i]
+                self._take(waiter.priority_class)
+                waiter.granted = True
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            else:
+                i += 1
+
+    async def acquire(self, name: str) -> str:
+        """Waits for a slot; returns ``ADMITTED`` or ``QUEUED``, or raises ``Overloaded``."""
+        priority_class = self.classes[name]
+        with self._lock:
+            # Nothing fitting this class is ever left queued, so a fit here jumps no one
+            if self._fits(priority_class):
+                self._take(priority_class)
+                self.counts[name][ADMITTED] += 1
+                return ADMITTED
+            if priority_class.deadline <= 0 or (self.max_queue and len(self._queue) >= self.max_queue):
+                self.counts[name][SHED] += 1
+                raise Overloaded(priority_class, priority_class.deadline)
+            waiter = _Waiter(priority_class)
+            bisect.insort(self._queue, (priority_class.priority, next(self._seq), waiter)) # Seq is unique: waiters never compared
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), priority_class.deadline)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException: # Cancelled (client gone): give back a slot granted meanwhile
+            self._abandon(waiter)
+            raise
+        with self._lock:
+            if waiter.granted: # Granted, possibly just as the deadline passed
+                self.counts[name][QUEUED] += 1
+                return QUEUED
+            self._queue = [item for item in self._queue if item[2] is not waiter]
+            self.counts[name][SHED] += 1
+        raise Overloaded(priority_class, priority_class.deadline)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            granted = waiter.granted
+            if not granted:
+                self._queue = [item for item in self._queue if item[2] is not waiter]
+        if granted:
+            self.release(waiter.priority_class.name)
+
+    def release(self, name: str) -> None:
+        with self._lock:
+            self._running -= 1
+            self.active[name] -= 1
+            self._grant_waiters()
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            queued = {name: 0 for name in self.classes}
+            for _, _, waiter in self._queue:
+                queued[waiter.priority_class.name] += 1
+            return {
+                name: dict(self.counts[name], active=self.active[name], waiting=queued[name])
+                for name in self.classes
+            }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding a slot of ``class_for(method, path)`` for each request.
+
+    ``class_for`` may return None for requests that bypass admission control.
+    ``outcomes`` (optional) is a counter labelled by class and outcome.
+    """
+
+    def __init__(self, app, controller: AdmissionController, class_for: Callable[[str, str], Optional[str]], outcomes=None):
+        self.app = app
+        self.controller = controller
+        self.class_for = class_for
+        self.outcomes = outcomes
+
+    async def __call__(self, scope, receive, send):
+        name = self.class_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            outcome = await self.controller.acquire(name)
+        except Overloaded as e:
+            if self.outcomes is not None:
+                self.outcomes.inc(name, SHED)
+            response = JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": retry_after_header(e.retry_after)})
+            await response(scope, receive, send)
+            return
+        if self.outcomes is not None:
+            self.outcomes.inc(name, outcome)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
@@ -0,0 +1,387 @@
+"""Fast-starting entry point for the sidecar backend.
+
+The Tauri shell waits for ``/health`` before it shows the UI, and importing
+FastAPI/pydantic and building the app is most of the backend's startup time.
+So the entry point binds the socket with ``LazyApp`` first, a small ASGI app
+that only needs the standard library:
+
+- ``/health`` is answered immediately;
+- ``backend.main`` is imported on a background thread as soon as the server starts;
+- ``/ready`` returns 503 until the app is imported and its deferred
+  initialization (``Backend.initialize`` in ``backend.main``) has finished;
+- every other request waits for the import and is then handed to the real app;
+- if the import (or the app's startup) fails, every request, ``/health``
+  included, gets a 503 naming the error, so the shell never sees a healthy
+  backend that cannot serve anything.
+
+``STARTUP_TIMING=1`` (or ``--startup-timing``) prints when each startup phase
+finished, relative to the start of the bootstrap.
+
+The server listens on TCP (``BACKEND_HOST``/``BACKEND_PORT``) or, with
+``BACKEND_UDS``, on a Unix domain socket only the current user can open.
+``BACKEND_PORT=0`` picks a free port; ``BACKEND_HANDSHAKE_FILE`` names a JSON
+file the address is written to once the server accepts requests, so the shell
+knows where to connect. The sockets are bound here, before uvicorn starts.
+``BACKEND_WORKERS=N`` serves the socket from N processes (see ``file_lock``
+for how they share the data files).
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from backend.settings import parse_bool # Standard library only, like the rest of this module
+
+_STARTED = time.perf_counter()
+
+HEALTH_BODY = b'{"status":"ok"}'
+STARTING_BODY = b'{"status":"starting"}'
+
+
+class StartupTimer:
+    """Records named startup phases; prints each one as it finishes when enabled."""
+
+    def __init__(self, enabled: bool, start: float = _STARTED):
+        self.enabled = enabled
+        self.start = start
+        self.last = start
+        self.phases: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str, since: Optional[float] = None) -> None:
+        """Ends ``phase``: it began at ``since``, or else when the previous sequential phase ended."""
+        now = time.perf_counter()
+        with self._lock:
+            if since is None:
+                since, self.last = self.last, now
+            duration = now - since
+            self.phases.append((phase, duration))
+        if self.enabled:
+            print(f"startup: {phase:<16} {duration * 1e3:8.1f} ms  (at {(now - self.start) * 1e3:8.1f} ms)", file=sys.stderr, flush=True)
+
+
+def _import_app(timer: StartupTimer):
+    start = time.perf_counter()
+    import fastapi, pydantic # noqa: F401 -- the bulk of the import time, measured on its own
+    timer.mark("imports", since=start)
+    start = time.perf_counter()
+    import backend.main
+    timer.mark("app build", since=start)
+    return backend.main.app
+
+
+async def _send_json(send, status: int, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _failed_body(error: BaseException) -> bytes:
+    return json.dumps({"status": "failed", "error": repr(error)}).encode()
+
+
+class LazyApp:
+    """ASGI app that serves /health at once and everything else from the app ``loader`` returns."""
+
+    def __init__(self, timer: Optional[StartupTimer] = None, loader: Optional[Callable] = None):
+        self.timer = timer or StartupTimer(enabled=False)
+        self.loader = loader or _import_app
+        self.app = None
+        self._loading: Optional[asyncio.Future] = None
+        self._lifespan_receive: Optional[asyncio.Queue] = None
+        self._lifespan_task: Optional[asyncio.Task] = None
+
+    def _ensure_loading(self) -> "asyncio.Future":
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        return self._loading
+
+    async def _load(self):
+        loop = asyncio.get_running_loop()
+        app = await loop.run_in_executor(None, self.loader, self.timer)
+        await self._start_app_lifespan(app)
+        self.app = app
+        return app
+
+    async def _start_app_lifespan(self, app) -> None:
+        """Runs the real app's lifespan startup (kept open until our own shutdown)."""
+        receive: asyncio.Queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup") and not started.done():
+                started.set_result(message)
+
+        async def run():
+            try:
+                await app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, receive.get, send)
+            finally:
+                if not started.done():
+                    started.set_result({"type": "lifespan.startup.failed"})
+
+        self._lifespan_receive = receive
+        self._lifespan_task = asyncio.ensure_future(run())
+        await receive.put({"type": "lifespan.startup"})
+        result = await started
+        if result["type"] == "lifespan.startup.failed":
+            raise RuntimeError(f"Application startup failed: {result.get('message', '')}")
+
+    async def _stop_app_lifespan(self) -> None:
+        if self._lifespan_task is not None:
+            await self._lifespan_receive.put({"type": "lifespan.shutdown"})
+            await self._lifespan_task
+
+    async def _lifespan(self, scope, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_loading() # In the background: startup must not wait for the import
+                self.timer.mark("server startup")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._loading is not None:
+                    try:
+                        await self._loading
+                    except Exception:
+                        pass
+                await self._stop_app_lifespan()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _load_error(self) -> Optional[BaseException]:
+        """The exception loading the app finished with, or None while it has not failed."""
+        if self._loading is None or not self._loading.done() or self._loading.cancelled():
+            return None
+        return self._loading.exception()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(scope, receive, send)
+            return
+        if self.app is None and scope["type"] == "http":
+            error = self._load_error()
+            if error is not None:
+                await _send_json(send, 503, _failed_body(error))
+                return
+            if scope["path"] == "/health":
+                await _send_json(send, 200, HEALTH_BODY)
+                return
+            if scope["path"] == "/ready" and not (self._loading is not None and self._loading.done()):
+                self._ensure_loading()
+                await _send_json(send, 503, STARTING_BODY)
+                return
+        app = self.app
+        if app is None:
+            try:
+                app = await asyncio.shield(self._ensure_loading())
+            except Exception as e:
+                if scope["type"] != "http":
+                    raise
+                await _send_json(send, 503, _failed_body(e)) # The load failed while this request waited
+                return
+        await app(scope, receive, send)
+
+
+def bind_tcp(host: str, port: int) -> socket.socket:
+    """Binds a listening TCP socket; port 0 lets the OS pick a free port."""
+    # proto must be IPPROTO_TCP (not 0) for asyncio to set TCP_NODELAY on accepted connections
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(2048)
+    except OSError:
+        sock.close()
+        raise
+    sock.set_inheritable(True)
+    return sock
+
+
+def bind_unix(path: str) -> socket.socket:
+    """Binds a listening Unix domain socket that only the current user can connect to.
+
+    A stale socket left behind by a previous run is replaced; any other file at
+    ``path`` is an error rather than being deleted.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix domain sockets are not supported on this platform")
+    try:
+        if stat.S_ISSOCK(os.lstat(path).st_mode):
+            os.unlink(path)
+        else:
+            raise FileExistsError(f"{path} exists and is not a socket")
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177) # No window in which the socket is reachable by others
+    try:
+        sock.bind(path)
+        os.chmod(path, 0o600)
+        sock.listen(2048)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(old_umask)
+    sock.set_inheritable(True)
+    return sock
+
+
+def describe_socket(sock: socket.socket) -> dict:
+    """What a client needs to reach ``sock``; this is the handshake file's content."""
+    if hasattr(socket, "AF_UNIX") and sock.family == socket.AF_UNIX:
+        return {"transport": "unix", "path": sock.getsockname(), "pid": os.getpid()}
+    host, port = sock.getsockname()[:2]
+    return {"transport": "tcp", "host": host, "port": port, "url": f"http://{host}:{port}", "pid": os.getpid()}
+
+
+def write_handshake(path: str, info: dict) -> None:
+    """Atomically writes ``info`` as JSON to ``path``, readable by the current user only."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".handshake-") # Created with mode 0600
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(info, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def choose_implementation(requested: str, fast: str, fallback: str) -> str:
+    """Returns ``requested``, or ``fallback`` if it names the fast module and that is not installed."""
+    if requested == fast and importlib.util.find_spec(fast) is None:
+        print(f"backend: {fast} is not installed, using {fallback}", file=sys.stderr, flush=True)
+        return fallback
+    return requested
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="backend", description="Runs the backend server.")
+    parser.add_argument("--host", default=os.getenv("BACKEND_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("BACKEND_PORT", "5002")),
+                        help="TCP port; 0 picks a free one (see --handshake-file)")
+    parser.add_argument("--uds", default=os.getenv("BACKEND_UDS") or None,
+                        help="serve on this Unix domain socket instead of TCP")
+    parser.add_argument("--handshake-file", default=os.getenv("BACKEND_HANDSHAKE_FILE") or None,
+                        help="write the address the server listens on to this JSON file once it accepts requests")
+    parser.add_argument("--loop", choices=("auto", "asyncio", "uvloop"), default=os.getenv("BACKEND_LOOP", "auto"))
+    parser.add_argument("--http", choices=("auto", "h11", "httptools"), default=os.getenv("BACKEND_HTTP", "auto"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BACKEND_WORKERS", "1")),
+                        help="server processes sharing the socket and the data files")
+    try:
+        startup_timing = parse_bool(os.getenv("STARTUP_TIMING", "0"))
+    except ValueError as e:
+        parser.error(f"STARTUP_TIMING: {e}")
+    parser.add_argument("--startup-timing", action="store_true", default=startup_timing)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Runs the backend server (what ``python backend/main.py`` and the frozen binary do)."""
+    if getattr(sys, "frozen", False):
+        import multiprocessing
+        multiprocessing.freeze_support() # Frozen worker processes start here; this runs their target instead
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    os.environ["BACKEND_WORKERS"] = str(args.workers) # Read by backend.main, here and in spawned workers
+    timer = StartupTimer(enabled=args.startup_timing)
+    if args.handshake_file and os.path.exists(args.handshake_file):
+        os.unlink(args.handshake_file) # Stale from an earlier run: it must not be read before ours is written
+    try:
+        sock = bind_unix(args.uds) if args.uds else bind_tcp(args.host, args.port)
+    except OSError as e:
+        print(f"backend: cannot listen on {args.uds or f'{args.host}:{args.port}'}: {e}", file=sys.stderr, flush=True)
+        return 1
+    import uvicorn
+    timer.mark("uvicorn import")
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            timer.mark("socket bind")
+            if args.handshake_file and self.started:
+                write_handshake(args.handshake_file, describe_socket(sock))
+
+        async def shutdown(self, sockets=None):
+            await super().shutdown(sockets=sockets)
+            cleanup() # uvicorn re-raises SIGTERM/SIGINT once it has shut down, so run() may not return
+
+    def cleanup():
+        sock.close()
+        for path in (args.handshake_file, args.uds):
+            if path:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    settings = dict(
+        host=args.host,
+        port=args.port,
+        uds=args.uds, # Only used for the log message: the socket is already bound
+        loop=choose_implementation(args.loop, "uvloop", "asyncio"),
+        http=choose_implementation(args.http, "httptools", "h11"),
+        lifespan="on",
+    )
+    if args.workers > 1:
+        return _run_workers(args, sock, settings, cleanup)
+    lazy_app = LazyApp(timer)
+    config = uvicorn.Config(lazy_app, **settings)
+    server = Server(config)
+    if timer.enabled:
+        _report_ready(lazy_app, timer)
+    try:
+        server.run(sockets=[sock])
+    finally:
+        cleanup()
+    return 0 if server.started else 1
+
+
+def _run_workers(args: argparse.Namespace, sock: socket.socket, settings: dict, cleanup: Callable[[], None]) -> int:
+    """Serves ``sock`` from ``args.workers`` spawned processes, each with its own ``LazyApp``."""
+    import uvicorn
+    from uvicorn.supervisors import Multiprocess
+
+    class Supervisor(Multiprocess):
+        def startup(self):
+            super().startup()
+            if args.handshake_file:
+                # The socket is already listening: connections wait in its backlog until a worker is up
+                write_handshake(args.handshake_file, dict(describe_socket(sock), workers=args.workers))
+
+    main_module = sys.modules["__main__"]
+    if getattr(main_module, "__spec__", None) is None and not getattr(sys, "frozen", False):
+        # Spawned workers re-run the parent's __main__ first. Point them at this stdlib-only module
+        # rather than backend/main.py, which would import the whole app a second time as __mp_main__.
+        main_module.__spec__ = importlib.util.find_spec("backend.bootstrap")
+    config = uvicorn.Config("backend.bootstrap:LazyApp", factory=True, workers=args.workers, **settings)
+    supervisor = Supervisor(config, target=uvicorn.Server(config).run, sockets=[sock])
+    try:
+        supervisor.run()
+    finally:
+        cleanup()
+    return 0
+
+
+def _report_ready(lazy_app: LazyApp, timer: StartupTimer) -> None:
+    """Marks the "deferred init" phase once backend.main reports initialization done."""
+
+    def wait():
+        while lazy_app.app is None:
+            time.sleep(0.005)
+        start = time.perf_counter()
+        import backend.main
+        backend.main.app.state.backend.wait_initialized()
+        timer.mark("deferred init", since=start)
+        print(f"startup: ready after {(time.perf_counter() - timer.start) * 1e3:.1f} ms", file=sys.stderr, flush=True)
+
+    threading.Thread(target=wait, name="startup-timing", daemon=True).start()
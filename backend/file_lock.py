@@ -0,0 +1,146 @@
+"""Inter-process file locks for multi-worker mode.
+
+With ``BACKEND_WORKERS > 1`` several server processes share the preferences
+file and the telemetry log. A ``FileLock`` is an advisory OS lock on a small
+``<file>.lock`` sidecar (``flock`` on POSIX, ``msvcrt.locking`` on Windows),
+reentrant within a process and usable from any thread.
+
+The lock file also holds a 64-bit *generation* counter, memory-mapped so it
+can be read without a syscall. Writers bump it (while holding the lock)
+whenever they change shared state in a way other processes cannot detect
+from a ``stat()`` alone: a preferences rewrite, a telemetry rollover. Other
+processes compare it against the value they saw last to drop stale caches.
+"""
+import logging
+import mmap
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+_COUNTER_SIZE = 8
+_LOCK_OFFSET = _COUNTER_SIZE # Windows locks a byte range; keep it clear of the mapped counter
+
+
+class FileLock:
+    """Reentrant inter-process lock on ``path`` with a shared generation counter.
+
+    Use ``lock_for`` rather than constructing one directly: POSIX ``flock``
+    locks belong to an open file, so two ``FileLock`` objects for the same path
+    in one process would block each other.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._unavailable = False
+
+    def _open(self) -> bool:
+        if self._fd is not None:
+            return True
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            # E.g. a read-only or missing directory: the write that follows fails with the real error.
+            # Retried on the next acquire, since the directory may be created later.
+            if not self._unavailable:
+                logger.warning("Cannot open lock file '%s': %s; continuing without it", self.path, e)
+                self._unavailable = True
+            return False
+        try:
+            if os.fstat(fd).st_size < _COUNTER_SIZE:
+                os.ftruncate(fd, _COUNTER_SIZE) # Zero-filled: generation 0
+            self._map = mmap.mmap(fd, _COUNTER_SIZE)
+        except OSError:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0 and self._open():
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                else:
+                    os.lseek(self._fd, _LOCK_OFFSET, os.SEEK_SET)
+                    while True:
+                        try:
+                            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1) # Retries for ~10 s, then raises
+                            break
+                        except OSError:
+                            continue
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        try:
+            if self._depth == 0 and self._fd is not None:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, _LOCK_OFFSET, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    @property
+    def generation(self) -> int:
+        """The shared counter; readable without holding the lock."""
+        if self._map is None:
+            with self._thread_lock:
+                if not self._open():
+                    return 0
+        return int.from_bytes(self._map[:_COUNTER_SIZE], "little")
+
+    def bump(self) -> int:
+        """Increments the shared counter (hold the lock) and returns the new value."""
+        if self._map is None:
+            return 0 # The lock file could not be opened
+        value = (self.generation + 1) & 0xFFFFFFFFFFFFFFFF
+        self._map[:_COUNTER_SIZE] = value.to_bytes(_COUNTER_SIZE, "little")
+        return value
+
+    def close(self) -> None:
+        with self._thread_lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+_locks: Dict[str, FileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def lock_for(path: str) -> FileLock:
+    """Returns the process-wide ``FileLock`` for ``path``."""
+    key = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(key)
+        return lock
@@ -0,0 +1,82 @@
+"""Blocking file I/O for async request handlers.
+
+The request handlers are ``async def`` and hand blocking work (preference file
+reads and writes, index lookups) to a dedicated, separately sized thread pool
+instead of Starlette's shared default threadpool, so a flood of one kind of
+request cannot hold every thread another endpoint needs. ``LoopLock`` lets
+coroutines queue for a resource on the event loop rather than each parking a
+pool thread on a ``threading.Lock``.
+"""
+import asyncio
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from backend.profiling import active_profile
+
+
+class IOExecutor:
+    """Lazily started thread pool; ``await executor.run(func, *args)`` calls ``func`` on it."""
+
+    def __init__(self, max_workers: int, name: str = "backend-io"):
+        self.max_workers = max(1, max_workers)
+        self.name = name
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get(self) -> ThreadPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+                executor = self._executor
+        return executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        profile = active_profile.get()
+        if profile is not None: # Inside a profiled request: profile the call on the pool thread too
+            return await loop.run_in_executor(self._get(), partial(profile.call, func, *args, **kwargs))
+        return await loop.run_in_executor(self._get(), partial(func, *args, **kwargs))
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> "Future":
+        """Runs ``func`` on the pool without waiting for it (callable from any thread)."""
+        return self._get().submit(func, *args)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops the pool after queued calls finish; the next ``run`` starts a new one."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class LoopLock:
+    """An ``asyncio.Lock`` per event loop, usable as ``async with lock:``.
+
+    asyncio locks are bound to the loop that first uses them; the app can be
+    driven from several loops over its lifetime (e.g. one per test client), so
+    each loop gets its own. Code outside the event loop (timer threads) still
+    needs the thread lock this sits in front of.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+    def _lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._guard:
+            lock = self._locks.get(loop)
+            if lock is None:
+                lock = self._locks[loop] = asyncio.Lock()
+        return lock
+
+    async def __aenter__(self) -> None:
+        await self._lock().acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._lock().release()
@@ -0,0 +1,149 @@
+"""Queue-based logging: the request path only enqueues, a background thread writes.
+
+``LogPipeline`` puts a ``QueueHandler`` on the root logger. Logging a record
+then costs creating it and one ``put_nowait``. A ``QueueListener`` thread
+formats the records and writes them to the output handlers: stderr and a
+size-rotated file under the log directory, as text or one JSON object per line.
+
+* Formatting is lazy. Messages use ``%``-style arguments, so a disabled level
+  formats nothing, and ``prepare`` leaves the merge of message and arguments
+  (and any traceback) to the listener thread. Arguments are therefore
+  formatted a little later than the call: log values, not objects that are
+  about to be mutated.
+* Enqueueing never blocks. If ``queue_size`` records are already waiting,
+  the record is dropped and counted in ``dropped``.
+* ``stop`` drains the queue. It first points the logger at the output handlers
+  directly, so nothing logged from then on is lost, then waits until the
+  listener has written everything queued before.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+# LogRecord attributes that are not ``extra=`` fields
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, ``extra`` fields and any traceback."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class _DirFileHandler(RotatingFileHandler):
+    """Rotating file handler that creates its directory when it first opens the file."""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.baseFilename)), exist_ok=True)
+        return super()._open()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, q: "queue.SimpleQueue", max_size: int):
+        super().__init__(q)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record # Formatted by the listener, off the request path
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+def output_handlers(path: Optional[str], max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                    json_format: bool = False, stream: bool = True) -> List[logging.Handler]:
+    """stderr and/or a rotating file at ``path`` (created on the first record), sharing one formatter."""
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = []
+    if stream:
+        handlers.append(logging.StreamHandler())
+    if path:
+        handlers.append(_DirFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+class LogPipeline:
+    """Routes ``logger`` (the root logger by default) through a queue to ``handlers``."""
+
+    def __init__(self, handlers: List[logging.Handler], queue_size: int = 10000, logger: Optional[logging.Logger] = None):
+        self.handlers = handlers
+        self.logger = logger if logger is not None else logging.getLogger()
+        # SimpleQueue (C, no condition variable) is several times cheaper per put than Queue; the handler bounds it
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.queue_handler = _NonBlockingQueueHandler(self.queue, max(1, queue_size))
+        self._listener: Optional[QueueListener] = None
+        self._users = 0
+        self._lock = threading.RLock() # acquire/release call start/stop with it held
+
+    @property
+    def dropped(self) -> int:
+        return self.queue_handler.dropped
+
+    @property
+    def running(self) -> bool:
+        return self._listener is not None
+
+    def start(self) -> None:
+        """Starts the listener and swaps the queue in for the output handlers (idempotent)."""
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            # One list assignment: a record logged meanwhile goes to either the old or the new handlers
+            self.logger.handlers = [h for h in self.logger.handlers if h not in self.handlers] + [self.queue_handler]
+
+    def acquire(self) -> None:
+        """Starts the pipeline on behalf of one more user (an app's lifespan)."""
+        with self._lock:
+            self._users += 1
+            self.start()
+
+    def release(self) -> None:
+        """Drops one ``acquire``; the last user to release it stops the pipeline."""
+        with self._lock:
+            self._users -= 1
+            if self._users == 0:
+                self.stop()
+
+    def stop(self) -> None:
+        """Writes everything queued so far; later records are written directly (idempotent)."""
+        with self._lock:
+            listener, self._listener = self._listener, None
+            if listener is None:
+                return
+            self.logger.handlers = [h for h in self.logger.handlers if h is not self.queue_handler] + self.handlers
+            listener.stop() # Returns once the listener has handled every record queued before it
+        for handler in self.handlers:
+            handler.flush()
+        if self.dropped:
+            self.logger.warning("%d log records were dropped because the log queue was full", self.dropped)
@@ -1,109 +1,143 @@
-from fastapi import FastAPI, HTTPException
-import uvicorn
+if __name__ == "__main__":
+    # Started as a program (the Tauri shell runs `python backend/main.py`; PyInstaller freezes this file).
+    # Hand over to the bootstrap before importing anything heavy: it answers /health right away
+    # and imports this module (as backend.main) in the background.
+    import os, sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from backend.bootstrap import main
+    sys.exit(main())
+
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi import Body
-from pydantic import BaseModel, ConfigDict, field_validator # Import field_validator
-from typing import Literal # Import Literal
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator # Import field_validator
+from typing import Any, AsyncIterator, List, Literal, Optional, Tuple # Import Literal
 import json
 import os
 import logging
-from logging.handlers import RotatingFileHandler
 import threading # Import threading
+import atexit
+import hashlib
+from functools import lru_cache
+import time
+import weakref
+from datetime import datetime, timezone
 import platformdirs # Import platformdirs
 
-# App identifiers for platformdirs
-APP_NAME = "OpenWebUIOnboarding"
-APP_AUTHOR = "OpenWebUI"
+from backend.admission import AdmissionController, AdmissionMiddleware, PriorityClass
+from backend.file_lock import FileLock, lock_for
+from backend.io_executor import IOExecutor, LoopLock
+from backend.log_pipeline import LogPipeline, output_handlers
+from backend.metrics import MetricsMiddleware, Registry, TimedLock
+from backend.profiling import ProfileStore, ProfilingMiddleware
+from backend.request_limits import BodyLimit, JsonArrayReader, PayloadLimitError, RequestLimitsMiddleware, json_limit_error
+from backend.serialization import FastJSONResponse, dumps_line, dumps_spaced, use_encoder
+from backend.preferences_store import SnapshotCache, WriteBehindWriter, atomic_write_json, file_signature
+from backend.settings import APP_AUTHOR, APP_NAME, Settings, parse_bool
+from backend.telemetry_governor import RATE_LIMITED, SAMPLED_OUT, TelemetryGovernor, parse_sample_rates, retry_after_header
+from backend.telemetry_aggregator import SUMMARY_EVENT, TelemetryAggregator
+from backend.storage import PreconditionFailed, PreferencesCodec, StorageBackend, TelemetryExport
+from backend.telemetry_export import compress_chunks, decode_cursor, encode_cursor, open_ranges, plan_export, read_ranges
+from backend.telemetry_index import IndexEntry, TelemetryIndex, parse_timestamp
+from backend.telemetry_segments import SegmentPolicy
+from backend.telemetry_writer import TelemetryWriter
 
-# Configuration (can be overridden by environment variables)
-# Use platformdirs for standard locations
-PREFERENCES_DIR = platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)
+# Per-app configuration lives in backend.settings (Settings.from_env() reads the environment variables).
+# What follows is process-wide: one root logger and one JSON encoder, shared by every app in the process.
 LOG_DIR = platformdirs.user_log_dir(APP_NAME, APP_AUTHOR)
+# JSON encoder for responses, the telemetry log and the preferences file: auto (orjson if installed) | orjson | json
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto')
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+# The settings of the app uvicorn and the bootstrap serve. Process-wide logging is set up from them at import,
+# so it follows the environment only: a Settings passed to create_app cannot change it
+ENV_SETTINGS = Settings.from_env()
 
-PREFERENCES_FILE = os.getenv('PREFERENCES_FILE_PATH', os.path.join(PREFERENCES_DIR, 'preferences.json'))
-TELEMETRY_FILE = os.getenv('TELEMETRY_FILE_PATH', os.path.join(LOG_DIR, 'telemetry.log'))
+# Logging: the request path only queues records; a background thread writes them to stderr and a size-rotated
+# file (LOG_FILE_PATH='' for stderr only), one per server process when BACKEND_WORKERS > 1. LOG_JSON=1 writes
+# one JSON object per line
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.getenv('LOG_FILE_PATH', os.path.join(LOG_DIR, 'backend.log'))
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+LOG_JSON = parse_bool(os.getenv('LOG_JSON', '0'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
 
-# Ensure log and preferences directories exist
-try:
-    if not os.path.exists(PREFERENCES_DIR):
-        os.makedirs(PREFERENCES_DIR)
-    if not os.path.exists(LOG_DIR):
-        os.makedirs(LOG_DIR)
-except OSError as e:
-    print(f"Warning: Could not create directories {PREFERENCES_DIR} or {LOG_DIR}: {e}")
+def _log_file_path() -> str:
+    if LOG_FILE and ENV_SETTINGS.shared_storage:
+        root, ext = os.path.splitext(LOG_FILE)
+        return f"{root}.{os.getpid()}{ext}" # Rotation is per process: workers must not rename each other's file
+    return LOG_FILE
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+# Setup logging (like basicConfig, only if the host, e.g. pytest, has not configured the root logger already)
+log_pipeline = LogPipeline(output_handlers(_log_file_path(), LOG_MAX_BYTES, LOG_BACKUPS, LOG_JSON), queue_size=LOG_QUEUE_SIZE)
+LOG_PIPELINE_INSTALLED = not logging.getLogger().handlers
+if LOG_PIPELINE_INSTALLED:
+    logging.getLogger().setLevel(LOG_LEVEL)
+    log_pipeline.start()
+    atexit.register(log_pipeline.stop) # Registered first, so it runs last and drains what the other handlers log
 logger = logging.getLogger(__name__)
-
-# Lock for preferences file access
-preferences_lock = threading.Lock()
+use_encoder(JSON_ENCODER)
 
 class Preferences(BaseModel):
     telemetry: bool
     theme: Literal["light", "dark"] # Use Literal for theme
-    model_config = ConfigDict(extra='forbid') # Forbid extra fields
-
-def load_preferences() -> Preferences:
-    """Loads preferences from the JSON file, returning defaults if it doesn't exist or is invalid."""
-    with preferences_lock: # Acquire lock
-        if os.path.exists(PREFERENCES_FILE):
-            try:
-                with open(PREFERENCES_FILE, 'r') as f:
-                    data = json.load(f)
-                    return Preferences(**data)
-            except json.JSONDecodeError as e:
-                # Handle JSONDecodeError specifically
-                logger.error(f"Error decoding JSON from '{PREFERENCES_FILE}': {e}. Returning defaults.")
-                return Preferences(telemetry=False, theme='light') # Return defaults
-            except Exception as e:
-                logger.error(f"Unexpected error loading preferences file '{PREFERENCES_FILE}': {e}. Returning defaults.")
-                return Preferences(telemetry=False, theme='light') # Return defaults
-        else:
-            logger.info(f"Preferences file '{PREFERENCES_FILE}' not found. Returning defaults.")
-            return Preferences(telemetry=False, theme='light') # Return defaults
+    model_config = ConfigDict(extra='forbid', frozen=True) # Forbid extra fields; frozen so snapshots can be shared
 
-def save_preferences(prefs: Preferences):
-    """Saves preferences to the JSON file."""
-    with preferences_lock: # Acquire lock
+def _read_preferences_file(path: str, exists: bool) -> Preferences:
+    if exists:
         try:
-            with open(PREFERENCES_FILE, 'w') as f:
-                json.dump(prefs.model_dump(), f, indent=2) # Use model_dump() instead of dict()
-            logger.info(f"Preferences saved to '{PREFERENCES_FILE}'")
-        except IOError as e:
-            logger.error(f"Error writing preferences to '{PREFERENCES_FILE}': {e}")
-            raise HTTPException(status_code=500, detail=f"Could not save preferences: {e}")
+            with open(path, 'r') as f:
+                data = json.load(f)
+                return Preferences(**data)
+        except json.JSONDecodeError as e:
+            # Handle JSONDecodeError specifically
+            logger.error("Error decoding JSON from '%s': %s. Returning defaults.", path, e)
+            return Preferences(telemetry=False, theme='light') # Return defaults
         except Exception as e:
-            logger.error(f"Unexpected error saving preferences to '{PREFERENCES_FILE}': {e}")
-            raise HTTPException(status_code=500, detail=f"An unexpected error occurred while saving preferences: {e}")
+            logger.error("Unexpected error loading preferences file '%s': %s. Returning defaults.", path, e)
+            return Preferences(telemetry=False, theme='light') # Return defaults
+    else:
+        logger.info("Preferences file '%s' not found. Returning defaults.", path)
+        return Preferences(telemetry=False, theme='light') # Return defaults
 
-app = FastAPI()
+@lru_cache(maxsize=16)
+def preferences_etag(prefs: Preferences) -> str:
+    """Strong ETag derived from the preference values (memoized; Preferences is frozen and hashable)."""
+    canonical = json.dumps(prefs.model_dump(), sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(canonical.encode()).hexdigest()[:20] + '"'
 
-@app.get("/health")
-def health_check():
-    return {"status": "ok"}
-@app.get("/")
-def root():
-    return {"message": "Backend is running"}
-@app.post("/onboarding")
-def onboarding(data: Preferences = Body(...)):
-    save_preferences(data)
-    return {"status": "saved"}
+@lru_cache(maxsize=16)
+def preferences_body(prefs: Preferences) -> bytes:
+    """Pre-encoded GET /preferences body (serialized by pydantic-core, once per value)."""
+    return prefs.model_dump_json().encode()
 
-@app.get("/preferences", response_model=Preferences)
-def get_preferences():
-    """Retrieve current user preferences."""
-    # load_preferences now handles potential errors internally and returns defaults
-    prefs = load_preferences()
-    return prefs
+def _etag_candidates(header: str):
+    return (candidate.strip() for candidate in header.split(","))
 
-@app.post("/preferences")
-def set_preferences(prefs: Preferences = Body(...)):
-    """Update user preferences."""
-    # save_preferences will raise HTTPException on failure
-    save_preferences(prefs)
-    return {"status": "updated"}
+def etag_matches_strong(header: str, etag: str) -> bool:
+    """If-Match (RFC 7232 3.1): strong comparison, so a weak ``W/`` tag never matches."""
+    return any(candidate == "*" or candidate == etag for candidate in _etag_candidates(header))
+
+def etag_matches_weak(header: str, etag: str) -> bool:
+    """If-None-Match (RFC 7232 3.2): weak comparison, ignoring any ``W/`` prefix."""
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in _etag_candidates(header))
+
+def _preferences_from_json(data: Optional[dict]) -> Preferences:
+    if data is None:
+        return Preferences(telemetry=False, theme='light') # Return defaults
+    try:
+        return Preferences(**data)
+    except ValidationError as e:
+        logger.error("Stored preferences are invalid: %s. Returning defaults.", e)
+        return Preferences(telemetry=False, theme='light') # Return defaults
+
+preferences_codec = PreferencesCodec(
+    parse=_preferences_from_json,
+    dump=lambda prefs: prefs.model_dump(),
+    matches=lambda header, prefs: etag_matches_strong(header, preferences_etag(prefs)),
+)
 
-# Telemetry endpoint
 class TelemetryData(BaseModel):
     event: str
     details: dict
@@ -117,8 +151,468 @@ class TelemetryData(BaseModel):
             raise ValueError('event cannot be empty')
         return v
 
-@app.post("/telemetry")
-def submit_telemetry(data: TelemetryData = Body(...)):
+def _telemetry_line(record: dict, compact: bool) -> bytes:
+    return dumps_line(record) if compact else dumps_spaced(record) + b"\n"
+
+def encode_telemetry(data: TelemetryData, ts: Optional[float] = None, sample_rate: float = 1.0, compact: bool = False) -> Tuple[bytes, IndexEntry]:
+    """Encodes one event as a telemetry log line stamped with its receive time."""
+    ts = time.time() if ts is None else ts
+    timestamp = datetime.fromtimestamp(ts, timezone.utc).isoformat() # Same field as the Tauri fallback log
+    record = {"event": data.event, "details": data.details, "timestamp": timestamp} # No model_dump() copy of details
+    if sample_rate < 1.0:
+        record["sample_rate"] = sample_rate # Weight 1/sample_rate when aggregating
+    line = _telemetry_line(record, compact)
+    return line, IndexEntry(data.event, ts, len(line))
+
+def request_priority_class(method: str, path: str) -> str:
+    """Admission class of a request; see ``Backend.admission_controller``."""
+    if path in ("/health", "/ready", "/metrics"):
+        return "critical"
+    if path in ("/", "/preferences", "/onboarding"):
+        return "interactive"
+    if method == "POST" and path in ("/telemetry", "/telemetry/batch"):
+        return "telemetry"
+    return "query" # Telemetry queries and exports, /debug, unknown paths
+
+class Backend:
+    """The state of one app: storage, caches, locks, metrics and background workers, configured by ``settings``.
+
+    Nothing here is shared with other ``Backend`` instances, so several apps
+    built by ``create_app`` can run side by side in one process.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = s = settings
+        self._data_dirs_ready = False
+
+        # Metrics, exposed at GET /metrics
+        self.metrics = metrics = Registry(enabled=s.metrics)
+        self.http_requests_total = metrics.counter("backend_http_requests_total", "HTTP requests by method, route and status.", ["method", "route", "status"])
+        self.http_request_seconds = metrics.histogram("backend_http_request_duration_seconds", "HTTP request latency by method and route.", ["method", "route"])
+        self.io_seconds = metrics.histogram("backend_io_duration_seconds", "Time spent in file I/O by operation.", ["op"])
+        self.lock_wait_seconds = metrics.histogram(
+            "backend_lock_wait_seconds", "Time spent waiting to acquire a lock.", ["lock"],
+            buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0),
+        )
+        self.telemetry_ingest_total = metrics.counter("backend_telemetry_ingest_total", "Telemetry events received, by governor outcome.", ["outcome"])
+        self.admission_total = metrics.counter("backend_admission_total", "Requests by priority class and admission outcome.", ["class", "outcome"])
+
+        # Lock for preferences file access (writers only; readers use the snapshot cache).
+        # Reentrant so a conditional save can read the current value while holding it.
+        self.preferences_lock = TimedLock(threading.RLock(), self.lock_wait_seconds, "preferences")
+        # Async writers queue here on the event loop, so at most one holds an I/O thread at a time
+        self.preferences_write_gate = LoopLock()
+        # Other workers' writes are detected by the file signature plus the shared generation counter
+        self.preferences_cache = SnapshotCache(enabled=s.preferences_cache, generation=self._preferences_generation)
+        self.preferences_write_behind = (
+            WriteBehindWriter(self._write_preferences_file, s.preferences_write_behind_ms / 1000)
+            if s.preferences_write_behind_ms > 0 else None
+        )
+        self.io_executor = IOExecutor(s.io_threads)
+        self.telemetry_governor = TelemetryGovernor(
+            rate=s.telemetry_rate_limit,
+            burst=s.telemetry_rate_burst,
+            event_rate=s.telemetry_event_rate_limit,
+            event_burst=s.telemetry_event_rate_burst,
+            sample_rates=parse_sample_rates(s.telemetry_sample_rates),
+        )
+
+        # Telemetry writer, started on first use
+        self.telemetry_writer_lock = threading.Lock()
+        self._telemetry_writer: Optional[TelemetryWriter] = None
+        self.telemetry_aggregator = TelemetryAggregator(
+            self.write_telemetry_summaries,
+            window=s.telemetry_aggregate_window_s,
+            group_by=list(s.telemetry_aggregate_keys),
+            raw_events=list(s.telemetry_raw_events),
+        ) if s.telemetry_aggregate else None
+        self.storage = self.create_storage(s.storage_backend)
+
+        self.admission_controller = AdmissionController(
+            [
+                PriorityClass("critical", 0, deadline=s.admission_deadline_ms / 1000),
+                PriorityClass("interactive", 1, deadline=s.admission_deadline_ms / 1000),
+                PriorityClass("query", 2, deadline=s.admission_deadline_ms / 1000),
+                PriorityClass("telemetry", 3, max_concurrent=s.admission_telemetry_concurrency, deadline=s.admission_telemetry_deadline_ms / 1000),
+            ],
+            capacity=s.admission_capacity,
+            max_queue=s.admission_max_queue,
+        )
+        self.profile_store = ProfileStore(s.profile_dir, retain=s.profile_retain)
+
+        # Deferred initialization: run in the background after startup, reported by GET /ready
+        self._init_lock = threading.Lock()
+        self._init_started = False
+        self.init_done = threading.Event()
+
+        metrics.gauge("backend_telemetry_bytes_written", "Bytes appended to the telemetry log by the current writer.", func=lambda: self._writer_stat("bytes_written"))
+        metrics.gauge("backend_telemetry_batches_written", "Group-commit batches written by the current writer.", func=lambda: self._writer_stat("batches_written"))
+        metrics.gauge("backend_telemetry_queue_depth", "Telemetry submissions waiting for the writer thread.", func=lambda: self._writer_stat("queue_depth"))
+        metrics.gauge("backend_log_records_dropped", "Log records dropped because the log queue was full.", func=lambda: log_pipeline.dropped)
+        metrics.gauge("backend_admission_waiting", "Requests waiting for an admission slot.", func=lambda: sum(c["waiting"] for c in self.admission_controller.summary().values()))
+
+    def ensure_data_dirs(self):
+        """Creates the log and preferences directories (deferred from construction to first use)."""
+        if self._data_dirs_ready:
+            return
+        s = self.settings
+        try:
+            os.makedirs(s.preferences_dir, exist_ok=True)
+            os.makedirs(s.log_dir, exist_ok=True)
+        except OSError as e:
+            logger.warning("Could not create directories %s or %s: %s", s.preferences_dir, s.log_dir, e)
+        self._data_dirs_ready = True
+
+    def shared_file_lock(self, path: str) -> Optional[FileLock]:
+        """The inter-process lock guarding ``path`` in multi-worker mode (None with a single worker)."""
+        return lock_for(path + '.lock') if self.settings.shared_storage else None
+
+    def _preferences_generation(self, path: str) -> int:
+        lock = self.shared_file_lock(path)
+        return lock.generation if lock is not None else 0
+
+    def load_preferences(self) -> Preferences:
+        """Loads preferences from the JSON file, returning defaults if it doesn't exist or is invalid."""
+        path = self.settings.preferences_file
+        if self.preferences_write_behind is not None:
+            pending = self.preferences_write_behind.pending_value(path)
+            if pending is not None:
+                return pending
+        cache = self.preferences_cache
+        cached = cache.get(path) # Lock-free fast path
+        if cached is not None:
+            return cached
+        with self.preferences_lock: # Acquire lock
+            # Taken before reading so external changes invalidate the snapshot
+            generation = cache.current_generation(path)
+            signature = file_signature(path)
+            with self.io_seconds.time("preferences_read"):
+                prefs = _read_preferences_file(path, exists=signature is not None)
+            cache.publish(path, prefs, signature, generation)
+            return prefs
+
+    def cached_preferences(self) -> Optional[Preferences]:
+        """The preferences if known without reading the file (pending write-behind value or snapshot), else None."""
+        path = self.settings.preferences_file
+        if self.preferences_write_behind is not None:
+            pending = self.preferences_write_behind.pending_value(path)
+            if pending is not None:
+                return pending
+        return self.preferences_cache.get(path) # A stat() only
+
+    async def load_preferences_async(self) -> Preferences:
+        """Loads preferences from the storage backend: cache hits stay on the loop, misses read on the I/O pool."""
+        storage = self.storage
+        cached = storage.cached_preferences()
+        if cached is not None:
+            return cached
+        return await self.io_executor.run(storage.load_preferences)
+
+    async def save_preferences_async(self, prefs: Preferences, if_match: Optional[str] = None):
+        """Saves preferences through the storage backend, mapping its errors to HTTP errors."""
+        storage = self.storage
+        async with self.preferences_write_gate:
+            try:
+                await self.io_executor.run(storage.save_preferences, prefs, if_match)
+            except PreconditionFailed:
+                raise HTTPException(status_code=412, detail="Preferences were modified by another client.")
+            except OSError as e:
+                logger.error("Error saving preferences to the %s storage: %s", storage.name, e)
+                raise HTTPException(status_code=500, detail=f"Could not save preferences: {e}")
+
+    def _write_preferences_file(self, path: str, prefs: Preferences):
+        """Atomically replaces the preferences file and publishes the matching snapshot."""
+        self.ensure_data_dirs()
+        shared = self.shared_file_lock(path)
+        with self.preferences_lock, shared or nullcontext(): # Acquire lock (and the other workers' too)
+            with self.io_seconds.time("preferences_write"):
+                atomic_write_json(path, prefs.model_dump()) # Use model_dump() instead of dict()
+            generation = shared.bump() if shared is not None else 0 # Tells other workers to drop their snapshot
+            self.preferences_cache.publish(path, prefs, file_signature(path), generation) # Swap in the new snapshot
+        logger.info("Preferences saved to '%s'", path)
+
+    def save_preferences(self, prefs: Preferences, if_match: Optional[str] = None):
+        """Saves preferences to the JSON file (or schedules the write in write-behind mode).
+
+        With ``if_match`` (an ``If-Match`` header value) the save only happens if the
+        current preferences still have a matching ETag; otherwise ``PreconditionFailed``
+        is raised.
+        """
+        path = self.settings.preferences_file
+        if self.settings.shared_storage:
+            self.ensure_data_dirs() # The lock file lives next to the preferences file
+        # Check and write as one step so concurrent writers (in any worker) can't interleave
+        with self.preferences_lock, self.shared_file_lock(path) or nullcontext():
+            if if_match is not None and not etag_matches_strong(if_match, preferences_etag(self.load_preferences())):
+                raise PreconditionFailed()
+            if self.preferences_write_behind is not None:
+                # Acknowledge right away; readers get the pending value until the coalesced write lands
+                self.preferences_write_behind.schedule(path, prefs)
+                return
+            try:
+                self._write_preferences_file(path, prefs)
+            except IOError as e:
+                self.preferences_cache.invalidate()
+                logger.error("Error writing preferences to '%s': %s", path, e)
+                raise HTTPException(status_code=500, detail=f"Could not save preferences: {e}")
+            except Exception as e:
+                self.preferences_cache.invalidate()
+                logger.error("Unexpected error saving preferences to '%s': %s", path, e)
+                raise HTTPException(status_code=500, detail=f"An unexpected error occurred while saving preferences: {e}")
+
+    def flush_preferences(self):
+        """Writes any deferred preferences update to disk."""
+        if self.preferences_write_behind is not None:
+            self.preferences_write_behind.flush()
+
+    def get_telemetry_writer(self) -> TelemetryWriter:
+        """Returns the running telemetry writer, starting it on first use."""
+        writer = self._telemetry_writer
+        if writer is not None:
+            return writer
+        with self.telemetry_writer_lock:
+            if self._telemetry_writer is None:
+                self.ensure_data_dirs()
+                s = self.settings
+                path = s.telemetry_file
+                self._telemetry_writer = TelemetryWriter(
+                    path,
+                    max_batch=s.telemetry_max_batch,
+                    max_delay=s.telemetry_max_delay_ms / 1000,
+                    queue_size=s.telemetry_queue_size,
+                    durability=s.telemetry_durability,
+                    policy=SegmentPolicy(
+                        max_bytes=s.telemetry_segment_max_bytes,
+                        max_age=s.telemetry_segment_max_age_s,
+                        compress=s.telemetry_compress_segments,
+                        retain_segments=s.telemetry_retain_segments,
+                        retain_bytes=s.telemetry_retain_bytes,
+                        retain_age=s.telemetry_retain_days * 86400,
+                    ),
+                    index=TelemetryIndex(path, file_lock=self.shared_file_lock(path)) if s.telemetry_index else None,
+                    file_lock=self.shared_file_lock(path),
+                    maintenance_lock=self.shared_file_lock(path + '.maintenance'),
+                )
+            return self._telemetry_writer
+
+    def close_telemetry_writer(self):
+        """Flushes queued telemetry events and stops the writer thread (the next event starts a new one)."""
+        if self.telemetry_aggregator is not None:
+            self.telemetry_aggregator.flush() # Emits the open windows through the writer first
+        with self.telemetry_writer_lock:
+            if self._telemetry_writer is not None:
+                self._telemetry_writer.close()
+                self._telemetry_writer = None
+
+    def _writer_stat(self, name: str) -> float:
+        writer = self._telemetry_writer
+        return getattr(writer, name) if writer is not None else 0
+
+    def write_telemetry_summaries(self, records: List[dict]):
+        """Appends the aggregator's summary records (one per closed window) to the telemetry log."""
+        compact = self.settings.telemetry_compact_lines
+        lines, entries = [], []
+        for record in records:
+            line = _telemetry_line(record, compact)
+            lines.append(line)
+            entries.append(IndexEntry(SUMMARY_EVENT, parse_timestamp(record["timestamp"]), len(line)))
+        self.storage.append_telemetry(b"".join(lines), entries)
+
+    def get_telemetry_index(self) -> TelemetryIndex:
+        index = self.get_telemetry_writer().index
+        if index is None:
+            raise HTTPException(status_code=404, detail="Telemetry index is disabled.")
+        return index
+
+    def create_storage(self, kind: str) -> StorageBackend:
+        """The storage backend named by ``settings.storage_backend``."""
+        if kind == 'files':
+            return FileStorage(self)
+        if kind == 'sqlite':
+            from backend.sqlite_storage import SqliteStorage # Only imported when selected
+            s = self.settings
+            return SqliteStorage(
+                s.storage_sqlite_path,
+                preferences_codec,
+                pool_size=s.storage_sqlite_pool_size,
+                durability=s.telemetry_durability,
+                max_batch=s.telemetry_max_batch,
+                queue_size=s.telemetry_queue_size,
+                retain_age=s.telemetry_retain_days * 86400,
+            )
+        raise ValueError(f"Unknown STORAGE_BACKEND: {kind!r} (expected 'files' or 'sqlite')")
+
+    def close(self):
+        """Writes the open aggregation windows and stops their timer, then flushes and closes the storage backend."""
+        if self.telemetry_aggregator is not None:
+            self.telemetry_aggregator.close() # A timer left armed would start a new writer after shutdown
+        self.storage.close()
+
+    def initialize(self):
+        """Work kept out of startup: data directories, preferences cache, telemetry writer."""
+        try:
+            self.ensure_data_dirs()
+            self.storage.load_preferences()
+            self.storage.start()
+        except Exception as e:
+            logger.error("Deferred initialization failed: %s", e) # Each subsystem retries on first use
+        finally:
+            self.init_done.set()
+
+    def wait_initialized(self, timeout: Optional[float] = None) -> bool:
+        return self.init_done.wait(timeout)
+
+    def start_deferred_init(self):
+        """Starts initialize() on the I/O pool once; returns immediately."""
+        with self._init_lock:
+            if self._init_started:
+                return
+            self._init_started = True
+        self.io_executor.submit(self.initialize)
+
+    def request_body_limit(self, path: str) -> BodyLimit:
+        """Body limits for a request path (0 = unlimited)."""
+        s = self.settings
+        if path == "/telemetry":
+            return BodyLimit(s.telemetry_max_event_bytes, s.telemetry_max_depth, s.telemetry_max_keys)
+        if path == "/telemetry/batch":
+            return BodyLimit(s.telemetry_max_batch_bytes) # Depth and keys are checked per record while streaming
+        return BodyLimit(s.request_max_body_bytes)
+
+class FileStorage(StorageBackend):
+    """preferences.json plus the segmented telemetry log, at the paths of ``backend``'s settings."""
+
+    name = "files"
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    def cached_preferences(self) -> Optional[Preferences]:
+        return self.backend.cached_preferences()
+
+    def load_preferences(self) -> Preferences:
+        return self.backend.load_preferences()
+
+    def save_preferences(self, prefs: Preferences, if_match: Optional[str] = None) -> None:
+        self.backend.save_preferences(prefs, if_match)
+
+    def append_telemetry(self, data: bytes, entries: List[IndexEntry]) -> None:
+        self.backend.get_telemetry_writer().submit(data, entries=entries)
+
+    async def append_telemetry_async(self, data: bytes, entries: List[IndexEntry]) -> None:
+        await self.backend.get_telemetry_writer().submit_async(data, entries=entries)
+
+    def telemetry_stats(self, since: Optional[float] = None, until: Optional[float] = None, bucket: Optional[int] = None) -> dict:
+        return self.backend.get_telemetry_index().stats(since, until, bucket)
+
+    def telemetry_events(self, event: str, since: Optional[float] = None, until: Optional[float] = None, limit: int = 100) -> Tuple[List[dict], int]:
+        return self.backend.get_telemetry_index().events(event, since, until, limit)
+
+    def export_telemetry(self, position: Optional[Tuple[int, int]], max_bytes: int = 0) -> TelemetryExport:
+        path = self.backend.settings.telemetry_file
+        plan = plan_export(path, position, max_bytes)
+        opened, missing = open_ranges(path, plan.ranges)
+        return TelemetryExport(read_ranges(opened), plan.cursor, plan.gap or missing)
+
+    def start(self) -> None:
+        self.backend.get_telemetry_writer().start()
+
+    def close(self) -> None:
+        self.backend.flush_preferences()
+        self.backend.close_telemetry_writer()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    backend: Backend = app.state.backend
+    if LOG_PIPELINE_INSTALLED:
+        log_pipeline.acquire() # Shared by every app in the process: only the last one to shut down stops it
+    backend.start_deferred_init()
+    yield
+    backend.close()
+    _open_backends.discard(backend)
+    backend.io_executor.shutdown()
+    if LOG_PIPELINE_INSTALLED:
+        log_pipeline.release() # Drains the queued records; anything logged later is written directly
+
+# Shared by every app create_app builds; handlers find their Backend at request.app.state.backend
+router = APIRouter(default_response_class=FastJSONResponse)
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """Request, I/O and lock metrics in the Prometheus text format."""
+    metrics = request.app.state.backend.metrics
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled.")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/debug/profiles")
+async def list_profiles(request: Request):
+    """Retained request profiles, newest first, each with its slowest functions."""
+    backend = request.app.state.backend
+    if not backend.settings.profiling:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    store = backend.profile_store
+    return {"directory": store.directory, "profiles": await backend.io_executor.run(store.list)}
+
+@router.get("/debug/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    """One profile as a cProfile/pstats file."""
+    backend = request.app.state.backend
+    if not backend.settings.profiling:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    path = await backend.io_executor.run(backend.profile_store.path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, media_type="application/octet-stream", filename=profile_id + ".prof")
+
+@router.get("/health")
+async def health_check():
+    return {"status": "ok"}
+@router.get("/ready")
+async def ready_check(request: Request):
+    """200 once deferred initialization has finished, 503 while it is still running."""
+    backend = request.app.state.backend
+    backend.start_deferred_init()
+    if not backend.init_done.is_set():
+        return FastJSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+@router.get("/")
+async def root():
+    return {"message": "Backend is running"}
+@router.post("/onboarding")
+async def onboarding(request: Request, data: Preferences = Body(...)):
+    await request.app.state.backend.save_preferences_async(data)
+    return {"status": "saved"}
+
+@router.get("/preferences", response_model=Preferences)
+async def get_preferences(request: Request, if_none_match: Optional[str] = Header(None)):
+    """Retrieve current user preferences.
+
+    The response carries an ETag; a matching `If-None-Match` gets `304 Not Modified`.
+    """
+    # load_preferences now handles potential errors internally and returns defaults
+    prefs = await request.app.state.backend.load_preferences_async()
+    etag = preferences_etag(prefs)
+    if if_none_match is not None and etag_matches_weak(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # Returned as a ready-made body: FastAPI would otherwise re-validate and re-encode the model each time
+    return Response(preferences_body(prefs), media_type="application/json", headers={"ETag": etag})
+
+@router.post("/preferences")
+async def set_preferences(request: Request, response: Response, prefs: Preferences = Body(...), if_match: Optional[str] = Header(None)):
+    """Update user preferences.
+
+    Send the ETag from `GET /preferences` as `If-Match` to get `412 Precondition Failed`
+    instead of overwriting a concurrent change.
+    """
+    # save_preferences will raise HTTPException on failure
+    await request.app.state.backend.save_preferences_async(prefs, if_match=if_match)
+    response.headers["ETag"] = preferences_etag(prefs)
+    return {"status": "updated"}
+
+# Telemetry endpoint
+@router.post("/telemetry")
+async def submit_telemetry(request: Request, data: TelemetryData = Body(...)):
     """Receive and log telemetry data locally."""
     # Explicit type checks within the endpoint
     if not isinstance(data.event, str):
@@ -126,20 +620,287 @@ def submit_telemetry(data: TelemetryData = Body(...)):
     if not isinstance(data.details, dict):
         raise HTTPException(status_code=422, detail="Invalid type for 'details', expected dictionary.")
 
+    backend: Backend = request.app.state.backend
+    admission = backend.telemetry_governor.admit(data.event)
+    backend.telemetry_ingest_total.inc(admission.outcome)
+    if admission.outcome == RATE_LIMITED:
+        raise HTTPException(status_code=429, detail="Telemetry rate limit exceeded.",
+                            headers={"Retry-After": retry_after_header(admission.retry_after)})
+    if admission.outcome == SAMPLED_OUT:
+        return {"status": "sampled"} # Counted, not written
+    aggregator = backend.telemetry_aggregator
+    if aggregator is not None and aggregator.aggregates(data.event):
+        aggregator.add(data.event, data.details, weight=1 / admission.sample_rate)
+        return {"status": "received"} # Logged with its window's summary record
+    path = backend.settings.telemetry_file
     try:
-        # For privacy, just log to a local file
-        with open(TELEMETRY_FILE, "a") as f:
-            f.write(json.dumps(data.model_dump()) + "\n") # Use model_dump() instead of dict()
+        # For privacy, just log to a local file (batched with concurrent events by the writer thread)
+        line, entry = encode_telemetry(data, sample_rate=admission.sample_rate, compact=backend.settings.telemetry_compact_lines)
+        with backend.io_seconds.time("telemetry_submit"):
+            await backend.storage.append_telemetry_async(line, [entry])
         return {"status": "received"}
     except IsADirectoryError as e:
-        logger.error(f"Telemetry log path '{TELEMETRY_FILE}' is a directory: {e}")
-        raise HTTPException(status_code=500, detail=f"Telemetry log path is a directory.")
+        logger.error("Telemetry log path '%s' is a directory: %s", path, e)
+        raise HTTPException(status_code=500, detail="Telemetry log path is a directory.")
     except IOError as e:
-        logger.error(f"Error writing to telemetry log '{TELEMETRY_FILE}': {e}")
+        logger.error("Error writing to telemetry log '%s': %s", path, e)
         # Don't necessarily fail the request, but log the error
         return {"status": "logged_with_error"}
 
 
-if __name__ == "__main__":
-    logger.info("Starting backend server on port 5002")
-    uvicorn.run(app, host="127.0.0.1", port=5002)
+class TelemetryBatch:
+    """Validates batch records one at a time and appends accepted ones in large chunks."""
+
+    def __init__(self, backend: Backend, chunk_bytes: Optional[int] = None):
+        self.backend = backend
+        self.settings = backend.settings
+        self.chunk_bytes = chunk_bytes if chunk_bytes is not None else self.settings.telemetry_batch_chunk_bytes
+        self.index = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.sampled_out = 0
+        self.errors: List[dict] = []
+        self.write_error = False
+        self._buffer: List[bytes] = []
+        self._entries: List[IndexEntry] = []
+        self._buffered = 0
+
+    def add(self, record, limit_error: Optional[str] = None) -> None:
+        """Validates a decoded record (an item of a JSON array) that passed its depth and key count."""
+        if limit_error is not None:
+            self._reject([{"loc": [], "msg": limit_error}])
+            return
+        try:
+            self._accept(TelemetryData.model_validate(record))
+        except ValidationError as e:
+            self._reject([{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()])
+
+    def add_json(self, line: bytes) -> None:
+        """Validates one raw NDJSON line, after its depth and key count."""
+        limit_error = json_limit_error(line, self.settings.telemetry_max_depth, self.settings.telemetry_max_keys)
+        if limit_error is not None:
+            self._reject([{"loc": [], "msg": limit_error}])
+            return
+        try:
+            self._accept(TelemetryData.model_validate_json(line))
+        except ValidationError as e:
+            self._reject([{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()])
+
+    def _accept(self, data: TelemetryData) -> None:
+        backend = self.backend
+        # Batches are the sanctioned bulk path: sampled and counted, but not rate limited
+        admission = backend.telemetry_governor.admit(data.event, limit=False)
+        backend.telemetry_ingest_total.inc(admission.outcome)
+        if admission.outcome == SAMPLED_OUT:
+            self.sampled_out += 1
+            self.index += 1
+            return
+        aggregator = backend.telemetry_aggregator
+        if aggregator is not None and aggregator.aggregates(data.event):
+            aggregator.add(data.event, data.details, weight=1 / admission.sample_rate)
+            self.accepted += 1
+            self.index += 1
+            return
+        line, entry = encode_telemetry(data, sample_rate=admission.sample_rate, compact=self.settings.telemetry_compact_lines)
+        self._buffer.append(line)
+        self._entries.append(entry)
+        self._buffered += len(line)
+        self.accepted += 1
+        self.index += 1
+
+    def _reject(self, errors: List[dict]) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.settings.telemetry_batch_max_reported_errors:
+            self.errors.append({"index": self.index, "errors": errors})
+        self.index += 1
+
+    @property
+    def chunk_ready(self) -> bool:
+        return self._buffered >= self.chunk_bytes
+
+    async def flush(self) -> None:
+        """Appends the buffered records in one write."""
+        if not self._buffer:
+            return
+        data, entries = b"".join(self._buffer), self._entries
+        self._buffer = []
+        self._entries = []
+        self._buffered = 0
+        if self.write_error:
+            return
+        try:
+            with self.backend.io_seconds.time("telemetry_submit"):
+                await self.backend.storage.append_telemetry_async(data, entries)
+        except IsADirectoryError as e:
+            logger.error("Telemetry log path '%s' is a directory: %s", self.settings.telemetry_file, e)
+            raise HTTPException(status_code=500, detail="Telemetry log path is a directory.")
+        except IOError as e:
+            logger.error("Error writing to telemetry log '%s': %s", self.settings.telemetry_file, e)
+            self.write_error = True
+
+    def result(self) -> dict:
+        result = {
+            "status": "logged_with_error" if self.write_error else "received",
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+        if self.sampled_out:
+            result["sampled_out"] = self.sampled_out
+        return result
+
+def _record_too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Telemetry record larger than {max_bytes} bytes.")
+
+async def _iter_ndjson_lines(stream: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Yields non-empty lines from a streamed body; memory is bounded by the longest line allowed."""
+    pending = b""
+    async for chunk in stream:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if len(line) > max_line_bytes:
+                raise _record_too_large(max_line_bytes)
+            if line.strip():
+                yield line
+        if len(pending) > max_line_bytes:
+            raise _record_too_large(max_line_bytes)
+    if pending.strip():
+        yield pending
+
+async def _iter_json_array(stream: AsyncIterator[bytes], settings: Settings) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Yields the decoded items of a streamed JSON array (with any depth/key limit error) as they complete."""
+    reader = JsonArrayReader(settings.telemetry_max_depth, settings.telemetry_max_keys, max_item_bytes=settings.telemetry_max_event_bytes)
+    try:
+        async for chunk in stream:
+            for item in reader.feed(chunk):
+                yield item
+        for item in reader.finish():
+            yield item
+    except PayloadLimitError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.post("/telemetry/batch")
+async def submit_telemetry_batch(request: Request):
+    """Receive many telemetry events as a JSON array or an NDJSON stream.
+
+    Records are validated individually; invalid ones are reported by index
+    without failing the rest of the batch. Both formats are parsed as they
+    stream in, so memory is bounded by the chunk size, not the body size.
+    """
+    backend: Backend = request.app.state.backend
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    batch = TelemetryBatch(backend)
+    if content_type in NDJSON_CONTENT_TYPES:
+        async for line in _iter_ndjson_lines(request.stream(), backend.settings.telemetry_max_event_bytes):
+            batch.add_json(line)
+            if batch.chunk_ready:
+                await batch.flush()
+    else:
+        try:
+            async for item, limit_error in _iter_json_array(request.stream(), backend.settings):
+                batch.add(item, limit_error)
+                if batch.chunk_ready:
+                    await batch.flush()
+        except ValueError as e:
+            written = f" {batch.index} earlier records were processed." if batch.index else ""
+            raise HTTPException(status_code=422, detail=f"Invalid JSON body: expected a JSON array of telemetry events ({e}).{written}")
+    await batch.flush()
+    return batch.result()
+
+
+def _parse_time_param(name: str, value: Optional[str]) -> Optional[float]:
+    ts = parse_timestamp(value)
+    if value not in (None, "") and ts is None:
+        raise HTTPException(status_code=422, detail=f"Invalid '{name}': expected epoch seconds or ISO 8601.")
+    return ts
+
+@router.get("/telemetry/stats")
+async def telemetry_stats(request: Request, since: Optional[str] = None, until: Optional[str] = None, bucket: Optional[int] = Query(None, ge=60)):
+    """Event counts from the telemetry index, optionally within [since, until) and bucketed by `bucket` seconds."""
+    backend: Backend = request.app.state.backend
+    since_ts, until_ts = _parse_time_param("since", since), _parse_time_param("until", until)
+    stats = await backend.io_executor.run(backend.storage.telemetry_stats, since_ts, until_ts, bucket)
+    stats["ingest"] = backend.telemetry_governor.summary() # Since this worker started, including events never written
+    if backend.telemetry_aggregator is not None:
+        stats["pending_aggregates"] = backend.telemetry_aggregator.pending() # Counted, summary not written yet
+    return stats
+
+@router.get("/telemetry/events")
+async def telemetry_events(request: Request, event: str, since: Optional[str] = None, until: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    """Recorded events of one type, oldest first, read by seeking to indexed offsets."""
+    backend: Backend = request.app.state.backend
+    since_ts, until_ts = _parse_time_param("since", since), _parse_time_param("until", until)
+    records, total = await backend.io_executor.run(backend.storage.telemetry_events, event, since_ts, until_ts, limit)
+    return {"event": event, "total": total, "returned": len(records), "events": records}
+
+
+@router.get("/telemetry/export")
+def export_telemetry(
+    request: Request,
+    cursor: Optional[str] = None,
+    max_bytes: int = Query(0, ge=0),
+    compress: Optional[bool] = Query(None, alias="gzip"),
+):
+    """Stream the telemetry log as NDJSON from `cursor` (or the oldest retained event).
+
+    The cursor to resume from is returned in the `X-Telemetry-Cursor` header;
+    `X-Telemetry-Gap: true` means events after the given cursor were already
+    deleted by retention. The body is gzipped when `gzip=true` or when the
+    client accepts gzip and `gzip` is not set to false.
+    """
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid export cursor.")
+    export = request.app.state.backend.storage.export_telemetry(position, max_bytes)
+    if compress is None:
+        compress = "gzip" in request.headers.get("accept-encoding", "").lower()
+    headers = {
+        "X-Telemetry-Cursor": encode_cursor(*export.cursor),
+        "X-Telemetry-Gap": "true" if export.gap else "false",
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        compress_chunks(export.chunks) if compress else export.chunks,
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+
+# Backends whose lifespan shutdown has not run; weak, so an app that is dropped is not kept alive
+_open_backends: "weakref.WeakSet[Backend]" = weakref.WeakSet()
+
+def _close_open_backends():
+    for backend in list(_open_backends):
+        backend.close()
+
+atexit.register(_close_open_backends) # Last resort if a lifespan shutdown never ran
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Builds an app with its own ``Backend``; ``settings`` defaults to ``Settings.from_env()``.
+
+    Background workers start on first use (or at lifespan startup) and stop at
+    lifespan shutdown, so apps with different settings can run side by side.
+    """
+    backend = Backend(settings if settings is not None else Settings.from_env())
+    # The router's routes as they are (include_router would rebuild each route, ~15 ms per app)
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse, routes=router.routes)
+    app.state.backend = backend
+    s = backend.settings
+    # Innermost, so metrics and profiles include the rejected requests
+    app.add_middleware(RequestLimitsMiddleware, limit_for=backend.request_body_limit)
+    if s.admission_capacity > 0:
+        # Outside the body limits, so a shed request's body is never read
+        app.add_middleware(AdmissionMiddleware, controller=backend.admission_controller, class_for=request_priority_class, outcomes=backend.admission_total)
+    if s.metrics:
+        app.add_middleware(MetricsMiddleware, requests=backend.http_requests_total, latency=backend.http_request_seconds)
+    if s.profiling:
+        # Outermost, so the profile includes the other middleware; not installed at all when off
+        app.add_middleware(ProfilingMiddleware, store=backend.profile_store, save=backend.io_executor.run, sample_rate=s.profile_sample_rate)
+    _open_backends.add(backend)
+    return app
+
+# The app uvicorn and the bootstrap serve, configured from the environment
+app = create_app(ENV_SETTINGS)
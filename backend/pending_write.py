@@ -0,0 +1,71 @@
+"""Hand-off between request handlers and a group-commit writer thread.
+
+``TelemetryWriter`` and the SQLite inserter both queue one ``PendingWrite``
+per submission and settle it from their writer thread once its batch is
+committed (or has failed). Submitters wait for that either on their own
+thread (``wait``) or on the event loop (``wait_async``), where the writer
+thread wakes them through ``call_soon_threadsafe``.
+"""
+import asyncio
+import threading
+from typing import Callable, Iterable, Optional
+
+
+class PendingWrite:
+    """One queued submission; subclasses add the payload the writer needs."""
+
+    __slots__ = ("done", "error", "_notify")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+        self._notify: Optional[Callable[[], None]] = None # Set while an async submitter waits
+
+    def wait(self) -> None:
+        """Blocks until settled; re-raises the write's error."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+    async def wait_async(self, enqueue: Callable[["PendingWrite", bool], bool]) -> None:
+        """Queues the submission with ``enqueue(self, block)`` and awaits it without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._notify = lambda: loop.call_soon_threadsafe(_settle_future, future, self)
+        try:
+            if not enqueue(self, False):
+                # Queue full: wait for room on a worker thread, never on the event loop
+                await loop.run_in_executor(None, enqueue, self, True)
+            await future
+        finally:
+            self._notify = None # Break the pending -> notify -> pending cycle: free the payload now, not at the next GC
+
+    def settle(self, error: Optional[Exception]) -> None:
+        """Called on the writer thread once the submission's batch is done."""
+        self.error = error
+        self.done.set()
+        notify = self._notify # Read once: a cancelled submitter clears it concurrently
+        if notify is not None:
+            try:
+                notify()
+            except RuntimeError:
+                pass # The submitter's event loop is already closed
+
+
+def _settle_future(future: "asyncio.Future", pending: PendingWrite) -> None:
+    if not future.done():
+        if pending.error is not None:
+            future.set_exception(pending.error)
+        else:
+            future.set_result(None)
+
+
+def fail_unsettled(batch: Iterable[PendingWrite], error: Exception) -> None:
+    """Settles with ``error`` every submission of ``batch`` the writer had not settled yet.
+
+    Writer threads call this when committing a batch raised something
+    unexpected, so no submitter waits forever and the thread keeps running.
+    """
+    for pending in batch:
+        if not pending.done.is_set():
+            pending.settle(error)
@@ -0,0 +1,204 @@
+"""In-memory snapshot and crash-safe persistence of the preferences file.
+
+Readers get the last parsed value without taking ``preferences_lock``; the
+snapshot is swapped in whole by writers and dropped whenever the file's
+stat signature (mtime, size, inode) no longer matches, e.g. after the Tauri
+``save_preferences`` command rewrote the same JSON file.
+
+Writes go through a temp file + fsync + rename, optionally deferred and
+coalesced by ``WriteBehindWriter``.
+"""
+import errno
+import logging
+import os
+import stat
+import tempfile
+import threading
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+from backend.serialization import dumps_pretty
+
+logger = logging.getLogger(__name__)
+
+
+class FileSignature(NamedTuple):
+    mtime_ns: int
+    size: int
+    ino: int
+
+
+class _Snapshot(NamedTuple):
+    path: str
+    signature: Optional[FileSignature]
+    value: Any
+    generation: int
+
+
+def file_signature(path: str) -> Optional[FileSignature]:
+    """Returns the stat signature of ``path``, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return FileSignature(st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class SnapshotCache:
+    """Holds one parsed value per file, validated against the file's signature.
+
+    The snapshot is a single immutable tuple, so publishing is one reference
+    assignment and readers need no lock. Values must be treated as immutable.
+
+    ``generation(path)``, if given, returns a counter that other processes
+    bump when they rewrite the file (see ``file_lock``); a snapshot is also
+    dropped when it changes. This catches rewrites the stat signature can miss
+    (same size, recycled inode, within one mtime tick).
+    """
+
+    def __init__(self, enabled: bool = True, generation: Optional[Callable[[str], int]] = None):
+        self.enabled = enabled
+        self.generation = generation
+        self._snapshot: Optional[_Snapshot] = None
+
+    def get(self, path: str) -> Optional[Any]:
+        """Returns the cached value for ``path`` if the file is unchanged, else None."""
+        snapshot = self._snapshot
+        if not self.enabled or snapshot is None or snapshot.path != path:
+            return None
+        if file_signature(path) != snapshot.signature:
+            return None
+        if self.generation is not None and self.generation(path) != snapshot.generation:
+            return None
+        return snapshot.value
+
+    def current_generation(self, path: str) -> int:
+        return self.generation(path) if self.generation is not None else 0
+
+    def publish(self, path: str, value: Any, signature: Optional[FileSignature], generation: int = 0) -> None:
+        """Swaps in ``value`` as the current snapshot for ``path``.
+
+        ``signature`` and ``generation`` must be taken *before* the file was read
+        (or right after it was written) so a concurrent external change is
+        detected on the next get.
+        """
+        if self.enabled:
+            self._snapshot = _Snapshot(path, signature, value, generation)
+
+    def invalidate(self) -> None:
+        self._snapshot = None
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """Writes ``data`` as JSON to a temp file, fsyncs it and renames it over ``path``.
+
+    A crash leaves either the old or the new file, never a truncated one.
+    Like a plain ``open(path, 'w')``, this fails if the directory is missing or
+    the existing file is read-only; the existing file's mode is preserved.
+    """
+    directory = os.path.dirname(path) or "."
+    mode = None
+    if os.path.exists(path):
+        if not os.access(path, os.W_OK):
+            raise PermissionError(errno.EACCES, "Permission denied", path)
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps_pretty(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode if mode is not None else 0o644) # mkstemp creates files as 0600
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str) -> None:
+    # Makes the rename itself durable; not supported (or needed) on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteBehindWriter:
+    """Coalesces rapid updates of a value into one disk write per window.
+
+    ``schedule`` only records the newest value and returns; a timer writes it
+    ``window`` seconds after the first unflushed update. ``flush`` writes the
+    pending value immediately (used on shutdown). A failed write keeps the
+    value pending and re-arms the timer, backing off from ``window`` up to
+    ``MAX_RETRY_DELAY`` seconds, so it is retried even if nothing else is saved.
+    """
+
+    MAX_RETRY_DELAY = 60.0
+
+    def __init__(self, write: Callable[[str, Any], None], window: float):
+        self._write = write
+        self.window = window
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pending: Optional[Tuple[str, Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._retry_delay = 0.0 # Delay of the last retry; 0 after a successful write
+        self.requested = 0
+        self.written = 0
+
+    def schedule(self, path: str, value: Any) -> None:
+        with self._lock:
+            self.requested += 1
+            previous = self._pending
+            self._pending = (path, value)
+            if self._timer is None:
+                self._arm_locked(self.window)
+        if previous is not None and previous[0] != path:
+            self._write_value(previous) # Never coalesce across files
+
+    def _arm_locked(self, delay: float) -> None:
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def pending_value(self, path: str) -> Optional[Any]:
+        pending = self._pending
+        return pending[1] if pending is not None and pending[0] == path else None
+
+    def flush(self) -> None:
+        """Writes the pending value now, if any."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending = self._pending
+        if pending is not None:
+            self._write_value(pending)
+
+    def _write_value(self, pending: Tuple[str, Any]) -> None:
+        with self._io_lock:
+            try:
+                self._write(*pending)
+            except OSError as e:
+                with self._lock:
+                    if self._pending is not None and self._timer is None:
+                        self._retry_delay = min(max(self._retry_delay * 2, self.window), self.MAX_RETRY_DELAY)
+                        self._arm_locked(self._retry_delay)
+                logger.error("Deferred write to '%s' failed (retrying in %.1f s): %s", pending[0], self._retry_delay, e)
+                return
+            self.written += 1
+            with self._lock:
+                self._retry_delay = 0.0
+                if self._pending is pending:
+                    self._pending = None
@@ -0,0 +1,194 @@
+"""Opt-in per-request profiling.
+
+``ProfilingMiddleware`` runs ``cProfile`` for a request that sends the
+``X-Debug-Profile`` header or is picked by the sampling rate. The profile
+covers the event-loop side of the request and every call the handler hands to
+the I/O pool (``IOExecutor.run`` runs them under ``RequestProfile.call``), so
+``load_preferences``, ``save_preferences`` and index lookups show up with their
+own timings. It is saved as a standard ``.prof`` file (open it with
+``python -m pstats`` or snakeviz) next to a small JSON summary, and
+``ProfileStore`` keeps only the newest ``retain`` profiles.
+
+cProfile allows one profiler per thread, so one request per process is
+profiled at a time; requests that would overlap run unprofiled. While a
+request is profiled, anything else the event loop runs is recorded too.
+
+With profiling disabled the middleware is not installed at all, and the I/O
+pool's only cost is one ``ContextVar`` lookup per call.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-debug-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+TOP_FUNCTIONS = 15
+
+# Set for the duration of a profiled request; read by IOExecutor.run
+active_profile: "ContextVar[Optional[RequestProfile]]" = ContextVar("active_profile", default=None)
+
+
+class RequestProfile:
+    """Profilers for one request: the event loop thread's plus one per I/O pool call."""
+
+    def __init__(self):
+        self.loop_profiler = cProfile.Profile()
+        self._lock = threading.Lock()
+        self._pool_profilers: List[cProfile.Profile] = []
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Calls ``func`` under a profiler of its own (on whichever thread runs it)."""
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._pool_profilers.append(profiler)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.loop_profiler, stream=io.StringIO())
+        with self._lock:
+            for profiler in self._pool_profilers:
+                stats.add(profiler)
+        return stats
+
+
+def _top_functions(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> List[dict]:
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            "calls": ncalls,
+            "own_ms": round(tottime * 1000, 3),
+            "cumulative_ms": round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+class ProfileStore:
+    """Profiles on disk: ``<id>.prof`` plus ``<id>.json``, newest ``retain`` kept."""
+
+    def __init__(self, directory: str, retain: int = 20):
+        self.directory = directory
+        self.retain = max(1, retain)
+        self._lock = threading.Lock()
+
+    def new_id(self, method: str, path: str) -> str:
+        now = datetime.now(timezone.utc)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        return f"{now:%Y%m%dT%H%M%S}{now.microsecond:06d}-{method.lower()}-{slug[:40]}"
+
+    def save(self, profile_id: str, profile: RequestProfile, info: dict) -> None:
+        """Writes the profile and its summary, then deletes the oldest beyond ``retain``."""
+        stats = profile.stats()
+        info = dict(info, id=profile_id, top=_top_functions(stats))
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            stats.dump_stats(os.path.join(self.directory, profile_id + ".prof"))
+            with open(os.path.join(self.directory, profile_id + ".json"), "w") as f:
+                json.dump(info, f)
+            for old in self._ids()[:-self.retain]:
+                for ext in (".prof", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, old + ext))
+                    except FileNotFoundError:
+                        pass
+
+    def _ids(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".prof")) # Ids sort by time
+
+    def list(self) -> List[dict]:
+        """Summaries of the retained profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                info = {"id": profile_id} # Summary missing or half-written: still list the profile
+            info["file"] = os.path.join(self.directory, profile_id + ".prof")
+            profiles.append(info)
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[str]:
+        """The ``.prof`` file of a retained profile, or None (ids are matched, never joined blindly)."""
+        return os.path.join(self.directory, profile_id + ".prof") if profile_id in self._ids() else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests picked by header or ``sample_rate``.
+
+    ``save`` runs the (blocking) ``store.save`` off the event loop, e.g.
+    ``IOExecutor.run``. The response carries the profile's id in
+    ``X-Profile-Id``.
+    """
+
+    def __init__(self, app, store: ProfileStore, save: Callable, sample_rate: float = 0.0):
+        self.app = app
+        self.store = store
+        self.save = save
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return value not in (b"0", b"false", b"")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        profile_id = self.store.new_id(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = dict(message, headers=list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())])
+            await send(message)
+
+        token = active_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            profile.loop_profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                profile.loop_profiler.disable()
+                self._busy.release()
+        finally:
+            active_profile.reset(token)
+            route = scope.get("route")
+            info = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None) or "unmatched",
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "created": datetime.now(timezone.utc).isoformat(),
+            }
+            try:
+                await self.save(self.store.save, profile_id, profile, info)
+            except OSError as e:
+                logger.error("Could not save request profile to '%s': %s", self.store.directory, e)
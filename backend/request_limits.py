@@ -0,0 +1,274 @@
+"""Bounded-memory limits on request bodies.
+
+``RequestLimitsMiddleware`` enforces a per-route body size. A ``Content-Length``
+over the limit is answered with 413 before any of the body is read. Chunked
+bodies (no ``Content-Length``) are counted as they stream in and cut off at the
+limit. Routes that accept a single JSON document can also have its nesting depth
+and key count checked chunk by chunk, before the framework parses it.
+
+``JsonScanner`` does that checking without decoding anything. The number of
+colons bounds the key count, and the number of opening brackets bounds the depth.
+Both are counted at C speed, so a typical event costs a few ``bytes.count`` calls.
+Only a document whose counts could exceed a limit is tokenized exactly, with
+strings skipped.
+
+``JsonArrayReader`` decodes a streamed JSON array one item at a time with the
+json module's C scanner. A batch is validated record by record, and memory is
+bounded by the largest record, not by the body.
+"""
+import codecs
+import json
+import re
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+_STRUCTURE = re.compile(rb'[\[\]{}:"]')
+_STRING_REST = re.compile(rb'(?:[^"\\]|\\.)*"', re.S)
+_QUOTE, _COLON, _BACKSLASH = ord('"'), ord(':'), ord('\\')
+_OPEN = (ord('{'), ord('['))
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_PARTIAL_TAIL = re.compile(r"[\w.+\-]*") # A literal or number the next chunk may complete
+
+
+class PayloadLimitError(ValueError):
+    """A body exceeded a configured limit; ``status_code`` is 413 (size) or 422 (depth, keys)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+class BodyLimit(NamedTuple):
+    max_bytes: int # 0 = unlimited
+    max_depth: int = 0 # Checked while the body streams in; 0 = not checked
+    max_keys: int = 0
+
+
+class JsonScanner:
+    """Incremental depth / key-count check of one JSON document fed in chunks.
+
+    ``feed`` raises ``PayloadLimitError`` (422) as soon as a limit is exceeded.
+    Until the cheap counts say a limit could be exceeded, the chunks are kept
+    rather than scanned. Callers bound the document's size.
+    """
+
+    def __init__(self, max_depth: int = 0, max_keys: int = 0):
+        self.max_depth = max_depth
+        self.max_keys = max_keys
+        self.depth = 0
+        self.keys = 0
+        self._colons = 0
+        self._opens = 0
+        self._pending: Optional[List[bytes]] = []
+        self._in_string = False
+        self._escape = False
+
+    def _within_counts(self) -> bool:
+        return (not self.max_keys or self._colons <= self.max_keys) and (not self.max_depth or self._opens <= self.max_depth)
+
+    def feed(self, chunk: bytes) -> None:
+        if self._pending is not None:
+            self._colons += chunk.count(b":")
+            self._opens += chunk.count(b"{") + chunk.count(b"[")
+            if self._within_counts():
+                self._pending.append(chunk)
+                return
+            # Over a limit, or just colons/brackets inside strings: scan everything so far exactly
+            chunk = b"".join(self._pending) + chunk
+            self._pending = None
+        self._scan(chunk)
+
+    def _string_end(self, data: bytes, pos: int) -> int:
+        """Offset just past the closing quote of the open string, or -1 if it runs past ``data``."""
+        if self._escape:
+            if pos >= len(data):
+                return -1
+            pos += 1
+            self._escape = False
+        m = _STRING_REST.match(data, pos)
+        if m is not None:
+            self._in_string = False
+            return m.end()
+        self._in_string = True
+        end = len(data)
+        while end > pos and data[end - 1] == _BACKSLASH:
+            end -= 1
+        self._escape = (len(data) - end) % 2 == 1 # The chunk split an escape sequence
+        return -1
+
+    def _scan(self, data: bytes) -> None:
+        pos = self._string_end(data, 0) if self._in_string else 0
+        while pos >= 0:
+            m = _STRUCTURE.search(data, pos)
+            if m is None:
+                break
+            pos = m.end()
+            c = data[pos - 1]
+            if c == _QUOTE:
+                pos = self._string_end(data, pos)
+            elif c == _COLON:
+                self.keys += 1
+                if self.max_keys and self.keys > self.max_keys:
+                    raise PayloadLimitError(422, f"More than {self.max_keys} object keys.")
+            elif c in _OPEN:
+                self.depth += 1
+                if self.max_depth and self.depth > self.max_depth:
+                    raise PayloadLimitError(422, f"Nesting deeper than {self.max_depth} levels.")
+            else: # Closing bracket
+                self.depth -= 1
+
+
+def json_limit_error(data: bytes, max_depth: int, max_keys: int) -> Optional[str]:
+    """Why ``data`` (one complete JSON document) is over the limits, or None."""
+    if (not max_keys or data.count(b":") <= max_keys) and (
+        not max_depth or data.count(b"{") + data.count(b"[") <= max_depth
+    ):
+        return None
+    try:
+        JsonScanner(max_depth, max_keys).feed(data)
+    except PayloadLimitError as e:
+        return str(e)
+    return None
+
+
+class JsonArrayReader:
+    """Decodes a JSON array fed in chunks, yielding each item once it is complete.
+
+    ``feed`` returns ``(item, limit error or None)`` pairs. An item over the
+    depth or key limit is still returned, with its error, so the caller can
+    reject just that record. An item longer than ``max_item_bytes`` raises
+    ``PayloadLimitError`` (413). Malformed JSON raises ``ValueError``.
+    """
+
+    def __init__(self, max_depth: int = 0, max_keys: int = 0, max_item_bytes: int = 0):
+        self.max_depth = max_depth
+        self.max_keys = max_keys
+        self.max_item_bytes = max_item_bytes
+        self.items = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._state = "start" # -> "first" -> ("item" <-> "next") -> "done"
+
+    def _too_large(self, text: str) -> bool:
+        limit = self.max_item_bytes
+        return bool(limit) and len(text) * 4 > limit and len(text.encode()) > limit
+
+    def _limit_error(self, text: str) -> Optional[str]:
+        if (self.max_keys and text.count(":") > self.max_keys) or (
+            self.max_depth and text.count("{") + text.count("[") > self.max_depth
+        ):
+            return json_limit_error(text.encode(), self.max_depth, self.max_keys)
+        return None
+
+    def _incomplete(self, error: json.JSONDecodeError, buf: str) -> bool:
+        rest = buf[error.pos:]
+        return (
+            _PARTIAL_TAIL.fullmatch(rest) is not None
+            or error.msg.startswith("Unterminated string")
+            or (error.msg.startswith("Invalid \\uXXXX") and len(rest) < 6)
+        )
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Tuple[Any, Optional[str]]]:
+        buf = self._buf + self._text.decode(chunk, final)
+        items: List[Tuple[Any, Optional[str]]] = []
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            c = buf[pos]
+            state = self._state
+            if state == "start":
+                if c != "[":
+                    raise ValueError("Expected a JSON array")
+                self._state = "first"
+                pos += 1
+            elif state == "next" or (state == "first" and c == "]"):
+                if c == "]":
+                    self._state = "done"
+                elif c != ",":
+                    raise ValueError(f"Expecting ',' delimiter after item {self.items - 1}")
+                else:
+                    self._state = "item"
+                pos += 1
+            elif state == "done":
+                raise ValueError("Unexpected data after the JSON array")
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if not final and self._incomplete(e, buf):
+                        break # Wait for the rest of the item
+                    raise ValueError(f"{e.msg} in item {self.items}")
+                except RecursionError:
+                    raise ValueError(f"Item {self.items} is nested too deeply")
+                if end == len(buf) and not final:
+                    break # A number may continue in the next chunk
+                text = buf[pos:end]
+                if self._too_large(text):
+                    raise PayloadLimitError(413, f"Record larger than {self.max_item_bytes} bytes.")
+                items.append((item, self._limit_error(text)))
+                self.items += 1
+                self._state = "next"
+                pos = end
+        self._buf = buf[pos:]
+        if self._too_large(self._buf):
+            raise PayloadLimitError(413, f"Record larger than {self.max_item_bytes} bytes.")
+        return items
+
+    def finish(self) -> List[Tuple[Any, Optional[str]]]:
+        """Decodes what is left and checks that the array was complete."""
+        items = self.feed(b"", final=True)
+        if self._state == "start":
+            raise ValueError("Expected a JSON array")
+        if self._state != "done":
+            raise ValueError("Unexpected end of JSON array")
+        return items
+
+
+class RequestLimitsMiddleware:
+    """ASGI middleware applying ``limit_for(path)`` to each request body."""
+
+    def __init__(self, app, limit_for: Callable[[str], BodyLimit]):
+        self.app = app
+        self.limit_for = limit_for
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self.limit_for(scope["path"])
+        if not (limit.max_bytes or limit.max_depth or limit.max_keys):
+            await self.app(scope, receive, send)
+            return
+        if limit.max_bytes:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > limit.max_bytes:
+                        # Rejected before a byte of the body is read
+                        response = JSONResponse({"detail": f"Request body larger than {limit.max_bytes} bytes."}, status_code=413)
+                        await response(scope, receive, send)
+                        return
+                    break
+        scanner = JsonScanner(limit.max_depth, limit.max_keys) if limit.max_depth or limit.max_keys else None
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if limit.max_bytes and received > limit.max_bytes:
+                    raise HTTPException(413, f"Request body larger than {limit.max_bytes} bytes.")
+                if scanner is not None and body:
+                    try:
+                        scanner.feed(body)
+                    except PayloadLimitError as e:
+                        raise HTTPException(e.status_code, str(e))
+            return message
+
+        await self.app(scope, limited_receive, send)
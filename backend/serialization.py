@@ -0,0 +1,83 @@
+"""JSON encoding for the telemetry log, the preferences file and API responses.
+
+Uses orjson when it is installed and the standard library otherwise (or when
+``use_encoder("json")`` says so). Output is UTF-8 bytes, ready to be written
+or sent as-is. Values orjson rejects (integers beyond 64 bits, lone
+surrogates, non-string keys) fall back to the standard library, so switching
+encoders never turns a request that used to succeed into an error.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError: # Optional speed-up
+    orjson = None
+
+_orjson = orjson
+
+
+def use_encoder(name: str) -> str:
+    """Selects ``"orjson"``, ``"json"`` or ``"auto"`` (orjson if installed); returns the encoder in use."""
+    global _orjson
+    if name not in ("auto", "orjson", "json"):
+        raise ValueError(f"Unknown JSON encoder: {name!r}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("JSON encoder 'orjson' requested but orjson is not installed")
+    _orjson = None if name == "json" else orjson
+    return encoder_name()
+
+
+def encoder_name() -> str:
+    return "orjson" if _orjson is not None else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def dumps_line(obj: Any) -> bytes:
+    """Compact JSON followed by a newline (one NDJSON line, without copying it to append the newline)."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, option=_orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode()
+
+
+def dumps_pretty(obj: Any) -> bytes:
+    """JSON indented by two spaces, for files people may edit by hand."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, option=_orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+    return json.dumps(obj, indent=2).encode()
+
+
+def dumps_spaced(obj: Any) -> bytes:
+    """``json.dumps`` default layout (``", "`` / ``": "``): the telemetry log's original line format."""
+    return json.dumps(obj).encode()
+
+
+def loads(data: Any) -> Any:
+    """Parses JSON; errors are ``json.JSONDecodeError`` with either encoder."""
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class of the app: renders with the selected encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
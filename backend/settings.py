@@ -0,0 +1,167 @@
+"""Per-instance backend configuration.
+
+``Settings`` holds everything ``create_app`` needs to build one backend:
+where its files live, writer and cache tuning, request limits, and which
+optional subsystems are on. Each field is read from the environment
+variable named in its metadata by ``Settings.from_env()``; ``Settings()``
+uses the defaults only, which is what tests and benchmarks want when they
+host several isolated apps in one process.
+
+File paths left as None are derived from ``preferences_dir`` and
+``log_dir`` when the settings are created.
+"""
+import os
+from dataclasses import dataclass, field, fields
+from typing import Mapping, Optional, Tuple
+
+# App identifiers for platformdirs
+APP_NAME = "OpenWebUIOnboarding"
+APP_AUTHOR = "OpenWebUI"
+
+
+def _user_dir(kind: str) -> str:
+    import platformdirs # Here, not at import: the bootstrap imports this module before it binds the socket
+    return getattr(platformdirs, kind)(APP_NAME, APP_AUTHOR)
+
+
+def _env(name: str, default):
+    return field(default=default, metadata={"env": name})
+
+
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off')
+
+
+def parse_bool(raw: str) -> bool:
+    """``1/true/yes/on`` or ``0/false/no/off``, any case; anything else is a ``ValueError``."""
+    value = raw.strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(f"Expected one of {', '.join(_TRUE + _FALSE)}, got {raw!r}")
+
+
+def _parse(raw: str, default):
+    if isinstance(default, bool):
+        return parse_bool(raw)
+    if isinstance(default, tuple):
+        return tuple(item.strip() for item in raw.split(',') if item.strip())
+    if isinstance(default, int):
+        return int(raw)
+    if isinstance(default, float):
+        return float(raw)
+    return raw
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Data locations; created on first use (platformdirs' standard locations by default)
+    preferences_dir: str = field(default_factory=lambda: _user_dir("user_data_dir"))
+    log_dir: str = field(default_factory=lambda: _user_dir("user_log_dir"))
+
+    preferences_file: Optional[str] = _env('PREFERENCES_FILE_PATH', None) # <preferences_dir>/preferences.json
+    telemetry_file: Optional[str] = _env('TELEMETRY_FILE_PATH', None) # <log_dir>/telemetry.log
+    # Set PREFERENCES_CACHE=0 to re-read the preferences file on every GET
+    preferences_cache: bool = _env('PREFERENCES_CACHE', True)
+    # Write-behind window for preference saves; 0 writes synchronously before responding
+    preferences_write_behind_ms: float = _env('PREFERENCES_WRITE_BEHIND_MS', 0.0)
+    # Telemetry group-commit writer: flush policy and durability (none | batch | event)
+    telemetry_max_batch: int = _env('TELEMETRY_MAX_BATCH', 512)
+    telemetry_max_delay_ms: float = _env('TELEMETRY_MAX_DELAY_MS', 0.0)
+    telemetry_queue_size: int = _env('TELEMETRY_QUEUE_SIZE', 10000)
+    telemetry_durability: str = _env('TELEMETRY_DURABILITY', 'none')
+    # Telemetry log segments: roll over by size/age, gzip sealed segments, keep a bounded history (0 = no limit)
+    telemetry_segment_max_bytes: int = _env('TELEMETRY_SEGMENT_MAX_BYTES', 32 * 1024 * 1024)
+    telemetry_segment_max_age_s: float = _env('TELEMETRY_SEGMENT_MAX_AGE_S', 24 * 3600.0)
+    telemetry_compress_segments: bool = _env('TELEMETRY_COMPRESS_SEGMENTS', True)
+    telemetry_retain_segments: int = _env('TELEMETRY_RETAIN_SEGMENTS', 50)
+    telemetry_retain_bytes: int = _env('TELEMETRY_RETAIN_BYTES', 256 * 1024 * 1024)
+    telemetry_retain_days: float = _env('TELEMETRY_RETAIN_DAYS', 30.0)
+    # Sidecar index backing /telemetry/stats and /telemetry/events
+    telemetry_index: bool = _env('TELEMETRY_INDEX', True)
+    # POST /telemetry/batch hands accepted NDJSON records to the writer in chunks of this many bytes
+    telemetry_batch_chunk_bytes: int = _env('TELEMETRY_BATCH_CHUNK_BYTES', 1024 * 1024)
+    telemetry_batch_max_reported_errors: int = 100
+    # Write telemetry lines without whitespace (like the Tauri shell does), using the fast encoder
+    telemetry_compact_lines: bool = _env('TELEMETRY_COMPACT_LINES', False)
+
+    # Request body limits: size (413, checked against Content-Length before reading), and per event nesting depth and key count (422)
+    request_max_body_bytes: int = _env('REQUEST_MAX_BODY_BYTES', 64 * 1024)
+    telemetry_max_event_bytes: int = _env('TELEMETRY_MAX_EVENT_BYTES', 256 * 1024)
+    telemetry_max_batch_bytes: int = _env('TELEMETRY_MAX_BATCH_BYTES', 64 * 1024 * 1024)
+    telemetry_max_depth: int = _env('TELEMETRY_MAX_DEPTH', 32)
+    telemetry_max_keys: int = _env('TELEMETRY_MAX_KEYS', 1000)
+
+    # Threads for blocking file I/O from the async handlers (separate from Starlette's default threadpool)
+    io_threads: int = _env('IO_THREADS', 8)
+    # Set METRICS=0 to turn off request/I/O instrumentation and GET /metrics
+    metrics: bool = _env('METRICS', True)
+
+    # Telemetry ingestion governor: token buckets for POST /telemetry (events/s; 0 = unlimited), per worker
+    telemetry_rate_limit: float = _env('TELEMETRY_RATE_LIMIT', 500.0)
+    telemetry_rate_burst: float = _env('TELEMETRY_RATE_BURST', 1000.0)
+    telemetry_event_rate_limit: float = _env('TELEMETRY_EVENT_RATE_LIMIT', 100.0)
+    telemetry_event_rate_burst: float = _env('TELEMETRY_EVENT_RATE_BURST', 200.0)
+    # Fraction of events kept per event name, e.g. "scroll=0.1,*=0.5" (applies to /telemetry and /telemetry/batch)
+    telemetry_sample_rates: str = _env('TELEMETRY_SAMPLE_RATES', '')
+
+    # Aggregation mode: count events per window in memory and log one summary record per window
+    telemetry_aggregate: bool = _env('TELEMETRY_AGGREGATE', False)
+    telemetry_aggregate_window_s: float = _env('TELEMETRY_AGGREGATE_WINDOW_S', 60.0)
+    # Comma-separated `details` keys that split the counters, e.g. "step,button"
+    telemetry_aggregate_keys: Tuple[str, ...] = _env('TELEMETRY_AGGREGATE_KEYS', ())
+    # Comma-separated event names still logged as raw events in aggregation mode
+    telemetry_raw_events: Tuple[str, ...] = _env('TELEMETRY_RAW_EVENTS', ())
+
+    # Server processes sharing the data files (set by the bootstrap); >1 turns on inter-process file locking
+    workers: int = _env('BACKEND_WORKERS', 1)
+
+    # Storage backend: 'files' (preferences.json + telemetry.log) or 'sqlite' (one WAL-mode database)
+    storage_backend: str = _env('STORAGE_BACKEND', 'files')
+    storage_sqlite_path: Optional[str] = _env('STORAGE_SQLITE_PATH', None) # <preferences_dir>/backend.db
+    storage_sqlite_pool_size: int = _env('STORAGE_SQLITE_POOL_SIZE', 4)
+
+    # Per-request profiling (off by default): requests with an X-Debug-Profile header, plus a sampled fraction
+    profiling: bool = _env('PROFILING', False)
+    profile_sample_rate: float = _env('PROFILE_SAMPLE_RATE', 0.0)
+    profile_retain: int = _env('PROFILE_RETAIN', 20)
+    profile_dir: Optional[str] = _env('PROFILE_DIR', None) # <log_dir>/profiles
+
+    # Admission control: requests running at once per worker (0 = off), by priority class (health > preferences > queries > telemetry).
+    # Telemetry gets at most admission_telemetry_concurrency of them; requests waiting past their class's deadline get 503
+    admission_capacity: int = _env('ADMISSION_CAPACITY', 64)
+    admission_max_queue: int = _env('ADMISSION_MAX_QUEUE', 1024)
+    admission_deadline_ms: float = _env('ADMISSION_DEADLINE_MS', 2000.0)
+    admission_telemetry_concurrency: int = _env('ADMISSION_TELEMETRY_CONCURRENCY', 16)
+    admission_telemetry_deadline_ms: float = _env('ADMISSION_TELEMETRY_DEADLINE_MS', 500.0)
+
+    def __post_init__(self):
+        derived = {
+            "preferences_file": os.path.join(self.preferences_dir, 'preferences.json'),
+            "telemetry_file": os.path.join(self.log_dir, 'telemetry.log'),
+            "storage_sqlite_path": os.path.join(self.preferences_dir, 'backend.db'),
+            "profile_dir": os.path.join(self.log_dir, 'profiles'),
+        }
+        for name, path in derived.items():
+            if getattr(self, name) is None:
+                object.__setattr__(self, name, path) # Frozen dataclass
+
+    @property
+    def shared_storage(self) -> bool:
+        return self.workers > 1
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None, **overrides) -> "Settings":
+        """Settings from environment variables (``os.environ`` by default); ``overrides`` win over both."""
+        environ = os.environ if environ is None else environ
+        values = {}
+        for f in fields(cls):
+            name = f.metadata.get("env")
+            if name is not None and name in environ:
+                try:
+                    values[f.name] = _parse(environ[name], f.default)
+                except ValueError as e:
+                    raise ValueError(f"{name}: {e}") from None
+        values.update(overrides)
+        return cls(**values)
@@ -0,0 +1,494 @@
+"""Embedded SQLite storage backend (``STORAGE_BACKEND=sqlite``).
+
+Preferences and telemetry live in one database file in WAL mode. Readers
+never block the writer or each other, and several worker processes can share
+the file without the ``FileLock`` machinery the flat files need.
+
+* ``preferences``: one row holding the JSON object. A conditional save reads,
+  compares and writes in one ``BEGIN IMMEDIATE`` transaction.
+* ``telemetry``: one row per event (``event``, ``ts``, the NDJSON ``line`` as
+  received), indexed on ``(event, ts)`` and ``ts``. An inserter thread takes
+  every submission queued while the previous transaction was committing and
+  inserts them in one ``executemany`` transaction (group commit, as
+  ``TelemetryWriter`` does for the log file).
+
+Connections come from a small thread-safe pool. Every query uses a constant
+SQL string, so each connection's statement cache keeps it prepared.
+
+Migrating existing data once (``preferences.json`` and every segment of
+``telemetry.log``)::
+
+    python -m backend.sqlite_storage migrate [--db PATH] [--preferences PATH] [--telemetry PATH]
+"""
+import argparse
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from backend.pending_write import PendingWrite, fail_unsettled
+from backend.serialization import dumps, loads
+from backend.storage import PreconditionFailed, PreferencesCodec, StorageBackend, StorageError, TelemetryExport
+from backend.telemetry_index import IndexEntry, entries_from_lines
+from backend.telemetry_segments import list_segments, open_segment
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS preferences (id INTEGER PRIMARY KEY CHECK (id = 1), data TEXT NOT NULL, updated REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS telemetry (id INTEGER PRIMARY KEY, event TEXT, ts REAL NOT NULL, line BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS telemetry_event_ts ON telemetry (event, ts)",
+    "CREATE INDEX IF NOT EXISTS telemetry_ts ON telemetry (ts)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+SELECT_PREFERENCES = "SELECT data FROM preferences WHERE id = 1"
+UPSERT_PREFERENCES = (
+    "INSERT INTO preferences (id, data, updated) VALUES (1, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET data = excluded.data, updated = excluded.updated"
+)
+INSERT_EVENT = "INSERT INTO telemetry (event, ts, line) VALUES (?, ?, ?)"
+DELETE_BEFORE = "DELETE FROM telemetry WHERE ts < ?"
+EXPORT_PAGE_ROWS = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+PRUNE_INTERVAL = 60.0
+
+
+def _time_filter(since: Optional[float], until: Optional[float]) -> Tuple[str, list]:
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    return "".join(" AND " + c for c in clauses), params
+
+
+class ConnectionPool:
+    """Up to ``size`` connections to ``path``, handed out to one thread at a time."""
+
+    def __init__(self, path: str, size: int = 4, synchronous: str = "NORMAL", timeout: float = 10.0):
+        self.path = path
+        self.size = max(1, size)
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode: transactions are explicit BEGIN ... COMMIT
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False, cached_statements=64)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            if not self._schema_ready:
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.execute("COMMIT")
+                self._schema_ready = True
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._open < self.size
+                if create:
+                    self._open += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                conn = self._idle.get() # Every connection is busy: wait for one
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        """Closes the idle connections (connections in use are closed when returned by a later close)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.execute("PRAGMA optimize") # Refreshes the planner statistics the queries need
+            except sqlite3.Error:
+                pass
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+
+class _Pending(PendingWrite):
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: list):
+        super().__init__()
+        self.rows = rows
+
+
+def _rows(data: bytes, entries: Optional[List[IndexEntry]]) -> list:
+    if entries is None:
+        lines = data.splitlines(keepends=True)
+        entries = entries_from_lines(lines)
+    rows, offset = [], 0
+    for entry in entries:
+        rows.append((entry.event, entry.ts, data[offset:offset + entry.length]))
+        offset += entry.length
+    return rows
+
+
+class SqliteStorage(StorageBackend):
+    """Preferences and telemetry in one SQLite database (see the module docstring).
+
+    ``durability`` follows ``TELEMETRY_DURABILITY``. ``"none"`` runs with
+    ``synchronous=NORMAL``: in WAL mode a commit survives a process crash but
+    may be lost on power failure. ``"batch"`` and ``"event"`` run with
+    ``synchronous=FULL``, and ``"event"`` also commits every submission on
+    its own. ``retain_age`` (seconds, 0 = keep everything) prunes old events.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        codec: PreferencesCodec,
+        pool_size: int = 4,
+        durability: str = "none",
+        max_batch: int = 512,
+        queue_size: int = 10000,
+        retain_age: float = 0.0,
+    ):
+        if durability not in ("none", "batch", "event"):
+            raise ValueError(f"Unknown telemetry durability level: {durability!r}")
+        self.path = path
+        self.codec = codec
+        self.durability = durability
+        self.max_batch = max(1, max_batch)
+        self.retain_age = retain_age
+        self.pool = ConnectionPool(path, pool_size, "NORMAL" if durability == "none" else "FULL")
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._state_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self.batches_written = 0
+        self.rows_written = 0
+
+    # Preferences
+
+    def _read_preferences(self, conn: sqlite3.Connection) -> Optional[dict]:
+        row = conn.execute(SELECT_PREFERENCES).fetchone()
+        if row is None:
+            return None
+        try:
+            data = loads(row[0])
+        except ValueError as e:
+            logger.error("Error decoding stored preferences in '%s': %s. Returning defaults.", self.path, e)
+            return None
+        return data if isinstance(data, dict) else None
+
+    def load_preferences(self):
+        try:
+            with self.pool.connection() as conn:
+                return self.codec.parse(self._read_preferences(conn))
+        except sqlite3.Error as e:
+            raise StorageError(f"Could not read preferences from '{self.path}': {e}") from e
+
+    def save_preferences(self, prefs, if_match: Optional[str] = None) -> None:
+        data = self.codec.dump(prefs)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN IMMEDIATE") # Check and write as one step, across workers too
+                if if_match is not None and not self.codec.matches(if_match, self.codec.parse(self._read_preferences(conn))):
+                    conn.execute("ROLLBACK")
+                    raise PreconditionFailed()
+                conn.execute(UPSERT_PREFERENCES, (dumps(data).decode(), time.time()))
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            raise StorageError(f"Could not save preferences to '{self.path}': {e}") from e
+        logger.info("Preferences saved to '%s'", self.path)
+
+    # Telemetry writes
+
+    def start(self) -> None:
+        with self._state_lock:
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="telemetry-sqlite", daemon=True)
+            self._thread.start()
+
+    def _enqueue(self, pending: _Pending, block: bool) -> bool:
+        with self._state_lock:
+            self._start_locked()
+            try:
+                self._queue.put(pending, block=block)
+            except queue.Full:
+                return False
+        return True
+
+    def append_telemetry(self, data: bytes, entries: Optional[List[IndexEntry]] = None) -> None:
+        pending = _Pending(_rows(data, entries))
+        self._enqueue(pending, block=True)
+        pending.wait()
+
+    async def append_telemetry_async(self, data: bytes, entries: Optional[List[IndexEntry]] = None) -> None:
+        await _Pending(_rows(data, entries)).wait_async(self._enqueue)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._commit(batch)
+            except Exception as e: # Not a database or I/O error: fail this batch, keep the thread alive
+                logger.exception("Telemetry inserter for '%s' failed a batch", self.path)
+                fail_unsettled(batch, StorageError(f"Could not write telemetry to '{self.path}': {e!r}"))
+
+    def _commit(self, batch: List[_Pending]) -> None:
+        error: Optional[Exception] = None
+        try:
+            with self.pool.connection() as conn:
+                groups = [[p] for p in batch] if self.durability == "event" else [batch]
+                for group in groups:
+                    conn.execute("BEGIN IMMEDIATE")
+                    for pending in group:
+                        conn.executemany(INSERT_EVENT, pending.rows)
+                        self.rows_written += len(pending.rows)
+                    conn.execute("COMMIT")
+                self._prune(conn)
+            self.batches_written += 1
+        except sqlite3.Error as e:
+            logger.error("Error writing telemetry to '%s': %s", self.path, e)
+            error = StorageError(f"Could not write telemetry to '{self.path}': {e}")
+        except OSError as e:
+            error = e
+        for pending in batch:
+            pending.settle(error)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        now = time.time()
+        if self.retain_age > 0 and now - self._last_prune >= PRUNE_INTERVAL:
+            self._last_prune = now
+            conn.execute(DELETE_BEFORE, (now - self.retain_age,))
+
+    def close(self) -> None:
+        """Writes all queued events, stops the inserter and closes the connections."""
+        with self._state_lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+        self.pool.close()
+
+    # Telemetry queries
+
+    def telemetry_stats(self, since: Optional[float] = None, until: Optional[float] = None, bucket: Optional[int] = None) -> dict:
+        where, params = _time_filter(since, until)
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT event, COUNT(*), MIN(ts), MAX(ts) FROM telemetry WHERE event IS NOT NULL{where} GROUP BY event", params
+                ).fetchall()
+                histogram = None
+                if bucket:
+                    histogram = {}
+                    for start, event, n in conn.execute(
+                        f"SELECT CAST(ts / ? AS INTEGER) * ? AS start, event, COUNT(*) FROM telemetry "
+                        f"WHERE event IS NOT NULL{where} GROUP BY start, event", [bucket, bucket] + params
+                    ):
+                        histogram.setdefault(int(start), {})[event] = n
+        except sqlite3.Error as e:
+            raise StorageError(f"Could not query telemetry in '{self.path}': {e}") from e
+        totals = {event: n for event, n, _, _ in rows}
+        result = {
+            "total": sum(totals.values()),
+            "events": dict(sorted(totals.items(), key=lambda item: (-item[1], item[0]))),
+            "first": min((first for _, _, first, _ in rows), default=None),
+            "last": max((last for _, _, _, last in rows), default=None),
+        }
+        if histogram is not None:
+            result["buckets"] = [{"start": start, "counts": histogram[start]} for start in sorted(histogram)]
+        return result
+
+    def telemetry_events(self, event: str, since: Optional[float] = None, until: Optional[float] = None, limit: int = 100) -> Tuple[List[dict], int]:
+        where, params = _time_filter(since, until)
+        try:
+            with self.pool.connection() as conn:
+                total = conn.execute(f"SELECT COUNT(*) FROM telemetry WHERE event = ?{where}", [event] + params).fetchone()[0]
+                lines = conn.execute(
+                    f"SELECT line FROM telemetry WHERE event = ?{where} ORDER BY ts, id LIMIT ?", [event] + params + [limit]
+                ).fetchall()
+        except sqlite3.Error as e:
+            raise StorageError(f"Could not query telemetry in '{self.path}': {e}") from e
+        records = []
+        for (line,) in lines:
+            try:
+                records.append(loads(line))
+            except ValueError:
+                continue
+        return records, total
+
+    def export_telemetry(self, position: Optional[Tuple[int, int]], max_bytes: int = 0) -> TelemetryExport:
+        """Cursor positions are ``(0, last exported row id)``."""
+        after = position[1] if position is not None else 0
+        try:
+            with self.pool.connection() as conn:
+                first = conn.execute("SELECT MIN(id) FROM telemetry").fetchone()[0]
+                gap = position is not None and first is not None and after < first - 1
+                if not max_bytes:
+                    end = conn.execute("SELECT MAX(id) FROM telemetry").fetchone()[0] or after
+                else:
+                    end, budget = after, max_bytes
+                    for row_id, length in conn.execute(
+                        "SELECT id, length(line) FROM telemetry WHERE id > ? ORDER BY id", (after,)
+                    ):
+                        end, budget = row_id, budget - length
+                        if budget <= 0:
+                            break
+        except sqlite3.Error as e:
+            raise StorageError(f"Could not query telemetry in '{self.path}': {e}") from e
+        return TelemetryExport(self._export_chunks(after, max(end, after)), (0, max(end, after)), gap)
+
+    def _export_chunks(self, after: int, end: int) -> Iterator[bytes]:
+        buf: List[bytes] = []
+        size = 0
+        while after < end:
+            # One short read transaction per page, so a long export never holds back the WAL checkpoint
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, line FROM telemetry WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (after, end, EXPORT_PAGE_ROWS)
+                ).fetchall()
+            if not rows:
+                break
+            for row_id, line in rows:
+                buf.append(line)
+                size += len(line)
+                after = row_id
+                if size >= EXPORT_CHUNK_SIZE:
+                    yield b"".join(buf)
+                    buf, size = [], 0
+        if buf:
+            yield b"".join(buf)
+
+    # Migration
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self.pool.connection() as conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+
+def migrate_from_files(storage: SqliteStorage, preferences_path: str, telemetry_path: str, force: bool = False, batch_lines: int = 10000) -> Tuple[bool, int]:
+    """Copies ``preferences.json`` and every segment of ``telemetry.log`` into ``storage``.
+
+    Returns ``(preferences copied, events copied)``. Runs once per source log:
+    a second run is a no-op unless ``force`` is set. The files are left in place.
+    """
+    marker = "migrated:" + os.path.abspath(telemetry_path)
+    if storage.get_meta(marker) is not None and not force:
+        logger.info("'%s' was already migrated to '%s'", telemetry_path, storage.path)
+        return False, 0
+    copied_preferences = False
+    if os.path.exists(preferences_path):
+        with open(preferences_path, "rb") as f:
+            try:
+                data = loads(f.read())
+            except ValueError as e:
+                logger.error("Skipping unreadable preferences file '%s': %s", preferences_path, e)
+                data = None
+        if isinstance(data, dict):
+            storage.save_preferences(storage.codec.parse(data))
+            copied_preferences = True
+    events = 0
+    for segment in list_segments(telemetry_path):
+        with open_segment(segment) as f:
+            lines: List[bytes] = []
+            for line in f:
+                if not line.strip():
+                    continue
+                lines.append(line if line.endswith(b"\n") else line + b"\n")
+                if len(lines) >= batch_lines:
+                    storage.append_telemetry(b"".join(lines), entries_from_lines(lines))
+                    events += len(lines)
+                    lines = []
+            if lines:
+                storage.append_telemetry(b"".join(lines), entries_from_lines(lines))
+                events += len(lines)
+    storage.set_meta(marker, str(time.time()))
+    return copied_preferences, events
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from backend.main import preferences_codec
+    from backend.settings import Settings
+
+    settings = Settings.from_env() # Paths as the server configures them
+
+    parser = argparse.ArgumentParser(description="SQLite storage backend tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="copy preferences.json and telemetry.log into the database")
+    migrate.add_argument("--db", default=settings.storage_sqlite_path)
+    migrate.add_argument("--preferences", default=settings.preferences_file)
+    migrate.add_argument("--telemetry", default=settings.telemetry_file)
+    migrate.add_argument("--force", action="store_true", help="copy again even if this log was migrated before")
+    args = parser.parse_args(argv)
+
+    storage = SqliteStorage(args.db, preferences_codec)
+    try:
+        copied, events = migrate_from_files(storage, args.preferences, args.telemetry, force=args.force)
+    finally:
+        storage.close()
+    print(f"preferences {'copied' if copied else 'not copied'}, {events} telemetry events copied into {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Storage backends: where preferences and telemetry are persisted.
+
+The API layer (``backend.main``) validates requests, computes ETags and
+encodes telemetry lines. A ``StorageBackend`` only persists and queries them.
+``STORAGE_BACKEND`` selects the implementation:
+
+* ``files`` (default): ``preferences.json`` plus the segmented, indexed
+  ``telemetry.log`` (``FileStorage`` in ``backend.main``, built on
+  ``preferences_store``, ``telemetry_writer`` and ``telemetry_index``).
+* ``sqlite``: one embedded SQLite database in WAL mode
+  (``backend.sqlite_storage``).
+
+Preferences cross this boundary as the API's model objects. A backend only
+needs the ``PreferencesCodec`` to turn them into JSON objects and back, and to
+evaluate ``If-Match``.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from backend.telemetry_index import IndexEntry
+
+
+class PreconditionFailed(Exception):
+    """The stored preferences no longer match the client's ``If-Match``."""
+
+
+class StorageError(OSError):
+    """A backend could not read or write its store (raised as the ``OSError`` the API layer handles)."""
+
+
+class PreferencesCodec(NamedTuple):
+    parse: Callable[[Optional[dict]], Any] # Stored JSON object (None if nothing stored) -> model, defaults if invalid
+    dump: Callable[[Any], dict]
+    matches: Callable[[str, Any], bool] # (If-Match header, current model) -> precondition holds
+
+
+class TelemetryExport(NamedTuple):
+    chunks: Iterator[bytes] # Uncompressed NDJSON
+    cursor: Tuple[int, int] # Where the next page starts
+    gap: bool # Events after the requested cursor were deleted by retention
+
+
+class StorageBackend(ABC):
+    """What the endpoints need from a storage engine; every method may block on I/O."""
+
+    name = ""
+
+    def cached_preferences(self) -> Optional[Any]:
+        """The current preferences if they can be returned without I/O (checked on the event loop), else None."""
+        return None
+
+    @abstractmethod
+    def load_preferences(self) -> Any:
+        """The stored preferences, or the defaults if there are none."""
+
+    @abstractmethod
+    def save_preferences(self, prefs: Any, if_match: Optional[str] = None) -> None:
+        """Replaces the preferences; raises ``PreconditionFailed`` if ``if_match`` does not match the current ones."""
+
+    @abstractmethod
+    def append_telemetry(self, data: bytes, entries: List[IndexEntry]) -> None:
+        """Persists encoded log lines (``entries`` describe them) before returning."""
+
+    @abstractmethod
+    async def append_telemetry_async(self, data: bytes, entries: List[IndexEntry]) -> None:
+        """``append_telemetry`` without blocking the event loop."""
+
+    @abstractmethod
+    def telemetry_stats(self, since: Optional[float] = None, until: Optional[float] = None, bucket: Optional[int] = None) -> dict:
+        """Per-event counts in ``[since, until)``, as ``TelemetryIndex.stats`` returns them."""
+
+    @abstractmethod
+    def telemetry_events(self, event: str, since: Optional[float] = None, until: Optional[float] = None, limit: int = 100) -> Tuple[List[dict], int]:
+        """Up to ``limit`` records of ``event`` (oldest first) and the total number of matches."""
+
+    @abstractmethod
+    def export_telemetry(self, position: Optional[Tuple[int, int]], max_bytes: int = 0) -> TelemetryExport:
+        """Plans an export page starting at ``position`` (None: the oldest event)."""
+
+    def start(self) -> None:
+        """Opens files/connections and starts background threads ahead of the first request."""
+
+    def close(self) -> None:
+        """Flushes pending writes and releases files/connections; the backend reopens on next use."""
@@ -0,0 +1,172 @@
+"""In-memory pre-aggregation of telemetry into per-window counters.
+
+Most telemetry is repetitive (clicks, wizard step transitions), and writing
+each event as a full JSON line costs disk space and makes analysis slow. In
+aggregation mode, events are counted in memory instead. The counters are keyed
+by event name plus the values of a configured set of ``details`` keys, and
+grouped into fixed time windows aligned to the epoch. When a window closes, all
+of its counters go to the log as one compact summary record::
+
+    {"event": "telemetry.summary", "timestamp": <window start>, "window_seconds": 60,
+     "counts": [{"event": "click", "details": {"button": "next"}, "count": 12}, ...]}
+
+Allow-listed event types bypass the counters and are still logged as raw
+events, so their full details are kept. Counts are weighted by ``1/sample_rate``,
+so sampled events still add up to the number received.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.serialization import dumps_line
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_EVENT = "telemetry.summary"
+
+_Key = Tuple[str, Tuple[Tuple[str, object], ...]]
+
+
+def _group_value(value):
+    """Details values as dictionary keys: scalars as-is, anything else as its JSON text."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return dumps_line(value).decode().rstrip("\n")
+
+
+def _count_value(count: float):
+    return int(count) if float(count).is_integer() else round(count, 6)
+
+
+class TelemetryAggregator:
+    """Counts events per ``window`` seconds and hands closed windows to ``emit``.
+
+    ``group_by`` lists the ``details`` keys that split an event's counters.
+    ``raw_events`` are the event names that ``aggregates`` rejects, so callers
+    log them raw. Each window holds at most ``max_keys`` counters. Beyond that,
+    new combinations are counted under their event name alone.
+    ``emit`` receives the summary records of the closed windows, oldest first. It
+    runs on a timer thread at each window boundary, or in ``flush``. If it
+    raises ``OSError``, the windows are kept and retried on the next flush.
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[List[dict]], None],
+        window: float = 60.0,
+        group_by: Iterable[str] = (),
+        raw_events: Iterable[str] = (),
+        max_keys: int = 10000,
+        clock: Callable[[], float] = time.time,
+    ):
+        if window <= 0:
+            raise ValueError(f"Aggregation window must be positive, got {window}")
+        self._emit = emit
+        self.window = window
+        self.group_by = tuple(group_by)
+        self.raw_events = frozenset(raw_events)
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+        self._windows: Dict[float, Dict[_Key, float]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+        self.events_counted = 0
+        self.records_emitted = 0
+
+    def aggregates(self, event: str) -> bool:
+        """False for the allow-listed events that are logged raw."""
+        return event not in self.raw_events
+
+    def add(self, event: str, details: dict, ts: Optional[float] = None, weight: float = 1.0) -> None:
+        """Counts one event received at ``ts`` (epoch seconds)."""
+        ts = self._clock() if ts is None else ts
+        start = math.floor(ts / self.window) * self.window
+        group = tuple((k, _group_value(details[k])) for k in self.group_by if k in details)
+        with self._lock:
+            counters = self._windows.get(start)
+            if counters is None:
+                counters = self._windows[start] = {}
+            key = (event, group)
+            if key not in counters and len(counters) >= self.max_keys:
+                key = (event, ())
+            counters[key] = counters.get(key, 0) + weight
+            self.events_counted += 1
+            if self._timer is None and not self._closed:
+                self._schedule_locked()
+
+    def _schedule_locked(self, delay: Optional[float] = None) -> None:
+        if delay is None: # Fire just after the oldest open window ends
+            delay = max(0.0, min(self._windows) + self.window - self._clock()) + 0.01
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+        self.flush(force=False)
+
+    def _take(self, force: bool) -> List[Tuple[float, Dict[_Key, float]]]:
+        now = self._clock()
+        with self._lock:
+            starts = sorted(s for s in self._windows if force or s + self.window <= now)
+            return [(s, self._windows.pop(s)) for s in starts]
+
+    def _restore(self, windows: List[Tuple[float, Dict[_Key, float]]]) -> None:
+        with self._lock:
+            for start, counters in windows:
+                current = self._windows.setdefault(start, {})
+                for key, count in counters.items():
+                    current[key] = current.get(key, 0) + count
+
+    def summary_record(self, start: float, counters: Dict[_Key, float]) -> dict:
+        return {
+            "event": SUMMARY_EVENT,
+            "timestamp": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            "window_seconds": self.window,
+            "counts": [
+                {"event": event, "details": dict(group), "count": _count_value(count)}
+                for (event, group), count in sorted(counters.items(), key=lambda item: (item[0][0], repr(item[0][1])))
+            ],
+        }
+
+    def flush(self, force: bool = True) -> int:
+        """Emits the closed windows (every window with ``force``); returns the number of records."""
+        failed = False
+        with self._emit_lock:
+            windows = self._take(force)
+            if windows:
+                try:
+                    self._emit([self.summary_record(start, counters) for start, counters in windows])
+                except OSError as e:
+                    logger.error("Could not write telemetry summaries: %s", e)
+                    self._restore(windows)
+                    windows, failed = [], True
+                self.records_emitted += len(windows)
+        with self._lock:
+            if self._timer is None and self._windows and not self._closed:
+                self._schedule_locked(self.window if failed else None) # Back off after a failed write
+        return len(windows)
+
+    def pending(self) -> Dict[str, float]:
+        """Counts per event name in windows not yet emitted."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for counters in self._windows.values():
+                for (event, _), count in counters.items():
+                    totals[event] = totals.get(event, 0) + count
+        return {event: _count_value(count) for event, count in totals.items()}
+
+    def close(self) -> None:
+        """Stops the timer and emits every window, including the current one."""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush(force=True)
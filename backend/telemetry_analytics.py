@@ -0,0 +1,584 @@
+"""Columnar offline analytics over the telemetry log.
+
+Answering a question about the log used to mean parsing every line in Python
+and counting in dicts, once per question. ``load_columns`` instead parses the
+segments once into NumPy columns, one row per event:
+
+* ``ts``: epoch seconds (NaN if the record has no usable timestamp);
+* ``event``: int32 codes into ``event_names`` (dictionary encoding);
+* ``weight``: how many received events the row stands for. This is
+  ``1/sample_rate`` for sampled events and the count for the entries of
+  ``telemetry.summary`` records, which become one row each at the window start;
+* ``columns``: one sparse column per ``details`` key, nested objects flattened
+  to dotted keys (``final_preferences.theme``). A column holds the rows that
+  have the key and their values: float64 if every value is a number, otherwise
+  int32 codes into the column's ``categories`` (strings as-is, anything else as
+  its JSON text).
+
+The questions are then vectorized NumPy operations: ``counts_over_time``,
+``funnel`` and ``percentiles``.
+
+Each segment's columns are cached in a ``.cols.npz`` sidecar. Sealed segments
+never change, so their cache is parsed once. For the active segment the cache
+records how many bytes it covers and is topped up with the lines appended
+since; it is rebuilt if the segment was replaced (rolled over or truncated).
+Retention deletes the cache together with its segment.
+
+Needs NumPy, which the server itself does not.
+
+Usage:
+    python -m backend.telemetry_analytics telemetry.log counts [--bucket 3600] [--event NAME ...]
+    python -m backend.telemetry_analytics telemetry.log funnel [--event step_changed] [--key step] [--final-event onboarding_completed]
+    python -m backend.telemetry_analytics telemetry.log percentiles KEY [--event NAME] [-q 50 90 99]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import zlib
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.serialization import dumps, loads
+from backend.telemetry_aggregator import SUMMARY_EVENT
+from backend.telemetry_index import parse_timestamp
+from backend.telemetry_segments import Segment, list_segments, open_segment, open_segment_at, segment_size, sidecar_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".cols.npz"
+CACHE_VERSION = 1
+MAX_COLUMNS = 256 # Distinct details keys per segment; values of further keys are dropped
+_HEAD_BYTES = 4096 # Fingerprint of the segment start, to notice a replaced active segment
+
+
+class Column(NamedTuple):
+    """Values of one ``details`` key. ``categories`` is None for numeric columns."""
+    rows: np.ndarray # int64, ascending
+    values: np.ndarray # float64, or int32 codes into categories
+    categories: Optional[List[str]]
+
+    @property
+    def numeric(self) -> bool:
+        return self.categories is None
+
+
+def _number_text(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _label(value) -> str:
+    return _number_text(float(value)) if isinstance(value, (int, float)) and not isinstance(value, bool) else str(value)
+
+
+def _as_categorical(column: Column) -> Column:
+    if not column.numeric:
+        return column
+    unique, codes = np.unique(column.values, return_inverse=True)
+    return Column(column.rows, codes.astype(np.int32), [_number_text(float(v)) for v in unique])
+
+
+def _group_totals(column: Column, values: np.ndarray, weights: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """Distinct values (ascending numbers, or categories in code order) and their summed weights."""
+    if not column.numeric:
+        present = np.flatnonzero(np.bincount(values, minlength=len(column.categories)))
+        return [column.categories[code] for code in present], np.bincount(values, weights, len(column.categories))[present]
+    low = values.min()
+    offsets = values - low
+    if offsets.max() < 1 << 20 and np.array_equal(offsets, np.floor(offsets)): # Small integers: no sort needed
+        offsets = offsets.astype(np.int64)
+        present = np.flatnonzero(np.bincount(offsets))
+        return [_label(low + v) for v in present.tolist()], np.bincount(offsets, weights)[present]
+    unique, inverse = np.unique(values, return_inverse=True)
+    return [_label(v) for v in unique.tolist()], np.bincount(inverse, weights)
+
+
+def _merge_columns(parts: List[Column]) -> Column:
+    """One column from parts with disjoint rows; numbers become categories if any part has strings."""
+    if len(parts) == 1:
+        return parts[0]
+    rows = np.concatenate([part.rows for part in parts])
+    if all(part.numeric for part in parts):
+        values, categories = np.concatenate([part.values for part in parts]), None
+    else:
+        ids: Dict[str, int] = {}
+        remapped = []
+        for part in map(_as_categorical, parts):
+            remap = np.array([ids.setdefault(c, len(ids)) for c in part.categories], dtype=np.int32)
+            remapped.append(remap[part.values] if len(part.values) else part.values)
+        values, categories = np.concatenate(remapped), list(ids)
+    if len(rows) > 1 and np.any(rows[1:] < rows[:-1]):
+        order = np.argsort(rows, kind="stable")
+        rows, values = rows[order], values[order]
+    return Column(rows, values, categories)
+
+
+class TelemetryColumns:
+    """Telemetry events as NumPy columns (see the module docstring)."""
+
+    def __init__(self, ts: np.ndarray, event: np.ndarray, weight: np.ndarray, event_names: List[str],
+                 columns: Dict[str, Column], skipped: int = 0):
+        self.ts = ts
+        self.event = event
+        self.weight = weight
+        self.event_names = event_names
+        self.columns = columns
+        self.skipped = skipped # Lines that were not JSON objects with an event name
+
+    def __len__(self) -> int:
+        return len(self.event)
+
+    @classmethod
+    def concat(cls, parts: Sequence["TelemetryColumns"]) -> "TelemetryColumns":
+        """Appends ``parts`` in order, unifying their event and category dictionaries."""
+        if len(parts) == 1:
+            return parts[0]
+        ids: Dict[str, int] = {}
+        events, pieces, offset = [], {}, 0
+        for part in parts:
+            remap = np.array([ids.setdefault(name, len(ids)) for name in part.event_names], dtype=np.int32)
+            events.append(remap[part.event] if len(part.event) else part.event)
+            for name, column in part.columns.items():
+                pieces.setdefault(name, []).append(column._replace(rows=column.rows + offset))
+            offset += len(part)
+        return cls(
+            np.concatenate([part.ts for part in parts]) if parts else np.empty(0),
+            np.concatenate(events) if parts else np.empty(0, dtype=np.int32),
+            np.concatenate([part.weight for part in parts]) if parts else np.empty(0),
+            list(ids),
+            {name: _merge_columns(columns) for name, columns in pieces.items()},
+            sum(part.skipped for part in parts),
+        )
+
+    def event_code(self, name: str) -> int:
+        """The code of event ``name``, or -1 if it never occurs."""
+        try:
+            return self.event_names.index(name)
+        except ValueError:
+            return -1
+
+    def _key_rows(self, key: str, event: Optional[str]) -> Tuple[Optional[Column], np.ndarray]:
+        """The column of ``key`` and a mask of its rows that belong to ``event`` (all if None)."""
+        column = self.columns.get(key)
+        if column is None:
+            return None, np.zeros(0, dtype=bool)
+        if event is None:
+            return column, np.ones(len(column.rows), dtype=bool)
+        return column, self.event[column.rows] == self.event_code(event)
+
+    def counts_over_time(self, bucket_seconds: float = 3600.0,
+                         events: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Weighted counts per time bucket and event.
+
+        Returns the start (epoch seconds) of each bucket that has events, and
+        a ``buckets x len(event_names)`` matrix of counts. ``events`` limits
+        the rows counted; rows without a timestamp are not counted.
+        """
+        n = len(self.event_names)
+        keep = ~np.isnan(self.ts)
+        if events is not None:
+            keep &= np.isin(self.event, [self.event_code(name) for name in events])
+        if not keep.any():
+            return np.empty(0), np.zeros((0, n))
+        bucket = np.floor(self.ts[keep] / bucket_seconds).astype(np.int64)
+        first, span = int(bucket.min()), int(bucket.max() - bucket.min()) + 1
+        if span * n <= 4 * len(bucket) + (1 << 20):
+            index = bucket - first # Dense: one bincount slot per bucket and event, empty buckets dropped below
+            starts = np.arange(first, first + span)
+        else:
+            starts, index = np.unique(bucket, return_inverse=True)
+        counts = np.bincount(index * n + self.event[keep], weights=self.weight[keep], minlength=len(starts) * n)
+        counts = counts.reshape(len(starts), n)
+        occupied = counts.any(axis=1)
+        return starts[occupied] * bucket_seconds, counts[occupied]
+
+    def funnel(self, event: str = "step_changed", key: str = "step", steps: Optional[Sequence] = None,
+               final_event: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Weighted count of ``event`` per value of ``details[key]``, in funnel order.
+
+        ``steps`` gives the order; by default numeric steps are ascending and
+        named steps go by descending count. ``final_event`` adds a last stage
+        counting that event (such as ``onboarding_completed``).
+        """
+        column, mask = self._key_rows(key, event)
+        stages: List[Tuple[str, float]] = []
+        if column is not None and mask.any():
+            labels, totals = _group_totals(column, column.values[mask], self.weight[column.rows[mask]])
+            found = dict(zip(labels, totals.tolist()))
+            if steps is None:
+                order = range(len(labels)) if column.numeric else np.argsort(-totals, kind="stable")
+                steps = [labels[i] for i in order]
+            stages = [(_label(step), found.get(_label(step), 0.0)) for step in steps]
+        elif steps is not None:
+            stages = [(_label(step), 0.0) for step in steps]
+        if final_event is not None:
+            stages.append((final_event, float(self.weight[self.event == self.event_code(final_event)].sum())))
+        return stages
+
+    def percentiles(self, key: str, qs: Sequence[float] = (50, 90, 99),
+                    event: Optional[str] = None) -> Tuple[float, List[float]]:
+        """Weighted percentiles of the numeric ``details[key]``; returns (count, values).
+
+        A row's value counts ``weight`` times (the inverted-CDF definition, so
+        with unit weights this is ``np.percentile(..., method="inverted_cdf")``).
+        Raises ValueError if the key has non-numeric values.
+        """
+        column, mask = self._key_rows(key, event)
+        if column is not None and not column.numeric:
+            raise ValueError(f"details key '{key}' is not numeric")
+        if column is None or not mask.any():
+            return 0.0, [math.nan] * len(qs)
+        values, weights = column.values[mask], self.weight[column.rows[mask]]
+        finite = np.isfinite(values)
+        values, weights = values[finite], weights[finite]
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        total = float(cumulative[-1]) if len(cumulative) else 0.0
+        if total <= 0:
+            return 0.0, [math.nan] * len(qs)
+        at = np.searchsorted(cumulative, np.asarray(qs, dtype=np.float64) / 100 * total, side="left")
+        return total, values[order][np.minimum(at, len(order) - 1)].tolist()
+
+
+def _loads_fallback(line: bytes):
+    # The writer falls back to the standard library for values orjson rejects (integers beyond 64 bits)
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class _ColumnBuilder:
+    """Accumulates one ``details`` key while parsing; values go to compact ``array``s, not lists."""
+
+    __slots__ = ("num_rows", "nums", "cat_rows", "codes", "categories")
+
+    def __init__(self):
+        self.num_rows, self.nums = array("q"), array("d")
+        self.cat_rows, self.codes = array("q"), array("i")
+        self.categories: Dict[str, int] = {}
+
+    def add_category(self, row: int, text: str) -> None:
+        code = self.categories.get(text)
+        if code is None:
+            code = self.categories[text] = len(self.categories)
+        self.cat_rows.append(row)
+        self.codes.append(code)
+
+    def column(self) -> Column:
+        parts = []
+        if self.nums:
+            parts.append(Column(np.frombuffer(self.num_rows, dtype=np.int64), np.frombuffer(self.nums, dtype=np.float64), None))
+        if self.codes:
+            parts.append(Column(np.frombuffer(self.cat_rows, dtype=np.int64), np.frombuffer(self.codes, dtype=np.int32),
+                                list(self.categories)))
+        return _merge_columns(parts)
+
+
+class _SegmentParser:
+    """Parses telemetry lines into columns, one row per event (see the module docstring)."""
+
+    def __init__(self, max_columns: int = MAX_COLUMNS):
+        self.max_columns = max_columns
+        self.ts, self.event, self.weight = array("d"), array("i"), array("d")
+        self.event_ids: Dict[str, int] = {}
+        self.builders: Dict[str, _ColumnBuilder] = {}
+        self.skipped = 0
+        self.dropped = 0 # Values of keys beyond max_columns
+        self._seconds: Dict[str, float] = {}
+
+    def _second(self, text: str) -> float:
+        if len(self._seconds) > 100000:
+            self._seconds.clear()
+        ts = parse_timestamp(text + "+00:00")
+        self._seconds[text] = base = math.nan if ts is None else ts
+        return base
+
+    def _timestamp(self, value) -> float:
+        if type(value) is str and len(value) == 25 and value.endswith("+00:00"): # Whole seconds
+            base = self._seconds.get(value[:19])
+            return self._second(value[:19]) if base is None else base
+        ts = parse_timestamp(value)
+        return math.nan if ts is None else ts
+
+    def _value(self, row: int, key: str, value) -> None:
+        kind = type(value)
+        if kind is dict:
+            self._details(row, value, key + ".")
+            return
+        builder = self.builders.get(key)
+        if builder is None:
+            if len(self.builders) >= self.max_columns:
+                self.dropped += 1
+                return
+            builder = self.builders[key] = _ColumnBuilder()
+        if kind is float or kind is int:
+            try:
+                builder.nums.append(value)
+                builder.num_rows.append(row)
+                return
+            except OverflowError: # Integers beyond float range
+                pass
+        builder.add_category(row, value if kind is str else dumps(value).decode())
+
+    def _details(self, row: int, details: dict, prefix: str) -> None:
+        for key, value in details.items():
+            self._value(row, prefix + key, value)
+
+    def _row(self, event: str, details, ts: float, weight: float) -> None:
+        code = self.event_ids.get(event)
+        if code is None:
+            code = self.event_ids[event] = len(self.event_ids)
+        row = len(self.event)
+        self.event.append(code)
+        self.ts.append(ts)
+        self.weight.append(weight)
+        if details and type(details) is dict:
+            self._details(row, details, "")
+
+    def _record(self, record, line: bytes) -> None:
+        """Any line: summaries, sampled events, odd timestamps, lines that are not events."""
+        event = record.get("event") if type(record) is dict else None
+        if type(event) is not str or not event:
+            if line.strip():
+                self.skipped += 1
+            return
+        ts = self._timestamp(record.get("timestamp"))
+        if event == SUMMARY_EVENT and type(record.get("counts")) is list:
+            for entry in record["counts"]:
+                if type(entry) is dict and type(entry.get("event")) is str and isinstance(entry.get("count"), (int, float)):
+                    self._row(entry["event"], entry.get("details"), ts, float(entry["count"]))
+            return
+        rate = record.get("sample_rate")
+        self._row(event, record.get("details"), ts, 1.0 / rate if type(rate) in (int, float) and rate > 0 else 1.0)
+
+    def feed(self, lines: Iterable[bytes]) -> int:
+        """Parses complete lines, stopping at one without a newline; returns the bytes consumed.
+
+        The loop is written out for the lines the app writes (an event with a
+        UTC ``isoformat()`` timestamp and flat details), which is most of the
+        parse time of a large log: each distinct second is parsed once, and
+        values are appended without a call per key. Anything else goes
+        through ``_record``.
+        """
+        consumed = 0
+        ts_append, event_append, weight_append = self.ts.append, self.event.append, self.weight.append
+        event_ids, builders, seconds = self.event_ids, self.builders, self._seconds
+        row = len(self.event)
+        for line in lines:
+            if not line.endswith(b"\n"):
+                break # Partial line at the end of the active segment, picked up next time
+            consumed += len(line)
+            try:
+                record = loads(line)
+            except ValueError:
+                record = _loads_fallback(line)
+            event = record.get("event") if type(record) is dict else None
+            stamp = record.get("timestamp") if event is not None else None
+            if (type(event) is not str or not event or event == SUMMARY_EVENT or "sample_rate" in record
+                    or type(stamp) is not str or len(stamp) != 32 or stamp[19] != "." or not stamp.endswith("+00:00")):
+                self._record(record, line)
+                row = len(self.event)
+                continue
+            base = seconds.get(stamp[:19])
+            if base is None:
+                base = self._second(stamp[:19])
+            try:
+                ts = base + float(stamp[19:26])
+            except ValueError:
+                ts = self._timestamp(stamp)
+            code = event_ids.get(event)
+            if code is None:
+                code = event_ids[event] = len(event_ids)
+            event_append(code)
+            ts_append(ts)
+            weight_append(1.0)
+            details = record.get("details")
+            if details and type(details) is dict:
+                for key, value in details.items():
+                    kind = type(value)
+                    builder = builders.get(key)
+                    if builder is None or kind is dict or kind is bool or value is None:
+                        self._value(row, key, value)
+                    elif kind is str:
+                        code = builder.categories.get(value)
+                        if code is None:
+                            code = builder.categories[value] = len(builder.categories)
+                        builder.cat_rows.append(row)
+                        builder.codes.append(code)
+                    elif kind is float or kind is int:
+                        try:
+                            builder.nums.append(value)
+                            builder.num_rows.append(row)
+                        except OverflowError: # Integers beyond float range
+                            self._value(row, key, value)
+                    else:
+                        self._value(row, key, value)
+            row += 1
+        return consumed
+
+    def columns(self) -> TelemetryColumns:
+        if self.dropped:
+            logger.warning("Dropped %d details values beyond the first %d keys", self.dropped, self.max_columns)
+        return TelemetryColumns(
+            np.frombuffer(self.ts, dtype=np.float64),
+            np.frombuffer(self.event, dtype=np.int32),
+            np.frombuffer(self.weight, dtype=np.float64),
+            list(self.event_ids),
+            {key: builder.column() for key, builder in self.builders.items()},
+            self.skipped,
+        )
+
+
+def parse_lines(lines: Iterable[bytes], max_columns: int = MAX_COLUMNS) -> TelemetryColumns:
+    """Columns of NDJSON telemetry lines."""
+    parser = _SegmentParser(max_columns)
+    parser.feed(line if line.endswith(b"\n") else line + b"\n" for line in lines)
+    return parser.columns()
+
+
+def _parse_segment(segment: Segment, offset: int, max_columns: int) -> Tuple[TelemetryColumns, int]:
+    """Parses the complete lines from ``offset``; returns the columns and the offset after the last one."""
+    parser = _SegmentParser(max_columns)
+    with open_segment_at(segment, offset) as f:
+        offset += parser.feed(f)
+    return parser.columns(), offset
+
+
+def _head_crc(segment: Segment, length: int) -> int:
+    with open_segment(segment) as f:
+        return zlib.crc32(f.read(min(length, _HEAD_BYTES)))
+
+
+def _save_cache(path: str, columns: TelemetryColumns, end: int, head_crc: int) -> None:
+    names = list(columns.columns)
+    meta = {
+        "version": CACHE_VERSION, "end": end, "head_crc": head_crc, "skipped": columns.skipped,
+        "events": columns.event_names,
+        "columns": [{"name": name, "categories": columns.columns[name].categories} for name in names],
+    }
+    arrays = {"meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+              "ts": columns.ts, "event": columns.event, "weight": columns.weight}
+    for i, name in enumerate(names):
+        arrays[f"rows{i}"], arrays[f"values{i}"] = columns.columns[name].rows, columns.columns[name].values
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays) # Uncompressed: loading is a read and no inflate
+    os.replace(tmp, path)
+
+
+def _load_cache(path: str) -> Optional[Tuple[TelemetryColumns, dict]]:
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes())
+            if meta.get("version") != CACHE_VERSION:
+                return None
+            columns = {
+                spec["name"]: Column(data[f"rows{i}"], data[f"values{i}"], spec["categories"])
+                for i, spec in enumerate(meta["columns"])
+            }
+            return TelemetryColumns(data["ts"], data["event"], data["weight"], meta["events"], columns, meta["skipped"]), meta
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable analytics cache '%s': %s", path, e)
+        return None
+
+
+def segment_columns(segment: Segment, cache: bool = True, max_columns: int = MAX_COLUMNS) -> TelemetryColumns:
+    """Columns of one segment, from (and kept in) its ``.cols.npz`` cache if ``cache``."""
+    if not cache:
+        return _parse_segment(segment, 0, max_columns)[0]
+    path = sidecar_path(segment.path, CACHE_SUFFIX)
+    cached = _load_cache(path)
+    size = segment_size(segment)
+    start, parts = 0, []
+    if cached is not None:
+        columns, meta = cached
+        if meta["end"] <= size and meta["head_crc"] == _head_crc(segment, meta["end"]):
+            if meta["end"] == size:
+                return columns
+            start, parts = meta["end"], [columns] # The active segment grew: parse only the new lines
+    appended, end = _parse_segment(segment, start, max_columns)
+    columns = TelemetryColumns.concat(parts + [appended]) if parts else appended
+    if end > start or cached is None:
+        try:
+            _save_cache(path, columns, end, _head_crc(segment, end))
+        except OSError as e:
+            logger.warning("Could not write analytics cache '%s': %s", path, e)
+    return columns
+
+
+def load_columns(log_path: str, cache: bool = True, max_columns: int = MAX_COLUMNS) -> TelemetryColumns:
+    """Columns of every segment of the telemetry log at ``log_path``, oldest first."""
+    parts = []
+    for segment in list_segments(log_path):
+        try:
+            parts.append(segment_columns(segment, cache, max_columns))
+        except FileNotFoundError: # Deleted by retention meanwhile
+            continue
+    return TelemetryColumns.concat(parts)
+
+
+def _format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _format_count(count: float) -> str:
+    return str(int(count)) if float(count).is_integer() else f"{count:.2f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Vectorized analytics over the telemetry log.")
+    parser.add_argument("log", help="path of the telemetry log (its sealed segments are included)")
+    parser.add_argument("--no-cache", action="store_true", help="parse the segments without reading or writing .cols.npz caches")
+    commands = parser.add_subparsers(dest="command", required=True)
+    counts = commands.add_parser("counts", help="events per time bucket")
+    counts.add_argument("--bucket", type=float, default=3600.0, help="bucket length in seconds")
+    counts.add_argument("--event", action="append", help="only these events (repeatable)")
+    funnel = commands.add_parser("funnel", help="drop-off across onboarding steps")
+    funnel.add_argument("--event", default="step_changed")
+    funnel.add_argument("--key", default="step", help="details key holding the step")
+    funnel.add_argument("--steps", nargs="+", help="step values in funnel order")
+    funnel.add_argument("--final-event", default="onboarding_completed", help="last stage ('' for none)")
+    percentiles = commands.add_parser("percentiles", help="percentiles of a numeric details key")
+    percentiles.add_argument("key")
+    percentiles.add_argument("--event")
+    percentiles.add_argument("-q", type=float, nargs="+", default=[50, 90, 99])
+    args = parser.parse_args(argv)
+
+    columns = load_columns(args.log, cache=not args.no_cache)
+    if args.command == "counts":
+        starts, matrix = columns.counts_over_time(args.bucket, args.event)
+        for start, row in zip(starts.tolist(), matrix):
+            for code in np.flatnonzero(row):
+                print(f"{_format_time(start)}  {columns.event_names[code]}  {_format_count(row[code])}")
+    elif args.command == "funnel":
+        stages = columns.funnel(args.event, args.key, args.steps, args.final_event or None)
+        first = stages[0][1] if stages else 0.0
+        previous = first
+        print(f"{'stage':<32}{'count':>12}{'of first':>10}{'drop-off':>10}")
+        for label, count in stages:
+            of_first = count / first if first else 0.0
+            drop = 1 - count / previous if previous else 0.0
+            print(f"{label:<32}{_format_count(count):>12}{of_first:>10.1%}{drop:>10.1%}")
+            previous = count
+    else:
+        try:
+            total, values = columns.percentiles(args.key, args.q, args.event)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f"count {_format_count(total)}")
+        for q, value in zip(args.q, values):
+            print(f"p{q:g} {value:g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,470 @@
+"""Compact binary storage format for telemetry records (``.tlb``).
+
+NDJSON repeats every event name, every ``details`` key and a 32-character
+timestamp on every line. A ``.tlb`` file stores the same records as:
+
+* a 4-byte magic, ``TLB\\x01``;
+* then length-prefixed records, where the length is a varint. The first
+  payload byte is the record kind:
+
+  - ``STRING``: the next entry of the file's string dictionary (UTF-8). Event
+    names, object keys and short string values are interned, so each is
+    stored once per file and referenced by a varint id.
+  - ``EVENT``: one telemetry record. The payload holds a flags byte, the
+    event name id and the timestamp. The timestamp is a zigzag varint delta,
+    in microseconds, from the previous record's timestamp, so it usually
+    takes 2-3 bytes. Next come the positions of ``event`` and ``timestamp``
+    among the record's keys, so key order survives. The remaining fields
+    follow as a tagged value tree.
+  - ``RAW``: a log line kept verbatim. This covers lines that are not JSON
+    objects, or whose JSON text would not re-render byte for byte (foreign
+    writers, odd whitespace).
+
+Conversion is lossless at the byte level. ``ndjson_to_binary`` records which of
+the two line layouts the app writes (``json.dumps`` default or compact) each
+line used. ``binary_to_ndjson`` then reproduces the original file exactly.
+``BinaryLogReader.scan`` yields ``(event, timestamp)`` without decoding the
+details, which is what counting and index rebuilds need.
+
+The dictionary is per file, and a reader must start at the beginning of the
+file. This makes ``.tlb`` an archive and interchange format for segments,
+next to the NDJSON log the server appends to.
+
+Usage:
+    python -m backend.telemetry_binary encode telemetry.log.3 telemetry.log.3.tlb
+    python -m backend.telemetry_binary decode telemetry.log.3.tlb telemetry.log.3
+"""
+import argparse
+import gzip
+import json
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from backend.telemetry_index import parse_timestamp
+
+MAGIC = b"TLB\x01"
+
+STRING, EVENT, RAW = 0, 1, 2
+
+# Value tags
+T_NULL, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_REF, T_LIST, T_DICT, T_BIGINT = range(10)
+
+# EVENT flags
+F_COMPACT = 0x01 # Rendered with compact separators and raw UTF-8 instead of json.dumps defaults
+F_NO_NEWLINE = 0x02 # The last line of a file without a trailing newline
+F_TIMESTAMP = 0x04 # "timestamp" is stored as a micros delta rather than inside the remaining fields
+
+MAX_INTERNED = 1 << 16 # Dictionary entries per file
+MAX_INTERNED_LENGTH = 64 # Longer string values are stored inline
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DOUBLE = struct.Struct("<d")
+_READ_SIZE = 1024 * 1024
+_FLUSH_SIZE = 256 * 1024
+
+
+def _render_spaced(record: Any) -> bytes:
+    return json.dumps(record).encode()
+
+
+def _render_compact(record: Any) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _put_varint(buf: bytearray, n: int) -> None:
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _varint(data: bytes, pos: int) -> Tuple[int, int]:
+    b = data[pos]
+    if b < 0x80:
+        return b, pos + 1
+    n, shift = b & 0x7F, 7
+    while True:
+        pos += 1
+        b = data[pos]
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos + 1
+        shift += 7
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+
+def _timestamp_micros(value: Any) -> Optional[int]:
+    """Microseconds since the epoch, if ``value`` is an ISO UTC string that renders back identically."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None or parsed.utcoffset() != timedelta(0) or parsed.isoformat() != value:
+        return None
+    return (parsed - _EPOCH) // timedelta(microseconds=1)
+
+
+def _timestamp_text(micros: int) -> str:
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+class BinaryLogWriter:
+    """Streams telemetry records to a binary file object in ``.tlb`` format."""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self._buf = bytearray(MAGIC)
+        self._ids: Dict[str, int] = {}
+        self._prev_micros = 0
+        self.records = 0
+
+    def _intern(self, s: str) -> Optional[int]:
+        ids = self._ids
+        sid = ids.get(s)
+        if sid is None and len(ids) < MAX_INTERNED:
+            sid = ids[s] = len(ids)
+            data = s.encode("utf-8", "surrogatepass")
+            _put_varint(self._buf, len(data) + 1)
+            self._buf.append(STRING)
+            self._buf += data
+        return sid
+
+    def _value(self, out: bytearray, value: Any) -> None:
+        if value is None:
+            out.append(T_NULL)
+        elif value is True:
+            out.append(T_TRUE)
+        elif value is False:
+            out.append(T_FALSE)
+        elif isinstance(value, str):
+            sid = self._intern(value) if len(value) <= MAX_INTERNED_LENGTH else None
+            if sid is not None:
+                out.append(T_REF)
+                _put_varint(out, sid)
+            else:
+                data = value.encode("utf-8", "surrogatepass")
+                out.append(T_STR)
+                _put_varint(out, len(data))
+                out += data
+        elif isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                out.append(T_INT)
+                _put_varint(out, _zigzag(value))
+            else:
+                data = str(value).encode()
+                out.append(T_BIGINT)
+                _put_varint(out, len(data))
+                out += data
+        elif isinstance(value, float):
+            out.append(T_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif isinstance(value, dict):
+            out.append(T_DICT)
+            _put_varint(out, len(value))
+            for k, v in value.items():
+                self._key(out, k)
+                self._value(out, v)
+        elif isinstance(value, (list, tuple)):
+            out.append(T_LIST)
+            _put_varint(out, len(value))
+            for v in value:
+                self._value(out, v)
+        else:
+            raise TypeError(f"Cannot store {type(value).__name__} in a telemetry record")
+
+    def _key(self, out: bytearray, key: str) -> None:
+        # Keys are always interned; past the dictionary limit they are stored inline (id 0 + length + bytes)
+        sid = self._intern(key)
+        if sid is not None:
+            _put_varint(out, sid + 1)
+        else:
+            data = key.encode("utf-8", "surrogatepass")
+            out.append(0)
+            _put_varint(out, len(data))
+            out += data
+
+    def write(self, record: dict, compact: bool = False, newline: bool = True) -> None:
+        """Appends one record; ``compact``/``newline`` describe how its NDJSON line was laid out."""
+        event = record.get("event")
+        if not isinstance(event, str):
+            raise ValueError("A telemetry record needs a string 'event'")
+        flags = (F_COMPACT if compact else 0) | (0 if newline else F_NO_NEWLINE)
+        micros = _timestamp_micros(record.get("timestamp"))
+        if micros is not None:
+            flags |= F_TIMESTAMP
+        payload = bytearray((EVENT, flags))
+        self._key(payload, event)
+        if micros is not None:
+            _put_varint(payload, _zigzag(micros - self._prev_micros))
+            self._prev_micros = micros
+        positions = {k: i for i, k in enumerate(record)}
+        _put_varint(payload, positions["event"])
+        _put_varint(payload, positions["timestamp"] if micros is not None else 0)
+        rest = {k: v for k, v in record.items() if k != "event" and not (micros is not None and k == "timestamp")}
+        self._value(payload, rest)
+        self._append(payload)
+
+    def write_raw(self, line: bytes) -> None:
+        """Appends a log line verbatim (including its newline, if any)."""
+        payload = bytearray((RAW,))
+        payload += line
+        self._append(payload)
+
+    def _append(self, payload: bytearray) -> None:
+        _put_varint(self._buf, len(payload))
+        self._buf += payload
+        self.records += 1
+        if len(self._buf) >= _FLUSH_SIZE:
+            self.flush()
+
+    def write_line(self, line: bytes) -> None:
+        """Stores one NDJSON log line so that ``BinaryLogReader.lines`` returns exactly the same bytes."""
+        newline = line.endswith(b"\n")
+        body = line[:-1] if newline else line
+        try:
+            record = json.loads(body)
+        except ValueError:
+            record = None
+        if isinstance(record, dict) and isinstance(record.get("event"), str):
+            for compact, render in ((False, _render_spaced), (True, _render_compact)):
+                if render(record) == body:
+                    self.write(record, compact=compact, newline=newline)
+                    return
+        self.write_raw(line)
+
+    def flush(self) -> None:
+        if self._buf:
+            self._f.write(self._buf)
+            self._buf = bytearray()
+
+    def close(self) -> None:
+        self.flush()
+        self._f.flush()
+
+
+class BinaryLogReader:
+    """Reads a ``.tlb`` stream written by ``BinaryLogWriter``, one record at a time."""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a binary telemetry file")
+        self._strings: List[str] = []
+        self._prev_micros = 0
+
+    def _payloads(self) -> Iterator[Tuple[bytes, int, int]]:
+        """Yields ``(buffer, start, end)`` of each non-dictionary payload; dictionary records are applied."""
+        strings = self._strings
+        data, pos = b"", 0
+        while True:
+            chunk = self._f.read(_READ_SIZE)
+            if not chunk:
+                if pos < len(data):
+                    raise ValueError("Truncated binary telemetry file")
+                return
+            data = data[pos:] + chunk
+            pos = 0
+            end_of_data = len(data)
+            while pos < end_of_data:
+                # A varint length never exceeds 10 bytes; read more if the header or payload is cut off
+                try:
+                    length, start = _varint(data, pos)
+                except IndexError:
+                    break
+                end = start + length
+                if end > end_of_data:
+                    break
+                if data[start] == STRING:
+                    strings.append(data[start + 1:end].decode("utf-8", "surrogatepass"))
+                else:
+                    yield data, start, end
+                pos = end
+
+    def _value(self, data: bytes, pos: int) -> Tuple[Any, int]:
+        # The hot path of full reads: one-byte varints (ids < 128, small ints) are decoded inline
+        tag = data[pos]
+        b = data[pos + 1] if tag >= T_INT else 0
+        if tag == T_REF:
+            if b < 0x80:
+                return self._strings[b], pos + 2
+            sid, pos = _varint(data, pos + 1)
+            return self._strings[sid], pos
+        if tag == T_INT:
+            if b < 0x80:
+                return (b >> 1) if not b & 1 else -((b + 1) >> 1), pos + 2
+            n, pos = _varint(data, pos + 1)
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+        if tag == T_DICT:
+            strings, value, result = self._strings, self._value, {}
+            n, pos = _varint(data, pos + 1)
+            for _ in range(n):
+                sid = data[pos]
+                if 0 < sid < 0x80:
+                    key = strings[sid - 1]
+                    pos += 1
+                else:
+                    key, pos = self._key(data, pos)
+                result[key], pos = value(data, pos)
+            return result, pos
+        pos += 1
+        if tag == T_STR:
+            n, pos = _varint(data, pos)
+            return data[pos:pos + n].decode("utf-8", "surrogatepass"), pos + n
+        if tag == T_FLOAT:
+            return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+        if tag == T_LIST:
+            n, pos = _varint(data, pos)
+            result = []
+            for _ in range(n):
+                item, pos = self._value(data, pos)
+                result.append(item)
+            return result, pos
+        if tag == T_NULL:
+            return None, pos
+        if tag == T_TRUE:
+            return True, pos
+        if tag == T_FALSE:
+            return False, pos
+        if tag == T_BIGINT:
+            n, pos = _varint(data, pos)
+            return int(data[pos:pos + n]), pos + n
+        raise ValueError(f"Unknown value tag {tag} in binary telemetry file")
+
+    def _key(self, data: bytes, pos: int) -> Tuple[str, int]:
+        sid, pos = _varint(data, pos)
+        if sid:
+            return self._strings[sid - 1], pos
+        n, pos = _varint(data, pos)
+        return data[pos:pos + n].decode("utf-8", "surrogatepass"), pos + n
+
+    def _header(self, data: bytes, pos: int) -> Tuple[int, str, Optional[int], int]:
+        """Decodes an EVENT payload up to the remaining fields: ``(flags, event, micros, pos)``."""
+        flags = data[pos + 1]
+        event, pos = self._key(data, pos + 2)
+        micros = None
+        if flags & F_TIMESTAMP:
+            delta, pos = _varint(data, pos)
+            micros = self._prev_micros = self._prev_micros + _unzigzag(delta)
+        return flags, event, micros, pos
+
+    def _record(self, data: bytes, start: int) -> Tuple[dict, int]:
+        flags, event, micros, pos = self._header(data, start)
+        event_pos, pos = _varint(data, pos)
+        ts_pos, pos = _varint(data, pos)
+        # The remaining fields are a T_DICT; decode it straight into the record, placing event/timestamp
+        n, pos = _varint(data, pos + 1)
+        timestamp = _timestamp_text(micros) if micros is not None else None
+        strings, value, record = self._strings, self._value, {}
+        for i in range(n + (1 if timestamp is None else 2)):
+            if i == event_pos:
+                record["event"] = event
+            elif i == ts_pos and timestamp is not None:
+                record["timestamp"] = timestamp
+            else:
+                sid = data[pos]
+                if 0 < sid < 0x80:
+                    key = strings[sid - 1]
+                    pos += 1
+                else:
+                    key, pos = self._key(data, pos)
+                record[key], pos = value(data, pos)
+        return record, flags
+
+    def __iter__(self) -> Iterator[dict]:
+        """Yields every record as a dict (RAW lines that parse as JSON objects too)."""
+        for data, start, end in self._payloads():
+            if data[start] == EVENT:
+                yield self._record(data, start)[0]
+            else:
+                try:
+                    record = json.loads(data[start + 1:end])
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+
+    def lines(self) -> Iterator[bytes]:
+        """Yields the original NDJSON lines, byte for byte."""
+        for data, start, end in self._payloads():
+            if data[start] == EVENT:
+                record, flags = self._record(data, start)
+                line = _render_compact(record) if flags & F_COMPACT else _render_spaced(record)
+                yield line if flags & F_NO_NEWLINE else line + b"\n"
+            else:
+                yield data[start + 1:end]
+
+    def scan(self) -> Iterator[Tuple[Optional[str], Optional[float]]]:
+        """Yields ``(event, epoch seconds)`` per record without decoding the other fields where possible."""
+        for data, start, end in self._payloads():
+            if data[start] == EVENT:
+                flags, event, micros, _ = self._header(data, start)
+                if micros is not None:
+                    yield event, micros / 1_000_000
+                else:
+                    yield event, parse_timestamp(self._record(data, start)[0].get("timestamp"))
+            else:
+                try:
+                    record = json.loads(data[start + 1:end])
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    event = record.get("event")
+                    yield (event if isinstance(event, str) else None), parse_timestamp(record.get("timestamp"))
+                else:
+                    yield None, None
+
+
+def _open_source(path: str) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def ndjson_to_binary(src: str, dst: str) -> int:
+    """Converts an NDJSON telemetry log (or gzipped segment) to ``.tlb``; returns the number of lines."""
+    with _open_source(src) as fin, open(dst, "wb") as fout:
+        writer = BinaryLogWriter(fout)
+        for line in fin:
+            writer.write_line(line)
+        writer.close()
+        return writer.records
+
+
+def binary_to_ndjson(src: str, dst: str) -> int:
+    """Converts a ``.tlb`` file back to the exact NDJSON it was made from; returns the number of lines."""
+    count = 0
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        buf = []
+        for line in BinaryLogReader(fin).lines():
+            buf.append(line)
+            count += 1
+            if len(buf) >= 4096:
+                fout.write(b"".join(buf))
+                buf = []
+        fout.write(b"".join(buf))
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert telemetry logs between NDJSON and the binary .tlb format.")
+    parser.add_argument("direction", choices=["encode", "decode"], help="encode: NDJSON -> .tlb, decode: .tlb -> NDJSON")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    args = parser.parse_args(argv)
+    convert = ndjson_to_binary if args.direction == "encode" else binary_to_ndjson
+    count = convert(args.src, args.dst)
+    print(f"{args.direction}d {count} records: {args.src} -> {args.dst}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Resumable, constant-memory export of the telemetry log.
+
+An export position is a ``(segment seq, uncompressed offset)`` pair, handed to
+clients as an opaque cursor. Segment numbers never change when the active
+segment rolls over, so a cursor stays valid while the segment is sealed and
+compressed. Each export is planned up front against a snapshot of the log
+(ending on a line boundary), which is what the returned next-cursor points at.
+The planned segments are opened before the response starts, so retention
+running mid-export cannot skip data past that cursor; the body is then streamed
+in fixed-size chunks.
+"""
+import base64
+import zlib
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from backend.telemetry_segments import Segment, list_segments, next_segment_seq, open_segment_at, segment_size
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class ExportRange(NamedTuple):
+    seq: int
+    start: int
+    end: int
+
+
+class ExportPlan(NamedTuple):
+    ranges: List[ExportRange]
+    cursor: Tuple[int, int]
+    gap: bool # Data between the requested cursor and the first range was deleted by retention
+
+
+def encode_cursor(seq: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{seq}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Raises ValueError for anything that is not a cursor we issued."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    seq, offset = base64.b64decode(padded.encode(), altchars=b"-_", validate=True).decode().split(":")
+    seq, offset = int(seq), int(offset)
+    if seq < 0 or offset < 0:
+        raise ValueError("negative cursor position")
+    return seq, offset
+
+
+def _complete_lines_end(path: str, size: int) -> int:
+    """Largest offset <= size that ends a complete line of the (growing) active segment."""
+    with open(path, "rb") as f:
+        position = size
+        while position > 0:
+            start = max(0, position - EXPORT_CHUNK_SIZE)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def _line_end_after(segment: Segment, offset: int) -> int:
+    """Offset just past the line containing ``offset``."""
+    with open_segment_at(segment, offset) as f:
+        return offset + len(f.readline())
+
+
+def plan_export(active_path: str, cursor: Optional[Tuple[int, int]] = None, max_bytes: int = 0) -> ExportPlan:
+    """Works out which byte ranges an export starting at ``cursor`` covers.
+
+    ``max_bytes`` (0 = unlimited) caps the page size; pages always end on a
+    line boundary, so a page may run past the cap by up to one line.
+    """
+    segments = list_segments(active_path)
+    if cursor == (0, 0):
+        cursor = (1, 0) # Issued for an empty log before the first segment existed: nothing precedes segment 1
+    if not segments:
+        return ExportPlan([], cursor or (next_segment_seq(active_path), 0), False)
+    seq, offset = cursor if cursor is not None else (segments[0].seq, 0)
+    gap = cursor is not None and seq < segments[0].seq
+    ranges: List[ExportRange] = []
+    next_cursor = (seq, offset)
+    budget = max_bytes
+    for segment in segments:
+        if segment.seq < seq:
+            continue
+        size = segment_size(segment)
+        if segment.active:
+            size = _complete_lines_end(segment.path, size)
+        start = offset if segment.seq == seq else 0
+        if start > size:
+            # The segment was replaced (e.g. the file was truncated externally): start over
+            start, gap = 0, True
+        end = size
+        if max_bytes and end - start > budget:
+            end = min(size, _line_end_after(segment, start + budget - 1))
+        if end > start:
+            ranges.append(ExportRange(segment.seq, start, end))
+        next_cursor = (segment.seq, end)
+        if max_bytes:
+            budget -= end - start
+            if budget <= 0:
+                break
+    return ExportPlan(ranges, next_cursor, gap)
+
+
+def _resolve(active_path: str, seq: int) -> Optional[Segment]:
+    # Look the segment up again: it may have been sealed or compressed since planning
+    for segment in list_segments(active_path):
+        if segment.seq == seq:
+            return segment
+    return None
+
+
+def _open_range(active_path: str, seq: int, start: int) -> Optional[BinaryIO]:
+    for _ in range(2): # Once more if compression replaced the file between lookup and open
+        segment = _resolve(active_path, seq)
+        if segment is None:
+            return None
+        try:
+            return open_segment_at(segment, start)
+        except FileNotFoundError:
+            pass
+    return None
+
+
+def open_ranges(active_path: str, ranges: List[ExportRange]) -> Tuple[List[Tuple[BinaryIO, ExportRange]], bool]:
+    """Opens every planned range now, before the response (and its cursor) goes out.
+
+    An open segment stays readable after retention deletes it or compression
+    replaces it, so the stream holds exactly what was planned. Returns the
+    open files and whether a range's segment was already gone (a gap).
+    """
+    opened: List[Tuple[BinaryIO, ExportRange]] = []
+    missing = False
+    try:
+        for r in ranges:
+            f = _open_range(active_path, r.seq, r.start)
+            if f is None:
+                missing = True
+            else:
+                opened.append((f, r))
+    except BaseException:
+        for f, _ in opened:
+            f.close()
+        raise
+    return opened, missing
+
+
+def read_ranges(opened: List[Tuple[BinaryIO, ExportRange]], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Streams ranges from ``open_ranges`` in chunks, closing every file at the end."""
+    try:
+        for f, (_, start, end) in opened:
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    finally:
+        for f, _ in opened:
+            f.close()
+
+
+def iter_export(active_path: str, ranges: List[ExportRange], compress: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yields the planned ranges as NDJSON bytes, optionally gzip-compressed on the fly.
+
+    The segments are opened by this call, not when iteration starts.
+    """
+    chunks = read_ranges(open_ranges(active_path, ranges)[0], chunk_size)
+    return compress_chunks(chunks) if compress else chunks
+
+
+def compress_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Gzips a stream of chunks on the fly (any storage backend's export)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
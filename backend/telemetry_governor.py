@@ -0,0 +1,172 @@
+"""Rate limiting and sampling for telemetry ingestion.
+
+A runaway frontend loop can post thousands of events per second, and every
+accepted event costs a log append. ``TelemetryGovernor`` decides, per event,
+before anything is encoded or written:
+
+1. *Sampling*: event names with a sample rate ``p < 1`` are kept with
+   probability ``p``; kept events are logged with ``"sample_rate": p`` so an
+   aggregation can weight them by ``1/p``.
+2. *Rate limiting*: a token bucket per event name plus a global one. An event
+   that finds either bucket empty is rejected with the time until a token is
+   available (``POST /telemetry`` answers 429 with ``Retry-After``).
+
+Every decision is counted per event name, so the number of events *received*
+stays exact even when most of them were never written.
+"""
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+ACCEPTED = "accepted"
+SAMPLED_OUT = "sampled_out"
+RATE_LIMITED = "rate_limited"
+OUTCOMES = (ACCEPTED, SAMPLED_OUT, RATE_LIMITED)
+
+# Names beyond ``max_events`` share one bucket and one set of counters
+OTHER_EVENTS = "(other)"
+
+
+class TokenBucket:
+    """Holds up to ``burst`` tokens, refilled at ``rate`` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class Admission(NamedTuple):
+    outcome: str
+    retry_after: float = 0.0 # Seconds, for RATE_LIMITED
+    sample_rate: float = 1.0 # For ACCEPTED events of a sampled type
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parses ``"scroll=0.1,mousemove=0.01"``; ``*`` sets the rate for every other event."""
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, value = item.partition("=")
+        rate = float(value) if sep else math.nan
+        if not name.strip() or not 0 <= rate <= 1:
+            raise ValueError(f"Invalid telemetry sample rate {item.strip()!r}: expected name=<0..1>")
+        rates[name.strip()] = rate
+    return rates
+
+
+def retry_after_header(seconds: float) -> str:
+    """``Retry-After`` takes whole seconds; round up so a client that honours it gets a token."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class TelemetryGovernor:
+    """Admits, samples or rejects telemetry events; thread-safe.
+
+    ``rate``/``burst`` bound all events together and ``event_rate``/``event_burst``
+    each event name; a rate of ``0`` disables that limit. ``sample_rates`` maps
+    event names (or ``*``) to the fraction of events kept.
+    """
+
+    def __init__(
+        self,
+        rate: float = 0.0,
+        burst: float = 0.0,
+        event_rate: float = 0.0,
+        event_burst: float = 0.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+        max_events: int = 1000,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.rate = rate
+        self.burst = burst or rate
+        self.event_rate = event_rate
+        self.event_burst = event_burst or event_rate
+        self.sample_rates = dict(sample_rates or {})
+        self.max_events = max_events
+        self._clock = clock
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._global = TokenBucket(rate, self.burst, clock()) if rate > 0 else None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def _key(self, event: str, table: dict) -> str:
+        return event if event in table or len(table) < self.max_events else OTHER_EVENTS
+
+    def _count(self, event: str, outcome: str) -> None:
+        key = self._key(event, self._counts)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = dict.fromkeys(OUTCOMES, 0)
+        counts[outcome] += 1
+
+    def admit(self, event: str, limit: bool = True) -> Admission:
+        """Decides the fate of one ``event``; ``limit=False`` applies sampling only."""
+        sample_rate = self.sample_rates.get(event, self.sample_rates.get("*", 1.0))
+        with self._lock:
+            if sample_rate < 1.0 and self._rng() >= sample_rate:
+                self._count(event, SAMPLED_OUT)
+                return Admission(SAMPLED_OUT)
+            if limit and (self._global is not None or self.event_rate > 0):
+                now = self._clock()
+                bucket = None
+                wait = self._global.wait_time(now) if self._global is not None else 0.0
+                if self.event_rate > 0:
+                    key = self._key(event, self._buckets)
+                    bucket = self._buckets.get(key)
+                    if bucket is None:
+                        bucket = self._buckets[key] = TokenBucket(self.event_rate, self.event_burst, now)
+                    wait = max(wait, bucket.wait_time(now))
+                if wait > 0:
+                    self._count(event, RATE_LIMITED)
+                    return Admission(RATE_LIMITED, retry_after=wait)
+                if self._global is not None:
+                    self._global.take()
+                if bucket is not None:
+                    bucket.take()
+            self._count(event, ACCEPTED)
+        return Admission(ACCEPTED, sample_rate=sample_rate)
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        """Per event name: how many events were accepted, sampled out and rate limited."""
+        with self._lock:
+            return {event: dict(counts) for event, counts in self._counts.items()}
+
+    def summary(self) -> dict:
+        """Totals plus a per-event breakdown of the events that were not all written."""
+        counters = self.counters()
+        totals = dict.fromkeys(OUTCOMES, 0)
+        for counts in counters.values():
+            for outcome, n in counts.items():
+                totals[outcome] += n
+        dropped = {
+            event: {"received": sum(counts.values()), **counts}
+            for event, counts in sorted(counters.items())
+            if counts[SAMPLED_OUT] or counts[RATE_LIMITED]
+        }
+        return {"received": sum(totals.values()), **totals, "events": dropped}
+
+    def reset(self) -> None:
+        """Refills every bucket and clears the counters."""
+        with self._lock:
+            now = self._clock()
+            self._global = TokenBucket(self.rate, self.burst, now) if self.rate > 0 else None
+            self._buckets.clear()
+            self._counts.clear()
@@ -0,0 +1,496 @@
+"""Sidecar index for the telemetry log.
+
+Every segment ``telemetry.log[.<seq>]`` gets two sidecar files next to it:
+
+* ``.names`` - one event name per line; the line number is the event id.
+* ``.idx``   - fixed-size records ``(event id, timestamp, offset, length)``.
+
+The writer thread appends to the sidecars of the active segment right after it
+writes a batch, and renames them together with the segment when it rolls over.
+Sidecars are only a cache: a missing, short or inconsistent index is rebuilt
+(or topped up) from the segment itself, so a crash never loses data.
+
+In memory, each segment keeps per-event arrays of offsets/timestamps for
+seeking to matching records, plus per-bucket counts for aggregation. Only the
+most recently used segments keep their per-event arrays loaded; counts are
+kept for all of them.
+
+In multi-worker mode each process has its own ``TelemetryIndex`` over the
+shared log. Under the shared ``FileLock`` it first reads whatever the other
+workers appended to the active segment's sidecars (``SegmentIndex.follow``),
+so each line is indexed, and persisted, exactly once.
+"""
+import logging
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from backend.serialization import loads
+from backend.telemetry_segments import (
+    Segment,
+    list_segments,
+    open_segment_at,
+    plain_segment_path,
+    sidecar_path,
+)
+
+logger = logging.getLogger(__name__)
+
+RECORD = struct.Struct("<IdQI") # event id, timestamp (epoch seconds), offset, length
+DEFAULT_BUCKET_SECONDS = 60
+_SCAN_CHUNK = 10000
+
+
+class IndexEntry(NamedTuple):
+    """One appended line: its event name (None if unparseable), timestamp and byte length."""
+    event: Optional[str]
+    ts: float
+    length: int
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Accepts epoch seconds or an ISO 8601 string; returns epoch seconds or None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def entries_from_lines(lines: Iterable[bytes]) -> List[IndexEntry]:
+    """Builds index entries by parsing raw log lines (used for rebuilds and external appends)."""
+    entries = []
+    for line in lines:
+        try:
+            record = loads(line)
+            event = record.get("event") if isinstance(record, dict) else None
+            ts = parse_timestamp(record.get("timestamp")) if isinstance(record, dict) else None
+        except ValueError:
+            event, ts = None, None
+        entries.append(IndexEntry(event if isinstance(event, str) and event else None, ts or 0.0, len(line)))
+    return entries
+
+
+class SegmentIndex:
+    """Index of one segment, optionally persisted to its sidecar files."""
+
+    def __init__(self, segment_path: str, bucket_seconds: int = DEFAULT_BUCKET_SECONDS):
+        self.segment_path = plain_segment_path(segment_path)
+        self.bucket_seconds = bucket_seconds
+        self.names: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.end = 0 # Bytes of the segment covered by the index
+        self.count = 0
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.buckets: Dict[int, Dict[str, int]] = {}
+        self.offsets: Optional[Dict[str, array]] = {}
+        self.lengths: Optional[Dict[str, array]] = {}
+        self.times: Optional[Dict[str, array]] = {}
+        self._idx_file = None
+        self._names_file = None
+        self._names_pos = 0 # Bytes of the sidecars reflected in memory (see follow)
+        self._idx_pos = 0
+        self.generation = 0 # Shared rollover generation the index was loaded at (multi-worker mode)
+
+    @property
+    def loaded(self) -> bool:
+        return self.offsets is not None
+
+    def add(self, offset: int, entries: Iterable[IndexEntry], persist: bool = True) -> None:
+        """Adds entries for lines written contiguously starting at ``offset``."""
+        records = bytearray()
+        new_names = []
+        for entry in entries:
+            if entry.event is not None:
+                # Clamp so timestamps are non-decreasing within a segment and bisect stays exact
+                ts = entry.ts if self.last is None or entry.ts >= self.last else self.last
+                event_id = self.ids.get(entry.event)
+                if event_id is None:
+                    event_id = self.ids[entry.event] = len(self.names)
+                    self.names.append(entry.event)
+                    new_names.append(entry.event)
+                self._add_memory(entry.event, ts, offset, entry.length)
+                if persist:
+                    records += RECORD.pack(event_id, ts, offset, entry.length)
+            offset += entry.length
+        self.end = max(self.end, offset)
+        if persist and (records or new_names):
+            self._persist(bytes(records), new_names)
+
+    def _add_memory(self, event: str, ts: float, offset: int, length: int) -> None:
+        self.count += 1
+        if self.first is None:
+            self.first = ts
+        self.last = ts
+        bucket = int(ts // self.bucket_seconds) * self.bucket_seconds
+        counts = self.buckets.setdefault(bucket, {})
+        counts[event] = counts.get(event, 0) + 1
+        if self.offsets is not None:
+            if event not in self.offsets:
+                self.offsets[event] = array("Q")
+                self.lengths[event] = array("I")
+                self.times[event] = array("d")
+            self.offsets[event].append(offset)
+            self.lengths[event].append(length)
+            self.times[event].append(ts)
+
+    def _persist(self, records: bytes, new_names: List[str]) -> None:
+        if self._names_file is None:
+            self._names_file = open(sidecar_path(self.segment_path, ".names"), "ab")
+            self._idx_file = open(sidecar_path(self.segment_path, ".idx"), "ab")
+        if new_names:
+            # Names first: an id in .idx must never point past the end of .names
+            data = "".join(name.replace("\n", " ") + "\n" for name in new_names).encode()
+            self._names_file.write(data)
+            self._names_file.flush()
+            self._names_pos += len(data)
+        self._idx_file.write(records)
+        self._idx_file.flush()
+        self._idx_pos += len(records)
+
+    def follow(self) -> None:
+        """Adds the records other processes appended to the sidecars since this index last read them."""
+        try:
+            with open(sidecar_path(self.segment_path, ".names"), "rb") as f:
+                f.seek(self._names_pos)
+                names = f.read()
+            with open(sidecar_path(self.segment_path, ".idx"), "rb") as f:
+                f.seek(self._idx_pos)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        names = names[:names.rfind(b"\n") + 1] # Complete lines only
+        for name in names.decode("utf-8").split("\n")[:-1]:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        self._names_pos += len(names)
+        usable = len(data) - len(data) % RECORD.size # A torn trailing record is read next time
+        for event_id, ts, offset, length in RECORD.iter_unpack(memoryview(data)[:usable]):
+            if event_id >= len(self.names):
+                break # Its name is not written yet; pick it up next time
+            self._add_memory(self.names[event_id], ts, offset, length)
+            self.end = max(self.end, offset + length)
+            self._idx_pos += RECORD.size
+
+    def close(self) -> None:
+        for f in (self._idx_file, self._names_file):
+            if f is not None:
+                f.close()
+        self._idx_file = self._names_file = None
+
+    def drop_details(self) -> None:
+        """Frees the per-event arrays; counts and buckets stay available."""
+        self.offsets = self.lengths = self.times = None
+
+    @classmethod
+    def load(cls, segment_path: str, bucket_seconds: int = DEFAULT_BUCKET_SECONDS) -> Optional["SegmentIndex"]:
+        """Loads persisted sidecars; returns None if they are missing or inconsistent."""
+        index = cls(segment_path, bucket_seconds)
+        try:
+            with open(sidecar_path(segment_path, ".names"), "rb") as f:
+                names = f.read().decode("utf-8").split("\n")[:-1]
+            with open(sidecar_path(segment_path, ".idx"), "rb") as f:
+                data = f.read()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return None
+        usable = len(data) - len(data) % RECORD.size # Drop a torn trailing record
+        index.names = names
+        index._names_pos = sum(len(name.encode("utf-8")) + 1 for name in names)
+        index._idx_pos = usable
+        index.ids = {name: i for i, name in enumerate(names)}
+        for event_id, ts, offset, length in RECORD.iter_unpack(memoryview(data)[:usable]):
+            if event_id >= len(names):
+                return None
+            index._add_memory(names[event_id], ts, offset, length)
+            index.end = offset + length
+        if usable != len(data):
+            with open(sidecar_path(segment_path, ".idx"), "r+b") as f:
+                f.truncate(usable)
+        return index
+
+    def scan(self, segment: Segment, persist: bool = True, stop: Optional[int] = None) -> None:
+        """Indexes the segment from ``self.end`` to ``stop`` (default: its current end)."""
+        position = self.end
+        with open_segment_at(segment, self.end) as f:
+            chunk = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break # Partial line still being written by someone else
+                if stop is not None and position + len(line) > stop:
+                    break
+                position += len(line)
+                chunk.append(line)
+                if len(chunk) >= _SCAN_CHUNK:
+                    self.add(self.end, entries_from_lines(chunk), persist)
+                    chunk = []
+            if chunk:
+                self.add(self.end, entries_from_lines(chunk), persist)
+
+    def count_between(self, since: Optional[float], until: Optional[float]) -> Dict[str, int]:
+        """Counts per event for buckets overlapping ``[since, until)``."""
+        if since is None and until is None:
+            totals: Dict[str, int] = {}
+            for counts in self.buckets.values():
+                for event, n in counts.items():
+                    totals[event] = totals.get(event, 0) + n
+            return totals
+        lo = float("-inf") if since is None else int(since // self.bucket_seconds) * self.bucket_seconds
+        hi = float("inf") if until is None else until
+        totals = {}
+        for bucket, counts in self.buckets.items():
+            if lo <= bucket < hi:
+                for event, n in counts.items():
+                    totals[event] = totals.get(event, 0) + n
+        return totals
+
+    def matches(self, event: str, since: Optional[float], until: Optional[float]) -> Tuple[array, array, int, int]:
+        """Returns (offsets, lengths, start, stop) of ``event`` records in ``[since, until)``."""
+        times = self.times.get(event)
+        if times is None:
+            return array("Q"), array("I"), 0, 0
+        start = 0 if since is None else bisect_left(times, since)
+        stop = len(times) if until is None else bisect_left(times, until)
+        return self.offsets[event], self.lengths[event], start, max(start, stop)
+
+
+def _remove_index_files(segment_path: str) -> None:
+    for suffix in (".idx", ".names"):
+        try:
+            os.unlink(sidecar_path(segment_path, suffix))
+        except FileNotFoundError:
+            pass
+
+
+class TelemetryIndex:
+    """Index over all segments of one telemetry log.
+
+    ``lock`` must be held by the writer around each write + ``appended`` call
+    so queries never index a batch the writer is about to record itself.
+    ``file_lock`` is the ``FileLock`` the writers of all processes share, if
+    several processes write the log; queries hold it too.
+    """
+
+    def __init__(self, active_path: str, bucket_seconds: int = DEFAULT_BUCKET_SECONDS, max_loaded: int = 8, file_lock=None):
+        self.active_path = active_path
+        self.bucket_seconds = bucket_seconds
+        self.max_loaded = max_loaded
+        self.lock = threading.RLock()
+        self.file_lock = file_lock
+        self._active: Optional[SegmentIndex] = None
+        self._sealed: Dict[str, SegmentIndex] = {} # plain path -> index (counts always, arrays if recent)
+        self._loaded: "OrderedDict[str, None]" = OrderedDict() # LRU of sealed indexes with arrays
+
+    # Writer-side hooks (called on the writer thread with ``lock`` held)
+
+    def appended(self, offset: int, data: bytes, entries: Optional[List[IndexEntry]]) -> None:
+        """Records lines the writer just appended at ``offset`` of the active segment."""
+        active = self._active_index(catch_up=False)
+        if active.end < offset:
+            # Someone else (e.g. the Tauri shell) appended since our last batch
+            active.scan(self._active_segment(), stop=offset)
+        if active.end != offset:
+            logger.warning("Telemetry index out of step at offset %s; rescanning '%s'", offset, self.active_path)
+            active.scan(self._active_segment())
+            return
+        if entries is None:
+            entries = entries_from_lines(data.splitlines(keepends=True))
+        active.add(offset, entries)
+
+    def sealed(self, sealed_path: str) -> None:
+        """Moves the active index's sidecars along with the segment the writer just sealed."""
+        active = self._active
+        self._active = None
+        if active is None:
+            return
+        active.close()
+        for suffix in (".idx", ".names"):
+            try:
+                os.replace(sidecar_path(self.active_path, suffix), sidecar_path(sealed_path, suffix))
+            except FileNotFoundError:
+                pass
+        if self.file_lock is not None:
+            return # Other workers appended too: the sidecars are complete, our in-memory copy may not be
+        active.segment_path = plain_segment_path(sealed_path)
+        self._sealed[active.segment_path] = active
+        self._touch(active.segment_path)
+
+    def close(self) -> None:
+        with self.lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    # Loading
+
+    def _active_segment(self) -> Segment:
+        return Segment(-1, self.active_path, False, True)
+
+    def _active_index(self, catch_up: bool = True) -> SegmentIndex:
+        if self.file_lock is not None and self._active is not None:
+            if self._active.generation != self.file_lock.generation:
+                # Another worker sealed the segment (and moved its sidecars) since we last looked
+                self._active.close()
+                self._active = None
+            else:
+                self._active.follow()
+        if self._active is None:
+            index = SegmentIndex.load(self.active_path, self.bucket_seconds)
+            try:
+                size = os.path.getsize(self.active_path)
+            except OSError:
+                size = 0
+            if index is None or index.end > size:
+                # Missing or stale (e.g. crash between sealing the log and its index): rebuild
+                _remove_index_files(self.active_path)
+                index = SegmentIndex(self.active_path, self.bucket_seconds)
+            if self.file_lock is not None:
+                index.generation = self.file_lock.generation
+            self._active = index
+        if catch_up and os.path.isfile(self.active_path) and os.path.getsize(self.active_path) > self._active.end:
+            self._active.scan(self._active_segment())
+        return self._active
+
+    def _touch(self, plain: str) -> None:
+        self._loaded[plain] = None
+        self._loaded.move_to_end(plain)
+        while len(self._loaded) > self.max_loaded:
+            evicted, _ = self._loaded.popitem(last=False)
+            if evicted in self._sealed:
+                self._sealed[evicted].drop_details()
+
+    def _sealed_index(self, segment: Segment, details: bool) -> SegmentIndex:
+        plain = plain_segment_path(segment.path)
+        index = self._sealed.get(plain)
+        if index is None or (details and not index.loaded):
+            index = SegmentIndex.load(segment.path, self.bucket_seconds)
+            if index is None:
+                logger.info("Rebuilding telemetry index for '%s'", segment.path)
+                _remove_index_files(segment.path)
+                index = SegmentIndex(segment.path, self.bucket_seconds)
+                index.scan(segment)
+                index.close()
+            self._sealed[plain] = index
+        if index.loaded:
+            self._touch(plain)
+        return index
+
+    def _segments(self, details: bool) -> List[Tuple[Segment, SegmentIndex]]:
+        segments = list_segments(self.active_path)
+        live = {plain_segment_path(s.path) for s in segments}
+        for plain in [p for p in self._sealed if p not in live]: # Removed by retention
+            del self._sealed[plain]
+            self._loaded.pop(plain, None)
+        result = []
+        for segment in segments:
+            if segment.active:
+                result.append((segment, self._active_index()))
+            else:
+                result.append((segment, self._sealed_index(segment, details)))
+        return result
+
+    def rebuild(self) -> None:
+        """Discards all sidecars and re-indexes every segment from the log."""
+        with self.lock, self.file_lock or nullcontext():
+            self.close()
+            self._sealed.clear()
+            self._loaded.clear()
+            for segment in list_segments(self.active_path):
+                _remove_index_files(segment.path)
+            self._segments(details=False)
+
+    # Queries
+
+    def stats(self, since: Optional[float] = None, until: Optional[float] = None, bucket: Optional[int] = None) -> dict:
+        """Per-event counts (and optionally a histogram) for ``[since, until)``.
+
+        Time bounds are resolved at the index bucket granularity.
+        """
+        with self.lock, self.file_lock or nullcontext():
+            segments = self._segments(details=False)
+            totals: Dict[str, int] = {}
+            histogram: Dict[int, Dict[str, int]] = {}
+            first = last = None
+            for _, index in segments:
+                if index.count == 0:
+                    continue
+                if (since is not None and index.last < since - self.bucket_seconds) or (until is not None and index.first >= until):
+                    continue
+                for event, n in index.count_between(since, until).items():
+                    totals[event] = totals.get(event, 0) + n
+                first = index.first if first is None else min(first, index.first)
+                last = index.last if last is None else max(last, index.last)
+                if bucket:
+                    lo = float("-inf") if since is None else int(since // self.bucket_seconds) * self.bucket_seconds
+                    hi = float("inf") if until is None else until
+                    for start, counts in index.buckets.items():
+                        if lo <= start < hi:
+                            target = histogram.setdefault(int(start // bucket) * bucket, {})
+                            for event, n in counts.items():
+                                target[event] = target.get(event, 0) + n
+        result = {
+            "total": sum(totals.values()),
+            "events": dict(sorted(totals.items(), key=lambda item: (-item[1], item[0]))),
+            "first": first,
+            "last": last,
+        }
+        if bucket:
+            result["buckets"] = [{"start": start, "counts": histogram[start]} for start in sorted(histogram)]
+        return result
+
+    def events(self, event: str, since: Optional[float] = None, until: Optional[float] = None, limit: int = 100) -> Tuple[List[dict], int]:
+        """Returns up to ``limit`` records of ``event`` in ``[since, until)`` (oldest first) and the total match count."""
+        records: List[dict] = []
+        total = 0
+        with self.lock, self.file_lock or nullcontext():
+            for segment, index in self._segments(details=False):
+                if index.count == 0 or event not in index.ids:
+                    continue
+                if (since is not None and index.last < since) or (until is not None and index.first >= until):
+                    continue
+                if not index.loaded:
+                    index = self._sealed_index(segment, details=True)
+                offsets, lengths, start, stop = index.matches(event, since, until)
+                total += stop - start
+                wanted = min(stop, start + max(0, limit - len(records)))
+                if wanted > start:
+                    records.extend(self._read(segment, offsets, lengths, start, wanted))
+        return records, total
+
+    def _read(self, segment: Segment, offsets: array, lengths: array, start: int, stop: int) -> List[dict]:
+        try:
+            f = open_segment_at(segment, offsets[start])
+        except FileNotFoundError:
+            if segment.compressed or segment.active:
+                raise
+            # Compressed by the maintenance thread since it was listed
+            f = open_segment_at(Segment(segment.seq, segment.path + ".gz", True, False), offsets[start])
+        records = []
+        with f:
+            position = offsets[start]
+            for i in range(start, stop):
+                if offsets[i] != position:
+                    f.seek(offsets[i]) # Forward only: offsets of one event are increasing
+                line = f.read(lengths[i])
+                position = offsets[i] + lengths[i]
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    continue
+        return records
@@ -0,0 +1,300 @@
+"""Segment layout, compression and retention for the telemetry log.
+
+The active segment is always ``TELEMETRY_FILE`` itself. When it rolls over it
+is renamed to ``<TELEMETRY_FILE>.<seq>`` (a cheap, atomic rename done by the
+writer thread between batches), and a maintenance thread later gzips it to
+``<TELEMETRY_FILE>.<seq>.gz`` and deletes whole segments that fall outside the
+retention policy. Sequence numbers only grow, so segment order is event order.
+
+Compressed segments are written as a series of independent gzip members of
+``COMPRESS_BLOCK_SIZE`` uncompressed bytes each, with the compressed offset of
+every member stored in a ``.blocks`` sidecar, so a reader can start at any
+uncompressed offset after decompressing at most one block.
+"""
+import gzip
+from array import array
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import nullcontext
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+COMPRESS_BLOCK_SIZE = 256 * 1024
+
+# Per-segment sidecar files (index, names, block table, analytics cache) share the segment's plain path as prefix
+SIDECAR_SUFFIXES = (".idx", ".names", ".blocks", ".cols.npz")
+
+
+class Segment(NamedTuple):
+    seq: int
+    path: str
+    compressed: bool
+    active: bool
+
+
+class SegmentPolicy:
+    """Rotation and retention limits; ``0`` disables the corresponding limit.
+
+    ``max_bytes``/``max_age`` (seconds) roll the active segment over.
+    ``retain_segments``, ``retain_bytes`` and ``retain_age`` (seconds, by
+    mtime) bound the sealed segments kept on disk.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        max_age: float = 0.0,
+        compress: bool = True,
+        retain_segments: int = 0,
+        retain_bytes: int = 0,
+        retain_age: float = 0.0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.retain_segments = retain_segments
+        self.retain_bytes = retain_bytes
+        self.retain_age = retain_age
+
+    @property
+    def rotates(self) -> bool:
+        return self.max_bytes > 0 or self.max_age > 0
+
+
+def sealed_segment_path(active_path: str, seq: int) -> str:
+    return f"{active_path}.{seq:06d}"
+
+
+def _segment_pattern(active_path: str) -> "re.Pattern":
+    return re.compile(re.escape(os.path.basename(active_path)) + r"\.(\d{6,})(\.gz)?$")
+
+
+def _sealed_segments(active_path: str) -> List[Segment]:
+    directory = os.path.dirname(active_path) or "."
+    pattern = _segment_pattern(active_path)
+    found = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        match = pattern.match(name)
+        if match is None:
+            continue
+        seq, compressed = int(match.group(1)), match.group(2) is not None
+        if seq in found and not found[seq].compressed:
+            continue
+        found[seq] = Segment(seq, os.path.join(directory, name), compressed, False)
+    return [found[seq] for seq in sorted(found)]
+
+
+def _next_seq(active_path: str, sealed: List[Segment]) -> int:
+    # The high-water mark keeps numbers unique even after retention deleted every sealed segment
+    try:
+        with open(active_path + ".seq") as f:
+            high_water = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        high_water = 0
+    return max(sealed[-1].seq if sealed else 0, high_water) + 1
+
+
+def list_segments(active_path: str, include_active: bool = True) -> List[Segment]:
+    """Lists sealed segments oldest first, followed by the active segment if it exists.
+
+    The active segment is reported with the sequence number it will get when
+    sealed, so ``(seq, offset)`` positions stay valid across a rollover. If a
+    crash left both the plain and the compressed copy of a segment, the plain
+    file is reported (it is complete; the ``.gz`` may not be).
+    """
+    segments = _sealed_segments(active_path)
+    if include_active and os.path.isfile(active_path):
+        segments.append(Segment(_next_seq(active_path, segments), active_path, False, True))
+    return segments
+
+
+def next_segment_seq(active_path: str) -> int:
+    return _next_seq(active_path, _sealed_segments(active_path))
+
+
+def record_segment_seq(active_path: str, seq: int) -> None:
+    """Persists the highest sequence number handed out so far."""
+    with open(active_path + ".seq", "w") as f:
+        f.write(str(seq))
+
+
+def segment_size(segment: Segment) -> int:
+    """Uncompressed size of a segment.
+
+    For block-compressed segments this is the block count times the block size
+    plus the last member's ISIZE trailer, so nothing has to be decompressed.
+    """
+    if not segment.compressed:
+        return os.path.getsize(segment.path)
+    table = _read_block_table(segment.path)
+    with open(segment.path, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        last_member = int.from_bytes(f.read(4), "little")
+    if table:
+        return (len(table) - 1) * COMPRESS_BLOCK_SIZE + last_member
+    return last_member # Single-member gzip (ISIZE is modulo 4 GiB)
+
+
+def plain_segment_path(path: str) -> str:
+    """Strips the ``.gz`` suffix; sidecars are named after the plain segment path."""
+    return path[:-3] if path.endswith(".gz") else path
+
+
+def sidecar_path(segment_path: str, suffix: str) -> str:
+    return plain_segment_path(segment_path) + suffix
+
+
+def remove_sidecars(segment_path: str) -> None:
+    for suffix in SIDECAR_SUFFIXES:
+        try:
+            os.unlink(sidecar_path(segment_path, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def open_segment(segment: Segment):
+    """Opens a segment for binary reading, transparently decompressing it."""
+    return gzip.open(segment.path, "rb") if segment.compressed else open(segment.path, "rb")
+
+
+def _read_block_table(segment_path: str) -> Optional[array]:
+    try:
+        with open(sidecar_path(segment_path, ".blocks"), "rb") as f:
+            table = array("Q")
+            table.frombytes(f.read())
+            return table
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def open_segment_at(segment: Segment, offset: int):
+    """Opens a segment positioned at uncompressed byte ``offset``.
+
+    Plain segments seek directly; compressed segments jump to the gzip member
+    containing ``offset`` via the block table and skip within that block only.
+    """
+    if not segment.compressed:
+        f = open(segment.path, "rb")
+        f.seek(offset)
+        return f
+    table = _read_block_table(segment.path)
+    if not table:
+        f = gzip.open(segment.path, "rb")
+        f.seek(offset) # No block table: decompress from the start
+        return f
+    block = min(offset // COMPRESS_BLOCK_SIZE, len(table) - 1)
+    raw = open(segment.path, "rb")
+    raw.seek(table[block])
+    f = gzip.GzipFile(fileobj=raw, mode="rb")
+    f.seek(offset - block * COMPRESS_BLOCK_SIZE)
+    f.myfileobj = raw # Closed together with the GzipFile
+    return f
+
+
+def compress_segment(path: str) -> str:
+    """Gzips a sealed segment block by block next to itself and removes the plain file."""
+    target = path + ".gz"
+    tmp = target + ".tmp"
+    table = array("Q")
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        while True:
+            block = src.read(COMPRESS_BLOCK_SIZE)
+            if not block:
+                break
+            table.append(dst.tell())
+            dst.write(gzip.compress(block, compresslevel=6, mtime=0))
+    with open(sidecar_path(path, ".blocks"), "wb") as f:
+        f.write(table.tobytes())
+    os.replace(tmp, target)
+    os.unlink(path)
+    return target
+
+
+def apply_retention(active_path: str, policy: SegmentPolicy, now: Optional[float] = None) -> List[str]:
+    """Deletes the oldest sealed segments that exceed the retention limits."""
+    now = time.time() if now is None else now
+    sealed = list_segments(active_path, include_active=False)
+    sizes = []
+    for segment in sealed:
+        try:
+            st = os.stat(segment.path)
+            sizes.append((segment, st.st_size, st.st_mtime))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in sizes)
+    deleted = []
+    for index, (segment, size, mtime) in enumerate(sizes):
+        remaining = len(sizes) - index
+        too_many = policy.retain_segments > 0 and remaining > policy.retain_segments
+        too_big = policy.retain_bytes > 0 and total > policy.retain_bytes
+        too_old = policy.retain_age > 0 and now - mtime > policy.retain_age
+        if not (too_many or too_big or too_old):
+            break
+        try:
+            os.unlink(segment.path)
+            deleted.append(segment.path)
+        except FileNotFoundError:
+            pass
+        remove_sidecars(segment.path)
+        total -= size
+    return deleted
+
+
+class SegmentMaintainer:
+    """Background thread that compresses sealed segments and enforces retention.
+
+    With several processes maintaining the same log, ``lock`` (a ``FileLock``)
+    serializes their maintenance passes.
+    """
+
+    def __init__(self, active_path: str, policy: SegmentPolicy, lock=None):
+        self.active_path = active_path
+        self.policy = policy
+        self.lock = lock
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # Pick up segments sealed (but not compressed) before a restart or crash
+        for segment in list_segments(self.active_path, include_active=False):
+            if not segment.compressed:
+                self._queue.put(segment.path)
+        self._queue.put(None) # Retention pass even if nothing needs compressing
+        self._thread = threading.Thread(target=self._run, name="telemetry-segments", daemon=True)
+        self._thread.start()
+
+    def sealed(self, path: str) -> None:
+        """Schedules maintenance for a segment the writer just sealed."""
+        self._queue.put(path)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            path = self._queue.get()
+            if path is _STOP:
+                break
+            try:
+                with self.lock or nullcontext():
+                    if path is not None and self.policy.compress and os.path.exists(path):
+                        compress_segment(path)
+                    apply_retention(self.active_path, self.policy)
+            except OSError as e:
+                logger.error("Telemetry segment maintenance failed for '%s': %s", path, e)
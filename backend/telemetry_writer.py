@@ -0,0 +1,295 @@
+"""Group-commit writer for the telemetry log.
+
+A single background thread owns one long-lived append handle. Request
+handlers hand it pre-encoded NDJSON lines through a bounded queue and (by
+default) wait until their batch has been written, so a ``200`` still means the
+event is in the file (``submit_async`` gives async handlers the same guarantee
+without tying up a thread while they wait). Everything queued while a batch is being written goes
+out together in the next ``write()`` call. With a ``TelemetryIndex`` the writer
+also records where each line landed right after writing it. With a ``SegmentPolicy`` the writer
+also rolls the log over between batches (see ``telemetry_segments``), so no
+event can be split across, lost from or duplicated in two segments.
+
+In multi-worker mode every server process runs its own writer on the same
+log. Each batch is then written while holding a ``FileLock`` shared by all of
+them, and a rollover bumps the lock's generation so the other writers reopen
+the new active segment instead of appending to the one just sealed.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from typing import Iterable, List, Literal, Optional
+
+from backend.file_lock import FileLock
+from backend.pending_write import PendingWrite, fail_unsettled
+from backend.telemetry_index import IndexEntry, TelemetryIndex
+from backend.telemetry_segments import (
+    SegmentMaintainer,
+    SegmentPolicy,
+    next_segment_seq,
+    record_segment_seq,
+    sealed_segment_path,
+)
+
+logger = logging.getLogger(__name__)
+
+Durability = Literal["none", "batch", "event"]
+
+_STOP = object()
+
+
+class TelemetryWriteError(OSError):
+    """Raised to submitters whose batch could not be written."""
+
+
+class _Pending(PendingWrite):
+    __slots__ = ("data", "entries")
+
+    def __init__(self, data: bytes, entries: Optional[List[IndexEntry]] = None):
+        super().__init__()
+        self.data = data
+        self.entries = entries
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+class TelemetryWriter:
+    """Appends lines to ``path`` in batches from a background thread.
+
+    ``max_batch`` caps the number of queued submissions written per syscall and
+    ``max_delay`` is how long (seconds) the writer lingers for more submissions
+    after the first one arrives; ``0`` writes whatever is already queued.
+    ``durability`` selects no fsync, one fsync per batch, or one per event.
+    ``file_lock`` is held around every batch when other processes write to
+    the same log (``maintenance_lock`` around segment compression/retention).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_batch: int = 512,
+        max_delay: float = 0.0,
+        queue_size: int = 10000,
+        durability: Durability = "none",
+        policy: Optional[SegmentPolicy] = None,
+        index: Optional[TelemetryIndex] = None,
+        file_lock: Optional[FileLock] = None,
+        maintenance_lock: Optional[FileLock] = None,
+    ):
+        if durability not in ("none", "batch", "event"):
+            raise ValueError(f"Unknown telemetry durability level: {durability!r}")
+        self.path = path
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self.durability = durability
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._state_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._fd: Optional[int] = None
+        self._fd_generation = 0
+        self._segment_size = 0
+        self._segment_opened = 0.0
+        self.file_lock = file_lock
+        self.policy = policy or SegmentPolicy()
+        self._maintainer = SegmentMaintainer(path, self.policy, maintenance_lock) if self.policy.rotates else None
+        self.index = index
+        self.batches_written = 0
+        self.bytes_written = 0
+        self.segments_sealed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        with self._state_lock:
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        if self._thread is None:
+            if self._maintainer is not None:
+                self._maintainer.start()
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, data: bytes, wait: bool = True, entries: Optional[List[IndexEntry]] = None) -> None:
+        """Queues ``data`` (one or more complete lines) for appending.
+
+        With ``wait`` the call returns once the data has been written according
+        to the durability level, and re-raises the ``OSError`` of a failed write.
+        ``entries`` describe the lines for the index; without them the index
+        parses the lines itself.
+        """
+        pending = _Pending(data, entries)
+        self._enqueue(pending, block=True)
+        if wait:
+            pending.wait()
+
+    async def submit_async(self, data: bytes, entries: Optional[List[IndexEntry]] = None) -> None:
+        """Awaitable ``submit(wait=True)``: the event loop keeps running while the batch is written."""
+        await _Pending(data, entries).wait_async(self._enqueue)
+
+    def _enqueue(self, pending: _Pending, block: bool) -> bool:
+        with self._state_lock:
+            if self._closed:
+                raise TelemetryWriteError(f"Telemetry writer for '{self.path}' is closed")
+            self._start_locked()
+            try:
+                self._queue.put(pending, block=block) # Blocks when the queue is full (backpressure)
+            except queue.Full:
+                return False
+        return True
+
+    def submit_many(self, lines: Iterable[bytes], wait: bool = True, entries: Optional[List[IndexEntry]] = None) -> None:
+        """Queues several lines as one submission so they land in one write."""
+        self.submit(b"".join(lines), wait=wait, entries=entries)
+
+    def flush(self) -> None:
+        """Blocks until everything submitted so far has been written."""
+        self.submit(b"", wait=True)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Writes all queued events, then stops the thread and closes the file."""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+        if self.index is not None:
+            self.index.close()
+        if self._maintainer is not None:
+            self._maintainer.close(timeout)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[_Pending] = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._commit(batch)
+            except Exception as e: # Not an I/O error: fail this batch, keep the thread (and later batches) alive
+                logger.exception("Telemetry writer for '%s' failed a batch", self.path)
+                self._close_fd()
+                fail_unsettled(batch, TelemetryWriteError(f"Could not write telemetry to '{self.path}': {e!r}"))
+        self._close_fd()
+
+    def _open(self) -> int:
+        if self.file_lock is not None and self._fd is not None:
+            if self.file_lock.generation != self._fd_generation:
+                self._close_fd() # Another worker rolled the log over: our fd points at a sealed segment
+            else:
+                self._segment_size = os.fstat(self._fd).st_size # Includes the other workers' appends
+        if self._fd is None:
+            flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0)
+            if self.file_lock is not None:
+                self._fd_generation = self.file_lock.generation
+            self._fd = os.open(self.path, flags, 0o644)
+            self._segment_size = os.fstat(self._fd).st_size
+            self._segment_opened = time.time()
+        return self._fd
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self._maintainer is None or self._segment_size == 0:
+            return False
+        policy = self.policy
+        if policy.max_bytes > 0 and self._segment_size + incoming > policy.max_bytes:
+            return True
+        return policy.max_age > 0 and time.time() - self._segment_opened >= policy.max_age
+
+    def _rotate(self) -> None:
+        """Seals the active segment. Runs on the writer thread, between batches."""
+        self._close_fd()
+        seq = next_segment_seq(self.path)
+        sealed = sealed_segment_path(self.path, seq)
+        os.rename(self.path, sealed)
+        if self.file_lock is not None:
+            self.file_lock.bump()
+        record_segment_seq(self.path, seq)
+        if self.index is not None:
+            self.index.sealed(sealed)
+        self.segments_sealed += 1
+        self._maintainer.sealed(sealed)
+
+    def _write(self, fd: int, data: bytes):
+        """Appends ``data``, rolling the segment over first if needed; returns (fd, offset written at)."""
+        if self._should_rotate(len(data)):
+            self._rotate()
+            fd = self._open()
+        _write_all(fd, data)
+        # Ask the kernel where the data landed: others (e.g. the Tauri shell) may append to the same file
+        self._segment_size = os.lseek(fd, 0, os.SEEK_CUR)
+        self.bytes_written += len(data)
+        return fd, self._segment_size - len(data)
+
+    def _index(self, offset: int, batch: List[_Pending]) -> None:
+        # The events are already written: an index failure must not fail the batch (the index catches up later)
+        try:
+            for pending in batch:
+                if pending.data:
+                    self.index.appended(offset, pending.data, pending.entries)
+                    offset += len(pending.data)
+        except (OSError, ValueError) as e:
+            logger.error("Could not update telemetry index for '%s': %s", self.path, e)
+
+    def _close_fd(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def _commit(self, batch: List[_Pending]) -> None:
+        error: Optional[OSError] = None
+        try:
+            # Hold the index lock across write + index update so queries never see a half-indexed batch
+            # (and the other workers' file lock, so their batches and rollovers can't interleave with ours)
+            with self.index.lock if self.index is not None else nullcontext(), self.file_lock or nullcontext():
+                fd = self._open()
+                if self.durability == "event":
+                    for pending in batch:
+                        if pending.data:
+                            fd, offset = self._write(fd, pending.data)
+                            os.fsync(fd)
+                            if self.index is not None:
+                                self._index(offset, [pending])
+                else:
+                    data = b"".join(pending.data for pending in batch)
+                    if data:
+                        fd, offset = self._write(fd, data)
+                        if self.durability == "batch":
+                            os.fsync(fd)
+                        if self.index is not None:
+                            self._index(offset, batch)
+            self.batches_written += 1
+        except OSError as e:
+            error = e
+            self._close_fd() # Reopen on the next batch
+        for pending in batch:
+            pending.settle(error)
@@ -0,0 +1,94 @@
+"""Benchmark: /health and /preferences latency during a telemetry flood, with and without admission control.
+
+Calls the app in-process through httpx. Each telemetry write is given a
+simulated device latency (``--write-ms``, holding an I/O pool thread like a
+slow disk would), and the preferences cache is off so every read needs an
+I/O thread too. While ``--flood`` concurrent clients post telemetry in a
+loop, one client alternates ``GET /health`` and ``GET /preferences`` and
+records their latency.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_admission [--flood 200] [--probes 200] [--write-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+
+async def _run(app, flood: int, probes: int):
+    statuses = Counter()
+    latencies = {"/health": [], "/preferences": []}
+    measuring = done = False
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def flooder():
+            while not done:
+                resp = await client.post("/telemetry", json={"event": "flood", "details": {"step": 1}})
+                if measuring:
+                    statuses[resp.status_code] += 1
+
+        tasks = [asyncio.ensure_future(flooder()) for _ in range(flood)]
+        await asyncio.sleep(0.5) # Let the flood build up
+        measuring, start = True, time.perf_counter()
+        for i in range(probes):
+            path = "/health" if i % 2 == 0 else "/preferences"
+            t = time.perf_counter()
+            resp = await client.get(path)
+            latencies[path].append(time.perf_counter() - t)
+            assert resp.status_code == 200, resp.status_code
+        elapsed = time.perf_counter() - start
+        measuring = False
+        done = True
+        await asyncio.gather(*tasks)
+    return latencies, statuses, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flood", type=int, default=200, help="concurrent telemetry clients")
+    parser.add_argument("--probes", type=int, default=200, help="high-priority requests measured")
+    parser.add_argument("--write-ms", type=float, default=20, help="simulated latency of each telemetry write")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "preferences.json"), "w") as f:
+            json.dump({"telemetry": True, "theme": "dark"}, f)
+
+        print(f"{'admission':<11}{'route':<14}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}   telemetry responses/s")
+        for admission in (False, True):
+            settings = Settings(
+                preferences_dir=tmp, log_dir=tmp, preferences_cache=False,
+                telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: the flood reaches admission control
+                admission_capacity=Settings.admission_capacity if admission else 0,
+            )
+            app = create_app(settings)
+            backend = app.state.backend
+
+            async def slow_append(data, entries):
+                await backend.io_executor.run(time.sleep, args.write_ms / 1000)
+
+            backend.storage.append_telemetry_async = slow_append
+            latencies, statuses, elapsed = asyncio.run(_run(app, args.flood, args.probes))
+            backend.close()
+            backend.io_executor.shutdown()
+            rates = ", ".join(f"{status}: {count / elapsed:.0f}" for status, count in sorted(statuses.items()))
+            for path, samples in latencies.items():
+                samples.sort()
+                p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+                print(f"{'on' if admission else 'off':<11}{path:<14}{statistics.median(samples) * 1000:>9.1f}"
+                      f"{p99 * 1000:>9.1f}{samples[-1] * 1000:>9.1f}   {rates if path == '/health' else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Load and latency benchmark for the backend API, with a stored baseline.
+
+Runs each scenario against the FastAPI app in-process (httpx ASGI transport)
+and/or against a real uvicorn server on localhost, at every requested
+concurrency level and payload size, and reports p50/p95/p99 latency and
+requests per second. Results are written as JSON; with ``--baseline`` they
+are compared against a stored run and the script exits non-zero when any
+scenario's throughput drops or p99 latency grows by more than ``--tolerance``.
+
+Scenarios:
+    health             GET /health
+    preferences_read   GET /preferences
+    preferences_write  POST /preferences
+    telemetry          POST /telemetry with a ``--payload-bytes`` details payload
+    mixed              GET /preferences (``--read-ratio``) and POST /telemetry
+
+Baselines are machine-specific: record one on the machine that runs the
+comparison (``--update-baseline``) before relying on it. ``--runs N`` repeats
+the whole matrix and reports each scenario's median, so a single noisy run
+neither becomes the baseline nor fails the check. A check runs with the
+baseline's ``--requests`` and ``--runs`` unless given, and refuses others.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_api_load [--target asgi|uvicorn|both] [--scenarios health,mixed]
+        [--concurrency 1,16,64] [--payload-bytes 100,10000] [--read-ratio 0.9]
+        [--requests 2000] [--runs 1] [--output results.json]
+        [--baseline benchmarks/baselines/api_load.json] [--tolerance 0.25] [--update-baseline]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List
+
+import httpx
+
+from backend.main import create_app
+from backend.settings import Settings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baselines", "api_load.json")
+SCENARIOS = ("health", "preferences_read", "preferences_write", "telemetry", "mixed")
+PAYLOAD_SCENARIOS = ("telemetry", "mixed")
+
+Request = Callable[[httpx.AsyncClient, int], "asyncio.Future"]
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _make_request(scenario: str, payload_bytes: int, read_ratio: float) -> Request:
+    details = {"step": 1, "blob": "x" * max(0, payload_bytes - 32)}
+
+    def telemetry(client, i):
+        return client.post("/telemetry", json={"event": "bench", "details": details})
+
+    def read(client, i):
+        return client.get("/preferences")
+
+    if scenario == "health":
+        return lambda client, i: client.get("/health")
+    if scenario == "preferences_read":
+        return read
+    if scenario == "preferences_write":
+        return lambda client, i: client.post("/preferences", json={"telemetry": i % 2 == 0, "theme": "dark"})
+    if scenario == "telemetry":
+        return telemetry
+    if scenario == "mixed":
+        rng = random.Random(0) # Same request sequence on every run
+        return lambda client, i: read(client, i) if rng.random() < read_ratio else telemetry(client, i)
+    raise ValueError(f"Unknown scenario: {scenario!r}")
+
+
+async def _run_scenario(client: httpx.AsyncClient, request: Request, requests: int, concurrency: int) -> Dict:
+    for i in range(min(50, requests)): # Warm-up: caches, writer thread, connections
+        await request(client, i)
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            if i >= requests:
+                return
+            start = time.perf_counter()
+            try:
+                resp = await request(client, i)
+                if resp.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1e3, 3),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1e3, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1e3, 3),
+    }
+
+
+@asynccontextmanager
+async def _asgi_client(data_dir: str) -> AsyncIterator[httpx.AsyncClient]:
+    # A fresh app per case; other settings from the environment, like the uvicorn target
+    app = create_app(Settings.from_env(
+        preferences_dir=data_dir, log_dir=data_dir, preferences_file=os.path.join(data_dir, "preferences.json"), telemetry_file=os.path.join(data_dir, "telemetry.log"),
+        telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+    ))
+    backend = app.state.backend
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            yield client
+    finally:
+        backend.close()
+        backend.io_executor.shutdown()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def _uvicorn_server(data_dir: str) -> Iterator[str]:
+    port = _free_port()
+    env = dict(os.environ, PREFERENCES_FILE_PATH=os.path.join(data_dir, "preferences.json"),
+               TELEMETRY_FILE_PATH=os.path.join(data_dir, "telemetry.log"),
+               TELEMETRY_RATE_LIMIT="0", TELEMETRY_EVENT_RATE_LIMIT="0") # Measure the write path, not the governor
+    log = open(os.path.join(data_dir, "uvicorn.log"), "wb") # The app logs every save at INFO
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(base_url + "/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                with open(log.name, "rb") as f:
+                    output = f.read().decode(errors="replace")
+                raise RuntimeError(f"uvicorn did not start on port {port}:\n{output}")
+            time.sleep(0.1)
+        yield base_url
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        log.close()
+
+
+@asynccontextmanager
+async def _http_client(base_url: str, concurrency: int) -> AsyncIterator[httpx.AsyncClient]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        yield client
+
+
+def _scenario_matrix(args) -> List[Dict]:
+    matrix = []
+    for scenario in args.scenarios:
+        for concurrency in args.concurrency:
+            for payload in (args.payload_bytes if scenario in PAYLOAD_SCENARIOS else [0]):
+                matrix.append({"scenario": scenario, "concurrency": concurrency, "payload_bytes": payload})
+    return matrix
+
+
+def _key(target: str, case: Dict) -> str:
+    return f"{target}/{case['scenario']}/c{case['concurrency']}/p{case['payload_bytes']}"
+
+
+def _targets(args) -> List[str]:
+    return ["asgi", "uvicorn"] if args.target == "both" else [args.target]
+
+
+def run(args) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    for target in _targets(args):
+        with ExitStack() as stack:
+            data_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            with open(os.path.join(data_dir, "preferences.json"), "w") as f:
+                json.dump({"telemetry": True, "theme": "dark"}, f)
+            base_url = stack.enter_context(_uvicorn_server(data_dir)) if target == "uvicorn" else None
+            for case in _scenario_matrix(args):
+                request = _make_request(case["scenario"], case["payload_bytes"], args.read_ratio)
+
+                async def measure():
+                    client_cm = _http_client(base_url, case["concurrency"]) if base_url else _asgi_client(data_dir)
+                    async with client_cm as client:
+                        return await _run_scenario(client, request, args.requests, case["concurrency"])
+
+                result = dict(case, target=target, **asyncio.run(measure()))
+                results[_key(target, case)] = result
+                print(f"{_key(target, case):<44}{result['rps']:>10.0f}{result['p50_ms']:>10.2f}"
+                      f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['errors']:>8}", flush=True)
+    return results
+
+
+def median_results(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Per scenario, the median of each metric over ``runs``, plus the range of rps and p99 they spanned."""
+    merged: Dict[str, Dict] = {}
+    for key, first in runs[0].items():
+        samples = [run[key] for run in runs if key in run]
+        merged[key] = dict(first, errors=max(r["errors"] for r in samples), runs=len(samples), **{
+            metric: round(statistics.median(r[metric] for r in samples), 3)
+            for metric in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        })
+        merged[key].update(
+            rps_min=min(r["rps"] for r in samples), rps_max=max(r["rps"] for r in samples),
+            p99_min_ms=min(r["p99_ms"] for r in samples), p99_max_ms=max(r["p99_ms"] for r in samples),
+        )
+    return merged
+
+
+def _spread(result: Dict, metric: str, low: str, high: str) -> float:
+    """Range of ``metric`` over the runs, relative to its median (0 for a single run)."""
+    return (result.get(high, result[metric]) - result.get(low, result[metric])) / result[metric]
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Returns one message per regression beyond ``tolerance`` (a fraction), median against median.
+
+    Results from ``--runs`` also hold the range their runs spanned. Where the
+    baseline's or the new range, relative to its median, is wider than
+    ``tolerance``, the scenario's tolerance widens to match: a smaller change
+    is within the noise.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        rps_tolerance = max(tolerance, *(_spread(r, "rps", "rps_min", "rps_max") for r in (base, result)))
+        p99_tolerance = max(tolerance, *(_spread(r, "p99_ms", "p99_min_ms", "p99_max_ms") for r in (base, result)))
+        if result["rps"] < base["rps"] * (1 - rps_tolerance):
+            regressions.append(f"{key}: throughput {result['rps']:.0f} rps vs baseline {base['rps']:.0f} rps (tolerance {rps_tolerance:.0%})")
+        if result["p99_ms"] > base["p99_ms"] * (1 + p99_tolerance):
+            regressions.append(f"{key}: p99 {result['p99_ms']:.2f} ms vs baseline {base['p99_ms']:.2f} ms (tolerance {p99_tolerance:.0%})")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{key}: {result['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def mismatches(args, baseline: Dict) -> List[str]:
+    """What makes a run with ``args`` not comparable with ``baseline`` (a stored report)."""
+    problems = [
+        f"--{name} {getattr(args, name)} vs {baseline['meta'].get(name, 1)} in the baseline"
+        for name in ("requests", "runs") if getattr(args, name) != baseline["meta"].get(name, 1)
+    ]
+    keys = {_key(target, case) for target in _targets(args) for case in _scenario_matrix(args)}
+    if not keys & set(baseline["results"]):
+        problems.append("no scenario, concurrency and payload size in common with the baseline")
+    return problems
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["asgi", "uvicorn", "both"], default="both")
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 16, 64])
+    parser.add_argument("--payload-bytes", type=_int_list, default=[100, 10000])
+    parser.add_argument("--read-ratio", type=float, default=0.9, help="share of reads in the mixed scenario")
+    parser.add_argument("--requests", type=int, help="measured requests per scenario (default: the baseline's, else 2000)")
+    parser.add_argument("--runs", type=int, help="repeat the matrix and report each scenario's median (default: the baseline's, else 1)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help=f"compare against a stored run (e.g. {os.path.relpath(DEFAULT_BASELINE, REPO_ROOT)})")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed rps drop / p99 growth (fraction)")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario!r} (choose from {', '.join(SCENARIOS)})")
+    baseline = None
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    defaults = baseline["meta"] if baseline else {}
+    if args.requests is None:
+        args.requests = defaults.get("requests", 2000)
+    if args.runs is None:
+        args.runs = defaults.get("runs", 1)
+    problems = mismatches(args, baseline) if baseline is not None else []
+    if problems:
+        parser.error(f"not comparable with {args.baseline}: {'; '.join(problems)}")
+
+    print(f"{'scenario':<44}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    runs = []
+    for n in range(args.runs):
+        if args.runs > 1:
+            print(f"run {n + 1} of {args.runs}", flush=True)
+        runs.append(run(args))
+    results = median_results(runs) if args.runs > 1 else runs[0]
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "requests": args.requests, "runs": args.runs},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+    elif baseline is not None:
+        unmatched = sorted(set(results) - set(baseline["results"]))
+        if unmatched:
+            print(f"\nNot in the baseline, not checked: {', '.join(unmatched)}", file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\nPERFORMANCE REGRESSION ({len(regressions)} beyond the tolerance):", file=sys.stderr)
+            for message in regressions:
+                print(f"  {message}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}, or the runs' spread where wider).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark: many isolated apps in one process, built by ``create_app``.
+
+Builds ``--apps`` apps, each with its own data directory, and reports what
+building one costs. Then ``--clients`` concurrent clients per app post
+telemetry and save preferences against all of them at once, through the
+in-process ASGI transport. At the end every app's log must hold exactly its
+own events and its preferences file the value only it saves. Any state shared
+between the instances would show up here as mixed data.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_app_instances [--apps 32] [--clients 4] [--events 200]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+
+def _preferences(n: int) -> dict:
+    return {"telemetry": n % 4 < 2, "theme": ("light", "dark")[n % 2]} # Differs between neighbouring apps
+
+
+async def _drive(app, n: int, clients: int, events: int) -> None:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker(c):
+            for i in range(events):
+                resp = await client.post("/telemetry", json={"event": f"app_{n}", "details": {"client": c, "i": i}})
+                assert resp.status_code == 200
+            resp = await client.post("/preferences", json=_preferences(n))
+            assert resp.status_code == 200
+
+        await asyncio.gather(*(worker(c) for c in range(clients)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", type=int, default=32)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients per app")
+    parser.add_argument("--events", type=int, default=200, help="telemetry events per client")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dirs = [os.path.join(tmp, f"app{n}") for n in range(args.apps)]
+        start = time.perf_counter()
+        apps = [
+            create_app(Settings(
+                preferences_dir=d, log_dir=d, io_threads=2,
+                telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+            ))
+            for d in dirs
+        ]
+        built = time.perf_counter() - start
+
+        async def run_all():
+            await asyncio.gather(*(_drive(app, n, args.clients, args.events) for n, app in enumerate(apps)))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
+        for app in apps:
+            app.state.backend.close()
+            app.state.backend.io_executor.shutdown()
+
+        for n, d in enumerate(dirs):
+            with open(os.path.join(d, "telemetry.log"), "rb") as f:
+                events = [json.loads(line)["event"] for line in f]
+            if events != [f"app_{n}"] * (args.clients * args.events):
+                raise SystemExit(f"app {n}: its log holds {len(events)} events, not only its own {args.clients * args.events}")
+            with open(os.path.join(d, "preferences.json")) as f:
+                if json.load(f) != _preferences(n):
+                    raise SystemExit(f"app {n}: preferences written by another app")
+
+    total = args.apps * args.clients * args.events
+    print(f"{args.apps} apps built in {built * 1000:.1f} ms ({built / args.apps * 1000:.2f} ms each)")
+    print(f"{total} events and {args.apps * args.clients} preference saves across all apps at once: "
+          f"{elapsed:.2f} s, {total / elapsed:.0f} events/s; every app kept only its own data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Load test: /health and GET /preferences latency while POST /telemetry is saturated.
+
+Probes request /health and GET /preferences back to back, first on an idle
+app and then while ``--flooders`` clients post telemetry events as fast as the
+writer accepts them. With the async handlers the probes' p99 should stay close
+to the idle numbers. ``--durability event`` (one fsync per event) makes the
+telemetry writes slow, which is the case that used to pin the threadpool.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_async_latency [--probes 2000] [--flooders 200] [--durability event]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _probe(client: AsyncClient, probes: int) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = {"/health": [], "/preferences": []}
+    for _ in range(probes):
+        for path, samples in latencies.items():
+            start = time.perf_counter()
+            resp = await client.get(path)
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200
+    return latencies
+
+
+async def _run(app, probes: int, flooders: int) -> Dict[str, List[float]]:
+    stop = asyncio.Event()
+    posted = 0
+
+    async def flood(client: AsyncClient):
+        nonlocal posted
+        while not stop.is_set():
+            resp = await client.post("/telemetry", json={"event": "flood", "details": {"n": posted}})
+            assert resp.status_code == 200
+            posted += 1
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        tasks = [asyncio.create_task(flood(client)) for _ in range(flooders)]
+        await asyncio.sleep(0.2 if flooders else 0) # Let the flood build up
+        try:
+            latencies = await _probe(client, probes)
+        finally:
+            stop.set()
+            await asyncio.gather(*tasks)
+    if flooders:
+        print(f"  ({posted} telemetry events posted during the run)")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--probes", type=int, default=2000, help="requests per probed endpoint")
+    parser.add_argument("--flooders", type=int, default=200, help="concurrent telemetry clients")
+    parser.add_argument("--durability", choices=["none", "batch", "event"], default="event")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(Settings(
+            preferences_dir=tmp, log_dir=tmp, telemetry_durability=args.durability,
+            telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+        ))
+        backend = app.state.backend
+        with open(backend.settings.preferences_file, "w") as f:
+            json.dump({"telemetry": True, "theme": "dark"}, f)
+
+        print(f"{'scenario':<12}{'endpoint':<16}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, flooders in (("idle", 0), ("flooded", args.flooders)):
+            latencies = asyncio.run(_run(app, args.probes, flooders))
+            for path, samples in latencies.items():
+                print(f"{name:<12}{path:<16}{statistics.median(samples) * 1e3:>10.2f}"
+                      f"{_percentile(samples, 0.99) * 1e3:>10.2f}{max(samples) * 1e3:>10.2f}")
+        backend.close()
+        backend.io_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark: cold start of the backend process until /health and /ready answer.
+
+Starts the backend repeatedly and measures, from process spawn, when
+``GET /health`` first returns 200 (what the Tauri shell waits for) and when
+``GET /ready`` does. Compares the lazy entry point (``python backend/main.py``,
+or a frozen ``backend_app`` given with ``--binary``) with the old eager startup,
+which imports the whole app before binding the socket.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_cold_start [--runs 5] [--binary dist/backend_app/backend_app]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EAGER = "import uvicorn, backend.main; uvicorn.run(backend.main.app, host='127.0.0.1', port={port}, log_level='warning')"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(port: int, path: str) -> Optional[int]:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        conn.request("GET", path)
+        return conn.getresponse().status
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def _wait_for(port: int, path: str, start: float, proc: subprocess.Popen, timeout: float = 60) -> float:
+    while time.perf_counter() - start < timeout:
+        if _status(port, path) == 200:
+            return time.perf_counter() - start
+        if proc.poll() is not None:
+            raise RuntimeError(f"backend exited with status {proc.returncode}")
+        time.sleep(0.005)
+    raise RuntimeError(f"{path} did not answer within {timeout} s")
+
+
+def _run_once(command: List[str], port: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BACKEND_PORT=str(port),
+                   PREFERENCES_FILE_PATH=os.path.join(tmp, "preferences.json"),
+                   TELEMETRY_FILE_PATH=os.path.join(tmp, "telemetry.log"))
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            health = _wait_for(port, "/health", start, proc)
+            ready = _wait_for(port, "/ready", start, proc)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+    return {"health": health, "ready": ready}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--binary", help="frozen backend_app to measure instead of python backend/main.py")
+    args = parser.parse_args()
+
+    lazy = [args.binary] if args.binary else [sys.executable, os.path.join("backend", "main.py")]
+    entries = [("lazy (entry point)", lambda port: lazy)]
+    if not args.binary:
+        entries.insert(0, ("eager (old startup)", lambda port: [sys.executable, "-c", EAGER.format(port=port)]))
+
+    print(f"{'startup':<22}{'health ms':>12}{'ready ms':>12}   (median of {args.runs}, from spawn)")
+    for name, command in entries:
+        runs = []
+        for _ in range(args.runs):
+            port = _free_port()
+            runs.append(_run_once(command(port), port))
+        health = statistics.median(r["health"] for r in runs)
+        ready = statistics.median(r["ready"] for r in runs)
+        print(f"{name:<22}{health * 1e3:>12.0f}{ready * 1e3:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Benchmark: request-path cost of logging, synchronous handler vs queue pipeline.
+
+"before" is the previous setup: ``logging.basicConfig`` with a
+``StreamHandler``, where each call formats its f-string message and writes
+it on the caller's thread. Here stderr is a file in a temporary directory; a
+terminal or a pipe to the Tauri shell is slower. "after" is ``LogPipeline``
+with ``%``-style arguments: the caller creates and enqueues the record, and
+the listener thread formats and writes it to the rotating log file (and
+stderr, also a file here).
+
+Reported per call, as CPU time of the calling thread:
+
+* an INFO record like ``Preferences saved to '...'``;
+* an ERROR record with an exception attached;
+* a DEBUG record below the configured level (f-string vs ``%``-style);
+* the median latency of ``POST /preferences`` through the bare ASGI app,
+  which logs one INFO record per save. It is measured with stderr as a plain
+  file and as a slow sink (``--slow-sink-ms`` per write, like a pipe the
+  reader drains slowly). The two setups alternate in rounds to cancel out
+  drift.
+
+With the slow sink, the report also gives the time ``stop()`` took to drain
+the queue at shutdown. That work is off the request path but not free.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_logging [--records 20000] [--requests 1000] [--rounds 4] [--slow-sink-ms 2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from backend.log_pipeline import LogPipeline, output_handlers
+from backend.main import create_app
+from backend.settings import Settings
+
+PATH = "/home/user/.local/share/OpenWebUIOnboarding/preferences.json"
+
+
+def _per_call(log: Callable[[int], None], records: int) -> float:
+    # CPU time of this thread only: on a busy or single-core machine the listener thread's work
+    # would otherwise show up in the caller's wall-clock time although the caller never waits for it
+    start = time.thread_time()
+    for i in range(records):
+        log(i)
+    return (time.thread_time() - start) / records
+
+
+def _calls(logger: logging.Logger, records: int, lazy: bool) -> dict:
+    try:
+        raise OSError(28, "No space left on device")
+    except OSError as e:
+        error = e
+    if lazy:
+        info = lambda i: logger.info("Preferences saved to '%s'", PATH)
+        err = lambda i: logger.error("Error writing to telemetry log '%s': %s", PATH, error, exc_info=error)
+        debug = lambda i: logger.debug("Loaded %d bytes from '%s'", i, PATH)
+    else:
+        info = lambda i: logger.info(f"Preferences saved to '{PATH}'")
+        err = lambda i: logger.error(f"Error writing to telemetry log '{PATH}': {error}", exc_info=error)
+        debug = lambda i: logger.debug(f"Loaded {i} bytes from '{PATH}'")
+    return {"INFO": _per_call(info, records), "ERROR + traceback": _per_call(err, records // 4), "DEBUG (disabled)": _per_call(debug, records)}
+
+
+def _request_latency(app, requests: int) -> float:
+    body = json.dumps({"telemetry": True, "theme": "dark"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/preferences", "raw_path": b"/preferences", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await app(scope, receive, send)
+            samples.append(time.perf_counter() - start)
+        return statistics.median(samples)
+
+    return asyncio.run(run())
+
+
+class _SlowStream:
+    """stderr that takes ``delay`` seconds per write, like a pipe the reader drains slowly or a busy disk."""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def _configure(mode: str, tmp: str, queue_size: int):
+    """Sets up the root logger as before (synchronous handler on stderr) or after (queue pipeline)."""
+    root = logging.getLogger()
+    root.handlers = []
+    if mode == "before":
+        logging.basicConfig(level=logging.INFO, force=True)
+        return None
+    root.setLevel(logging.INFO)
+    pipeline = LogPipeline(output_handlers(os.path.join(tmp, "backend.log")), queue_size=queue_size)
+    pipeline.start()
+    return pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--slow-sink-ms", type=float, default=2.0, help="per-write delay of the slow stderr scenario")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("backend.main")
+    # Room for every record: a dropped record costs the caller less than a queued one
+    queue_size = 2 * args.records + args.requests * args.rounds
+    calls = {}
+    latency = {(mode, sink): [] for mode in ("before", "after") for sink in ("file", "slow")}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(Settings(preferences_dir=tmp, log_dir=tmp))
+        real_stderr, stderr_file = sys.stderr, open(os.path.join(tmp, "stderr"), "w")
+        try:
+            sys.stderr = stderr_file
+            for mode in ("before", "after"):
+                pipeline = _configure(mode, tmp, queue_size)
+                calls[mode] = _calls(logger, args.records, lazy=mode == "after")
+                if pipeline is not None:
+                    pipeline.stop()
+            for round_ in range(args.rounds):
+                for sink in ("file", "slow"):
+                    sys.stderr = _SlowStream(stderr_file, args.slow_sink_ms / 1000 if sink == "slow" else 0)
+                    for mode in (("before", "after") if round_ % 2 == 0 else ("after", "before")):
+                        pipeline = _configure(mode, tmp, queue_size)
+                        latency[mode, sink].append(_request_latency(app, args.requests))
+                        if pipeline is not None:
+                            start = time.perf_counter()
+                            pipeline.stop() # Drains what the slow sink has not written yet
+                            drain = time.perf_counter() - start
+        finally:
+            sys.stderr = real_stderr
+            stderr_file.close()
+            logging.getLogger().handlers = []
+            app.state.backend.close()
+            app.state.backend.io_executor.shutdown()
+
+    print(f"{'caller CPU per call':<42}{'before us':>11}{'after us':>11}")
+    for name in calls["before"]:
+        print(f"{name:<42}{calls['before'][name] * 1e6:>11.2f}{calls['after'][name] * 1e6:>11.2f}")
+    for sink, label in (("file", "stderr to a file"), ("slow", f"stderr {args.slow_sink_ms:g} ms per write")):
+        before, after = (statistics.median(latency[mode, sink]) * 1e6 for mode in ("before", "after"))
+        print(f"{'POST /preferences, ' + label:<42}{before:>11.0f}{after:>11.0f}")
+    print(f"(last slow-sink round: the listener needed {drain * 1000:.0f} ms at shutdown to drain its queue)")
+
+
+if __name__ == "__main__":
+    main()
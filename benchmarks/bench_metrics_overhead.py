@@ -0,0 +1,112 @@
+"""Benchmark: request latency with metrics on vs off.
+
+Measures GET /health, GET /preferences and POST /telemetry end to end through
+an httpx client on the in-process ASGI transport (the cheapest client path;
+over a real socket the relative overhead is smaller still), and the app alone
+by calling it as a bare ASGI callable. "off" is an app built with
+``metrics=False``: no ``MetricsMiddleware`` and a disabled registry, so the
+I/O timers and lock-wait recording are skipped as well. The configurations alternate in rounds to cancel out drift; the
+report gives median latencies and the added latency.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_metrics_overhead [--requests 5000] [--rounds 6]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+
+def _request(method: str, path: str, body: bytes = b""):
+    headers = [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return scope, receive
+
+
+async def _send(message):
+    pass
+
+
+async def _measure_app(app, path: str, method: str, body: bytes, requests: int) -> List[float]:
+    samples = []
+    for _ in range(requests):
+        scope, receive = _request(method, path, body)
+        start = time.perf_counter()
+        await app(scope, receive, _send)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def _measure_client(app, path: str, method: str, body: bytes, requests: int) -> List[float]:
+    samples = []
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.request(method, path, content=body, headers={"content-type": "application/json"})
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint per round")
+    parser.add_argument("--rounds", type=int, default=6)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    endpoints = [
+        ("GET /health", "GET", "/health", b""),
+        ("GET /preferences", "GET", "/preferences", b""),
+        ("POST /telemetry", "POST", "/telemetry", json.dumps({"event": "bench", "details": {"step": 1}}).encode()),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        apps = {}
+        for enabled in (False, True): # One app per setting, each with its own data directory
+            data_dir = os.path.join(tmp, "on" if enabled else "off")
+            os.makedirs(data_dir)
+            with open(os.path.join(data_dir, "preferences.json"), "w") as f:
+                json.dump({"telemetry": True, "theme": "dark"}, f)
+            apps[enabled] = create_app(Settings(
+                preferences_dir=data_dir, log_dir=data_dir, metrics=enabled,
+                telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+            ))
+
+        modes = (("end to end", _measure_client), ("app only", _measure_app))
+        samples = {(mode, name, enabled): [] for mode, _ in modes for name, *_ in endpoints for enabled in (False, True)}
+        for round_ in range(args.rounds):
+            for enabled in ((False, True) if round_ % 2 == 0 else (True, False)):
+                for mode, measure in modes:
+                    for name, method, path, body in endpoints:
+                        samples[mode, name, enabled] += asyncio.run(measure(apps[enabled], path, method, body, args.requests))
+        for app in apps.values():
+            app.state.backend.close()
+            app.state.backend.io_executor.shutdown()
+
+    print(f"{'mode':<12}{'endpoint':<20}{'off us':>10}{'on us':>10}{'added us':>10}{'overhead':>10}")
+    for mode, _ in modes:
+        for name, *_ in endpoints:
+            off = statistics.median(samples[mode, name, False])
+            on = statistics.median(samples[mode, name, True])
+            print(f"{mode:<12}{name:<20}{off * 1e6:>10.1f}{on * 1e6:>10.1f}{(on - off) * 1e6:>10.1f}{(on - off) / off:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
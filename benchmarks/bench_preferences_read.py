@@ -0,0 +1,111 @@
+"""Microbenchmark: GET /preferences throughput under concurrent readers.
+
+Runs 1, 8 and 64 concurrent readers while a single writer keeps saving
+preferences, once with the snapshot cache disabled (every read takes the lock
+and parses the file) and once with it enabled. Two levels are measured:
+``load_preferences()`` called from reader threads, and full GET requests
+through the in-process ASGI app (which includes routing/serialization cost).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_preferences_read [--duration SECONDS]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import Preferences, create_app
+from backend.settings import Settings
+
+READER_COUNTS = (1, 8, 64)
+
+
+def _run_threads(backend, readers: int, duration: float, write_interval: float) -> dict:
+    stop_at = time.perf_counter() + duration
+    counts = [0] * readers
+    writes = 0
+
+    def reader(slot):
+        while time.perf_counter() < stop_at:
+            backend.load_preferences()
+            counts[slot] += 1
+
+    def writer():
+        nonlocal writes
+        while time.perf_counter() < stop_at:
+            theme = "dark" if writes % 2 else "light"
+            backend.save_preferences(Preferences(telemetry=True, theme=theme))
+            writes += 1
+            time.sleep(write_interval)
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"readers": readers, "reads_per_sec": sum(counts) / duration, "writes": writes}
+
+
+async def _run_http(app, readers: int, duration: float, write_interval: float) -> dict:
+    stop_at = time.perf_counter() + duration
+    reads = 0
+    writes = 0
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        async def reader():
+            nonlocal reads
+            while time.perf_counter() < stop_at:
+                resp = await client.get("/preferences")
+                assert resp.status_code == 200
+                reads += 1
+
+        async def writer():
+            nonlocal writes
+            while time.perf_counter() < stop_at:
+                theme = "dark" if writes % 2 else "light"
+                resp = await client.post("/preferences", json={"telemetry": True, "theme": theme})
+                assert resp.status_code == 200
+                writes += 1
+                await asyncio.sleep(write_interval)
+
+        await asyncio.gather(writer(), *(reader() for _ in range(readers)))
+
+    return {"readers": readers, "reads_per_sec": reads / duration, "writes": writes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per scenario")
+    parser.add_argument("--write-interval", type=float, default=0.01, help="seconds between writes")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING) # Keep per-request INFO lines out of the numbers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prefs_path = Path(tmp) / "preferences.json"
+        prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
+
+        print(f"{'level':<10}{'cache':<8}{'readers':>8}{'reads/s':>12}{'writes':>8}")
+        for level in ("function", "http"):
+            for enabled in (False, True):
+                app = create_app(Settings(preferences_dir=tmp, log_dir=tmp, preferences_cache=enabled))
+                backend = app.state.backend
+                for readers in READER_COUNTS:
+                    if level == "function":
+                        result = _run_threads(backend, readers, args.duration, args.write_interval)
+                    else:
+                        result = asyncio.run(_run_http(app, readers, args.duration, args.write_interval))
+                    label = "on" if enabled else "off"
+                    print(f"{level:<10}{label:<8}{readers:>8}{result['reads_per_sec']:>12.0f}{result['writes']:>8}")
+                backend.close()
+                backend.io_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark: sustained preference saves/s vs actual disk writes.
+
+N threads call ``save_preferences()`` back to back for a fixed time, first in
+write-through mode (one atomic write per save) and then with write-behind
+windows of increasing length, which coalesce bursts into one disk write.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_preferences_write [--duration 2] [--threads 8]
+"""
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+
+from backend.main import Backend, Preferences
+from backend.settings import Settings
+
+WINDOWS_MS = (0, 5, 20, 100)
+
+
+def _run(backend, threads: int, duration: float) -> int:
+    stop_at = time.perf_counter() + duration
+    counts = [0] * threads
+
+    def worker(slot):
+        while time.perf_counter() < stop_at:
+            theme = "dark" if counts[slot] % 2 else "light"
+            backend.save_preferences(Preferences(telemetry=True, theme=theme))
+            counts[slot] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'window ms':>10}{'saves/s':>12}{'disk writes':>13}{'saves/write':>13}")
+        for window in WINDOWS_MS:
+            backend = Backend(Settings(preferences_dir=tmp, log_dir=tmp, preferences_write_behind_ms=window))
+            writer = backend.preferences_write_behind
+            saves = _run(backend, args.threads, args.duration)
+            if writer is not None:
+                writer.flush()
+            disk_writes = writer.written if writer is not None else saves
+            with open(backend.settings.preferences_file) as f:
+                json.load(f) # Never torn
+            print(f"{window:>10}{saves / args.duration:>12.0f}{disk_writes:>13}{saves / max(disk_writes, 1):>13.0f}")
+            backend.close()
+            backend.io_executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
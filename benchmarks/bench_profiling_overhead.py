@@ -0,0 +1,105 @@
+"""Benchmark: request latency with per-request profiling off, idle and active.
+
+Calls the app as a bare ASGI callable (GET /preferences and POST /telemetry)
+in three configurations:
+
+* off: ``PROFILING=0``, the middleware is not installed (the default);
+* idle: the middleware is installed but the request is not picked (no
+  header, sample rate 0), the cost every request pays once profiling is on;
+* profiled: every request sends ``X-Debug-Profile: 1`` and is profiled and
+  saved (to a temporary directory).
+
+The configurations alternate in rounds to cancel out drift; the report gives
+median latencies.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_profiling_overhead [--requests 3000] [--rounds 4]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+from backend.main import create_app
+from backend.settings import Settings
+
+MODES = ("off", "idle", "profiled")
+
+
+def _request(method: str, path: str, body: bytes, profile: bool):
+    headers = [(b"host", b"bench"), (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if profile:
+        headers.append((b"x-debug-profile", b"1"))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return scope, receive
+
+
+async def _send(message):
+    pass
+
+
+async def _measure(app, method: str, path: str, body: bytes, requests: int, profile: bool) -> List[float]:
+    samples = []
+    for _ in range(requests):
+        scope, receive = _request(method, path, body, profile)
+        start = time.perf_counter()
+        await app(scope, receive, _send)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000, help="requests per endpoint per round")
+    parser.add_argument("--rounds", type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    endpoints = [
+        ("GET /preferences", "GET", "/preferences", b""),
+        ("POST /telemetry", "POST", "/telemetry", json.dumps({"event": "bench", "details": {"step": 1}}).encode()),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        apps = {}
+        for profiling in (False, True): # "idle" and "profiled" share the app with profiling on
+            data_dir = os.path.join(tmp, "on" if profiling else "off")
+            os.makedirs(data_dir)
+            with open(os.path.join(data_dir, "preferences.json"), "w") as f:
+                json.dump({"telemetry": True, "theme": "dark"}, f)
+            apps[profiling] = create_app(Settings(
+                preferences_dir=data_dir, log_dir=data_dir, profiling=profiling, profile_retain=20,
+                telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+            ))
+
+        samples = {(mode, name): [] for mode in MODES for name, *_ in endpoints}
+        for round_ in range(args.rounds):
+            for mode in (MODES if round_ % 2 == 0 else MODES[::-1]):
+                app = apps[mode != "off"]
+                for name, method, path, body in endpoints:
+                    requests = args.requests if mode != "profiled" else max(1, args.requests // 10)
+                    samples[mode, name] += asyncio.run(_measure(app, method, path, body, requests, mode == "profiled"))
+        for app in apps.values():
+            app.state.backend.close()
+            app.state.backend.io_executor.shutdown()
+
+    print(f"{'endpoint':<20}{'off us':>10}{'idle us':>10}{'added':>8}{'profiled us':>14}")
+    for name, *_ in endpoints:
+        off, idle, profiled = (statistics.median(samples[mode, name]) for mode in MODES)
+        print(f"{name:<20}{off * 1e6:>10.1f}{idle * 1e6:>10.1f}{(idle - off) / off:>8.1%}{profiled * 1e6:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
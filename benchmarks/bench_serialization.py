@@ -0,0 +1,76 @@
+"""Benchmark: telemetry line encoding, old path vs the serialization module.
+
+Compares encode time and peak allocation per event for a small event and one
+with a 100 KB ``details`` payload:
+
+- old: ``json.dumps(data.model_dump() + timestamp)`` then ``str.encode``
+- default layout: ``dumps_spaced`` on the fields (no ``model_dump`` copy)
+- compact: ``dumps_line`` with orjson (if installed) and with the stdlib
+
+Usage (from the repository root):
+    python -m benchmarks.bench_serialization [--iterations 20000]
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+from backend import serialization
+from backend.main import TelemetryData
+
+TIMESTAMP = "2025-01-01T00:00:00+00:00"
+
+
+def _old(data: TelemetryData) -> bytes:
+    record = data.model_dump()
+    record["timestamp"] = TIMESTAMP
+    return (json.dumps(record) + "\n").encode()
+
+
+def _spaced(data: TelemetryData) -> bytes:
+    return serialization.dumps_spaced({"event": data.event, "details": data.details, "timestamp": TIMESTAMP}) + b"\n"
+
+
+def _compact(data: TelemetryData) -> bytes:
+    return serialization.dumps_line({"event": data.event, "details": data.details, "timestamp": TIMESTAMP})
+
+
+def _measure(encode, data: TelemetryData, iterations: int):
+    encode(data)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(data)
+    per_event = (time.perf_counter() - start) / iterations
+    tracemalloc.start()
+    encode(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_event, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000, help="encodes per small event (large: 1/20th)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    payloads = [
+        ("small", TelemetryData(event="wizard_step", details={"step": 3, "action": "next", "ok": True}), args.iterations),
+        ("100 KB", TelemetryData(event="crash_report", details={"trace": "frame\n" * 17000, "n": list(range(50))}), max(1, args.iterations // 20)),
+    ]
+    paths = [("old (model_dump + json.dumps)", "json", _old), ("default layout", "json", _spaced), ("compact (json)", "json", _compact)]
+    if serialization.orjson is not None:
+        paths.append(("compact (orjson)", "orjson", _compact))
+
+    print(f"{'payload':<9}{'path':<32}{'us/event':>10}{'peak KB':>10}")
+    for label, data, iterations in payloads:
+        for name, encoder, encode in paths:
+            serialization.use_encoder(encoder)
+            per_event, peak = _measure(encode, data, iterations)
+            print(f"{label:<9}{name:<32}{per_event * 1e6:>10.2f}{peak / 1024:>10.1f}")
+    serialization.use_encoder("auto")
+
+
+if __name__ == "__main__":
+    main()
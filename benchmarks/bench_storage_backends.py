@@ -0,0 +1,141 @@
+"""Benchmark: file storage vs SQLite storage (write throughput and query latency).
+
+Both backends are driven through the ``StorageBackend`` interface the
+endpoints use. The scenarios are:
+
+* single-event appends from several threads, as concurrent POST /telemetry does;
+* 500-event appends, as POST /telemetry/batch does;
+* ``telemetry_stats`` (whole range, and the last 10% with 10-minute buckets)
+  and ``telemetry_events`` (newest matches of one event type) on the store
+  filled by the write scenarios, reported as p50/p95;
+* preferences saves with ``If-Match`` and uncached loads.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_storage_backends [--events 100000] [--threads 8] [--queries 200]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from backend.main import Backend, FileStorage, Preferences, preferences_codec, preferences_etag
+from backend.settings import Settings
+from backend.sqlite_storage import SqliteStorage
+from backend.telemetry_index import IndexEntry
+
+EVENTS = ("wizard_step", "click", "scroll", "network_check", "preferences_saved", "error")
+T0 = 1_714_000_000.0
+
+
+def _encoded(i: int):
+    ts = T0 + i * 0.01
+    event = EVENTS[i % len(EVENTS)]
+    line = (json.dumps({"event": event, "details": {"step": i % 6, "i": i}, "timestamp": ts}) + "\n").encode()
+    return line, IndexEntry(event, ts, len(line))
+
+
+def _singles(storage, start: int, events: int, threads: int) -> float:
+    def worker(n):
+        for i in range(start + n, start + events, threads):
+            line, entry = _encoded(i)
+            storage.append_telemetry(line, [entry])
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    began = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - began
+
+
+def _batches(storage, start: int, events: int) -> float:
+    began = time.perf_counter()
+    for first in range(start, start + events, 500):
+        encoded = [_encoded(i) for i in range(first, min(first + 500, start + events))]
+        storage.append_telemetry(b"".join(line for line, _ in encoded), [entry for _, entry in encoded])
+    return time.perf_counter() - began
+
+
+def _latencies(fn, n: int):
+    samples = []
+    for _ in range(n):
+        began = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - began)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def _run(storage, args) -> dict:
+    results = {}
+    singles = args.events // 10
+    results["append 1 event x threads"] = singles / _singles(storage, 0, singles, args.threads)
+    results["append 500-event batches"] = args.events / _batches(storage, singles, args.events)
+    total = singles + args.events
+    assert storage.telemetry_stats()["total"] == total, storage.telemetry_stats()["total"]
+    recent = T0 + total * 0.009
+    queries = {
+        "stats, all": lambda: storage.telemetry_stats(),
+        "stats, last 10%, buckets": lambda: storage.telemetry_stats(since=recent, bucket=600),
+        "events, last 10%, 100": lambda: storage.telemetry_events("click", since=recent, limit=100),
+    }
+    for name, query in queries.items():
+        results[name] = _latencies(query, args.queries)
+
+    prefs = [Preferences(telemetry=bool(i % 2), theme="dark") for i in range(2)]
+    storage.save_preferences(prefs[0])
+    began = time.perf_counter()
+    for i in range(1, args.queries + 1):
+        storage.save_preferences(prefs[i % 2], if_match=preferences_etag(prefs[(i - 1) % 2]))
+    results["save preferences (If-Match)"] = args.queries / (time.perf_counter() - began)
+    results["load preferences"] = _latencies(storage.load_preferences, args.queries)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Durability and segment settings from the environment, as for the server
+        settings = Settings.from_env(
+            preferences_dir=tmp, log_dir=tmp, preferences_file=os.path.join(tmp, "preferences.json"),
+            telemetry_file=os.path.join(tmp, "telemetry.log"), storage_backend="files",
+            preferences_cache=False, # Measure the reads, not the snapshot cache
+        )
+        backend = Backend(settings)
+        files = FileStorage(backend)
+        try:
+            results["files"] = _run(files, args)
+        finally:
+            files.close()
+            backend.io_executor.shutdown()
+        sqlite = SqliteStorage(os.path.join(tmp, "backend.db"), preferences_codec, durability=settings.telemetry_durability)
+        try:
+            results["sqlite"] = _run(sqlite, args)
+        finally:
+            sqlite.close()
+
+    print(f"{args.events // 10} single-event + {args.events} batched events, {args.threads} writer threads, "
+          f"durability {settings.telemetry_durability}\n")
+    print(f"{'writes':<30}{'files ev/s':>14}{'sqlite ev/s':>14}")
+    for name in ("append 1 event x threads", "append 500-event batches", "save preferences (If-Match)"):
+        print(f"{name:<30}{results['files'][name]:>14.0f}{results['sqlite'][name]:>14.0f}")
+    print(f"\n{'queries (ms)':<30}{'files p50':>11}{'p95':>9}{'sqlite p50':>12}{'p95':>9}")
+    for name in ("stats, all", "stats, last 10%, buckets", "events, last 10%, 100", "load preferences"):
+        (fp50, fp95), (sp50, sp95) = results["files"][name], results["sqlite"][name]
+        print(f"{name:<30}{fp50 * 1000:>11.2f}{fp95 * 1000:>9.2f}{sp50 * 1000:>12.2f}{sp95 * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Benchmark: bytes and write syscalls with raw telemetry lines vs aggregation mode.
+
+Replays a realistic onboarding event mix through single POST /telemetry calls
+against the in-process ASGI app. The mix is mostly repetitive wizard steps,
+clicks, scrolls and network checks, plus rare errors and completions that stay
+raw. The replay runs once with every event logged as a raw line, and once in
+aggregation mode. For each run it reports the bytes on disk (log plus index
+sidecars) and the write syscalls made by the process (from
+``/proc/self/io``, so Linux only; elsewhere they show as ``n/a``).
+
+The default window is short (1 s), so the replay spans several windows. With
+the production 60 s window, aggregation saves even more.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_aggregation [--events 20000] [--window 1] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+GROUP_BY = ("step", "button", "action", "status")
+RAW_EVENTS = ("error", "onboarding_complete")
+BUTTONS = ("next", "back", "skip", "retry", "download", "theme_dark", "theme_light", "telemetry_toggle")
+
+
+def _event_mix(events: int, seed: int = 1) -> List[dict]:
+    rng = random.Random(seed)
+    sessions = [f"{rng.getrandbits(64):016x}" for _ in range(50)]
+    mix = []
+    for _ in range(events):
+        session, step, roll = rng.choice(sessions), rng.randrange(6), rng.random()
+        if roll < 0.40:
+            details = {"step": step, "action": "next" if rng.random() < 0.9 else "back", "session": session}
+            mix.append({"event": "wizard_step", "details": details})
+        elif roll < 0.75:
+            details = {"step": step, "button": rng.choice(BUTTONS), "x": rng.randrange(1280), "y": rng.randrange(800)}
+            mix.append({"event": "click", "details": details})
+        elif roll < 0.90:
+            mix.append({"event": "scroll", "details": {"step": step, "offset": rng.randrange(4000)}})
+        elif roll < 0.95:
+            details = {"status": "ok" if rng.random() < 0.95 else "fail", "latency_ms": rng.randrange(5, 900)}
+            mix.append({"event": "network_check", "details": details})
+        elif roll < 0.98:
+            details = {"step": step, "message": "Backend download failed", "stack": "Traceback ...\n" * 8}
+            mix.append({"event": "error", "details": details})
+        else:
+            mix.append({"event": "onboarding_complete", "details": {"session": session, "duration_s": rng.randrange(600)}})
+    return mix
+
+
+def _write_syscalls() -> Optional[int]:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("syscw:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _disk_bytes(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+async def _replay(app, mix: List[dict], concurrency: int) -> None:
+    queue = iter(mix)
+
+    async def worker():
+        for record in queue:
+            resp = await client.post("/telemetry", json=record)
+            assert resp.status_code == 200
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def _run(mix: List[dict], concurrency: int, window: Optional[float]):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(Settings(
+            preferences_dir=tmp, log_dir=tmp,
+            telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+            telemetry_aggregate=bool(window), telemetry_aggregate_window_s=window or 60.0,
+            telemetry_aggregate_keys=GROUP_BY, telemetry_raw_events=RAW_EVENTS,
+        ))
+        backend = app.state.backend
+        aggregator = backend.telemetry_aggregator
+        backend.get_telemetry_writer().start()
+        syscalls = _write_syscalls()
+        start = time.perf_counter()
+        asyncio.run(_replay(app, mix, concurrency))
+        backend.close_telemetry_writer() # Includes the last (partial) window
+        elapsed = time.perf_counter() - start
+        if aggregator is not None:
+            aggregator.close()
+        backend.io_executor.shutdown()
+        if syscalls is not None:
+            syscalls = _write_syscalls() - syscalls
+        return _disk_bytes(tmp), syscalls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--window", type=float, default=1.0, help="aggregation window in seconds")
+    parser.add_argument("--concurrency", type=int, default=16, help="in-flight single POSTs")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    mix = _event_mix(args.events)
+    raw_share = sum(r["event"] in RAW_EVENTS for r in mix) / len(mix)
+    print(f"{args.events} events, {raw_share:.1%} allow-listed as raw, window {args.window:g} s\n")
+    print(f"{'mode':<14}{'bytes':>12}{'bytes/event':>13}{'write calls':>13}{'calls/event':>13}{'events/s':>10}")
+    results = {}
+    for name, window in (("raw lines", None), ("aggregated", args.window)):
+        size, syscalls, elapsed = results[name] = _run(mix, args.concurrency, window)
+        calls = f"{syscalls:>13}{syscalls / args.events:>13.3f}" if syscalls is not None else f"{'n/a':>13}{'n/a':>13}"
+        print(f"{name:<14}{size:>12}{size / args.events:>13.1f}{calls}{args.events / elapsed:>10.0f}")
+    (raw_size, raw_calls, _), (agg_size, agg_calls, _) = results["raw lines"], results["aggregated"]
+    print(f"\nbytes written: {raw_size / agg_size:.1f}x fewer", end="")
+    print(f", write syscalls: {raw_calls / max(1, agg_calls):.1f}x fewer" if raw_calls is not None else "")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark: columnar analytics vs a per-line loop over the telemetry log.
+
+Writes a synthetic log of ``--events`` onboarding-style records (step
+changes with a funnel-shaped step distribution, checks with a numeric
+latency, theme changes, completions), then answers three questions:
+
+* counts per event per hour;
+* funnel drop-off across the ``step_changed`` steps, plus completions;
+* p50/p90/p99 of ``details.latency_ms`` of ``network_status_checked``.
+
+"naive" is how this was done before: read the log line by line, parse each
+line (with ``backend.serialization.loads``, i.e. orjson when installed) and
+count in dicts, once per question. "columnar" is ``load_columns``: the first
+load parses every line into NumPy columns and writes the ``.cols.npz``
+cache; later loads read the cache. The answers of both are compared.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_analytics [--events 10000000] [--repeat 5]
+"""
+import argparse
+import logging
+import math
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from backend.serialization import dumps_line, loads
+from backend.telemetry_analytics import load_columns
+from backend.telemetry_index import parse_timestamp
+
+STEPS = ("Welcome", "System Info", "Network", "Preferences", "Download", "Complete")
+HOUR = 3600.0
+
+
+def _write_log(path: str, events: int, start: float) -> None:
+    rng = np.random.default_rng(42)
+    kinds = rng.choice(4, size=events, p=[0.7, 0.15, 0.1, 0.05]).tolist()
+    steps = np.minimum(rng.geometric(0.25, size=events) - 1, len(STEPS) - 1).tolist()
+    latency = np.round(rng.lognormal(4, 0.6, size=events), 1).tolist()
+    with open(path, "wb") as f:
+        chunk = []
+        for i in range(events):
+            kind = kinds[i]
+            if kind == 0:
+                record = {"event": "step_changed", "details": {"step": steps[i], "step_name": STEPS[steps[i]]}}
+            elif kind == 1:
+                record = {"event": "network_status_checked", "details": {"online": i % 50 != 0, "latency_ms": latency[i]}}
+            elif kind == 2:
+                record = {"event": "theme_changed", "details": {"theme": "dark" if i % 3 else "light"}}
+            else:
+                record = {"event": "onboarding_completed", "details": {"final_preferences": {"telemetry": True, "theme": "dark"}}}
+            record["timestamp"] = datetime.fromtimestamp(start + i * 0.05, timezone.utc).isoformat()
+            chunk.append(dumps_line(record))
+            if len(chunk) == 10000:
+                f.write(b"".join(chunk))
+                chunk = []
+        f.write(b"".join(chunk))
+
+
+def _lines(path: str):
+    with open(path, "rb") as f:
+        for line in f:
+            yield loads(line)
+
+
+def naive_counts(path: str) -> dict:
+    counts = {}
+    for record in _lines(path):
+        key = (math.floor(parse_timestamp(record["timestamp"]) / HOUR) * HOUR, record["event"])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def naive_funnel(path: str) -> list:
+    steps, completed = {}, 0
+    for record in _lines(path):
+        if record["event"] == "step_changed":
+            step = record["details"]["step"]
+            steps[step] = steps.get(step, 0) + 1
+        elif record["event"] == "onboarding_completed":
+            completed += 1
+    return [(str(step), float(steps[step])) for step in sorted(steps)] + [("onboarding_completed", float(completed))]
+
+
+def naive_percentiles(path: str) -> list:
+    values = []
+    for record in _lines(path):
+        if record["event"] == "network_status_checked":
+            values.append(record["details"]["latency_ms"])
+    values.sort()
+    return [values[max(0, math.ceil(q / 100 * len(values)) - 1)] for q in (50, 90, 99)]
+
+
+def _columnar_counts(columns) -> dict:
+    starts, matrix = columns.counts_over_time(HOUR)
+    rows, codes = np.nonzero(matrix)
+    return {(starts[r], columns.event_names[c]): int(matrix[r, c]) for r, c in zip(rows.tolist(), codes.tolist())}
+
+
+def _time(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each columnar query (best is reported)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "telemetry.log")
+        _write_log(path, args.events, 1_700_000_000.0)
+        size = os.path.getsize(path)
+
+        naive = {}
+        for name, fn in (("counts", naive_counts), ("funnel", naive_funnel), ("percentiles", naive_percentiles)):
+            naive[name] = _time(lambda: fn(path), 1)
+
+        start = time.perf_counter()
+        load_columns(path)
+        convert = time.perf_counter() - start
+        cache_size = os.path.getsize(path + ".cols.npz")
+        load, columns = _time(lambda: load_columns(path), args.repeat)
+        columnar = {
+            "counts": _time(lambda: _columnar_counts(columns), args.repeat),
+            "funnel": _time(lambda: columns.funnel(final_event="onboarding_completed"), args.repeat),
+            "percentiles": _time(lambda: columns.percentiles("latency_ms", event="network_status_checked")[1], args.repeat),
+        }
+
+    for name in naive:
+        if naive[name][1] != columnar[name][1]:
+            raise SystemExit(f"{name}: columnar answer differs from the per-line loop")
+    print(f"{args.events} events, {size / 1e6:.0f} MB of NDJSON; cache {cache_size / 1e6:.0f} MB")
+    print(f"{'question':<14}{'naive s':>10}{'columnar ms':>14}{'speed-up':>10}")
+    for name in naive:
+        print(f"{name:<14}{naive[name][0]:>10.2f}{columnar[name][0] * 1000:>14.1f}{naive[name][0] / columnar[name][0]:>9.0f}x")
+    naive_total = sum(seconds for seconds, _ in naive.values())
+    queries = sum(seconds for seconds, _ in columnar.values())
+    print(f"first load (parse + write cache): {convert:.2f} s; cached load: {load:.2f} s")
+    print(f"all three questions: naive {naive_total:.2f} s, columnar {convert + queries:.2f} s cold / {load + queries:.2f} s cached")
+
+
+if __name__ == "__main__":
+    main()
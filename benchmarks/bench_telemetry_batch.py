@@ -0,0 +1,87 @@
+"""Benchmark: 10k single POST /telemetry calls vs one 10k-event POST /telemetry/batch.
+
+All requests go through the in-process ASGI app. The batch is sent both as a
+JSON array and as a streamed NDJSON body.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_batch [--events 10000] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from backend.main import create_app
+from backend.settings import Settings
+
+
+def _event(i: int) -> dict:
+    return {"event": "wizard_step", "details": {"step": i % 6, "action": "next"}}
+
+
+async def _singles(client: AsyncClient, events: int, concurrency: int) -> None:
+    queue = iter(range(events))
+
+    async def worker():
+        for i in queue:
+            resp = await client.post("/telemetry", json=_event(i))
+            assert resp.status_code == 200
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def _batch_array(client: AsyncClient, events: int, concurrency: int) -> None:
+    resp = await client.post("/telemetry/batch", json=[_event(i) for i in range(events)])
+    assert resp.json()["accepted"] == events
+
+
+async def _batch_ndjson(client: AsyncClient, events: int, concurrency: int) -> None:
+    async def body():
+        for start in range(0, events, 500):
+            yield "".join(json.dumps(_event(i)) + "\n" for i in range(start, min(start + 500, events))).encode()
+
+    resp = await client.post("/telemetry/batch", content=body(), headers={"Content-Type": "application/x-ndjson"})
+    assert resp.json()["accepted"] == events
+
+
+async def _measure(app, scenario, events: int, concurrency: int) -> float:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        await scenario(client, events, concurrency)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=16, help="in-flight single POSTs")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    scenarios = [
+        ("single POST /telemetry", _singles),
+        ("batch (JSON array)", _batch_array),
+        ("batch (NDJSON stream)", _batch_ndjson),
+    ]
+    print(f"{'scenario':<26}{'seconds':>10}{'events/s':>12}")
+    for name, scenario in scenarios:
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app(Settings(
+                preferences_dir=tmp, log_dir=tmp,
+                telemetry_rate_limit=0, telemetry_event_rate_limit=0, # Unlimited: measure the write path
+            ))
+            elapsed = asyncio.run(_measure(app, scenario, args.events, args.concurrency))
+            app.state.backend.close()
+            app.state.backend.io_executor.shutdown()
+            with open(os.path.join(tmp, "telemetry.log"), "rb") as f:
+                assert f.read().count(b"\n") == args.events
+        print(f"{name:<26}{elapsed:>10.2f}{args.events / elapsed:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark: NDJSON telemetry log vs the binary ``.tlb`` format (size and speed).
+
+Generates a synthetic corpus in the log's own line format. The mix is
+onboarding events with a handful of ``details`` keys, a session id and a
+timestamp a few milliseconds apart. The benchmark then measures:
+
+* size on disk, plain and gzipped (as sealed segments are stored);
+* writing every record from dicts;
+* reading every record back into dicts;
+* scanning ``(event, timestamp)`` only, as index rebuilds and counting do;
+* converting in both directions, checking that the round trip is byte-exact.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_binary [--events 2000000] [--no-gzip]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from backend.serialization import encoder_name, loads
+from backend.telemetry_binary import BinaryLogReader, BinaryLogWriter, binary_to_ndjson, ndjson_to_binary
+from backend.telemetry_index import parse_timestamp
+
+EVENTS = ("wizard_step", "click", "scroll", "network_check", "preferences_saved", "error")
+BUTTONS = ("next", "back", "skip", "retry", "download")
+
+
+def _records(events: int, seed: int = 1):
+    rng = random.Random(seed)
+    sessions = [f"{rng.getrandbits(64):016x}" for _ in range(200)]
+    ts = 1_714_000_000.0
+    for _ in range(events):
+        ts += rng.expovariate(1 / 0.005)
+        event = rng.choice(EVENTS)
+        details = {"step": rng.randrange(6), "session": rng.choice(sessions)}
+        if event == "click":
+            details.update(button=rng.choice(BUTTONS), x=rng.randrange(1280), y=rng.randrange(800))
+        elif event == "network_check":
+            details.update(ok=rng.random() < 0.95, latency_ms=round(rng.uniform(5, 900), 1))
+        elif event == "error":
+            details.update(message="Backend download failed: connection reset", attempt=rng.randrange(1, 4))
+        yield {"event": event, "details": details, "timestamp": datetime.fromtimestamp(ts, timezone.utc).isoformat()}
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def _write_ndjson(path: str, records) -> None:
+    with open(path, "wb") as f:
+        buf = []
+        for record in records:
+            buf.append(json.dumps(record).encode() + b"\n")
+            if len(buf) >= 4096:
+                f.write(b"".join(buf))
+                buf = []
+        f.write(b"".join(buf))
+
+
+def _write_binary(path: str, records) -> None:
+    with open(path, "wb") as f:
+        writer = BinaryLogWriter(f)
+        for record in records:
+            writer.write(record)
+        writer.close()
+
+
+def _read_ndjson(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if loads(line))
+
+
+def _read_binary(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in BinaryLogReader(f))
+
+
+def _scan_ndjson(path: str) -> int:
+    n = 0
+    with open(path, "rb") as f:
+        for line in f:
+            record = loads(line)
+            record["event"], parse_timestamp(record["timestamp"])
+            n += 1
+    return n
+
+
+def _scan_binary(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in BinaryLogReader(f).scan())
+
+
+def _gzip_size(path: str) -> int:
+    with open(path, "rb") as src, gzip.open(path + ".gz", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    size = os.path.getsize(path + ".gz")
+    os.remove(path + ".gz")
+    return size
+
+
+def _digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _time_writes(ndjson: str, binary: str, n: int):
+    records = list(_records(n)) # Freed on return, before the read scenarios
+    return _timed(lambda: _write_ndjson(ndjson, records))[0], _timed(lambda: _write_binary(binary, records))[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--no-gzip", action="store_true", help="skip the gzipped sizes")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    n = args.events
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ndjson, binary = os.path.join(tmp, "telemetry.log"), os.path.join(tmp, "telemetry.tlb")
+        results = {}
+        results["write"] = _time_writes(ndjson, binary, n)
+        results["read all fields"] = (_timed(lambda: _read_ndjson(ndjson))[0], _timed(lambda: _read_binary(binary))[0])
+        results["scan event + time"] = (_timed(lambda: _scan_ndjson(ndjson))[0], _timed(lambda: _scan_binary(binary))[0])
+
+        converted, restored = os.path.join(tmp, "converted.tlb"), os.path.join(tmp, "restored.log")
+        to_binary = _timed(lambda: ndjson_to_binary(ndjson, converted))[0]
+        to_ndjson = _timed(lambda: binary_to_ndjson(converted, restored))[0]
+        lossless = _digest(restored) == _digest(ndjson)
+
+        sizes = {"plain": (os.path.getsize(ndjson), os.path.getsize(binary))}
+        if not args.no_gzip:
+            sizes["gzip -6"] = (_gzip_size(ndjson), _gzip_size(binary))
+
+    print(f"{n} events, NDJSON parsed with {encoder_name()}\n")
+    print(f"{'size':<20}{'NDJSON MB':>12}{'.tlb MB':>12}{'ratio':>8}{'B/event NDJSON':>16}{'B/event .tlb':>14}")
+    for name, (a, b) in sizes.items():
+        print(f"{name:<20}{a / 1e6:>12.1f}{b / 1e6:>12.1f}{a / b:>7.1f}x{a / n:>16.1f}{b / n:>14.1f}")
+    print(f"\n{'operation':<20}{'NDJSON s':>12}{'.tlb s':>12}{'NDJSON ev/s':>14}{'.tlb ev/s':>12}")
+    for name, (a, b) in results.items():
+        print(f"{name:<20}{a:>12.2f}{b:>12.2f}{n / a:>14.0f}{n / b:>12.0f}")
+    print(f"\nconvert NDJSON -> .tlb {to_binary:.2f} s, .tlb -> NDJSON {to_ndjson:.2f} s, byte-exact round trip: {lossless}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Benchmark: /telemetry/export throughput and peak Python memory vs log size.
+
+Streams synthetic logs of increasing size through ``iter_export`` (plain and
+gzip) and reports MB/s and the tracemalloc peak, which should stay flat.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_export [--sizes-mb 10 50 200]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from backend.telemetry_export import iter_export, plan_export
+
+
+def _write_log(path: str, size_mb: int) -> None:
+    line = (json.dumps({"event": "wizard_step", "details": {"step": 3, "note": "x" * 60}}) + "\n").encode()
+    block = line * (1024 * 1024 // len(line))
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    print(f"{'size MB':>8}{'gzip':>6}{'MB/s':>10}{'peak KB':>10}")
+    for size_mb in args.sizes_mb:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "telemetry.log")
+            _write_log(path, size_mb)
+            for compress in (False, True):
+                tracemalloc.start()
+                start = time.perf_counter()
+                total = sum(len(chunk) for chunk in iter_export(path, plan_export(path).ranges, compress=compress))
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                assert total > 0
+                print(f"{size_mb:>8}{'yes' if compress else 'no':>6}{os.path.getsize(path) / 1e6 / elapsed:>10.0f}{peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
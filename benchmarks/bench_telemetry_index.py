@@ -0,0 +1,88 @@
+"""Benchmark: indexed telemetry queries vs a full scan of the log.
+
+Writes a synthetic log with ``--events`` records across a handful of event
+types (one of them rare), builds the sidecar index from scratch, then times
+``/telemetry/stats``- and ``/telemetry/events``-style lookups against the
+equivalent line-by-line scan.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_index [--events 1000000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from backend.telemetry_index import TelemetryIndex
+
+EVENT_TYPES = ("click", "wizard_step", "theme_toggle", "page_view", "network_check")
+
+
+def _write_log(path: str, events: int, start: float) -> None:
+    with open(path, "wb") as f:
+        chunk = []
+        for i in range(events):
+            event = "rare_error" if i % 10000 == 0 else EVENT_TYPES[i % len(EVENT_TYPES)]
+            ts = datetime.fromtimestamp(start + i * 0.1, timezone.utc).isoformat()
+            chunk.append(json.dumps({"event": event, "details": {"i": i}, "timestamp": ts}) + "\n")
+            if len(chunk) == 10000:
+                f.write("".join(chunk).encode())
+                chunk = []
+        f.write("".join(chunk).encode())
+
+
+def _scan(path: str, event: str, since: float) -> int:
+    matches = 0
+    with open(path, "rb") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["event"] == event and datetime.fromisoformat(record["timestamp"]).timestamp() >= since:
+                matches += 1
+    return matches
+
+
+def _time(fn, repeat: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    start = 1_700_000_000.0
+    since = start + args.events * 0.1 * 0.9 # Last 10% of the time range
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "telemetry.log")
+        _write_log(path, args.events, start)
+        print(f"log: {args.events} events, {os.path.getsize(path) / 1e6:.0f} MB")
+
+        index = TelemetryIndex(path)
+        t0 = time.perf_counter()
+        index.stats()
+        print(f"initial index build: {time.perf_counter() - t0:.2f} s")
+        index.close()
+
+        index = TelemetryIndex(path)
+        t0 = time.perf_counter()
+        index.stats()
+        print(f"index load from sidecars: {time.perf_counter() - t0:.2f} s")
+
+        _, total = index.events("rare_error", since=since)
+        print(f"{'query':<44}{'best ms':>10}")
+        print(f"{'stats (all time)':<44}{_time(index.stats):>10.3f}")
+        print(f"{'stats (since, 1h buckets)':<44}{_time(lambda: index.stats(since, None, 3600)):>10.3f}")
+        print(f"{'events rare_error since (%d matches)' % total:<44}{_time(lambda: index.events('rare_error', since=since)):>10.3f}")
+        print(f"{'events click since, limit 100':<44}{_time(lambda: index.events('click', since=since)):>10.3f}")
+        print(f"{'full scan rare_error since':<44}{_time(lambda: _scan(path, 'rare_error', since), repeat=1):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
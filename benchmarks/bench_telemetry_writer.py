@@ -0,0 +1,85 @@
+"""Benchmark: telemetry events/s, open-append-close per event vs the group-commit writer.
+
+Each scenario runs N submitter threads that each append the same number of
+events, once with the original per-event ``open(..., "a")`` path (with and without an
+fsync per event) and once through ``TelemetryWriter`` with each durability
+level. Note that on tmpfs/RAM disks opening a file is nearly free, so the
+difference shows mostly on real disks and in the fsync scenarios.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_telemetry_writer [--events 20000]
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from backend.telemetry_writer import TelemetryWriter
+
+THREAD_COUNTS = (1, 8, 32)
+LINE = (json.dumps({"event": "wizard_step", "details": {"step": 3, "action": "next"}}) + "\n").encode()
+
+
+def _open_append_close(path: str, fsync: bool = False):
+    def submit():
+        with open(path, "ab") as f:
+            f.write(LINE)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    return submit, lambda: None
+
+
+def _group_commit(path: str, durability: str):
+    writer = TelemetryWriter(path, durability=durability)
+    return (lambda: writer.submit(LINE)), writer.close
+
+
+def _run(factory, threads: int, events: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "telemetry.log")
+        submit, close = factory(path)
+        per_thread = events // threads
+
+        def worker():
+            for _ in range(per_thread):
+                submit()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        close()
+        elapsed = time.perf_counter() - start
+        with open(path, "rb") as f:
+            assert f.read().count(b"\n") == per_thread * threads
+        return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=20000, help="events per scenario")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("open/append/close", _open_append_close),
+        ("open/append/fsync/close", lambda p: _open_append_close(p, fsync=True)),
+    ]
+    for durability in ("none", "batch", "event"):
+        scenarios.append((f"writer fsync={durability}", lambda p, d=durability: _group_commit(p, d)))
+
+    print(f"{'path':<24}{'threads':>8}{'events/s':>12}")
+    for name, factory in scenarios:
+        for threads in THREAD_COUNTS:
+            # fsync-heavy paths are orders of magnitude slower on real disks; keep their runs short
+            events = args.events // 20 if "fsync" in name and not name.endswith("none") else args.events
+            rate = _run(factory, threads, events)
+            print(f"{name:<24}{threads:>8}{rate:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
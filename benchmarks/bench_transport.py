@@ -0,0 +1,147 @@
+"""Benchmark: small /preferences calls over a Unix domain socket vs TCP loopback.
+
+Starts the backend (``python backend/main.py``) once per transport and server
+stack, waits for the handshake file and ``/ready``, then times sequential
+``GET /preferences`` and ``POST /preferences`` calls from a single client. By
+default the client keeps one connection open, as the webview does; with
+``--new-connections`` it connects for every request, which adds the connection
+setup to the cost of each call.
+
+Stacks: ``asyncio+h11`` (pure Python) and ``uvloop+httptools`` (the opt-in fast
+loop and HTTP parser, skipped if they are not installed).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_transport [--requests 1000] [--new-connections]
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STACKS = [("asyncio+h11", "asyncio", "h11"), ("uvloop+httptools", "uvloop", "httptools")]
+BODY = json.dumps({"telemetry": True, "theme": "dark"}).encode()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 5):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def _connect(info: dict) -> http.client.HTTPConnection:
+    if info["transport"] == "unix":
+        return UnixHTTPConnection(info["path"])
+    conn = http.client.HTTPConnection(info["host"], info["port"], timeout=5)
+    conn.connect()
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # As browsers do
+    return conn
+
+
+def _call(conn: http.client.HTTPConnection, method: str) -> None:
+    if method == "GET":
+        conn.request("GET", "/preferences")
+    else:
+        conn.request("POST", "/preferences", body=BODY, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{method} /preferences returned {response.status}")
+
+
+def _start(tmp: str, transport: str, loop: str, http_impl: str):
+    handshake = os.path.join(tmp, "handshake.json")
+    env = dict(os.environ, BACKEND_LOOP=loop, BACKEND_HTTP=http_impl, BACKEND_HANDSHAKE_FILE=handshake,
+               PREFERENCES_FILE_PATH=os.path.join(tmp, "preferences.json"),
+               TELEMETRY_FILE_PATH=os.path.join(tmp, "telemetry.log"),
+               TELEMETRY_RATE_LIMIT="0", TELEMETRY_EVENT_RATE_LIMIT="0")
+    if transport == "uds":
+        env["BACKEND_UDS"] = os.path.join(tmp, "backend.sock")
+    else:
+        env["BACKEND_PORT"] = "0"
+    log = open(os.path.join(tmp, "server.log"), "w")
+    proc = subprocess.Popen([sys.executable, os.path.join("backend", "main.py")], cwd=REPO_ROOT, env=env,
+                            stdout=log, stderr=log)
+    log.close()
+    deadline = time.monotonic() + 60
+    while not os.path.exists(handshake):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError(f"backend did not start ({transport}, {loop}, {http_impl})")
+        time.sleep(0.01)
+    with open(handshake) as f:
+        info = json.load(f)
+    while True:
+        conn = _connect(info)
+        conn.request("GET", "/ready")
+        status = conn.getresponse().status
+        conn.close()
+        if status == 200:
+            return proc, info
+        time.sleep(0.01)
+
+
+def _measure(info: dict, method: str, requests: int, new_connections: bool) -> List[float]:
+    samples = []
+    conn = None if new_connections else _connect(info)
+    for _ in range(requests):
+        start = time.perf_counter()
+        if new_connections:
+            conn = _connect(info)
+        _call(conn, method)
+        if new_connections:
+            conn.close()
+        samples.append(time.perf_counter() - start)
+    if not new_connections:
+        conn.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="timed calls per method and configuration")
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--new-connections", action="store_true", help="open a new connection for every request")
+    args = parser.parse_args()
+
+    stacks = [s for s in STACKS if s[1] == "asyncio" or
+              (importlib.util.find_spec(s[1]) and importlib.util.find_spec(s[2]))]
+    results: Dict[tuple, List[float]] = {}
+    for name, loop, http_impl in stacks:
+        for transport in ("tcp", "uds"):
+            with tempfile.TemporaryDirectory() as tmp:
+                proc, info = _start(tmp, transport, loop, http_impl)
+                try:
+                    for method in ("GET", "POST"):
+                        _measure(info, method, args.warmup, args.new_connections)
+                        results[name, transport, method] = _measure(info, method, args.requests, args.new_connections)
+                finally:
+                    proc.terminate()
+                    proc.wait(10)
+
+    mode = "new connection per request" if args.new_connections else "keep-alive"
+    print(f"{'stack':<18}{'call':<18}{'tcp p50':>9}{'uds p50':>9}{'tcp p99':>9}{'uds p99':>9}{'uds gain':>10}   (us, {mode})")
+    for name, *_ in stacks:
+        for method in ("GET", "POST"):
+            tcp, uds = results[name, "tcp", method], results[name, "uds", method]
+            tcp50, uds50 = statistics.median(tcp), statistics.median(uds)
+            tcp99, uds99 = statistics.quantiles(tcp, n=100)[98], statistics.quantiles(uds, n=100)[98]
+            print(f"{name:<18}{method + ' /preferences':<18}{tcp50 * 1e6:>9.0f}{uds50 * 1e6:>9.0f}"
+                  f"{tcp99 * 1e6:>9.0f}{uds99 * 1e6:>9.0f}{1 - uds50 / tcp50:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,8 @@ pip install -r requirements.txt
 echo "Running PyInstaller..."
 # Adjust PyInstaller options as needed (e.g., --onefile, --name)
 # Outputting to a common dist directory at the project root
-pyinstaller main.py --distpath ../dist --workpath ../build/pyinstaller_backend --specpath . --clean -n backend_app
+# --paths .. lets PyInstaller resolve the backend.* sibling modules imported by main.py
+pyinstaller main.py --paths .. --distpath ../dist --workpath ../build/pyinstaller_backend --specpath . --clean -n backend_app
 
 # Optional: Deactivate virtual environment
 # deactivate
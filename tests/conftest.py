@@ -1,6 +1,9 @@
 import logging
 import pytest
 import os
+from fastapi.testclient import TestClient
+
+from backend.settings import Settings
 
 # Removed problematic setup_environment fixture
 
@@ -19,4 +22,39 @@ def suppress_warnings(caplog):
     with caplog.at_level(logging.WARNING):
         yield caplog
 
+@pytest.fixture
+def make_app(tmp_path):
+    """Builds apps with create_app, each with its own state and its files in tmp_path unless overridden.
+
+    Keyword arguments are Settings fields; the environment is not read, so tests
+    can run in parallel (pytest -n auto). The apps' backends are closed at teardown.
+    """
+    from backend.main import create_app # Not at conftest import: pytest has not set up log capturing yet
+    apps = []
+
+    def make(**overrides):
+        overrides.setdefault("preferences_dir", str(tmp_path))
+        overrides.setdefault("log_dir", str(tmp_path))
+        app = create_app(Settings(**overrides))
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        app.state.backend.close()
+        app.state.backend.io_executor.shutdown()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def backend(app):
+    """The app's Backend: its settings, storage, caches, writer and metrics."""
+    return app.state.backend
+
+@pytest.fixture
+def client(app):
+    return TestClient(app)
+
 # Add any additional fixtures as needed.
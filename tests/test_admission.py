@@ -0,0 +1,95 @@
+import asyncio
+import time
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from backend.admission import ADMITTED, QUEUED, AdmissionController, AdmissionMiddleware, Overloaded, PriorityClass
+from backend.main import request_priority_class
+
+CLASSES = [PriorityClass("high", 0, deadline=1.0), PriorityClass("low", 1, max_concurrent=1, deadline=0.05)]
+
+def test_waiters_are_served_by_priority_and_shed_after_deadline():
+    async def run():
+        controller = AdmissionController(CLASSES, capacity=1)
+        assert await controller.acquire("high") == ADMITTED
+        low = asyncio.ensure_future(controller.acquire("low"))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(controller.acquire("high")) # Queued after low, served before it
+        await asyncio.sleep(0)
+        controller.release("high")
+        assert await high == QUEUED
+        with pytest.raises(Overloaded): # Its 50 ms deadline passes while high holds the only slot
+            await low
+        controller.release("high")
+        assert await controller.acquire("low") == ADMITTED
+        with pytest.raises(Overloaded):
+            await controller.acquire("low")
+        return controller.summary()
+
+    summary = asyncio.run(run())
+    assert summary["low"]["shed"] == 2 and summary["low"]["waiting"] == 0
+
+def test_cancelled_waiter_gives_back_its_slot():
+    async def run():
+        controller = AdmissionController(CLASSES, capacity=1)
+        await controller.acquire("high")
+        waiter = asyncio.ensure_future(controller.acquire("high"))
+        await asyncio.sleep(0)
+        controller.release("high") # Granted to the waiter...
+        waiter.cancel() # ...which is cancelled before it runs
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert await controller.acquire("high") == ADMITTED
+        return controller.summary()
+
+    assert asyncio.run(run())["high"]["active"] == 1
+
+def test_high_priority_routes_meet_latency_target_under_telemetry_flood(monkeypatch, make_app):
+    # Every read takes an I/O pool thread; telemetry is not rate limited
+    app = make_app(preferences_cache=False, telemetry_rate_limit=0, telemetry_event_rate_limit=0)
+    backend = app.state.backend
+
+    async def slow_append(data, entries):
+        await backend.io_executor.run(time.sleep, 0.05) # A slow disk: each write holds an I/O pool thread for 50 ms
+
+    monkeypatch.setattr(backend.storage, 'append_telemetry_async', slow_append)
+    controller = AdmissionController(
+        [
+            PriorityClass("critical", 0), PriorityClass("interactive", 1), PriorityClass("query", 2),
+            PriorityClass("telemetry", 3, max_concurrent=2, deadline=0.3),
+        ],
+        capacity=32,
+    )
+    guarded = AdmissionMiddleware(app, controller, request_priority_class)
+
+    async def run():
+        async with AsyncClient(transport=ASGITransport(app=guarded), base_url="http://test") as client:
+            flood = [asyncio.ensure_future(client.post("/telemetry", json={"event": "flood", "details": {}})) for _ in range(200)]
+            await asyncio.sleep(0.1)
+            latencies = []
+            for _ in range(10):
+                for path in ("/health", "/preferences"):
+                    start = time.perf_counter()
+                    assert (await client.get(path)).status_code == 200
+                    latencies.append(time.perf_counter() - start)
+            statuses = [resp.status_code for resp in await asyncio.gather(*flood)]
+        return latencies, statuses
+
+    latencies, statuses = asyncio.run(run())
+    # Without admission control the 200 writes fill all 8 I/O threads, and a preferences read waits ~1 s behind them
+    assert max(latencies) < 0.25, latencies
+    assert statuses.count(200) >= 2 and statuses.count(503) > 100 # Telemetry queued, then shed past its deadline
+    assert set(statuses) <= {200, 503}
+    assert controller.summary()["telemetry"]["shed"] == statuses.count(503)
+
+def test_shed_response(app):
+    controller = AdmissionController([PriorityClass("critical", 0, max_concurrent=1, deadline=0)])
+
+    async def run():
+        await controller.acquire("critical") # Occupies the only slot
+        async with AsyncClient(transport=ASGITransport(app=AdmissionMiddleware(app, controller, lambda method, path: "critical")), base_url="http://test") as client:
+            return await client.get("/health")
+
+    resp = asyncio.run(run())
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "1"
+    assert "critical" in resp.json()["detail"]
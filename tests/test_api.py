@@ -1,40 +1,18 @@
-import os
+import gc
 import json
-import tempfile
-import shutil
 import pytest
+import weakref
 from fastapi.testclient import TestClient
-from unittest.mock import patch, mock_open
 
-from backend.main import app, PREFERENCES_FILE, TELEMETRY_FILE
-
-client = TestClient(app)
-
-import backend.main # Import the module to monkeypatch
-
-@pytest.fixture(autouse=True)
-def patch_file_paths(monkeypatch, tmp_path):
-    """Patches the file path constants in the main module for test isolation."""
-    test_prefs_path = tmp_path / "preferences.json"
-    test_telemetry_path = tmp_path / "telemetry.log"
-    
+@pytest.fixture
+def client(make_app, tmp_path):
+    """A client of an app of its own, with its files in tmp_path."""
     # Initialize preferences file with defaults for consistent starting state
-    test_prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
-    # Ensure telemetry file exists for tests that might read it initially (though current tests don't)
-    # test_telemetry_path.touch() # Let the API create it
-    
-    monkeypatch.setattr(backend.main, 'PREFERENCES_FILE', str(test_prefs_path))
-    monkeypatch.setattr(backend.main, 'TELEMETRY_FILE', str(test_telemetry_path))
-    
-    # Yield the paths for potential direct use in tests if needed, though patching is preferred
-    yield {
-        "prefs_file": test_prefs_path,
-        "telemetry_file": test_telemetry_path
-    }
-    # No explicit cleanup needed for tmp_path files, pytest handles it.
-    # Monkeypatch automatically reverts changes after the test.
-
-def test_preferences_get_and_post(): # Remove temp_files argument
+    (tmp_path / "preferences.json").write_text(json.dumps({"telemetry": False, "theme": "light"}))
+    # The telemetry log is created by the API
+    return TestClient(make_app())
+
+def test_preferences_get_and_post(client): # Remove temp_files argument
     # Initial GET should return defaults
     resp = client.get("/preferences")
     assert resp.status_code == 200
@@ -54,7 +32,7 @@ def test_preferences_get_and_post(): # Remove temp_files argument
     data = resp.json()
     assert data == new_prefs
 
-def test_onboarding_post(): # Remove temp_files argument
+def test_onboarding_post(client): # Remove temp_files argument
     # POST onboarding data (same schema as preferences)
     onboarding_data = {"telemetry": True, "theme": "dark"}
     resp = client.post("/onboarding", json=onboarding_data)
@@ -66,7 +44,7 @@ def test_onboarding_post(): # Remove temp_files argument
     assert resp.status_code == 200
     assert resp.json() == onboarding_data
 
-def test_telemetry_post(tmp_path): # Add tmp_path argument
+def test_telemetry_post(client, tmp_path): # Add tmp_path argument
     # POST telemetry event
     telemetry = {"event": "test_event", "details": {"foo": "bar"}}
     resp = client.post("/telemetry", json=telemetry)
@@ -74,7 +52,7 @@ def test_telemetry_post(tmp_path): # Add tmp_path argument
     assert resp.json()["status"] in ("received", "logged_with_error")
 
     # Check that the event was logged
-    # Get the patched path (monkeypatch handles this implicitly in main.py, but we need it for assertion)
+    # The app's telemetry log lives in tmp_path
     telemetry_file_path = tmp_path / "telemetry.log" 
     assert telemetry_file_path.exists(), f"Telemetry log file {telemetry_file_path} was not created"
     with open(telemetry_file_path, "r") as f:
@@ -93,7 +71,7 @@ def test_telemetry_post(tmp_path): # Add tmp_path argument
         {"telemetry": False, "theme": "light", "extra": "field"}, # Extra field (FastAPI might ignore this by default)
     ],
 )
-def test_preferences_post_invalid_data(invalid_prefs):
+def test_preferences_post_invalid_data(client, invalid_prefs):
     """Tests POST /preferences with various invalid data payloads."""
     resp = client.post("/preferences", json=invalid_prefs)
     assert resp.status_code == 422  # Unprocessable Entity
@@ -109,7 +87,7 @@ def test_preferences_post_invalid_data(invalid_prefs):
         {},
     ],
 )
-def test_onboarding_post_invalid_data(invalid_data):
+def test_onboarding_post_invalid_data(client, invalid_data):
     """Tests POST /onboarding with various invalid data payloads."""
     resp = client.post("/onboarding", json=invalid_data)
     assert resp.status_code == 422
@@ -125,17 +103,17 @@ def test_onboarding_post_invalid_data(invalid_data):
         {}, # Empty object
     ],
 )
-def test_telemetry_post_invalid_data(invalid_telemetry):
+def test_telemetry_post_invalid_data(client, invalid_telemetry):
     """Tests POST /telemetry with various invalid data payloads."""
     resp = client.post("/telemetry", json=invalid_telemetry)
     assert resp.status_code == 422
 
 # New tests for file I/O errors and edge cases
 
-def test_preferences_get_file_not_found(monkeypatch):
+def test_preferences_get_file_not_found(make_app):
     """Test GET /preferences when preferences file doesn't exist."""
-    # Override the patched path with a non-existent file
-    monkeypatch.setattr(backend.main, 'PREFERENCES_FILE', '/nonexistent/path/preferences.json')
+    # An app whose preferences file doesn't exist
+    client = TestClient(make_app(preferences_file='/nonexistent/path/preferences.json'))
     
     # Should return default preferences
     resp = client.get("/preferences")
@@ -144,13 +122,13 @@ def test_preferences_get_file_not_found(monkeypatch):
     assert data["telemetry"] is False
     assert data["theme"] == "light"
 
-def test_preferences_get_corrupted_file(monkeypatch, tmp_path):
+def test_preferences_get_corrupted_file(make_app, tmp_path):
     """Test GET /preferences when preferences file is corrupted."""
     # Create a corrupted JSON file
     corrupted_file = tmp_path / "corrupted_preferences.json"
     corrupted_file.write_text("{invalid json")
     
-    monkeypatch.setattr(backend.main, 'PREFERENCES_FILE', str(corrupted_file))
+    client = TestClient(make_app(preferences_file=str(corrupted_file)))
     
     # Should return default preferences
     resp = client.get("/preferences")
@@ -159,44 +137,44 @@ def test_preferences_get_corrupted_file(monkeypatch, tmp_path):
     assert data["telemetry"] is False
     assert data["theme"] == "light"
 
-def test_preferences_post_io_error(monkeypatch):
+def test_preferences_post_io_error(make_app):
     """Test POST /preferences when file can't be written."""
     # Set preferences file to a path that can't be written to
-    monkeypatch.setattr(backend.main, 'PREFERENCES_FILE', '/root/forbidden/preferences.json')
+    client = TestClient(make_app(preferences_file='/root/forbidden/preferences.json'))
     
     # Should return 500 Internal Server Error
     resp = client.post("/preferences", json={"telemetry": True, "theme": "dark"})
     assert resp.status_code == 500
     assert resp.json()["detail"].startswith("Could not save preferences:")
 
-def test_onboarding_post_io_error(monkeypatch):
+def test_onboarding_post_io_error(make_app):
     """Test POST /onboarding when file can't be written."""
     # Set preferences file to a path that can't be written to
-    monkeypatch.setattr(backend.main, 'PREFERENCES_FILE', '/root/forbidden/preferences.json')
+    client = TestClient(make_app(preferences_file='/root/forbidden/preferences.json'))
     
     # Should return 500 Internal Server Error
     resp = client.post("/onboarding", json={"telemetry": True, "theme": "dark"})
     assert resp.status_code == 500
     assert resp.json()["detail"].startswith("Could not save preferences:")
 
-def test_telemetry_post_io_error(monkeypatch):
+def test_telemetry_post_io_error(make_app):
     """Test POST /telemetry when file can't be written."""
     # Set telemetry file to a path that can't be written to
-    monkeypatch.setattr(backend.main, 'TELEMETRY_FILE', '/root/forbidden/telemetry.log')
+    client = TestClient(make_app(telemetry_file='/root/forbidden/telemetry.log'))
     
     # Should still return 200 OK with logged_with_error status
     resp = client.post("/telemetry", json={"event": "test_event", "details": {"foo": "bar"}})
     assert resp.status_code == 200
     assert resp.json()["status"] == "logged_with_error"
 
-def test_root_endpoint():
+def test_root_endpoint(client):
     """Test the root endpoint."""
     resp = client.get("/")
     assert resp.status_code == 200
     assert "message" in resp.json()
     assert resp.json()["message"] == "Backend is running"
 
-def test_multiple_telemetry_events(tmp_path):
+def test_multiple_telemetry_events(client, tmp_path):
     """Test submitting multiple telemetry events."""
     # Submit multiple events
     events = [
@@ -222,7 +200,7 @@ def test_multiple_telemetry_events(tmp_path):
         assert f'"event": "{event["event"]}"' in lines[i]
         assert f'"id": {event["details"]["id"]}' in lines[i]
 
-def test_preferences_persistence(tmp_path):
+def test_preferences_persistence(client, tmp_path):
     """Test that preferences are properly persisted to disk."""
     # Initial state
     resp = client.get("/preferences")
@@ -243,3 +221,14 @@ def test_preferences_persistence(tmp_path):
     # Verify via API
     resp = client.get("/preferences")
     assert resp.json() == new_prefs
+
+def test_apps_are_not_kept_alive_after_shutdown(tmp_path):
+    from backend.main import _open_backends, create_app
+    from backend.settings import Settings
+    with TestClient(create_app(Settings(preferences_dir=str(tmp_path), log_dir=str(tmp_path)))) as c:
+        backend = c.app.state.backend
+        assert backend in _open_backends # Closed at exit if the lifespan never shuts it down
+    assert backend not in _open_backends
+    dropped = weakref.ref(create_app(Settings(preferences_dir=str(tmp_path), log_dir=str(tmp_path))).state.backend)
+    gc.collect()
+    assert dropped() is None # Held weakly: a dropped app is freed
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import threading
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from backend.io_executor import IOExecutor, LoopLock
+from backend.telemetry_writer import TelemetryWriter
+
+@pytest.fixture(autouse=True)
+def preferences_file(tmp_path):
+    prefs_path = tmp_path / "preferences.json"
+    prefs_path.write_text(json.dumps({"telemetry": True, "theme": "dark"}))
+    return prefs_path
+
+@pytest.mark.asyncio
+async def test_reads_are_served_while_telemetry_writes_are_stalled(monkeypatch, app, backend, tmp_path):
+    writer = backend.get_telemetry_writer()
+    release = threading.Event()
+    commit = writer._commit
+    def stalled_commit(batch):
+        release.wait(10)
+        commit(batch)
+    monkeypatch.setattr(writer, "_commit", stalled_commit)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        # More in-flight telemetry requests than the default threadpool has threads
+        posts = [asyncio.create_task(ac.post("/telemetry", json={"event": "flood", "details": {"n": i}})) for i in range(100)]
+        await asyncio.sleep(0.1)
+        health = await asyncio.wait_for(ac.get("/health"), 2)
+        prefs = await asyncio.wait_for(ac.get("/preferences"), 2)
+        assert health.status_code == 200
+        assert prefs.json() == {"telemetry": True, "theme": "dark"}
+        assert not any(post.done() for post in posts) # Still waiting for their write
+        release.set()
+        responses = await asyncio.gather(*posts)
+    assert all(r.json() == {"status": "received"} for r in responses)
+    assert len((tmp_path / "telemetry.log").read_bytes().splitlines()) == 100
+
+@pytest.mark.asyncio
+async def test_concurrent_async_saves_are_serialized(app):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        etag = (await ac.get("/preferences")).headers["etag"]
+        responses = await asyncio.gather(*(
+            ac.post("/preferences", json={"telemetry": i % 2 == 0, "theme": "light"}, headers={"If-Match": etag})
+            for i in range(10)
+        ))
+    # Exactly one conditional writer wins; the rest see the changed ETag
+    assert sorted(r.status_code for r in responses) == [200] + [412] * 9
+
+@pytest.mark.asyncio
+async def test_submit_async_raises_write_errors(tmp_path):
+    directory = tmp_path / "is_a_dir"
+    directory.mkdir()
+    writer = TelemetryWriter(str(directory))
+    try:
+        with pytest.raises(IsADirectoryError):
+            await writer.submit_async(b'{"event": "x"}\n')
+    finally:
+        writer.close()
+
+def test_submit_async_waits_for_queue_space(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), queue_size=1)
+    async def submit_all():
+        await asyncio.gather(*(writer.submit_async(b"%d\n" % i) for i in range(50)))
+    asyncio.run(submit_all())
+    writer.close()
+    assert sorted(int(line) for line in path.read_bytes().splitlines()) == list(range(50))
+
+def test_loop_lock_works_across_event_loops():
+    lock = LoopLock()
+    async def use():
+        async with lock:
+            await asyncio.sleep(0)
+        return True
+    assert asyncio.run(use())
+    assert asyncio.run(use()) # A fresh loop must not trip over a lock bound to the old one
+
+def test_io_executor_runs_on_its_own_threads():
+    executor = IOExecutor(2, name="test-io")
+    try:
+        name = asyncio.run(executor.run(lambda: threading.current_thread().name))
+        assert name.startswith("test-io")
+    finally:
+        executor.shutdown()
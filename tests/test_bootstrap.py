@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from httpx import ASGITransport, AsyncClient
+
+from backend.bootstrap import LazyApp, StartupTimer
+
+class FakeApp:
+    """Stands in for backend.main.app: echoes the path and records lifespan events."""
+
+    def __init__(self):
+        self.events = []
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                self.events.append(message["type"])
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        body = f"app:{scope['path']}".encode()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+def _blocking_loader(fake, release):
+    def load(timer):
+        release.wait(5)
+        return fake
+    return load
+
+@pytest.mark.asyncio
+async def test_health_is_served_before_the_app_is_loaded():
+    fake, release = FakeApp(), threading.Event()
+    lazy = LazyApp(loader=_blocking_loader(fake, release))
+    async with AsyncClient(transport=ASGITransport(app=lazy), base_url="http://test") as ac:
+        health = await asyncio.wait_for(ac.get("/health"), 1)
+        assert health.status_code == 200
+        assert health.json() == {"status": "ok"}
+        ready = await ac.get("/ready")
+        assert ready.status_code == 503
+        assert ready.json() == {"status": "starting"}
+        pending = asyncio.ensure_future(ac.get("/preferences"))
+        await asyncio.sleep(0.05)
+        assert not pending.done() # Waits for the app instead of failing
+        release.set()
+        assert (await pending).text == "app:/preferences"
+        # Once loaded, everything (including /health and /ready) goes to the real app
+        assert (await ac.get("/ready")).text == "app:/ready"
+        assert (await ac.get("/health")).text == "app:/health"
+    assert fake.events == ["lifespan.startup"]
+
+@pytest.mark.asyncio
+async def test_lifespan_starts_loading_and_forwards_shutdown():
+    fake, release = FakeApp(), threading.Event()
+    lazy = LazyApp(loader=_blocking_loader(fake, release))
+    messages = asyncio.Queue()
+    sent = []
+    async def send(message):
+        sent.append(message["type"])
+    task = asyncio.ensure_future(lazy({"type": "lifespan"}, messages.get, send))
+    await messages.put({"type": "lifespan.startup"})
+    await asyncio.sleep(0.05)
+    assert sent == ["lifespan.startup.complete"] # Startup does not wait for the import
+    assert lazy.app is None
+    release.set()
+    await messages.put({"type": "lifespan.shutdown"})
+    await asyncio.wait_for(task, 5)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert fake.events == ["lifespan.startup", "lifespan.shutdown"]
+
+def test_startup_timer_records_phases():
+    timer = StartupTimer(enabled=False, start=time.perf_counter())
+    timer.mark("first")
+    started = time.perf_counter()
+    time.sleep(0.01)
+    timer.mark("background", since=started)
+    assert [name for name, _ in timer.phases] == ["first", "background"]
+    assert timer.phases[1][1] >= 0.01
+
+def test_ready_endpoint_reports_deferred_initialization(client):
+    deadline = time.monotonic() + 5
+    resp = client.get("/ready")
+    while resp.status_code == 503 and time.monotonic() < deadline:
+        time.sleep(0.01)
+        resp = client.get("/ready")
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "ready"}
+
+def test_data_directories_are_created_on_first_use(make_app, tmp_path):
+    app = make_app(preferences_dir=str(tmp_path / "data"), log_dir=str(tmp_path / "logs"))
+    assert not (tmp_path / "data").exists()
+    resp = TestClient(app).post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert resp.status_code == 200
+    assert (tmp_path / "data" / "preferences.json").exists()
+    assert (tmp_path / "logs").is_dir()
+
+@pytest.mark.asyncio
+async def test_failed_import_makes_health_and_ready_unavailable():
+    release = threading.Event()
+    def load(timer):
+        release.wait(5)
+        raise ValueError("STORAGE_BACKEND: unknown backend 'bogus'")
+    lazy = LazyApp(loader=load)
+    async with AsyncClient(transport=ASGITransport(app=lazy), base_url="http://test") as ac:
+        assert (await ac.get("/health")).status_code == 200 # Still loading
+        waiting = asyncio.ensure_future(ac.get("/preferences"))
+        await asyncio.sleep(0.05)
+        release.set()
+        failed = await asyncio.wait_for(waiting, 5)
+        assert failed.status_code == 503
+        assert "bogus" in failed.json()["error"]
+        for path in ("/health", "/ready", "/preferences"):
+            resp = await ac.get(path)
+            assert resp.status_code == 503, path
+            assert resp.json()["status"] == "failed"
+            assert "bogus" in resp.json()["error"]
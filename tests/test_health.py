@@ -1,10 +1,9 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
-from backend.main import app
 
 # Restore marker for pytest-asyncio plugin
 @pytest.mark.asyncio
-async def test_health_check():
+async def test_health_check(app):
     async with AsyncClient(base_url="http://test", transport=ASGITransport(app=app)) as ac:
         response = await ac.get("/health")
     assert response.status_code == 200
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+from backend.log_pipeline import LogPipeline, output_handlers
+
+@pytest.fixture
+def test_logger(request):
+    logger = logging.getLogger(f"test_log_pipeline.{request.node.name}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    yield logger
+    logger.handlers = []
+
+class _Probe:
+    """Formats as the name of the thread that formatted it."""
+
+    def __str__(self):
+        return threading.current_thread().name
+
+def test_records_are_formatted_and_written_off_the_calling_thread(test_logger, tmp_path):
+    path = tmp_path / "logs" / "backend.log" # Directory created on the first record
+    pipeline = LogPipeline(output_handlers(str(path), max_bytes=2000, backups=2, stream=False), logger=test_logger)
+    pipeline.start()
+    test_logger.info("formatted on %s", _Probe())
+    test_logger.debug("below the level %s", 1 / 1)
+    pipeline.stop()
+    text = path.read_text()
+    assert f"INFO {test_logger.name}: formatted on Thread-" in text and "(_monitor)" in text # The listener thread
+    assert "below the level" not in text
+
+    pipeline.start()
+    for i in range(100):
+        test_logger.warning("record %d of %s", i, "many")
+    pipeline.stop()
+    assert sorted(path.parent.iterdir()) == [path, path.with_name("backend.log.1"), path.with_name("backend.log.2")]
+    assert path.read_text().splitlines()[-1].endswith("record 99 of many") # Rotated at 2000 bytes
+
+def test_json_format_and_logging_after_stop(test_logger, tmp_path):
+    path = tmp_path / "backend.log"
+    pipeline = LogPipeline(output_handlers(str(path), json_format=True, stream=False), logger=test_logger)
+    pipeline.start()
+    try:
+        raise OSError("disk full")
+    except OSError:
+        test_logger.exception("Could not write '%s'", "telemetry.log", extra={"route": "/telemetry"})
+    pipeline.stop()
+    test_logger.error("after stop") # Written directly once the pipeline is stopped
+
+    first, second = (json.loads(line) for line in path.read_text().splitlines())
+    assert first["message"] == "Could not write 'telemetry.log'" and first["level"] == "ERROR"
+    assert first["route"] == "/telemetry" and "OSError: disk full" in first["exc"]
+    assert second["message"] == "after stop"
+
+class _BlockedHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.unblocked = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.unblocked.wait()
+        self.messages.append(record.getMessage())
+
+def test_full_queue_drops_instead_of_blocking_and_stop_drains(test_logger):
+    handler = _BlockedHandler()
+    pipeline = LogPipeline([handler], queue_size=10, logger=test_logger)
+    pipeline.start()
+    start = time.perf_counter()
+    for i in range(100):
+        test_logger.info("record %d", i)
+    assert time.perf_counter() - start < 0.5 # Never waits for the stuck handler
+    assert 80 <= pipeline.dropped <= 90
+    handler.unblocked.set()
+    pipeline.stop()
+    assert len(handler.messages) == 100 - pipeline.dropped + 1 # Plus the warning about the dropped records
+    assert handler.messages[-1].startswith(f"{pipeline.dropped} log records were dropped")
+
+APP_CHILD = r"""
+import sys
+from fastapi.testclient import TestClient
+import backend.main
+assert backend.main.LOG_PIPELINE_INSTALLED
+with TestClient(backend.main.app) as client:
+    for theme in ("dark", "light"):
+        assert client.post("/preferences", json={"telemetry": True, "theme": theme}).status_code == 200
+backend.main.logger.info("after shutdown") # Written directly, and still drained at exit
+"""
+
+def test_app_logs_through_the_pipeline_and_drains_on_shutdown(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, LOG_FILE_PATH=str(tmp_path / "backend.log"), PREFERENCES_FILE_PATH=str(tmp_path / "preferences.json"),
+               TELEMETRY_FILE_PATH=str(tmp_path / "telemetry.log"), LOG_JSON="1", PYTHONPATH=root)
+    subprocess.run([sys.executable, "-c", APP_CHILD], env=env, cwd=root, check=True, timeout=60, capture_output=True)
+    messages = [json.loads(line)["message"] for line in (tmp_path / "backend.log").read_text().splitlines()]
+    assert messages.count(f"Preferences saved to '{tmp_path / 'preferences.json'}'") == 2
+    assert messages[-1] == "after shutdown"
+
+def test_pipeline_runs_until_the_last_user_releases_it(test_logger, tmp_path):
+    path = tmp_path / "backend.log"
+    pipeline = LogPipeline(output_handlers(str(path), max_bytes=0, backups=0, stream=False), logger=test_logger)
+    pipeline.acquire()
+    pipeline.acquire() # Two apps in one process
+    pipeline.release()
+    assert pipeline.running # The other app still logs through the queue
+    test_logger.warning("still queued")
+    pipeline.release()
+    assert not pipeline.running
+    assert "still queued" in path.read_text()
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.metrics import Registry, TimedLock
+
+@pytest.fixture(autouse=True)
+def preferences_file(tmp_path):
+    prefs_path = tmp_path / "preferences.json"
+    prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
+    return prefs_path
+
+def _sample(text: str, series: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def _scrape(client: TestClient) -> str:
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return resp.text
+
+def test_requests_are_counted_per_route_and_status(client):
+    before = _scrape(client)
+    client.get("/preferences")
+    client.get("/preferences")
+    client.get("/telemetry/events", params={"event": "x", "limit": 0})
+    client.get("/no/such/route")
+    after = _scrape(client)
+    ok = 'backend_http_requests_total{method="GET",route="/preferences",status="200"}'
+    assert _sample(after, ok) - _sample(before, ok) == 2
+    invalid = 'backend_http_requests_total{method="GET",route="/telemetry/events",status="422"}'
+    assert _sample(after, invalid) - _sample(before, invalid) == 1
+    unmatched = 'backend_http_requests_total{method="GET",route="unmatched",status="404"}'
+    assert _sample(after, unmatched) - _sample(before, unmatched) == 1
+    assert "/no/such/route" not in after
+
+def test_latency_histogram_is_cumulative(client):
+    client.get("/health")
+    text = _scrape(client)
+    labels = 'method="GET",route="/health"'
+    count = _sample(text, f"backend_http_request_duration_seconds_count{{{labels}}}")
+    assert count >= 1
+    assert _sample(text, f'backend_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == count
+    assert _sample(text, f'backend_http_request_duration_seconds_bucket{{{labels},le="0.0005"}}') <= count
+
+def test_io_timers_lock_waits_and_telemetry_bytes(client):
+    before = _scrape(client)
+    client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    client.post("/telemetry", json={"event": "metrics_test", "details": {}})
+    after = _scrape(client)
+    for op in ("preferences_write", "telemetry_submit"):
+        series = f'backend_io_duration_seconds_count{{op="{op}"}}'
+        assert _sample(after, series) - _sample(before, series) == 1
+    waits = 'backend_lock_wait_seconds_count{lock="preferences"}'
+    assert _sample(after, waits) > _sample(before, waits)
+    assert _sample(after, "backend_telemetry_bytes_written") > 0
+
+def test_histogram_render_and_label_escaping():
+    registry = Registry()
+    histogram = registry.histogram("h_seconds", "Help.", ["path"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'a"b')
+    histogram.observe(0.5, 'a"b')
+    histogram.observe(5.0, 'a"b')
+    lines = registry.render().decode().splitlines()
+    assert lines[:2] == ["# HELP h_seconds Help.", "# TYPE h_seconds histogram"]
+    assert 'h_seconds_bucket{path="a\\"b",le="0.1"} 1' in lines
+    assert 'h_seconds_bucket{path="a\\"b",le="1.0"} 2' in lines
+    assert 'h_seconds_bucket{path="a\\"b",le="+Inf"} 3' in lines
+    assert 'h_seconds_count{path="a\\"b"} 3' in lines
+
+def test_disabled_registry_records_nothing():
+    registry = Registry(enabled=False)
+    counter = registry.counter("c_total", "Help.")
+    counter.inc()
+    assert registry.render().decode().splitlines() == ["# HELP c_total Help.", "# TYPE c_total counter"]
+
+def test_timed_lock_records_contended_wait():
+    registry = Registry()
+    waits = registry.histogram("wait_seconds", "Help.", ["lock"], buckets=(0.01, 1.0))
+    lock = TimedLock(threading.Lock(), waits, "test")
+    held = threading.Event()
+    def holder():
+        with lock:
+            held.set()
+            time.sleep(0.05)
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait()
+    with lock:
+        pass
+    thread.join()
+    text = registry.render().decode()
+    assert 'wait_seconds_bucket{lock="test",le="0.01"} 1' in text # The holder's uncontended acquire
+    assert 'wait_seconds_count{lock="test"} 2' in text
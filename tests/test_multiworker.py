@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+
+from backend.file_lock import FileLock, lock_for
+from backend.main import Preferences
+from backend.preferences_store import SnapshotCache, atomic_write_json, file_signature
+from backend.telemetry_index import TelemetryIndex
+from backend.telemetry_segments import SegmentPolicy, list_segments, open_segment
+from backend.telemetry_writer import TelemetryWriter
+
+# Two FileLock objects on one path stand in for two worker processes: flock locks
+# belong to the open file, so they exclude each other just like separate processes.
+
+def test_file_lock_excludes_other_holders_and_is_reentrant(tmp_path):
+    path = str(tmp_path / "data.lock")
+    mine, theirs = FileLock(path), FileLock(path)
+    acquired = threading.Event()
+    with mine:
+        with mine: # Reentrant
+            pass
+        t = threading.Thread(target=lambda: (theirs.acquire(), acquired.set(), theirs.release()))
+        t.start()
+        assert not acquired.wait(0.2)
+    assert acquired.wait(5)
+    t.join()
+
+def test_generation_is_shared_between_holders(tmp_path):
+    path = str(tmp_path / "data.lock")
+    mine, theirs = FileLock(path), FileLock(path)
+    assert theirs.generation == 0
+    with mine:
+        assert mine.bump() == 1
+    assert theirs.generation == 1
+
+def test_lock_for_returns_one_lock_per_path(tmp_path):
+    assert lock_for(str(tmp_path / "a.lock")) is lock_for(str(tmp_path / "." / "a.lock"))
+    assert lock_for(str(tmp_path / "a.lock")) is not lock_for(str(tmp_path / "b.lock"))
+
+def test_missing_directory_degrades_to_a_process_lock(tmp_path):
+    lock = FileLock(str(tmp_path / "missing" / "data.lock"))
+    with lock:
+        assert lock.bump() == 0
+    assert lock.generation == 0
+
+def test_snapshot_dropped_when_another_worker_bumps_the_generation(tmp_path):
+    path = str(tmp_path / "prefs.json")
+    atomic_write_json(path, {"v": 1})
+    other_worker = FileLock(path + ".lock")
+    ours = FileLock(path + ".lock")
+    cache = SnapshotCache(generation=lambda p: ours.generation)
+    cache.publish(path, "v1", file_signature(path), ours.generation)
+    assert cache.get(path) == "v1"
+    with other_worker:
+        other_worker.bump() # E.g. a same-size rewrite within one mtime tick
+    assert cache.get(path) is None
+
+def test_preferences_written_by_another_worker_are_seen(make_app, tmp_path):
+    path = str(tmp_path / "preferences.json")
+    backend = make_app(workers=2).state.backend # Shared storage: file locks and generation counters
+    backend.save_preferences(Preferences(telemetry=True, theme="light"))
+    assert backend.load_preferences() == Preferences(telemetry=True, theme="light")
+    # Another worker rewrites the file in place with a value of the same size and the same
+    # mtime, so only the shared generation tells this worker its snapshot is stale
+    signature = file_signature(path)
+    other_worker = FileLock(path + ".lock")
+    with other_worker:
+        with open(path, "r+") as f:
+            f.write(json.dumps({"telemetry": False, "theme": "dark"}, indent=2))
+        os.utime(path, ns=(signature.mtime_ns, signature.mtime_ns))
+        other_worker.bump()
+    assert file_signature(path) == signature
+    assert backend.load_preferences() == Preferences(telemetry=False, theme="dark")
+
+def _worker(path, policy):
+    lock = FileLock(str(path) + ".lock")
+    return TelemetryWriter(str(path), policy=policy, index=TelemetryIndex(str(path), file_lock=lock),
+                           file_lock=lock, maintenance_lock=FileLock(str(path) + ".maintenance.lock"))
+
+def _line(worker, i):
+    return (json.dumps({"event": f"w{worker}", "timestamp": time.time(), "i": i}) + "\n").encode()
+
+def test_workers_share_log_segments_and_index(tmp_path):
+    path = tmp_path / "telemetry.log"
+    policy = SegmentPolicy(max_bytes=2048, compress=True)
+    workers = [_worker(path, policy) for _ in range(3)]
+    threads = [
+        threading.Thread(target=lambda w=w, n=n: [w.submit(_line(n, i)) for i in range(200)])
+        for n, w in enumerate(workers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = {"w0": 200, "w1": 200, "w2": 200}
+    for w in workers: # Every worker's index counts every worker's events exactly once
+        assert w.index.stats()["events"] == expected
+    assert sum(w.segments_sealed for w in workers) > 3
+    for w in workers:
+        w.close()
+
+    seen = []
+    for segment in list_segments(str(path)):
+        with open_segment(segment) as f:
+            for line in f:
+                record = json.loads(line) # No torn or interleaved lines
+                seen.append((record["event"], record["i"]))
+    assert sorted(seen) == sorted((f"w{n}", i) for n in range(3) for i in range(200))
+    # The persisted sidecars hold each line once as well
+    assert TelemetryIndex(str(path)).stats()["events"] == expected
@@ -0,0 +1,113 @@
+"""Runs the server with several worker processes, hammers every endpoint and checks the files."""
+import glob
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from backend.main import Preferences
+from backend.telemetry_index import TelemetryIndex
+from backend.telemetry_segments import list_segments, open_segment
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 3
+CLIENTS = 6
+ROUNDS = 40
+BATCH = 5
+
+
+def _start(tmp_path):
+    handshake = tmp_path / "handshake.json"
+    env = dict(
+        os.environ,
+        BACKEND_WORKERS=str(WORKERS),
+        BACKEND_PORT="0",
+        BACKEND_HANDSHAKE_FILE=str(handshake),
+        PREFERENCES_FILE_PATH=str(tmp_path / "preferences.json"),
+        TELEMETRY_FILE_PATH=str(tmp_path / "telemetry.log"),
+        TELEMETRY_SEGMENT_MAX_BYTES="16384", # Many rollovers while the workers race
+    )
+    proc = subprocess.Popen([sys.executable, os.path.join("backend", "main.py")], cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while not handshake.exists():
+        assert proc.poll() is None and time.monotonic() < deadline, "server did not start"
+        time.sleep(0.05)
+    url = json.loads(handshake.read_text())["url"]
+    with httpx.Client(base_url=url, timeout=30) as client:
+        while client.get("/ready").status_code != 200:
+            assert time.monotonic() < deadline, "server did not become ready"
+            time.sleep(0.05)
+    return proc, url
+
+
+def _hammer(url, n, sent, errors):
+    event = f"client{n}"
+    try:
+        with httpx.Client(base_url=url, timeout=30) as client:
+            for i in range(ROUNDS):
+                assert client.post("/telemetry", json={"event": event, "details": {"i": i}}).status_code == 200
+                records = [{"event": event, "details": {"i": i, "b": b}} for b in range(BATCH)]
+                resp = client.post("/telemetry/batch", json=records)
+                assert resp.status_code == 200 and resp.json()["accepted"] == BATCH
+                sent[event] = sent.get(event, 0) + 1 + BATCH
+
+                current = client.get("/preferences")
+                assert current.status_code == 200
+                Preferences(**current.json())
+                wanted = {"telemetry": i % 2 == 0, "theme": "dark" if n % 2 else "light"}
+                resp = client.post("/preferences", json=wanted, headers={"If-Match": current.headers["ETag"]})
+                assert resp.status_code in (200, 412)
+
+                assert client.get("/telemetry/stats").status_code == 200
+                assert client.get("/telemetry/events", params={"event": event, "limit": 5}).status_code == 200
+                assert client.get("/health").status_code == 200
+                if i % 10 == 0:
+                    export = client.get("/telemetry/export")
+                    assert export.status_code == 200
+                    for line in export.text.splitlines():
+                        json.loads(line)
+    except Exception as e: # Reported by the main thread
+        errors.append(e)
+
+
+def test_workers_hammering_every_endpoint_keep_files_consistent(tmp_path):
+    proc, url = _start(tmp_path)
+    sent, errors = {}, []
+    try:
+        threads = [threading.Thread(target=_hammer, args=(url, n, sent, errors)) for n in range(CLIENTS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors[0]
+        expected = {f"client{n}": ROUNDS * (1 + BATCH) for n in range(CLIENTS)}
+        assert sent == expected
+        with httpx.Client(base_url=url, timeout=30) as client:
+            for _ in range(WORKERS * 2): # Connections land on different workers; every one must agree
+                with httpx.Client(base_url=url, timeout=30) as fresh:
+                    assert fresh.get("/telemetry/stats").json()["events"] == expected
+            exported = [json.loads(line) for line in client.get("/telemetry/export").text.splitlines()]
+        assert len(exported) == sum(expected.values())
+    finally:
+        proc.terminate()
+        proc.wait(30)
+
+    assert proc.returncode == 0
+    counts = {}
+    segments = list_segments(str(tmp_path / "telemetry.log"))
+    assert len(segments) > 2
+    for segment in segments:
+        with open_segment(segment) as f:
+            for line in f:
+                event = json.loads(line)["event"] # Every line is whole
+                counts[event] = counts.get(event, 0) + 1
+    assert counts == expected
+    assert TelemetryIndex(str(tmp_path / "telemetry.log")).stats()["events"] == expected
+    with open(tmp_path / "preferences.json") as f:
+        Preferences(**json.load(f))
+    assert glob.glob(str(tmp_path / "preferences.json.*.tmp")) == []
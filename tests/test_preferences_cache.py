@@ -0,0 +1,61 @@
+import json
+import os
+import pytest
+from unittest.mock import patch
+
+import backend.main
+from backend.preferences_store import SnapshotCache, file_signature
+
+@pytest.fixture(autouse=True)
+def prefs_path(tmp_path):
+    """A fresh preferences file where the app's backend looks for it."""
+    test_prefs_path = tmp_path / "preferences.json"
+    test_prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
+    return test_prefs_path
+
+def test_repeated_get_reads_file_once(client):
+    with patch('backend.main._read_preferences_file', wraps=backend.main._read_preferences_file) as reader:
+        for _ in range(5):
+            resp = client.get("/preferences")
+            assert resp.status_code == 200
+            assert resp.json() == {"telemetry": False, "theme": "light"}
+    assert reader.call_count == 1
+
+def test_get_after_post_uses_published_snapshot(client):
+    resp = client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert resp.status_code == 200
+    with patch('backend.main._read_preferences_file') as reader:
+        resp = client.get("/preferences")
+    assert resp.json() == {"telemetry": True, "theme": "dark"}
+    reader.assert_not_called()
+
+def test_external_change_invalidates_snapshot(client, prefs_path):
+    assert client.get("/preferences").json()["theme"] == "light"
+    # Simulate the Tauri shell rewriting the file in place with the same size
+    original = prefs_path.read_text()
+    prefs_path.write_text('{"telemetry": false, "theme": "dark" }')
+    assert len(prefs_path.read_text()) == len(original)
+    st = os.stat(prefs_path)
+    os.utime(prefs_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert client.get("/preferences").json()["theme"] == "dark"
+
+def test_deleted_file_falls_back_to_defaults(client, prefs_path):
+    client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    prefs_path.unlink()
+    assert client.get("/preferences").json() == {"telemetry": False, "theme": "light"}
+
+def test_snapshot_cache_disabled(tmp_path):
+    path = tmp_path / "value.json"
+    path.write_text("{}")
+    cache = SnapshotCache(enabled=False)
+    cache.publish(str(path), "value", file_signature(str(path)))
+    assert cache.get(str(path)) is None
+
+def test_snapshot_cache_keyed_by_path(tmp_path):
+    first, second = tmp_path / "a.json", tmp_path / "b.json"
+    first.write_text("{}")
+    second.write_text("{}")
+    cache = SnapshotCache()
+    cache.publish(str(first), "a", file_signature(str(first)))
+    assert cache.get(str(first)) == "a"
+    assert cache.get(str(second)) is None
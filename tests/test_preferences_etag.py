@@ -0,0 +1,87 @@
+import builtins
+import json
+import pytest
+from unittest.mock import patch
+
+import backend.main
+
+@pytest.fixture(autouse=True)
+def prefs_path(tmp_path):
+    test_prefs_path = tmp_path / "preferences.json"
+    test_prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
+    return test_prefs_path
+
+def test_get_preferences_returns_etag(client):
+    response = client.get("/preferences")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert client.get("/preferences").headers["etag"] == etag
+
+def test_if_none_match_returns_304_without_file_reads(client, prefs_path):
+    etag = client.get("/preferences").headers["etag"] # Warm the snapshot cache
+    real_open = builtins.open
+    opened = []
+    def tracking_open(file, *args, **kwargs):
+        opened.append(file)
+        return real_open(file, *args, **kwargs)
+    with patch.object(backend.main, '_read_preferences_file') as mock_read, \
+         patch.object(backend.main.json, 'dumps', wraps=json.dumps) as mock_dumps, \
+         patch('builtins.open', side_effect=tracking_open):
+        response = client.get("/preferences", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    mock_read.assert_not_called()
+    mock_dumps.assert_not_called()
+    assert str(prefs_path) not in [str(f) for f in opened]
+
+def test_if_none_match_weak_and_list_forms(client):
+    etag = client.get("/preferences").headers["etag"]
+    assert client.get("/preferences", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/preferences", headers={"If-None-Match": "*"}).status_code == 304
+    stale = client.get("/preferences", headers={"If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.json() == {"telemetry": False, "theme": "light"}
+
+def test_etag_changes_after_update(client):
+    old = client.get("/preferences").headers["etag"]
+    response = client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert response.status_code == 200
+    new = response.headers["etag"]
+    assert new != old
+    assert client.get("/preferences").headers["etag"] == new
+    assert client.get("/preferences", headers={"If-None-Match": old}).status_code == 200
+
+def test_etag_changes_after_external_edit(client, prefs_path):
+    old = client.get("/preferences").headers["etag"]
+    prefs_path.write_text(json.dumps({"telemetry": True, "theme": "light"}))
+    response = client.get("/preferences", headers={"If-None-Match": old})
+    assert response.status_code == 200
+    assert response.json() == {"telemetry": True, "theme": "light"}
+
+def test_if_match_current_etag_saves(client):
+    etag = client.get("/preferences").headers["etag"]
+    response = client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert client.get("/preferences").json() == {"telemetry": True, "theme": "dark"}
+
+def test_if_match_stale_etag_is_rejected(client, prefs_path):
+    etag = client.get("/preferences").headers["etag"]
+    client.post("/preferences", json={"telemetry": True, "theme": "light"}, headers={"If-Match": etag})
+    # A second client still holding the original ETag must not overwrite the first change
+    response = client.post("/preferences", json={"telemetry": False, "theme": "dark"}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert json.loads(prefs_path.read_text()) == {"telemetry": True, "theme": "light"}
+
+def test_if_match_uses_strong_comparison(client, prefs_path):
+    etag = client.get("/preferences").headers["etag"]
+    response = client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"If-Match": f"W/{etag}"})
+    assert response.status_code == 412 # A weak tag never satisfies If-Match
+    assert json.loads(prefs_path.read_text()) == {"telemetry": False, "theme": "light"}
+    response = client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"If-Match": f'W/{etag}, {etag}'})
+    assert response.status_code == 200
+
+def test_if_match_wildcard_and_unconditional_post(client):
+    assert client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"If-Match": "*"}).status_code == 200
+    assert client.post("/preferences", json={"telemetry": False, "theme": "light"}).status_code == 200
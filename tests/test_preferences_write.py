@@ -0,0 +1,99 @@
+import json
+import os
+import stat
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from backend.preferences_store import WriteBehindWriter, atomic_write_json
+
+@pytest.fixture(autouse=True)
+def prefs_path(tmp_path):
+    test_prefs_path = tmp_path / "preferences.json"
+    test_prefs_path.write_text(json.dumps({"telemetry": False, "theme": "light"}))
+    return test_prefs_path
+
+@pytest.fixture
+def app(make_app, request):
+    # Tests using write_behind get an app with a 200 ms write-behind window
+    return make_app(preferences_write_behind_ms=200 if "write_behind" in request.fixturenames else 0)
+
+@pytest.fixture
+def write_behind(backend):
+    return backend.preferences_write_behind
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    directory = tmp_path / "data"
+    directory.mkdir()
+    path = directory / "prefs.json"
+    atomic_write_json(str(path), {"theme": "dark"})
+    atomic_write_json(str(path), {"theme": "light"})
+    assert json.loads(path.read_text()) == {"theme": "light"}
+    assert os.listdir(directory) == ["prefs.json"]
+
+def test_atomic_write_preserves_mode(tmp_path):
+    path = tmp_path / "prefs.json"
+    path.write_text("{}")
+    os.chmod(path, 0o640)
+    atomic_write_json(str(path), {"theme": "dark"})
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+def test_crash_before_rename_keeps_old_file(client, prefs_path):
+    with patch("backend.preferences_store.os.replace", side_effect=OSError("simulated crash")):
+        resp = client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert resp.status_code == 500
+    assert json.loads(prefs_path.read_text()) == {"telemetry": False, "theme": "light"}
+    assert os.listdir(prefs_path.parent) == ["preferences.json"]
+    assert client.get("/preferences").json() == {"telemetry": False, "theme": "light"}
+
+def test_write_behind_coalesces_burst(make_app, prefs_path):
+    # A window longer than the test, so the burst coalesces however slowly the machine runs it
+    app = make_app(preferences_write_behind_ms=60_000)
+    client, write_behind = TestClient(app), app.state.backend.preferences_write_behind
+    for i in range(20):
+        theme = "dark" if i % 2 == 0 else "light"
+        resp = client.post("/preferences", json={"telemetry": True, "theme": theme})
+        assert resp.status_code == 200
+    # Acknowledged and visible before anything reached the disk
+    assert client.get("/preferences").json() == {"telemetry": True, "theme": "light"}
+    assert json.loads(prefs_path.read_text())["telemetry"] is False
+    write_behind.flush()
+    assert json.loads(prefs_path.read_text()) == {"telemetry": True, "theme": "light"}
+    assert write_behind.requested == 20
+    assert write_behind.written == 1
+
+def test_write_behind_timer_writes(client, prefs_path, write_behind):
+    client.post("/onboarding", json={"telemetry": True, "theme": "dark"})
+    deadline = time.monotonic() + 5
+    while write_behind.written == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(prefs_path.read_text()) == {"telemetry": True, "theme": "dark"}
+
+def test_write_behind_failure_stays_pending(client, prefs_path, write_behind):
+    client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    with patch("backend.preferences_store.os.replace", side_effect=OSError("disk full")):
+        write_behind.flush()
+    assert write_behind.written == 0
+    assert client.get("/preferences").json()["theme"] == "dark"
+    write_behind.flush()
+    assert json.loads(prefs_path.read_text())["theme"] == "dark"
+
+def test_failed_timer_write_is_retried_without_another_save():
+    writes, failures = [], [OSError("disk full")]
+    def write(path, value):
+        if failures:
+            raise failures.pop()
+        writes.append((path, value))
+    writer = WriteBehindWriter(write, window=0.02)
+    writer.schedule("prefs.json", {"theme": "dark"}) # The timer's write fails; nothing else is saved
+    deadline = time.monotonic() + 5
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writes == [("prefs.json", {"theme": "dark"})]
+    assert writer.pending_value("prefs.json") is None
+
+def test_shutdown_flushes_pending_write(app, prefs_path, write_behind):
+    with TestClient(app) as lifespan_client:
+        lifespan_client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert json.loads(prefs_path.read_text()) == {"telemetry": True, "theme": "dark"}
@@ -0,0 +1,44 @@
+import pstats
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.profiling import ProfilingMiddleware
+
+@pytest.fixture
+def profiled(make_app):
+    """A client of an app with profiling on (three profiles retained under tmp_path), and its profile store."""
+    def make(sample_rate=0.0):
+        app = make_app(profiling=True, profile_retain=3, profile_sample_rate=sample_rate)
+        return TestClient(app), app.state.backend.profile_store
+    return make
+
+def _functions(path):
+    return {name for _, _, name in pstats.Stats(path).stats}
+
+def test_header_profiles_handler_and_io_pool_calls(profiled):
+    client, store = profiled()
+    assert "X-Profile-Id" not in client.get("/preferences").headers # Not asked for
+    resp = client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"X-Debug-Profile": "1"})
+    assert resp.status_code == 200
+    profile_id = resp.headers["X-Profile-Id"]
+
+    profiles = client.get("/debug/profiles").json()["profiles"]
+    assert [p["id"] for p in profiles] == [profile_id]
+    assert profiles[0]["route"] == "/preferences" and profiles[0]["status"] == 200
+    assert profiles[0]["top"] and profiles[0]["duration_ms"] > 0
+    assert {"set_preferences", "save_preferences", "_write_preferences_file"} <= _functions(profiles[0]["file"])
+
+    resp = client.get(f"/debug/profiles/{profile_id}")
+    assert resp.status_code == 200 and len(resp.content) > 0
+    assert client.get("/debug/profiles/..%2Fpreferences").status_code == 404
+
+def test_sampling_and_retention(profiled):
+    client, store = profiled(sample_rate=1.0)
+    ids = [client.post("/telemetry", json={"event": "e", "details": {}}).headers["X-Profile-Id"] for _ in range(5)]
+    assert [p["id"] for p in store.list()] == ids[:-4:-1] # Newest three, newest first
+    assert "submit_telemetry" in _functions(store.list()[-1]["file"])
+    assert "X-Profile-Id" not in client.get("/health", headers={"X-Debug-Profile": "0"}).headers
+
+def test_disabled_by_default(app):
+    assert not any(m.cls is ProfilingMiddleware for m in app.user_middleware)
+    assert TestClient(app).get("/debug/profiles").status_code == 404
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.request_limits import JsonArrayReader, JsonScanner, PayloadLimitError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def telemetry_path(tmp_path):
+    return tmp_path / "telemetry.log"
+
+def _logged(client, path):
+    client.app.state.backend.close_telemetry_writer()
+    return [json.loads(line)["event"] for line in path.read_bytes().splitlines()] if path.exists() else []
+
+def _nested(depth):
+    value = {}
+    for _ in range(depth - 1):
+        value = {"a": value}
+    return value
+
+def test_content_length_over_limit_is_rejected_before_reading(make_app):
+    app = make_app(telemetry_max_event_bytes=1000)
+    sent = []
+
+    async def receive():
+        raise AssertionError("body was read")
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/telemetry", "raw_path": b"/telemetry", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", b"5000000")],
+        "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]["status"] == 413
+
+def test_chunked_body_is_cut_off_at_the_limit(make_app, telemetry_path):
+    client = TestClient(make_app(telemetry_max_event_bytes=1000))
+    def body():
+        yield b'{"event": "big", "details": {"x": "'
+        for _ in range(100):
+            yield b"y" * 100
+        yield b'"}}'
+    resp = client.post("/telemetry", content=body(), headers={"Content-Type": "application/json"})
+    assert resp.status_code == 413
+    assert client.post("/preferences", content=b"{" + b" " * 70000 + b"}", headers={"Content-Type": "application/json"}).status_code == 413
+    assert _logged(client, telemetry_path) == []
+
+def test_depth_and_key_limits(make_app, telemetry_path):
+    client = TestClient(make_app(telemetry_max_depth=5, telemetry_max_keys=20))
+    assert client.post("/telemetry", json={"event": "ok", "details": _nested(4)}).status_code == 200
+    resp = client.post("/telemetry", json={"event": "deep", "details": _nested(5)})
+    assert resp.status_code == 422 and "Nesting" in resp.json()["detail"]
+    resp = client.post("/telemetry", json={"event": "wide", "details": {str(i): i for i in range(19)}})
+    assert resp.status_code == 422 and "keys" in resp.json()["detail"]
+
+    records = [{"event": "a", "details": {}}, {"event": "deep", "details": _nested(5)}, {"event": "b", "details": {"k": "[{:,"}}]
+    body = client.post("/telemetry/batch", json=records).json()
+    assert (body["accepted"], body["rejected"]) == (2, 1)
+    assert body["errors"][0]["index"] == 1 and "Nesting" in body["errors"][0]["errors"][0]["msg"]
+    ndjson = "\n".join(json.dumps(r) for r in records)
+    body = client.post("/telemetry/batch", content=ndjson, headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (body["accepted"], body["rejected"]) == (2, 1)
+    assert _logged(client, telemetry_path) == ["ok", "a", "b", "a", "b"]
+
+def test_oversized_batch_record(make_app):
+    client = TestClient(make_app(telemetry_max_event_bytes=1000))
+    records = [{"event": "a", "details": {}}, {"event": "b", "details": {"x": "y" * 2000}}]
+    assert client.post("/telemetry/batch", json=records).status_code == 413
+    ndjson = "\n".join(json.dumps(r) for r in records)
+    assert client.post("/telemetry/batch", content=ndjson, headers={"Content-Type": "application/x-ndjson"}).status_code == 413
+
+def test_array_reader_is_chunking_independent():
+    records = [{"event": "é", "details": {"s": 'quote " brace } bracket ] comma , colon : slash \\ \u2603', "n": [1.5e3, {"x": None}]}}, [], 12345, "s", True]
+    data = json.dumps(records, indent=1).encode()
+    for size in (1, 2, 3, 7, len(data)):
+        reader = JsonArrayReader(max_depth=10, max_keys=10)
+        items = []
+        for i in range(0, len(data), size):
+            items += reader.feed(data[i:i + size])
+        items += reader.finish()
+        assert [item for item, error in items] == records
+        assert all(error is None for _, error in items)
+    for bad in (b"[1,]", b"[1 2", b"{}", b"[1]]", b"[1] x", b"]", b"[1", b"", b'["a]'):
+        with pytest.raises(ValueError):
+            reader = JsonArrayReader()
+            reader.feed(bad)
+            reader.finish()
+    (_, error), = JsonArrayReader(max_depth=2).feed(b'[{"a": {"b": {"c": 1}}} ')
+    assert "Nesting" in error
+    with pytest.raises(PayloadLimitError):
+        JsonArrayReader(max_item_bytes=100).feed(b'[{"a": "' + b"x" * 200)
+    with pytest.raises(PayloadLimitError):
+        JsonScanner(max_depth=2).feed(b'{"a": {"b": {"c": 1}}}')
+    scanner = JsonScanner(max_keys=2)
+    scanner.feed(b'{"a": ":::", "b": 1}') # Colons in strings do not count as keys
+    with pytest.raises(PayloadLimitError):
+        scanner.feed(b'{"c": 1}')
+
+RSS_CHILD = r"""
+import asyncio, os, resource, sys
+sys.path.insert(0, sys.argv[3])
+from backend.main import create_app
+from backend.settings import Settings
+
+directory = os.path.dirname(sys.argv[2])
+# No index: its per-event arrays grow with the log, not with the request
+app = create_app(Settings(preferences_dir=directory, log_dir=directory, telemetry_file=sys.argv[2], telemetry_index=False))
+megabytes = int(sys.argv[1])
+record = b'{"event": "bulk", "details": {"step": 1, "text": "' + b"x" * 150 + b'"}}'
+per_chunk = 64 * 1024 // (len(record) + 1)
+
+def chunks():
+    yield b"[" + record
+    sent = len(record) + 1
+    while sent < megabytes * 1024 * 1024:
+        chunk = b"," + b",".join([record] * per_chunk)
+        sent += len(chunk)
+        yield chunk
+    yield b"]"
+
+async def main():
+    body = chunks()
+    status = []
+
+    async def receive():
+        chunk = next(body, None)
+        return {"type": "http.request", "body": chunk or b"", "more_body": chunk is not None}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/telemetry/batch", "raw_path": b"/telemetry/batch", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    await app(scope, receive, send)
+    assert status == [200], status
+
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+asyncio.run(main())
+app.state.backend.close_telemetry_writer()
+print(baseline, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def test_batch_peak_rss_does_not_grow_with_body_size(tmp_path):
+    growth = {}
+    for megabytes in (1, 16):
+        out = subprocess.run(
+            [sys.executable, "-c", RSS_CHILD, str(megabytes), str(tmp_path / f"telemetry{megabytes}.log"), ROOT],
+            capture_output=True, text=True, check=True, timeout=120,
+        ).stdout.split()
+        growth[megabytes] = int(out[-1]) - int(out[-2]) # KiB above the post-import baseline
+    assert (tmp_path / "telemetry16.log").stat().st_size > 15 * 1024 * 1024
+    assert growth[16] - growth[1] < 8 * 1024, growth # 15 MiB more body, well under 8 MiB more memory
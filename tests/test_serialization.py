@@ -0,0 +1,55 @@
+import json
+import pytest
+
+import backend.main
+from backend import serialization
+from backend.main import encode_telemetry, TelemetryData
+
+ENCODERS = ["json"] + (["orjson"] if serialization.orjson is not None else [])
+
+@pytest.fixture(params=ENCODERS)
+def encoder(request):
+    serialization.use_encoder(request.param)
+    yield request.param
+    serialization.use_encoder(backend.main.JSON_ENCODER)
+
+def test_dumps_is_compact_json(encoder):
+    data = {"event": "wizard_step", "details": {"step": 3, "labels": ["a", "é"]}}
+    assert json.loads(serialization.dumps(data)) == data
+    assert b" " not in serialization.dumps({"a": [1, 2], "b": {"c": None}})
+
+def test_dumps_falls_back_for_values_orjson_rejects(encoder):
+    data = {"big": 2 ** 70, "surrogate": "\ud800", 1: "int key"}
+    assert json.loads(serialization.dumps(data)) == json.loads(json.dumps(data))
+
+def test_dumps_pretty_matches_stdlib_layout(encoder):
+    prefs = {"telemetry": True, "theme": "dark"}
+    assert serialization.dumps_pretty(prefs) == json.dumps(prefs, indent=2).encode()
+
+def test_loads_raises_json_decode_error(encoder):
+    assert serialization.loads(b'[{"event": "x"}]') == [{"event": "x"}]
+    with pytest.raises(json.JSONDecodeError):
+        serialization.loads(b"{not json")
+
+def test_use_encoder_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        serialization.use_encoder("simplejson")
+
+def test_telemetry_line_keeps_default_layout(encoder):
+    line, entry = encode_telemetry(TelemetryData(event="e", details={"id": 1}), ts=0)
+    assert line == b'{"event": "e", "details": {"id": 1}, "timestamp": "1970-01-01T00:00:00+00:00"}\n'
+    assert entry.length == len(line)
+
+def test_telemetry_line_compact_mode(encoder):
+    line, entry = encode_telemetry(TelemetryData(event="e", details={"id": 1, "blob": "x" * 100000}), ts=0, compact=True)
+    assert line.startswith(b'{"event":"e","details":{"id":1,"blob":"xxx')
+    assert line.endswith(b'"timestamp":"1970-01-01T00:00:00+00:00"}\n')
+    assert entry.length == len(line)
+
+def test_responses_use_selected_encoder(encoder, client, tmp_path):
+    prefs_path = tmp_path / "preferences.json"
+    prefs_path.write_text(json.dumps({"telemetry": True, "theme": "dark"}))
+    resp = client.get("/preferences")
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.content == b'{"telemetry":true,"theme":"dark"}'
+    assert client.get("/health").content == b'{"status":"ok"}'
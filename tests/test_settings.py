@@ -0,0 +1,24 @@
+import pytest
+
+from backend.settings import Settings
+
+@pytest.mark.parametrize("raw, expected", [
+    ("1", True), ("true", True), ("Yes", True), (" ON ", True),
+    ("0", False), ("false", False), ("NO", False), ("off", False),
+])
+def test_boolean_variables_accept_common_spellings(raw, expected):
+    settings = Settings.from_env({"METRICS": raw, "PROFILING": raw, "PREFERENCES_CACHE": raw}, preferences_dir="p", log_dir="l")
+    assert (settings.metrics, settings.profiling, settings.preferences_cache) == (expected,) * 3
+
+def test_unrecognised_boolean_is_an_error():
+    with pytest.raises(ValueError, match="PROFILING"):
+        Settings.from_env({"PROFILING": "enabled"}, preferences_dir="p", log_dir="l")
+
+def test_environment_values_are_typed_and_overrides_win():
+    settings = Settings.from_env(
+        {"TELEMETRY_MAX_BATCH": "64", "PROFILE_SAMPLE_RATE": "0.5", "TELEMETRY_RAW_EVENTS": "error, crash,", "IO_THREADS": "2"},
+        preferences_dir="p", log_dir="l", io_threads=3,
+    )
+    assert settings.telemetry_max_batch == 64 and settings.profile_sample_rate == 0.5
+    assert settings.telemetry_raw_events == ("error", "crash") and settings.io_threads == 3
+    assert settings.preferences_file.endswith("preferences.json") and settings.telemetry_file.startswith("l")
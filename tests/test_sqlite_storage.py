@@ -0,0 +1,133 @@
+import gzip
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+import backend.main
+from backend.main import Preferences, preferences_codec
+from backend.sqlite_storage import SqliteStorage, main, migrate_from_files
+from backend.storage import PreconditionFailed, StorageError
+from backend.telemetry_index import IndexEntry, TelemetryIndex
+
+@pytest.fixture
+def db(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "backend.db"), preferences_codec)
+    yield storage
+    storage.close()
+
+@pytest.fixture
+def sqlite_client(make_app):
+    return TestClient(make_app(storage_backend='sqlite'))
+
+def _line(event, ts, **details):
+    return (json.dumps({"event": event, "details": details, "timestamp": ts}) + "\n").encode()
+
+def _append(storage, events):
+    lines = [_line(event, ts, i=i) for i, (event, ts) in enumerate(events)]
+    storage.append_telemetry(b"".join(lines), [IndexEntry(event, ts, len(line)) for (event, ts), line in zip(events, lines)])
+
+def test_preferences_round_trip_and_if_match(db):
+    assert db.load_preferences() == Preferences(telemetry=False, theme='light') # Defaults
+    db.save_preferences(Preferences(telemetry=True, theme='dark'))
+    assert db.load_preferences() == Preferences(telemetry=True, theme='dark')
+    etag = backend.main.preferences_etag(db.load_preferences())
+    db.save_preferences(Preferences(telemetry=False, theme='dark'), if_match=etag)
+    with pytest.raises(PreconditionFailed):
+        db.save_preferences(Preferences(telemetry=True, theme='light'), if_match=etag) # Stale
+    assert db.load_preferences() == Preferences(telemetry=False, theme='dark')
+
+def test_queries_match_the_file_index(db, tmp_path):
+    events = [("click" if i % 3 else "step", 1_714_000_000 + i * 7.5) for i in range(200)]
+    _append(db, events)
+    log = tmp_path / "telemetry.log"
+    log.write_bytes(b"".join(_line(event, ts, i=i) for i, (event, ts) in enumerate(events)))
+    index = TelemetryIndex(str(log))
+    assert db.telemetry_stats(bucket=600) == index.stats(bucket=600)
+    records, total = db.telemetry_events("step", since=1_714_000_100, limit=5)
+    assert total == sum(1 for event, ts in events if event == "step" and ts >= 1_714_000_100)
+    assert [r["details"]["i"] for r in records] == [15, 18, 21, 24, 27]
+    index.close()
+
+def test_concurrent_appends_are_all_committed(db):
+    def worker(n):
+        for i in range(50):
+            _append(db, [(f"w{n}", 1_714_000_000 + i)])
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert db.telemetry_stats()["total"] == 400
+    assert db.batches_written < 400 # Submissions queued together share a transaction
+
+def test_unexpected_error_fails_the_batch_and_the_inserter_keeps_running(db):
+    commit = db._commit
+    calls = []
+    def flaky_commit(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise TypeError("not a database error")
+        commit(batch)
+    db._commit = flaky_commit
+    with pytest.raises(StorageError, match="TypeError"):
+        _append(db, [("lost", 1_714_000_000)])
+    _append(db, [("kept", 1_714_000_001)])
+    assert db.telemetry_stats()["events"] == {"kept": 1}
+
+def test_export_pages_and_gap(db):
+    _append(db, [("e", 1_714_000_000 + i) for i in range(30)])
+    first = db.export_telemetry(None, max_bytes=200)
+    page = b"".join(first.chunks)
+    assert 200 <= len(page) < 400 and page.endswith(b"\n")
+    rest = db.export_telemetry(first.cursor)
+    body = page + b"".join(rest.chunks)
+    assert [json.loads(line)["details"]["i"] for line in body.splitlines()] == list(range(30))
+    db.retain_age = 1 # Everything is older than a second
+    db._last_prune = 0
+    _append(db, [("e", time.time())])
+    assert db.export_telemetry(first.cursor).gap
+
+def test_api_on_sqlite_backend(sqlite_client):
+    client = sqlite_client
+    resp = client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+    assert client.get("/preferences").json() == {"telemetry": True, "theme": "dark"}
+    assert client.get("/preferences", headers={"If-None-Match": etag}).status_code == 304
+    assert client.post("/preferences", json={"telemetry": False, "theme": "dark"}, headers={"If-Match": etag}).status_code == 200
+    assert client.post("/preferences", json={"telemetry": True, "theme": "dark"}, headers={"If-Match": etag}).status_code == 412
+
+    for i in range(3):
+        assert client.post("/telemetry", json={"event": "click", "details": {"i": i}}).json() == {"status": "received"}
+    batch = "\n".join(json.dumps({"event": "step", "details": {"i": i}}) for i in range(4))
+    assert client.post("/telemetry/batch", content=batch, headers={"Content-Type": "application/x-ndjson"}).json()["accepted"] == 4
+    stats = client.get("/telemetry/stats").json()
+    assert stats["total"] == 7 and stats["events"] == {"step": 4, "click": 3}
+    assert client.get("/telemetry/events", params={"event": "click"}).json()["total"] == 3
+
+    with client.stream("GET", "/telemetry/export", params={"gzip": "true"}, headers={"Accept-Encoding": "identity"}) as resp:
+        assert len(gzip.decompress(b"".join(resp.iter_raw())).splitlines()) == 7
+        cursor = resp.headers["X-Telemetry-Cursor"]
+    client.post("/telemetry", json={"event": "late", "details": {}})
+    resp = client.get("/telemetry/export", params={"cursor": cursor, "gzip": "false"})
+    assert [json.loads(line)["event"] for line in resp.content.splitlines()] == ["late"]
+
+def test_migrate_from_files(client, backend, tmp_path, db):
+    client.post("/preferences", json={"telemetry": True, "theme": "dark"})
+    for i in range(25):
+        client.post("/telemetry", json={"event": f"e{i % 2}", "details": {"i": i}})
+    backend.close_telemetry_writer()
+    expected = backend.storage.telemetry_stats()["events"]
+    backend.close_telemetry_writer()
+
+    assert migrate_from_files(db, str(tmp_path / "preferences.json"), str(tmp_path / "telemetry.log"), batch_lines=10) == (True, 25)
+    assert db.load_preferences() == Preferences(telemetry=True, theme='dark')
+    assert db.telemetry_stats()["events"] == expected
+    assert b"".join(db.export_telemetry(None).chunks) == (tmp_path / "telemetry.log").read_bytes()
+    assert migrate_from_files(db, str(tmp_path / "preferences.json"), str(tmp_path / "telemetry.log")) == (False, 0) # Once only
+    db.close()
+    assert main(["migrate", "--db", db.path, "--preferences", str(tmp_path / "preferences.json"),
+                 "--telemetry", str(tmp_path / "telemetry.log"), "--force"]) == 0
+    assert db.telemetry_stats()["total"] == 50 # Reopened on use
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.telemetry_aggregator import SUMMARY_EVENT, TelemetryAggregator
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_040.0 # A multiple of 60: window boundaries fall on whole minutes
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def emitted():
+    return []
+
+@pytest.fixture
+def aggregator(emitted):
+    aggregator = TelemetryAggregator(emitted.extend, window=60, group_by=["step"], raw_events=["error"], clock=FakeClock())
+    yield aggregator
+    aggregator.close()
+
+def _counts(record):
+    return {(c["event"], json.dumps(c["details"], sort_keys=True)): c["count"] for c in record["counts"]}
+
+def test_closed_window_becomes_one_summary_record(aggregator, emitted):
+    for step in (1, 1, 2):
+        aggregator.add("wizard_step", {"step": step, "session": "abc"})
+    aggregator.add("click", {"button": "next"})
+    assert aggregator.flush(force=False) == 0 # Window still open
+    aggregator._clock.now += 60
+    assert aggregator.flush(force=False) == 1
+    [record] = emitted
+    assert record["event"] == SUMMARY_EVENT
+    assert record["timestamp"] == "2023-11-14T22:14:00+00:00"
+    assert record["window_seconds"] == 60
+    assert _counts(record) == {
+        ("click", "{}"): 1,
+        ("wizard_step", '{"step": 1}'): 2,
+        ("wizard_step", '{"step": 2}'): 1,
+    }
+
+def test_events_are_grouped_by_receive_window(aggregator, emitted):
+    aggregator.add("click", {}, ts=aggregator._clock.now - 1) # Previous window
+    aggregator.add("click", {})
+    aggregator.add("click", {})
+    assert aggregator.flush(force=False) == 1
+    assert _counts(emitted[0]) == {("click", "{}"): 1}
+    assert aggregator.pending() == {"click": 2}
+    aggregator.close() # Shutdown writes the current window too
+    assert _counts(emitted[1]) == {("click", "{}"): 2}
+    assert aggregator.pending() == {}
+
+def test_raw_events_are_not_aggregated(aggregator):
+    assert aggregator.aggregates("click")
+    assert not aggregator.aggregates("error")
+
+def test_sampled_events_are_weighted(aggregator, emitted):
+    for _ in range(3):
+        aggregator.add("scroll", {}, weight=1 / 0.25)
+    aggregator.add("scroll", {}, weight=1 / 0.3)
+    aggregator.flush()
+    assert _counts(emitted[0]) == {("scroll", "{}"): 15.333333}
+
+def test_key_limit_folds_new_combinations_into_the_event(emitted):
+    aggregator = TelemetryAggregator(emitted.extend, group_by=["id"], max_keys=2, clock=FakeClock())
+    for i in range(5):
+        aggregator.add("view", {"id": i})
+    aggregator.add("view", {"id": [1, 2]})
+    aggregator.close()
+    assert _counts(emitted[0]) == {("view", '{"id": 0}'): 1, ("view", '{"id": 1}'): 1, ("view", "{}"): 4}
+
+def test_failed_write_keeps_the_window(emitted):
+    def emit(records):
+        if not emitted:
+            emitted.append("failed")
+            raise OSError("disk full")
+        emitted.extend(records)
+    aggregator = TelemetryAggregator(emit, clock=FakeClock())
+    aggregator.add("click", {})
+    assert aggregator.flush() == 0
+    aggregator.add("click", {})
+    aggregator.close()
+    assert _counts(emitted[1]) == {("click", "{}"): 2}
+
+def test_timer_emits_when_the_window_ends():
+    done = threading.Event()
+    aggregator = TelemetryAggregator(lambda records: done.set(), window=0.2)
+    aggregator.add("click", {})
+    assert done.wait(2)
+    aggregator.close()
+
+def test_aggregation_mode_through_the_api(make_app, tmp_path):
+    path = tmp_path / "telemetry.log"
+    app = make_app(telemetry_aggregate=True, telemetry_aggregate_window_s=3600, telemetry_aggregate_keys=("step",), telemetry_raw_events=("error",))
+    client, backend = TestClient(app), app.state.backend
+    aggregator = backend.telemetry_aggregator
+    for step in (1, 2, 2):
+        assert client.post("/telemetry", json={"event": "wizard_step", "details": {"step": step}}).json() == {"status": "received"}
+    assert client.post("/telemetry", json={"event": "error", "details": {"message": "boom"}}).status_code == 200
+    resp = client.post("/telemetry/batch", json=[{"event": "wizard_step", "details": {"step": 1}}] * 4)
+    assert resp.json()["accepted"] == 4
+
+    stats = client.get("/telemetry/stats").json()
+    assert stats["events"] == {"error": 1}
+    assert stats["pending_aggregates"] == {"wizard_step": 7}
+    backend.close_telemetry_writer() # Flushes the open window first
+    aggregator.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r["event"] for r in records] == ["error", SUMMARY_EVENT]
+    assert records[0]["details"] == {"message": "boom"}
+    assert _counts(records[1]) == {("wizard_step", '{"step": 1}'): 5, ("wizard_step", '{"step": 2}'): 2}
+    assert client.get("/telemetry/stats").json()["events"] == {"error": 1, SUMMARY_EVENT: 1}
+    backend.close_telemetry_writer()
+
+def test_backend_close_stops_the_window_timer(make_app, tmp_path):
+    app = make_app(telemetry_aggregate=True, telemetry_aggregate_window_s=0.2)
+    backend = app.state.backend
+    with TestClient(app) as client:
+        assert client.post("/telemetry", json={"event": "click", "details": {}}).status_code == 200
+        assert backend.telemetry_aggregator.pending() == {"click": 1}
+    assert backend._telemetry_writer is None and backend.telemetry_aggregator._timer is None
+    time.sleep(0.4) # Past the window end: no timer left to emit through a new writer
+    assert backend._telemetry_writer is None
+    with open(tmp_path / "telemetry.log") as f:
+        assert [json.loads(line)["event"] for line in f] == [SUMMARY_EVENT]
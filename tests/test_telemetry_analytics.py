@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import backend.telemetry_analytics as analytics
+from backend.telemetry_analytics import load_columns, main, parse_lines
+from backend.telemetry_segments import compress_segment, list_segments, remove_sidecars, sealed_segment_path
+
+STEPS = ("Welcome", "System Info", "Network", "Preferences")
+
+def _line(event, details, ts, **extra):
+    timestamp = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    return (json.dumps({"event": event, "details": details, "timestamp": timestamp, **extra}) + "\n").encode()
+
+def _events(n, start=1_714_000_000.25, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        ts = start + i * 7.3
+        if i % 4:
+            step = min(int(rng.expovariate(0.8)), 3)
+            lines.append(_line("step_changed", {"step": step, "step_name": STEPS[step]}, ts))
+        elif i % 8 == 0:
+            lines.append(_line("network_status_checked", {"online": True, "latency_ms": round(rng.uniform(1, 500), 1)}, ts))
+        else:
+            lines.append(_line("onboarding_completed", {"final_preferences": {"theme": "dark", "telemetry": True}}, ts))
+    return lines
+
+def test_records_become_dictionary_encoded_columns():
+    lines = [
+        _line("step_changed", {"step": 1, "step_name": "Welcome", "os": {"name": "linux", "bits": 64}}, 100.5),
+        _line("theme_changed", {"theme": "dark", "ok": True, "none": None, "tags": ["a"]}, 101.0, sample_rate=0.25),
+        json.dumps({"event": "telemetry.summary", "timestamp": "1970-01-01T00:02:00+00:00", "window_seconds": 60,
+                    "counts": [{"event": "step_changed", "details": {"step": 2}, "count": 7},
+                               {"event": "click", "details": {}, "count": 3}]}).encode() + b"\n",
+        json.dumps({"event": "step_changed", "details": {"step": 2**70}, "timestamp": 130}).encode() + b"\n", # Not valid for orjson
+        _line("step_changed", {"step": "last"}, 140.0),
+        b"not json\n",
+        b"\n",
+        b'{"details": {}}\n',
+    ]
+    columns = parse_lines(lines)
+    assert len(columns) == 6 and columns.skipped == 2
+    assert columns.event_names == ["step_changed", "theme_changed", "click"]
+    assert columns.event.tolist() == [0, 1, 0, 2, 0, 0]
+    assert columns.ts.tolist() == [100.5, 101.0, 120.0, 120.0, 130.0, 140.0]
+    assert columns.weight.tolist() == [1, 4, 7, 3, 1, 1]
+
+    assert columns.columns["os.name"].categories == ["linux"] and columns.columns["os.bits"].numeric
+    theme = columns.columns["theme"]
+    assert theme.rows.tolist() == [1] and theme.categories == ["dark"]
+    assert [columns.columns[key].categories for key in ("ok", "none", "tags")] == [["true"], ["null"], ['["a"]']]
+    step = columns.columns["step"] # Numbers and strings mixed: every value as a category
+    assert step.rows.tolist() == [0, 2, 4, 5]
+    assert [step.categories[code] for code in step.values] == ["1", "2", str(2**70), "last"]
+
+def test_questions_match_a_per_line_loop():
+    lines = _events(3000)
+    columns = parse_lines(lines)
+    records = [json.loads(line) for line in lines]
+
+    expected = {}
+    for record in records:
+        start = math.floor(datetime.fromisoformat(record["timestamp"]).timestamp() / 600) * 600
+        expected[start, record["event"]] = expected.get((start, record["event"]), 0) + 1
+    starts, matrix = columns.counts_over_time(600)
+    found = {(start, columns.event_names[code]): count
+             for start, row in zip(starts.tolist(), matrix.tolist()) for code, count in enumerate(row) if count}
+    assert found == expected
+    starts, matrix = columns.counts_over_time(600, events=["onboarding_completed"])
+    assert matrix.sum() == sum(r["event"] == "onboarding_completed" for r in records)
+
+    steps = [r["details"]["step"] for r in records if r["event"] == "step_changed"]
+    completed = sum(r["event"] == "onboarding_completed" for r in records)
+    assert columns.funnel(final_event="onboarding_completed") == [(str(s), steps.count(s)) for s in range(4)] + [("onboarding_completed", completed)]
+    by_name = columns.funnel(key="step_name")
+    assert [label for label, _ in by_name] == list(STEPS) # Named steps by descending count
+    assert columns.funnel(key="step_name", steps=["Network", "Missing"]) == [("Network", steps.count(2)), ("Missing", 0)]
+
+    latencies = [r["details"]["latency_ms"] for r in records if r["event"] == "network_status_checked"]
+    count, values = columns.percentiles("latency_ms", (50, 90, 99), event="network_status_checked")
+    assert count == len(latencies)
+    assert values == np.percentile(latencies, [50, 90, 99], method="inverted_cdf").tolist()
+    with pytest.raises(ValueError):
+        columns.percentiles("step_name")
+
+def test_percentiles_weight_sampled_and_summarized_events():
+    lines = [_line("check", {"ms": 10}, 1.0, sample_rate=0.1), _line("check", {"ms": 1000}, 2.0)]
+    lines += [_line("check", {"ms": 20}, 3.0)] * 4
+    count, (p50, p90, p99) = parse_lines(lines).percentiles("ms", (50, 90, 99))
+    assert count == 15 and (p50, p90, p99) == (10, 20, 1000) # The sampled row stands for 10 events
+
+def test_segments_are_cached_and_the_active_segment_topped_up(tmp_path, monkeypatch):
+    active = str(tmp_path / "telemetry.log")
+    lines = _events(900)
+    for seq, part in ((1, lines[:300]), (2, lines[300:600])):
+        with open(sealed_segment_path(active, seq), "wb") as f:
+            f.writelines(part)
+    compress_segment(sealed_segment_path(active, 1))
+    with open(active, "wb") as f:
+        f.writelines(lines[600:850])
+        f.write(lines[850][:20]) # A line still being written
+
+    parsed = []
+    real_parse = analytics._parse_segment
+    monkeypatch.setattr(analytics, "_parse_segment", lambda segment, offset, max_columns: parsed.append((segment.seq, offset)) or real_parse(segment, offset, max_columns))
+
+    first = load_columns(active)
+    assert len(first) == 850 and [seq for seq, _ in parsed] == [1, 2, 3]
+    assert sorted(p.name for p in tmp_path.glob("*.cols.npz")) == ["telemetry.log.000001.cols.npz", "telemetry.log.000002.cols.npz", "telemetry.log.cols.npz"]
+    reference = parse_lines(lines[:850])
+    assert first.event_names == reference.event_names and first.event.tolist() == reference.event.tolist()
+
+    parsed.clear()
+    cached = load_columns(active)
+    complete = sum(map(len, lines[600:850]))
+    assert parsed == [(3, complete)] and cached.ts.tolist() == first.ts.tolist() # Only the partial line is read again
+    assert cached.columns["step_name"].categories == first.columns["step_name"].categories
+
+    with open(active, "ab") as f:
+        f.write(lines[850][20:])
+        f.writelines(lines[851:])
+    grown = load_columns(active)
+    assert parsed == [(3, complete), (3, complete)] # Only the appended lines
+    expected = parse_lines(lines)
+    assert grown.event.tolist() == expected.event.tolist() and grown.weight.tolist() == expected.weight.tolist()
+    assert grown.columns["latency_ms"].values.tolist() == expected.columns["latency_ms"].values.tolist()
+
+    os.replace(active, sealed_segment_path(active, 3)) # Rollover: a new active segment
+    with open(active, "wb") as f:
+        f.writelines(_events(50, start=1_800_000_000, seed=2))
+    parsed.clear()
+    assert len(load_columns(active)) == 950 and [seq for seq, _ in parsed] == [3, 4]
+
+    remove_sidecars(list_segments(active)[0].path)
+    assert not (tmp_path / "telemetry.log.000001.cols.npz").exists()
+    assert len(load_columns(active, cache=False)) == 950
+
+def test_cli_prints_funnel_and_percentiles(tmp_path, capsys):
+    path = tmp_path / "telemetry.log"
+    path.write_bytes(b"".join(_events(400)))
+    assert main([str(path), "funnel"]) == 0
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].split() == ["stage", "count", "of", "first", "drop-off"]
+    assert out[1].startswith("0") and out[1].split()[2:] == ["100.0%", "0.0%"]
+    assert out[-1].startswith("onboarding_completed")
+    assert main([str(path), "percentiles", "latency_ms", "-q", "50"]) == 0
+    assert capsys.readouterr().out.splitlines() == ["count 50", "p50 " + format(load_columns(str(path)).percentiles("latency_ms", (50,))[1][0], "g")]
+    assert main([str(path), "percentiles", "step_name"]) == 1
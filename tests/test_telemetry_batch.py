@@ -0,0 +1,94 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+@pytest.fixture
+def telemetry_path(tmp_path):
+    return tmp_path / "telemetry.log"
+
+def _logged_events(path):
+    with open(path) as f:
+        return [json.loads(line)["event"] for line in f]
+
+def test_batch_json_array(client, telemetry_path):
+    events = [{"event": f"event_{i}", "details": {"index": i}} for i in range(20)]
+    resp = client.post("/telemetry/batch", json=events)
+    assert resp.status_code == 200
+    assert resp.json() == {"status": "received", "accepted": 20, "rejected": 0, "errors": []}
+    assert _logged_events(telemetry_path) == [f"event_{i}" for i in range(20)]
+
+def test_batch_reports_per_record_errors(client, telemetry_path):
+    events = [
+        {"event": "ok_1", "details": {}},
+        {"event": "", "details": {}},
+        {"event": "ok_2", "details": "not_an_object"},
+        "not an object",
+        {"event": "ok_3", "details": {}, "extra": 1},
+        {"event": "ok_4", "details": {}},
+    ]
+    resp = client.post("/telemetry/batch", json=events)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["accepted"] == 2
+    assert body["rejected"] == 4
+    assert [error["index"] for error in body["errors"]] == [1, 2, 3, 4]
+    assert _logged_events(telemetry_path) == ["ok_1", "ok_4"]
+
+def test_batch_array_is_one_append(client, backend):
+    events = [{"event": f"event_{i}", "details": {}} for i in range(50)]
+    writer = backend.get_telemetry_writer()
+    with patch.object(writer, "submit_async", wraps=writer.submit_async) as submit:
+        resp = client.post("/telemetry/batch", json=events)
+    assert resp.status_code == 200
+    assert submit.call_count == 1
+
+def test_batch_ndjson_stream(client, telemetry_path):
+    lines = [json.dumps({"event": f"event_{i}", "details": {"index": i}}) for i in range(100)]
+    lines.insert(10, "{broken json")
+    lines.insert(20, "")
+
+    def body():
+        # Split mid-line to exercise the incremental line splitter
+        data = ("\n".join(lines) + "\n").encode()
+        for start in range(0, len(data), 37):
+            yield data[start:start + 37]
+
+    resp = client.post("/telemetry/batch", content=body(), headers={"Content-Type": "application/x-ndjson"})
+    assert resp.status_code == 200
+    body_json = resp.json()
+    assert body_json["accepted"] == 100
+    assert body_json["rejected"] == 1
+    assert body_json["errors"][0]["index"] == 10
+    assert _logged_events(telemetry_path) == [f"event_{i}" for i in range(100)]
+
+def test_batch_ndjson_flushes_in_chunks(make_app, telemetry_path):
+    app = make_app(telemetry_batch_chunk_bytes=256)
+    client = TestClient(app)
+    lines = "".join(json.dumps({"event": f"event_{i}", "details": {}}) + "\n" for i in range(100))
+    writer = app.state.backend.get_telemetry_writer()
+    with patch.object(writer, "submit_async", wraps=writer.submit_async) as submit:
+        resp = client.post("/telemetry/batch", content=lines, headers={"Content-Type": "application/x-ndjson"})
+    assert resp.json()["accepted"] == 100
+    assert submit.call_count > 1
+    assert len(_logged_events(telemetry_path)) == 100
+
+def test_batch_rejects_non_array_body(client):
+    resp = client.post("/telemetry/batch", json={"event": "single", "details": {}})
+    assert resp.status_code == 422
+    resp = client.post("/telemetry/batch", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert resp.status_code == 422
+
+def test_batch_error_report_is_capped(client, backend):
+    max_reported = backend.settings.telemetry_batch_max_reported_errors
+    events = [{"event": "", "details": {}}] * (max_reported + 50)
+    body = client.post("/telemetry/batch", json=events).json()
+    assert body["rejected"] == len(events)
+    assert len(body["errors"]) == max_reported
+
+def test_batch_directory_conflict(make_app, tmp_path):
+    directory = tmp_path / "telemetry_dir.log"
+    directory.mkdir()
+    client = TestClient(make_app(telemetry_file=str(directory)))
+    resp = client.post("/telemetry/batch", json=[{"event": "a", "details": {}}])
+    assert resp.status_code == 500
@@ -0,0 +1,86 @@
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.telemetry_binary import (
+    MAGIC, BinaryLogReader, BinaryLogWriter, binary_to_ndjson, main, ndjson_to_binary,
+)
+
+def _record(i):
+    ts = datetime.fromtimestamp(1_714_000_000 + i * 0.0137, timezone.utc).isoformat()
+    return {"event": f"wizard_step_{i % 3}", "details": {"step": i % 6, "action": "next", "i": i}, "timestamp": ts}
+
+def _encode(lines):
+    buf = io.BytesIO()
+    writer = BinaryLogWriter(buf)
+    for line in lines:
+        writer.write_line(line)
+    writer.close()
+    return buf.getvalue()
+
+def test_app_log_lines_round_trip_byte_for_byte():
+    lines = [json.dumps(_record(i)).encode() + b"\n" for i in range(500)]
+    data = _encode(lines)
+    assert data.startswith(MAGIC)
+    assert len(data) < len(b"".join(lines)) / 3
+    assert list(BinaryLogReader(io.BytesIO(data)).lines()) == lines
+    assert list(BinaryLogReader(io.BytesIO(data))) == [_record(i) for i in range(500)]
+
+def test_every_json_value_and_odd_line_survives():
+    lines = [
+        json.dumps({"event": "e", "details": {"n": None, "t": True, "f": False, "neg": -5, "big": 2**70,
+                                              "pi": 3.14159, "inf": float("inf"), "s": "é" * 100, "l": [[], {}, [1, "a"]]},
+                    "timestamp": "2025-01-01T00:00:00+00:00", "sample_rate": 0.1}).encode() + b"\n",
+        json.dumps({"timestamp": "2025-01-01T00:00:00.5+00:00", "event": "order"}).encode() + b"\n", # Not isoformat(): kept as text
+        json.dumps({"event": "ü", "timestamp": 1714000000.5}, separators=(",", ":"), ensure_ascii=False).encode() + b"\n",
+        b'{"event":  "extra spaces"}\n',
+        b"not json\n",
+        b"\n",
+        b'["a list"]\n',
+        b'{"event": 5}\n',
+        json.dumps({"event": "no newline at end of file"}).encode(),
+    ]
+    data = _encode(lines)
+    assert list(BinaryLogReader(io.BytesIO(data)).lines()) == lines
+    records = list(BinaryLogReader(io.BytesIO(data)))
+    assert records[0]["details"]["big"] == 2**70
+    assert list(records[1]) == ["timestamp", "event"] # Key order kept
+    scanned = list(BinaryLogReader(io.BytesIO(data)).scan())
+    assert scanned[0] == ("e", 1735689600.0)
+    assert scanned[2] == ("ü", 1714000000.5)
+    assert scanned[4] == (None, None)
+
+def test_reader_handles_records_split_across_reads(monkeypatch):
+    monkeypatch.setattr("backend.telemetry_binary._READ_SIZE", 7)
+    lines = [json.dumps(_record(i)).encode() + b"\n" for i in range(50)]
+    assert list(BinaryLogReader(io.BytesIO(_encode(lines))).lines()) == lines
+
+def test_truncated_or_foreign_files_are_rejected():
+    data = _encode([json.dumps(_record(1)).encode() + b"\n"])
+    with pytest.raises(ValueError):
+        list(BinaryLogReader(io.BytesIO(data[:-3])))
+    with pytest.raises(ValueError):
+        BinaryLogReader(io.BytesIO(b'{"event": "x"}\n'))
+
+def test_writer_rejects_records_without_an_event():
+    with pytest.raises(ValueError):
+        BinaryLogWriter(io.BytesIO()).write({"details": {}})
+
+def test_converter_round_trips_a_real_log(client, backend, tmp_path):
+    log = tmp_path / "telemetry.log"
+    for i in range(20):
+        assert client.post("/telemetry", json={"event": f"step_{i % 4}", "details": {"i": i, "ok": True}}).status_code == 200
+    backend.close_telemetry_writer()
+    with open(log, "ab") as f:
+        f.write(b'{"event": "from_tauri", "timestamp": "2025-01-01T00:00:00Z"}\n') # Foreign writer
+    with open(log, "rb") as f, gzip.open(tmp_path / "telemetry.log.1.gz", "wb") as gz:
+        gz.write(f.read())
+
+    assert main(["encode", str(log), str(tmp_path / "t.tlb")]) == 0
+    assert binary_to_ndjson(str(tmp_path / "t.tlb"), str(tmp_path / "restored.log")) == 21
+    assert (tmp_path / "restored.log").read_bytes() == log.read_bytes()
+    assert ndjson_to_binary(str(tmp_path / "telemetry.log.1.gz"), str(tmp_path / "gz.tlb")) == 21
+    assert (tmp_path / "gz.tlb").read_bytes() == (tmp_path / "t.tlb").read_bytes()
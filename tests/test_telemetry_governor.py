@@ -0,0 +1,160 @@
+import asyncio
+import json
+import statistics
+import time
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from backend.telemetry_governor import (
+    ACCEPTED, OTHER_EVENTS, RATE_LIMITED, SAMPLED_OUT, TelemetryGovernor, parse_sample_rates, retry_after_header,
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def telemetry_path(tmp_path):
+    return tmp_path / "telemetry.log"
+
+def _use(monkeypatch, backend, governor):
+    monkeypatch.setattr(backend, 'telemetry_governor', governor)
+    return governor
+
+def _logged(backend, path):
+    backend.close_telemetry_writer()
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_global_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    governor = TelemetryGovernor(rate=10, burst=3, clock=clock)
+    assert [governor.admit(f"e{i}").outcome for i in range(4)] == [ACCEPTED] * 3 + [RATE_LIMITED]
+    limited = governor.admit("e")
+    assert limited.retry_after == pytest.approx(0.1)
+    clock.now += 0.1
+    assert governor.admit("e").outcome == ACCEPTED
+    assert governor.admit("e").outcome == RATE_LIMITED
+
+def test_event_buckets_limit_each_name_separately():
+    clock = FakeClock()
+    governor = TelemetryGovernor(event_rate=1, event_burst=2, clock=clock)
+    assert [governor.admit("noisy").outcome for _ in range(3)] == [ACCEPTED, ACCEPTED, RATE_LIMITED]
+    assert governor.admit("quiet").outcome == ACCEPTED # A noisy event does not starve the others
+    assert governor.admit("noisy").retry_after == pytest.approx(1.0)
+
+def test_rejected_event_takes_no_tokens():
+    clock = FakeClock()
+    governor = TelemetryGovernor(rate=100, burst=2, event_rate=1, event_burst=1, clock=clock)
+    assert governor.admit("a").outcome == ACCEPTED
+    assert governor.admit("a").outcome == RATE_LIMITED # Per-event bucket empty: global token kept
+    assert governor.admit("b").outcome == ACCEPTED
+    assert governor.admit("c").outcome == RATE_LIMITED # Now the global bucket is empty
+
+def test_zero_rate_disables_limits():
+    governor = TelemetryGovernor()
+    assert all(governor.admit("e").outcome == ACCEPTED for _ in range(10000))
+
+def test_sampling_is_counted_and_records_the_rate():
+    draws = iter([0.05, 0.5, 0.09, 0.99])
+    governor = TelemetryGovernor(sample_rates={"scroll": 0.1}, rng=lambda: next(draws))
+    outcomes = [governor.admit("scroll") for _ in range(4)]
+    assert [a.outcome for a in outcomes] == [ACCEPTED, SAMPLED_OUT, ACCEPTED, SAMPLED_OUT]
+    assert outcomes[0].sample_rate == 0.1
+    assert governor.admit("click").sample_rate == 1.0 # No rate configured: never sampled
+    summary = governor.summary()
+    assert summary == {
+        "received": 5, ACCEPTED: 3, SAMPLED_OUT: 2, RATE_LIMITED: 0,
+        "events": {"scroll": {"received": 4, ACCEPTED: 2, SAMPLED_OUT: 2, RATE_LIMITED: 0}},
+    }
+
+def test_default_sample_rate_and_unbounded_names():
+    governor = TelemetryGovernor(sample_rates={"*": 0.0, "click": 1.0}, max_events=2)
+    assert governor.admit("click").outcome == ACCEPTED
+    for i in range(5):
+        assert governor.admit(f"random_{i}").outcome == SAMPLED_OUT
+    counters = governor.counters()
+    assert set(counters) == {"click", "random_0", OTHER_EVENTS}
+    assert counters[OTHER_EVENTS][SAMPLED_OUT] == 4
+    governor.reset()
+    assert governor.counters() == {}
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("") == {}
+    assert parse_sample_rates(" scroll=0.1, *=0.5 ,") == {"scroll": 0.1, "*": 0.5}
+    for spec in ("scroll", "scroll=2", "=0.5", "scroll=abc"):
+        with pytest.raises(ValueError):
+            parse_sample_rates(spec)
+
+def test_retry_after_header_rounds_up():
+    assert retry_after_header(0.01) == "1"
+    assert retry_after_header(1.2) == "2"
+
+def test_post_telemetry_rate_limited_returns_429(monkeypatch, client, backend, telemetry_path):
+    _use(monkeypatch, backend, TelemetryGovernor(event_rate=0.5, event_burst=2))
+    statuses = [client.post("/telemetry", json={"event": "loop", "details": {}}) for _ in range(3)]
+    assert [r.status_code for r in statuses] == [200, 200, 429]
+    assert statuses[2].headers["Retry-After"] == "2"
+    assert statuses[2].json() == {"detail": "Telemetry rate limit exceeded."}
+    assert len(_logged(backend, telemetry_path)) == 2
+    ingest = client.get("/telemetry/stats").json()["ingest"]
+    assert ingest["received"] == 3 and ingest[RATE_LIMITED] == 1
+    assert ingest["events"]["loop"] == {"received": 3, ACCEPTED: 2, SAMPLED_OUT: 0, RATE_LIMITED: 1}
+
+def test_sampled_events_are_weighted_in_the_log(monkeypatch, client, backend, telemetry_path):
+    draws = iter([0.1, 0.3] * 5)
+    _use(monkeypatch, backend, TelemetryGovernor(sample_rates={"scroll": 0.25}, rng=lambda: next(draws)))
+    responses = [client.post("/telemetry", json={"event": "scroll", "details": {}}).json() for _ in range(2)]
+    assert responses == [{"status": "received"}, {"status": "sampled"}]
+    resp = client.post("/telemetry/batch", json=[{"event": "scroll", "details": {}}] * 4 + [{"event": "click", "details": {}}])
+    assert resp.json() == {"status": "received", "accepted": 3, "rejected": 0, "errors": [], "sampled_out": 2}
+    records = _logged(backend, telemetry_path)
+    assert [r.get("sample_rate") for r in records] == [0.25, 0.25, 0.25, None]
+
+def test_batch_endpoint_is_not_rate_limited(monkeypatch, client, backend, telemetry_path):
+    _use(monkeypatch, backend, TelemetryGovernor(rate=1, burst=1))
+    resp = client.post("/telemetry/batch", json=[{"event": "e", "details": {}}] * 50)
+    assert resp.json()["accepted"] == 50
+
+async def _preferences_latencies(ac, count):
+    latencies = []
+    for _ in range(count):
+        t0 = time.perf_counter()
+        assert (await ac.get("/preferences")).status_code == 200
+        latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0)
+    return latencies
+
+@pytest.mark.asyncio
+async def test_flood_is_capped_and_preferences_stay_responsive(monkeypatch, app, backend, telemetry_path):
+    rate, burst, tick = 50, 20, 0.005 # Each flood request advances the fake clock by one tick
+    clock = FakeClock()
+    _use(monkeypatch, backend, TelemetryGovernor(rate=rate, burst=burst, clock=clock))
+    statuses = {200: 0, 429: 0}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        # p95 without the flood, measured the same way and on the same (possibly busy) cores
+        baseline = statistics.quantiles(await _preferences_latencies(ac, 100), n=20)[-1]
+        flooding = True
+
+        async def flood(n):
+            while flooding:
+                resp = await ac.post("/telemetry", json={"event": f"runaway_{n % 3}", "details": {"n": n}})
+                statuses[resp.status_code] += 1
+                clock.now += tick
+
+        floods = [asyncio.ensure_future(flood(n)) for n in range(20)]
+        latencies = await _preferences_latencies(ac, 100)
+        flooding = False
+        await asyncio.gather(*floods)
+
+    assert statuses[429] > 0
+    assert statuses[200] <= burst + rate * clock.now
+    assert len(_logged(backend, telemetry_path)) == statuses[200] # Rejected events never reach the log
+    assert backend.telemetry_governor.summary()["received"] == statuses[200] + statuses[429]
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    assert p95 < 5 * baseline # Rejections are cheap: the flood must not leave the probes queued behind a backlog
@@ -0,0 +1,107 @@
+import json
+import os
+import pytest
+from unittest.mock import patch
+
+from backend.telemetry_index import RECORD, TelemetryIndex, parse_timestamp
+from backend.telemetry_segments import SegmentPolicy, list_segments
+from backend.telemetry_writer import TelemetryWriter
+
+@pytest.fixture
+def telemetry_path(tmp_path):
+    return tmp_path / "telemetry.log"
+
+def _post(client, event, **details):
+    resp = client.post("/telemetry", json={"event": event, "details": details})
+    assert resp.status_code == 200
+
+def _line(event, ts, **details):
+    return (json.dumps({"event": event, "details": details, "timestamp": ts}) + "\n").encode()
+
+def test_stats_and_events_endpoints(client):
+    for i in range(5):
+        _post(client, "click", i=i)
+    for i in range(3):
+        _post(client, "step", i=i)
+    stats = client.get("/telemetry/stats").json()
+    assert stats["total"] == 8
+    assert stats["events"] == {"click": 5, "step": 3}
+    body = client.get("/telemetry/events", params={"event": "step"}).json()
+    assert body["total"] == 3
+    assert [e["details"]["i"] for e in body["events"]] == [0, 1, 2]
+    assert all("timestamp" in e for e in body["events"])
+    body = client.get("/telemetry/events", params={"event": "click", "limit": 2}).json()
+    assert body["total"] == 5
+    assert body["returned"] == 2
+
+def test_time_filters(client, backend):
+    writer = backend.get_telemetry_writer()
+    base = 1_700_000_000.0
+    for minute in range(10):
+        writer.submit(_line("tick", base + minute * 60, minute=minute))
+    since = base + 5 * 60
+    body = client.get("/telemetry/events", params={"event": "tick", "since": since}).json()
+    assert [e["details"]["minute"] for e in body["events"]] == [5, 6, 7, 8, 9]
+    iso_until = "2023-11-14T22:18:20+00:00" # base + 5 minutes
+    assert parse_timestamp(iso_until) == since
+    body = client.get("/telemetry/events", params={"event": "tick", "until": iso_until}).json()
+    assert body["total"] == 5
+    stats = client.get("/telemetry/stats", params={"since": since, "bucket": 120}).json()
+    assert stats["total"] == 5
+    assert sum(sum(b["counts"].values()) for b in stats["buckets"]) == 5
+
+def test_invalid_time_param(client):
+    assert client.get("/telemetry/stats", params={"since": "yesterday"}).status_code == 422
+
+def test_events_query_seeks_instead_of_scanning(client):
+    for i in range(50):
+        _post(client, "noise", i=i)
+    _post(client, "needle", i=0)
+    client.get("/telemetry/stats") # Warm the index
+    with patch("backend.telemetry_index.entries_from_lines", side_effect=AssertionError("log was scanned")):
+        body = client.get("/telemetry/events", params={"event": "needle"}).json()
+    assert body["total"] == 1
+
+def test_index_rebuilt_after_crash(client, backend, telemetry_path):
+    for i in range(20):
+        _post(client, "click", i=i)
+    backend.close_telemetry_writer()
+    idx_path = str(telemetry_path) + ".idx"
+    # Simulate a crash that tore the last record and lost two more
+    size = os.path.getsize(idx_path)
+    with open(idx_path, "r+b") as f:
+        f.truncate(size - 2 * RECORD.size - 5)
+    index = TelemetryIndex(str(telemetry_path))
+    assert index.stats()["events"] == {"click": 20}
+    os.unlink(idx_path)
+    index = TelemetryIndex(str(telemetry_path))
+    records, total = index.events("click")
+    assert total == 20
+    assert [r["details"]["i"] for r in records] == list(range(20))
+
+def test_external_appends_are_indexed(client, telemetry_path):
+    _post(client, "click")
+    # The Tauri fallback writes the same file directly
+    with open(telemetry_path, "ab") as f:
+        f.write(_line("offline_event", "2024-01-01T00:00:00.123456789+00:00"))
+    _post(client, "click")
+    stats = client.get("/telemetry/stats").json()
+    assert stats["events"] == {"click": 2, "offline_event": 1}
+
+def test_index_spans_rotated_and_compressed_segments(tmp_path):
+    path = tmp_path / "rotating.log"
+    index = TelemetryIndex(str(path))
+    writer = TelemetryWriter(str(path), policy=SegmentPolicy(max_bytes=2000), index=index)
+    base = 1_700_000_000.0
+    for i in range(200):
+        writer.submit(_line("odd" if i % 2 else "even", base + i, i=i))
+    writer.close()
+    assert sum(s.compressed for s in list_segments(str(path))) >= 5
+    fresh = TelemetryIndex(str(path))
+    assert fresh.stats()["events"] == {"even": 100, "odd": 100}
+    records, total = fresh.events("odd", since=base + 150)
+    assert total == 25
+    assert [r["details"]["i"] for r in records] == list(range(151, 200, 2))
+    rebuilt = TelemetryIndex(str(path))
+    rebuilt.rebuild()
+    assert rebuilt.stats()["total"] == 200
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+from backend.telemetry_segments import (
+    SegmentMaintainer,
+    SegmentPolicy,
+    apply_retention,
+    list_segments,
+    open_segment,
+    sealed_segment_path,
+)
+from backend.telemetry_writer import TelemetryWriter
+
+def _all_events(active_path):
+    events = []
+    for segment in list_segments(str(active_path)):
+        with open_segment(segment) as f:
+            events.extend(json.loads(line)["i"] for line in f)
+    return events
+
+def _line(i):
+    return (json.dumps({"event": "e", "i": i}) + "\n").encode()
+
+def test_rollover_by_size_keeps_every_event_once(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), policy=SegmentPolicy(max_bytes=512, compress=False))
+    threads = [
+        threading.Thread(target=lambda base=t: [writer.submit(_line(base * 100 + i)) for i in range(100)])
+        for t in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.close()
+    segments = list_segments(str(path))
+    assert len(segments) > 2
+    assert all(os.path.getsize(s.path) <= 512 for s in segments)
+    assert sorted(_all_events(path)) == list(range(400))
+
+def test_rollover_by_age(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), policy=SegmentPolicy(max_age=0.05, compress=False))
+    writer.submit(_line(0))
+    time.sleep(0.1)
+    writer.submit(_line(1))
+    writer.close()
+    assert [s.active for s in list_segments(str(path))] == [False, True]
+    assert _all_events(path) == [0, 1]
+
+def test_sealed_segments_are_compressed(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), policy=SegmentPolicy(max_bytes=200))
+    for i in range(20):
+        writer.submit(_line(i))
+    writer.close()
+    segments = list_segments(str(path))
+    assert all(s.compressed for s in segments if not s.active)
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+    assert _all_events(path) == list(range(20))
+
+def test_retention_deletes_oldest_whole_segments(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), policy=SegmentPolicy(max_bytes=100, compress=False, retain_segments=3))
+    for i in range(30):
+        writer.submit(_line(i))
+    writer.close()
+    sealed = list_segments(str(path), include_active=False)
+    assert len(sealed) == 3
+    events = _all_events(path)
+    # The newest events survive, in order, with no gaps
+    assert events == list(range(events[0], 30))
+
+def test_retention_by_bytes_and_age(tmp_path):
+    path = tmp_path / "telemetry.log"
+    for seq in range(1, 5):
+        with open(sealed_segment_path(str(path), seq), "wb") as f:
+            f.write(b"x" * 100)
+    old = time.time() - 3600
+    os.utime(sealed_segment_path(str(path), 1), (old, old))
+    deleted = apply_retention(str(path), SegmentPolicy(retain_age=60))
+    assert deleted == [sealed_segment_path(str(path), 1)]
+    deleted = apply_retention(str(path), SegmentPolicy(retain_bytes=250))
+    assert deleted == [sealed_segment_path(str(path), 2)]
+    assert [s.seq for s in list_segments(str(path))] == [3, 4]
+
+def test_interrupted_compression_is_resumed(tmp_path):
+    path = tmp_path / "telemetry.log"
+    sealed = sealed_segment_path(str(path), 1)
+    with open(sealed, "wb") as f:
+        f.write(_line(0))
+    # A crash mid-compression leaves a partial .gz next to the complete plain file
+    with open(sealed + ".gz", "wb") as f:
+        f.write(b"partial")
+    assert list_segments(str(path))[0].compressed is False
+    maintainer = SegmentMaintainer(str(path), SegmentPolicy(max_bytes=1))
+    maintainer.start()
+    maintainer.close()
+    assert not os.path.exists(sealed)
+    with gzip.open(sealed + ".gz") as f:
+        assert f.read() == _line(0)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import threading
+import pytest
+from unittest.mock import patch
+
+from backend.telemetry_writer import TelemetryWriter, TelemetryWriteError
+
+def _lines(path):
+    with open(path, "rb") as f:
+        return f.read().splitlines()
+
+def test_submit_waits_until_written(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path))
+    try:
+        writer.submit(b'{"event": "a"}\n')
+        assert _lines(path) == [b'{"event": "a"}']
+    finally:
+        writer.close()
+
+def test_concurrent_submits_are_grouped(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), max_batch=1000, max_delay=0.05)
+    try:
+        threads = [
+            threading.Thread(target=writer.submit, args=(json.dumps({"event": f"e{i}"}).encode() + b"\n",))
+            for i in range(50)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        lines = _lines(path)
+        assert sorted(json.loads(l)["event"] for l in lines) == sorted(f"e{i}" for i in range(50))
+        assert writer.batches_written < 50
+    finally:
+        writer.close()
+
+def test_close_flushes_unacknowledged_events(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path), max_delay=0.05)
+    for i in range(100):
+        writer.submit(f"{i}\n".encode(), wait=False)
+    writer.close()
+    assert _lines(path) == [str(i).encode() for i in range(100)]
+
+def test_submit_after_close_fails(tmp_path):
+    writer = TelemetryWriter(str(tmp_path / "telemetry.log"))
+    writer.close()
+    with pytest.raises(TelemetryWriteError):
+        writer.submit(b"x\n")
+
+def test_write_error_is_reported_to_submitter(tmp_path):
+    directory = tmp_path / "telemetry.log"
+    directory.mkdir()
+    writer = TelemetryWriter(str(directory))
+    try:
+        with pytest.raises(IsADirectoryError):
+            writer.submit(b"x\n")
+    finally:
+        writer.close()
+
+def test_unexpected_error_fails_the_batch_and_the_writer_keeps_running(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path))
+    write = writer._write
+    calls = []
+    def flaky_write(fd, data):
+        calls.append(data)
+        if len(calls) == 1:
+            raise TypeError("not an I/O error")
+        return write(fd, data)
+    try:
+        with patch.object(writer, "_write", flaky_write):
+            with pytest.raises(TelemetryWriteError, match="TypeError"):
+                writer.submit(b'{"event": "a"}\n')
+            writer.submit(b'{"event": "b"}\n')
+        assert _lines(path) == [b'{"event": "b"}']
+    finally:
+        writer.close()
+
+@pytest.mark.asyncio
+async def test_cancelled_async_submitter_does_not_break_the_writer(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path))
+    entered, release = threading.Event(), threading.Event()
+    commit = writer._commit
+    def stalled_commit(batch):
+        entered.set()
+        release.wait(10)
+        commit(batch)
+    try:
+        with patch.object(writer, "_commit", stalled_commit):
+            task = asyncio.ensure_future(writer.submit_async(b'{"event": "a"}\n'))
+            await asyncio.get_running_loop().run_in_executor(None, entered.wait, 10)
+            task.cancel() # Clears the notify hook while the writer thread is about to settle the batch
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            release.set()
+        await writer.submit_async(b'{"event": "b"}\n')
+        assert _lines(path) == [b'{"event": "a"}', b'{"event": "b"}']
+    finally:
+        writer.close()
+
+@pytest.mark.parametrize("durability, expected_fsyncs", [("none", 0), ("batch", 1), ("event", 3)])
+def test_durability_levels(tmp_path, durability, expected_fsyncs):
+    path = tmp_path / "telemetry.log"
+    # A long linger groups the three submissions (and the flush marker) into one batch
+    writer = TelemetryWriter(str(path), max_delay=0.2, durability=durability)
+    try:
+        with patch("backend.telemetry_writer.os.fsync") as fsync:
+            for line in (b"a\n", b"b\n", b"c\n"):
+                writer.submit(line, wait=False)
+            writer.flush()
+        assert fsync.call_count == expected_fsyncs
+        assert writer.batches_written == 1
+        assert _lines(path) == [b"a", b"b", b"c"]
+    finally:
+        writer.close()
+
+def test_submit_many_is_one_write(tmp_path):
+    path = tmp_path / "telemetry.log"
+    writer = TelemetryWriter(str(path))
+    try:
+        with patch("backend.telemetry_writer.os.write", wraps=os.write) as write:
+            writer.submit_many([b"a\n", b"b\n", b"c\n"])
+        assert write.call_count == 1
+        assert _lines(path) == [b"a", b"b", b"c"]
+    finally:
+        writer.close()
+
+def test_unknown_durability_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TelemetryWriter(str(tmp_path / "telemetry.log"), durability="sometimes")
+
+def test_app_shutdown_flushes_writer(app, tmp_path):
+    from fastapi.testclient import TestClient
+
+    path = tmp_path / "telemetry.log"
+    backend = app.state.backend
+    with TestClient(app) as client:
+        resp = client.post("/telemetry", json={"event": "shutdown_test", "details": {}})
+        assert resp.status_code == 200
+        assert backend._telemetry_writer is not None
+    assert backend._telemetry_writer is None
+    assert json.loads(_lines(path)[0])["event"] == "shutdown_test"
@@ -0,0 +1,116 @@
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import time
+import pytest
+
+from backend import bootstrap
+from backend.bootstrap import bind_tcp, bind_unix, choose_implementation, describe_socket, parse_args, write_handshake
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+needs_unix = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="no Unix domain sockets")
+
+@needs_unix
+def test_unix_socket_is_private_to_the_user(tmp_path):
+    path = str(tmp_path / "backend.sock")
+    sock = bind_unix(path)
+    try:
+        mode = os.stat(path).st_mode
+        assert stat.S_ISSOCK(mode)
+        assert stat.S_IMODE(mode) == 0o600
+        assert describe_socket(sock) == {"transport": "unix", "path": path, "pid": os.getpid()}
+    finally:
+        sock.close()
+
+@needs_unix
+def test_stale_socket_is_replaced_but_other_files_are_not(tmp_path):
+    path = str(tmp_path / "backend.sock")
+    bind_unix(path).close() # Leaves the socket file behind, as a crashed server would
+    bind_unix(path).close()
+    regular = tmp_path / "not-a-socket"
+    regular.write_text("keep me")
+    with pytest.raises(FileExistsError):
+        bind_unix(str(regular))
+    assert regular.read_text() == "keep me"
+
+def test_port_zero_picks_a_free_port():
+    sock = bind_tcp("127.0.0.1", 0)
+    try:
+        info = describe_socket(sock)
+        assert info["transport"] == "tcp"
+        assert info["port"] > 0
+        assert info["url"] == f"http://127.0.0.1:{info['port']}"
+    finally:
+        sock.close()
+
+def test_handshake_file_is_written_atomically_and_privately(tmp_path):
+    path = tmp_path / "run" / "handshake.json"
+    write_handshake(str(path), {"transport": "tcp", "port": 1234})
+    assert json.loads(path.read_text()) == {"transport": "tcp", "port": 1234}
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(path.parent) == ["handshake.json"]
+
+def test_fast_implementations_fall_back_when_missing(monkeypatch):
+    monkeypatch.setattr(bootstrap.importlib.util, "find_spec", lambda name: None)
+    assert choose_implementation("uvloop", "uvloop", "asyncio") == "asyncio"
+    assert choose_implementation("httptools", "httptools", "h11") == "h11"
+    assert choose_implementation("auto", "uvloop", "asyncio") == "auto"
+
+def test_transport_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("BACKEND_PORT", "0")
+    monkeypatch.setenv("BACKEND_UDS", "/tmp/backend.sock")
+    monkeypatch.setenv("BACKEND_HANDSHAKE_FILE", "/tmp/handshake.json")
+    monkeypatch.setenv("BACKEND_LOOP", "uvloop")
+    args = parse_args([])
+    assert (args.port, args.uds, args.handshake_file, args.loop, args.http) == (0, "/tmp/backend.sock", "/tmp/handshake.json", "uvloop", "auto")
+    assert parse_args(["--uds", "/tmp/other.sock"]).uds == "/tmp/other.sock"
+
+def test_startup_timing_is_parsed_strictly(monkeypatch):
+    monkeypatch.setenv("STARTUP_TIMING", "Off")
+    assert parse_args([]).startup_timing is False
+    monkeypatch.setenv("STARTUP_TIMING", "yes")
+    assert parse_args([]).startup_timing is True
+    monkeypatch.setenv("STARTUP_TIMING", "ture") # A typo is an error, not "on"
+    with pytest.raises(SystemExit):
+        parse_args([])
+
+@needs_unix
+def test_server_runs_on_a_unix_socket(tmp_path):
+    sock_path, handshake = str(tmp_path / "backend.sock"), str(tmp_path / "handshake.json")
+    env = dict(os.environ, BACKEND_UDS=sock_path, BACKEND_HANDSHAKE_FILE=handshake,
+               PREFERENCES_FILE_PATH=str(tmp_path / "preferences.json"), TELEMETRY_FILE_PATH=str(tmp_path / "telemetry.log"))
+    proc = subprocess.Popen([sys.executable, os.path.join("backend", "main.py")], cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(handshake):
+            assert proc.poll() is None and time.monotonic() < deadline
+            time.sleep(0.01)
+        with open(handshake) as f:
+            assert json.load(f)["path"] == sock_path
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(10)
+            client.connect(sock_path)
+            client.sendall(b"GET /preferences HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            response = b""
+            while chunk := client.recv(65536):
+                response += chunk
+        assert response.startswith(b"HTTP/1.1 200")
+        assert json.loads(response.split(b"\r\n\r\n", 1)[1]) == {"telemetry": False, "theme": "light"}
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    assert not os.path.exists(sock_path)
+    assert not os.path.exists(handshake)
+
+def test_tcp_connections_disable_nagle():
+    # asyncio only sets TCP_NODELAY on accepted sockets whose proto is IPPROTO_TCP;
+    # without it keep-alive requests stall on delayed ACKs (~40 ms each)
+    sock = bind_tcp("127.0.0.1", 0)
+    try:
+        assert sock.proto == socket.IPPROTO_TCP
+    finally:
+        sock.close()